@@ -15,6 +15,30 @@ def create_app():
     # 設定読み込み
     app.config.from_object('config.Config')
     
+    # リクエスト・処理段階毎のレイテンシ計測（GET /metrics で Prometheus テキスト形式）
+    from app.metrics import init_metrics, metrics_response
+    init_metrics(app)
+    
+    # プロファイリング・低速リクエストの記録（GET /debug/requests）
+    from app.request_profiler import init_request_profiler, debug_requests_response
+    init_request_profiler(app)
+    
+    # 結果キャッシュ（同一内容の再送はモデル評価を省略）
+    from app.result_cache import init_result_cache
+    init_result_cache(app)
+    
+    # 定型メールのテンプレート指紋インデックス（安定したテンプレートはモデル評価を省略）
+    from app.template_index import init_template_index
+    init_template_index(app)
+    
+    # 入力の上限（長文メールは先頭・重要箇所・末尾のみを分類・文脈補完）
+    from app.input_budget import init_input_budget
+    init_input_budget(app)
+    
+    # 単体分類のマイクロバッチ（同時に届いたリクエストの推論を1回にまとめる）
+    from app.micro_batcher import init_micro_batcher
+    init_micro_batcher(app)
+    
     # Blueprint登録
     from app.classifier import classifier_bp
     from app.context_enricher import context_bp
@@ -22,8 +46,40 @@ def create_app():
     app.register_blueprint(classifier_bp, url_prefix='/api')
     app.register_blueprint(context_bp, url_prefix='/api')
     
+    # モデルの差し替え（同期・非同期・ファイル監視のいずれの再読み込みでも）で結果キャッシュ・テンプレート予測を破棄
+    from app.classifier import init_model_swap_invalidation
+    init_model_swap_invalidation(app)
+    
+    # モデルファイル監視（再学習後のファイル置き換えで自動的に再読み込み）
+    from app.model_watcher import init_model_watcher
+    init_model_watcher(app)
+    
     @app.route('/health')
     def health_check():
         return {"status": "healthy", "service": "gmail-classifier"}
     
+    @app.route('/ready')
+    def readiness_check():
+        # ウォームアップ完了まで 503（失敗した場合は再実行を開始）
+        warmup = app.extensions.get('startup_warmup')
+        if warmup is None:
+            return {"status": "ready", "service": "gmail-classifier", "warmup": None}
+        if not warmup.ready:
+            if warmup.state in ('pending', 'failed'):
+                warmup.start()
+            return {"status": warmup.state, "service": "gmail-classifier", "warmup": warmup.describe()}, 503
+        return {"status": "ready", "service": "gmail-classifier", "warmup": warmup.describe()}
+    
+    @app.route('/metrics')
+    def metrics():
+        return metrics_response()
+    
+    @app.route('/debug/requests')
+    def debug_requests():
+        return debug_requests_response()
+    
+    # 起動時ウォームアップ（モデル・文脈補完を合成メールで実行してから /ready が 200 を返す）
+    from app.startup_warmup import init_startup_warmup
+    init_startup_warmup(app)
+    
     return app
\ No newline at end of file
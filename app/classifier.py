@@ -3,199 +3,173 @@ Gmail分類API Blueprint
 機械学習モデルを使用してメールを分類
 """
 
-from flask import Blueprint, request, jsonify
-import pickle
-import joblib
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+import json
 import os
-import pandas as pd
 import re
-from typing import List, Dict
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.svm import LinearSVC
+import weakref
+from typing import Dict, Iterator, List, Optional, Tuple
+# pandas・scikit-learn・joblib はリクエスト処理では使わないため import しない
+# （joblib形式のモデルを読み込む場合のみ app.model_bundle が読み込む）
+# PayPay特化特徴量関数は model_sync_solution.py の単一定義を使用（下位互換のため再公開）
+from models.model_sync_solution import create_paypay_specialized_features
 from .context_enricher import advanced_enricher
+from .input_budget import current_input_budget
+from .metrics import count_classifications, timed
+from .micro_batcher import current_micro_batcher
+from .model_bundle import ModelBundle, load_bundle
+from .model_holder import ModelHolder
+from .model_watcher import model_watcher_status
+from .prefork import request_master_reload
+from .result_cache import current_result_cache, make_cache_key
+from .template_index import current_template_index, infer_with_templates
 
 classifier_bp = Blueprint('classifier', __name__)
 
-# グローバル変数でPipelineモデルをキャッシュ
-_pipeline = None
+def _report_loaded(bundle: ModelBundle) -> None:
+    """読み込んだモデルバンドルの情報を出力"""
+    # NumPy配列形式のバンドルは読み込み時に検証しないため max_probability_error を持たない
+    info = bundle.collapse_info
+    if info.get('mapped'):
+        print(f"Serving NumPy scorer ({info.get('folds')} folds, {info.get('vocabulary_size')} terms)")
+    elif info.get('collapsed'):
+        error = info.get('max_probability_error')
+        print(f"Collapsed model into single scorer ({info.get('folds')} folds, "
+              f"max probability error: {'n/a' if error is None else f'{error:.2e}'})")
+    if bundle.feature_version_mismatch():
+        print(f"Warning: model was trained with {bundle.feature_function_name} "
+              f"v{bundle.feature_version}, current version differs")
 
-def create_paypay_specialized_features(text: str) -> str:
+# モデルバンドル（モデル・特徴量関数・推論エンジン）のホルダー
+# 読み込みは1回にまとめ、再読み込みはバックグラウンドで準備してから原子的に差し替える
+_holder = ModelHolder(load_bundle, on_loaded=_report_loaded)
+
+def init_model_swap_invalidation(app) -> None:
     """
-    PayPay分類問題に特化した拡張特徴量エンジニアリング（統合ガイド2版）
+    モデルの差し替え毎にアプリケーションの結果キャッシュ・テンプレート予測を破棄する処理をホルダーに登録
+    （同期・非同期の再読み込み、ファイル監視による再読み込みのいずれでも旧モデルの結果を残さない）
     """
-    features = []
-    
-    # 基本テキスト
-    features.append(text)
-    
-    # === PayPay特化特徴量（重点強化） ===
-    paypay_variants = [
-        'PayPay', 'paypay', 'ペイペイ', 'ペイ', 'PAYPAY', 
-        'PayPay残高', 'PayPay決済', 'PayPay利用'
-    ]
-    
-    # PayPay検出強度計算
-    paypay_strength = 0
-    for variant in paypay_variants:
-        count = text.count(variant)
-        if count > 0:
-            paypay_strength += count
-            features.append(f"PAYPAY_VARIANT_{variant.replace(' ', '_')}")
-    
-    if paypay_strength > 0:
-        features.append(f"PAYPAY_STRENGTH_{min(paypay_strength, 5)}")  # 上镐5で正規化
-    
-    # PayPay文脈特徴量
-    paypay_contexts = {
-        'チャージ': ['チャージ', 'charge', '入金', '残高追加'],
-        '決済': ['決済', '支払い', '購入', 'お支払い', '利用'],
-        '完了': ['完了', '終了', 'しました', 'されました'],
-        '通知': ['お知らせ', '通知', 'ご案内', 'notice']
-    }
-    
-    for context_type, keywords in paypay_contexts.items():
-        context_count = sum(1 for keyword in keywords if keyword in text)
-        if context_count > 0:
-            features.append(f"PAYPAY_CONTEXT_{context_type}_{context_count}")
-    
-    # === 決済サービス階層化特徴量 ===
-    payment_services = {
-        'major': ['PayPay', 'LINE Pay', 'Apple Pay', 'Google Pay'],
-        'credit': ['ペイディ', 'Paidy', 'メルペイ', '楽天ペイ'],
-        'card': ['デビットカード', 'クレジットカード', 'VISA', 'MasterCard', 'JCB'],
-        'bank': ['銀行振込', '口座振替', '引き落とし', '振替']
-    }
-    
-    for service_type, services in payment_services.items():
-        service_count = sum(1 for service in services if service in text)
-        if service_count > 0:
-            features.append(f"PAYMENT_TYPE_{service_type.upper()}_{service_count}")
-    
-    # === 金額パターン拡張特徴量 ===
-    amount_patterns = {
-        'comma_yen': r'\d{1,3}(?:,\d{3})*円',      # 1,000円
-        'symbol_yen': r'¥\d{1,3}(?:,\d{3})*',      # ¥1,000
-        'decimal': r'\d+\.\d{2}',                   # 3360.00
-        'simple_yen': r'\d+円',                     # 1000円
-        'range_amount': r'\d{3,6}円'                # 100-999999円
-    }
-    
-    total_amounts = 0
-    for pattern_name, pattern in amount_patterns.items():
-        matches = re.findall(pattern, text)
-        if matches:
-            total_amounts += len(matches)
-            features.append(f"AMOUNT_{pattern_name.upper()}_{len(matches)}")
-            
-            # 金額レンジ分類
-            for match in matches:
-                # 数値のみ抽出
-                numbers = re.findall(r'\d+', match.replace(',', ''))
-                if numbers:
-                    amount = int(numbers[0])
-                    if amount < 1000:
-                        features.append("AMOUNT_RANGE_SMALL")
-                    elif amount < 10000:
-                        features.append("AMOUNT_RANGE_MEDIUM")
-                    else:
-                        features.append("AMOUNT_RANGE_LARGE")
-    
-    if total_amounts > 0:
-        features.append(f"TOTAL_AMOUNT_MENTIONS_{min(total_amounts, 3)}")
-    
-    # === 決済アクション詳細分類 ===
-    action_categories = {
-        'completion': ['完了', '終了', 'しました', 'されました', '実行'],
-        'processing': ['処理中', '手続き', '確認中', 'processing'],
-        'notification': ['お知らせ', '通知', 'ご案内', '連絡'],
-        'charge': ['チャージ', '入金', '追加', '補充'],
-        'payment': ['支払い', '決済', '購入', '引き落とし', '振替'],
-        'card_usage': ['ご利用', '使用', '決済', 'transaction']
-    }
-    
-    for action_type, actions in action_categories.items():
-        action_count = sum(1 for action in actions if action in text)
-        if action_count > 0:
-            features.append(f"ACTION_{action_type.upper()}_{action_count}")
-    
-    # === PayPay特化組み合わせ特徴量 ===
-    # PayPay + 完了の組み合わせ
-    if any(variant in text for variant in paypay_variants) and any(completion in text for completion in ['完了', 'しました']):
-        features.append("PAYPAY_COMPLETION_COMBO")
-    
-    # PayPay + 金額の組み合わせ
-    if any(variant in text for variant in paypay_variants) and total_amounts > 0:
-        features.append("PAYPAY_AMOUNT_COMBO")
-    
-    return ' '.join(features)
+    app_ref = weakref.ref(app)  # ホルダーはプロセス内で共有のため、テスト等で作り直したアプリを保持しない
+
+    def invalidate(bundle: ModelBundle) -> None:
+        app = app_ref()
+        if app is None:
+            return
+        for name in ('result_cache', 'template_index'):
+            service = app.extensions.get(name)
+            if service is not None:
+                service.invalidate()
+
+    _holder.add_swap_listener(invalidate)
+
+def load_model_bundle() -> ModelBundle:
+    """モデルバンドルの取得（特徴量関数・推論エンジンは読み込み時に解決済み）"""
+    return _holder.get()
+
+def current_model_bundle() -> Optional[ModelBundle]:
+    """読み込み済みのモデルバンドル（未読み込みならNone。読み込みは行わない）"""
+    return _holder.current
 
 def load_pipeline():
     """Pipeline化されたモデルの読み込み（優先順位付き）"""
-    global _pipeline
+    return load_model_bundle().model
+
+def _build_result(message_id: str, inference: Dict, text: str, context_analysis: Dict,
+                  fingerprint: Optional[str] = None, template_hit: bool = False) -> Dict:
+    """分類結果レスポンスの組み立て（単体・バッチ共通）"""
+    return {
+        "messageId": message_id,
+        "classification": inference['label'],
+        "confidence": inference['confidence'],
+        "probabilities": inference['probabilities'],
+        "top_k": inference['top_k'],
+        "margin": inference['margin'],
+        "calibration": inference['calibration'],
+        "inference_source": "template" if template_hit else "model",
+        "template_fingerprint": fingerprint,
+        "text_length": len(text),
+        "model_status": "loaded",
+        "context_analysis": {
+            "enriched_context": context_analysis['enriched_context'],
+            "priority_level": context_analysis['priority_level'],
+            "paypay_strength": context_analysis['paypay_strength'],
+            "payment_analysis": context_analysis['payment_analysis'],
+            "extracted_amounts": context_analysis['entities']['amounts'],
+            "extracted_dates": context_analysis['entities']['dates']
+        }
+    }
+
+def _classify_cache_key(bundle: ModelBundle, email: Dict, top_k: int) -> str:
+    """分類結果のキャッシュキー（モデルバージョン + 結果に影響する入力フィールド）"""
+    fields = {field: email.get(field, '') for field in bundle.input_fields}
+    fields.update(subject=email.get('subject', ''), body=email.get('body', ''), top_k=top_k)
+    return make_cache_key('classify', bundle.version, fields)
+
+def _with_request_fields(result: Dict, message_id: str, budget_info: Dict) -> Dict:
+    """キャッシュ済み結果にリクエストの messageId・入力の切り詰めの有無を設定"""
+    return {
+        **result,
+        "messageId": message_id,
+        "input_truncated": budget_info['truncated'],
+        "original_text_length": budget_info['original_length']
+    }
+
+def _classify_emails(bundle: ModelBundle, emails: List[Dict], top_k: int) -> List[Dict]:
+    """
+    複数メールの分類（一括分類・ストリーム分類共通）
+    特徴量エンジニアリング・予測をリスト全体に対して1回のベクトル化推論で実行
+    """
+    # 長文は上限内に収めてから分類（キャッシュキーも上限内のテキストから作成）
+    budget = current_input_budget()
+    budgeted = [budget.apply(email) for email in emails]
+    originals, emails = emails, [email for email, _ in budgeted]
     
-    if _pipeline is None:
-        # 教師あり学習モデルを最優先で読み込み
-        supervised_model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'supervised_model_v1.pkl')
-        realworld_model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'realworld_improved_v1.pkl')
-        balanced_model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'balanced_model_v1.pkl')
-        pipeline_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'paypay_specialized_v1.pkl')
-        old_model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'model.pkl')
-        
-        if os.path.exists(supervised_model_path):
-            # 教師あり学習モデルを読み込み（最優先）
-            loaded_data = joblib.load(supervised_model_path)
-            _pipeline = loaded_data['pipeline']
-            print(f"Loaded supervised model with accuracy: {loaded_data.get('accuracy', 'N/A')}")
-        elif os.path.exists(realworld_model_path):
-            # 実運用改良モデルを読み込み（2番目）
-            loaded_data = joblib.load(realworld_model_path)
-            _pipeline = loaded_data['pipeline']
-            print(f"Loaded realworld improved model with accuracy: {loaded_data.get('accuracy', 'N/A')}")
-        elif os.path.exists(balanced_model_path):
-            # バランス調整モデルを読み込み（3番目）
-            loaded_data = joblib.load(balanced_model_path)
-            _pipeline = loaded_data['pipeline']
-            print(f"Loaded balanced model with accuracy: {loaded_data.get('accuracy', 'N/A')}")
-        elif os.path.exists(pipeline_path):
-            # Pipeline化されたモデルを読み込み（4番目）
-            loaded_data = joblib.load(pipeline_path)
-            _pipeline = loaded_data['pipeline']
-            print("Loaded PayPay specialized model")
-        elif os.path.exists(old_model_path):
-            # 旧形式のモデルを読み込み（fallback）
-            with open(old_model_path, 'rb') as f:
-                vectorizer, model = pickle.load(f)
-            # 旧形式をPipelineに変換
-            from sklearn.pipeline import make_pipeline
-            _pipeline = make_pipeline(vectorizer, model)
-            print("Loaded legacy model")
+    # キャッシュ済みの結果を引き当て、未計算のものだけを推論（リスト内の重複も1回だけ計算）
+    # 推論中にモデルが差し替えられた場合は旧モデルの結果を書き戻さないよう、推論前の世代を put() に渡す
+    cache = current_result_cache()
+    generation = cache.generation
+    keys = [_classify_cache_key(bundle, email, top_k) for email in emails]
+    cached = {}
+    pending = {}
+    for i, key in enumerate(keys):
+        if key in cached or key in pending:
+            continue
+        result = cache.lookup(key)
+        if result is not None:
+            cached[key] = result
         else:
-            # デモ用の簡易分類器（最終フォールバック）
-            vectorizer = TfidfVectorizer(max_features=1000)
-            model = LinearSVC()
-            
-            # ダミーデータで初期化
-            dummy_texts = [
-                "支払い期限のお知らせ 料金の引き落とし",
-                "会議のご案内 スケジュール調整",
-                "重要なお知らせ システムメンテナンス"
-            ]
-            dummy_labels = ["支払い関係", "通知", "重要"]
-            
-            X = vectorizer.fit_transform(dummy_texts)
-            model.fit(X, dummy_labels)
-            
-            from sklearn.pipeline import make_pipeline
-            _pipeline = make_pipeline(vectorizer, model)
-            print("Loaded fallback dummy model")
+            pending[key] = i
     
-    return _pipeline
+    if pending:
+        pending_emails = [emails[i] for i in pending.values()]
+        texts = [bundle.build_text(email) for email in pending_emails]
+        
+        # 予測実行（テンプレート高速経路で返せないものだけを1回のベクトル化推論）
+        inferences, fingerprints, template_hits = infer_with_templates(
+            current_template_index(), bundle, texts, top_k
+        )
+        
+        for key, email, text, inference, fingerprint, template_hit in zip(
+                pending, pending_emails, texts, inferences, fingerprints, template_hits):
+            with timed('enrich'):
+                context_analysis = advanced_enricher.enrich_context(email.get('subject', ''), email.get('body', ''))
+            cached[key] = _build_result("", inference, text, context_analysis, fingerprint, template_hit)
+            cache.put(key, cached[key], generation)
+    
+    results = [_with_request_fields(cached[key], email.get("messageId", ""), info)
+               for key, email, (_, info) in zip(keys, originals, budgeted)]
+    count_classifications(
+        (result['classification'], result['inference_source'] if key in pending else 'cache')
+        for key, result in zip(keys, results)
+    )
+    return results
 
 @classifier_bp.route('/classify', methods=['POST'])
 def classify_email():
     """メール分類エンドポイント"""
     try:
-        data = request.json
+        with timed('parse'):
+            data = request.json
         
         # 必須フィールドの確認
         if not data or 'subject' not in data or 'body' not in data:
@@ -203,85 +177,209 @@ def classify_email():
                 "error": "Missing required fields: subject, body"
             }), 400
         
-        subject = data.get('subject', '')
-        body = data.get('body', '')
+        # 長文は上限内に収めてから分類（先頭・重要箇所・末尾のみ）
+        email, budget_info = current_input_budget().apply(data)
+        subject = email.get('subject', '')
+        body = email.get('body', '')
         
-        # Pipeline読み込み
-        pipeline = load_pipeline()
+        # モデルバンドル読み込み（特徴量関数・推論エンジンは解決済み）
+        bundle = load_model_bundle()
+        top_k = current_app.config.get('INFERENCE_TOP_K', 3)
         
-        # テキスト結合と特徴量エンジニアリング
-        text = f"{subject} {body}"
+        computed = []
         
-        # モデルタイプに応じて特徴量エンジニアリングを選択
-        supervised_model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'supervised_model_v1.pkl')
-        realworld_model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'realworld_improved_v1.pkl')
-        balanced_model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'balanced_model_v1.pkl')
+        def compute() -> Dict:
+            # 同時に届いた他の単体分類と推論をまとめる（推論前の処理中は合流し得るリクエストとして数える）
+            batcher = current_micro_batcher()
+            with batcher.pending():
+                # モデルの入力フィールドからテキストを構成
+                text = bundle.build_text(email)
+                
+                # 予測実行（安定した定型テンプレートは過去の予測を使用、それ以外は特徴量エンジニアリング + モデル）
+                inferences, fingerprints, template_hits = infer_with_templates(
+                    current_template_index(), bundle, [text], top_k, infer=batcher.infer
+                )
+            
+            # 高度文脈補完（新機能）
+            with timed('enrich'):
+                context_analysis = advanced_enricher.enrich_context(subject, body)
+            
+            computed.append(True)
+            return _build_result("", inferences[0], text, context_analysis, fingerprints[0], template_hits[0])
         
-        if os.path.exists(supervised_model_path) and _pipeline is not None:
-            # 教師あり学習モデル用の特徴量エンジニアリング
-            from models.analyze_groundtruth_data import create_supervised_features
-            enhanced_text = create_supervised_features(text)
-        elif os.path.exists(realworld_model_path) and _pipeline is not None:
-            # 実運用改良モデル用の特徴量エンジニアリング
-            from models.train_realworld_model import create_improved_features
-            enhanced_text = create_improved_features(text)
-        elif os.path.exists(balanced_model_path) and _pipeline is not None:
-            # バランス調整モデルの場合は、内蔵の特徴量エンジニアリングを使用
-            enhanced_text = text  # Pipeline内で処理される
-        else:
-            # 従来のPayPay特化特徴量エンジニアリング
-            enhanced_text = create_paypay_specialized_features(text)
+        # 同一内容の再送は結果キャッシュから返す（同時に届いた同一内容は1回だけ計算）
+        result = current_result_cache().get_or_compute(_classify_cache_key(bundle, email, top_k), compute)
+        count_classifications([(result['classification'], result['inference_source'] if computed else 'cache')])
         
-        # 予測実行（Pipeline）
-        prediction = pipeline.predict([enhanced_text])[0]
+        # 結果返却（文脈情報付き）
+        with timed('serialize'):
+            return jsonify(_with_request_fields(result, data.get("messageId", ""), budget_info))
         
-        # 信頼度計算（CalibratedClassifierCVで確率化）
-        try:
-            probabilities = pipeline.predict_proba([enhanced_text])[0]
-            confidence = float(max(probabilities))
-        except:
-            confidence = 0.8  # デフォルト値
+    except Exception as e:
+        return jsonify({
+            "error": f"Classification failed: {str(e)}"
+        }), 500
+
+@classifier_bp.route('/classify/batch', methods=['POST'])
+def classify_email_batch():
+    """
+    メール一括分類エンドポイント
+    特徴量エンジニアリング・予測・文脈補完をリスト全体に対して1回ずつ実行
+    """
+    try:
+        with timed('parse'):
+            data = request.json
         
-        # 高度文脈補完（新機能）
-        context_analysis = advanced_enricher.enrich_context(subject, body)
+        # {"emails": [...]} 形式と配列そのものの両方を受け付ける
+        emails = data.get('emails') if isinstance(data, dict) else data
         
-        # 結果返却（文脈情報付き）
-        result = {
-            "messageId": data.get("messageId", ""),
-            "classification": prediction,
-            "confidence": confidence,
-            "text_length": len(text),
-            "model_status": "loaded",
-            "context_analysis": {
-                "enriched_context": context_analysis['enriched_context'],
-                "priority_level": context_analysis['priority_level'],
-                "paypay_strength": context_analysis['paypay_strength'],
-                "payment_analysis": context_analysis['payment_analysis'],
-                "extracted_amounts": context_analysis['entities']['amounts'],
-                "extracted_dates": context_analysis['entities']['dates']
-            }
-        }
+        if not isinstance(emails, list) or len(emails) == 0:
+            return jsonify({
+                "error": "Missing required field: emails (non-empty list)"
+            }), 400
         
-        return jsonify(result)
+        max_batch_size = current_app.config.get('BATCH_MAX_SIZE', 500)
+        if len(emails) > max_batch_size:
+            return jsonify({
+                "error": f"Batch too large: {len(emails)} emails (max {max_batch_size})"
+            }), 413
+        
+        invalid_indices = [
+            i for i, email in enumerate(emails)
+            if not isinstance(email, dict) or 'subject' not in email or 'body' not in email
+        ]
+        if invalid_indices:
+            return jsonify({
+                "error": "Missing required fields: subject, body",
+                "invalid_indices": invalid_indices
+            }), 400
+        
+        # モデルバンドル読み込みはバッチ全体で1回
+        bundle = load_model_bundle()
+        top_k = current_app.config.get('INFERENCE_TOP_K', 3)
+        results = _classify_emails(bundle, emails, top_k)
+        
+        with timed('serialize'):
+            return jsonify({
+                "results": results,
+                "count": len(results)
+            })
         
     except Exception as e:
         return jsonify({
-            "error": f"Classification failed: {str(e)}"
+            "error": f"Batch classification failed: {str(e)}"
         }), 500
 
+def _read_ndjson(stream, max_line_bytes: int) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    NDJSON の入力を1行ずつ読む（入力全体は読み込まない）
+
+    Yields:
+        (行番号, メール, エラー) のいずれか一方がNone。空行は読み飛ばす
+    """
+    line_no = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        line_no += 1
+        
+        if len(line) > max_line_bytes and not line.endswith(b'\n'):
+            # 上限を超えた行は残りを読み捨てる（1行分をメモリに載せない）
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_line_bytes)
+            yield line_no, None, f"Line too long (max {max_line_bytes} bytes)"
+            continue
+        if not line.strip():
+            continue
+        
+        try:
+            email = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(email, dict) or 'subject' not in email or 'body' not in email:
+            yield line_no, None, "Missing required fields: subject, body"
+            continue
+        yield line_no, email, None
+
+@classifier_bp.route('/classify/stream', methods=['POST'])
+def classify_email_stream():
+    """
+    ストリーム分類エンドポイント（メールボックスのエクスポートなどの大量処理用）
+    1行1メールの NDJSON を読みながら STREAM_CHUNK_SIZE 件毎に一括分類と同じ処理で分類し、
+    結果をチャンク毎に1行1件の NDJSON で返す（入力の大きさによらずメモリ使用量は一定）
+
+    結果は入力順で、各行に入力の行番号（line）を付ける。不正な行は error の行を返して処理を続ける。
+    クライアントの読み出しが遅い場合は送信が詰まった時点で次のチャンクの読み込みを止める
+    """
+    try:
+        # モデルバンドルはストリーム全体で1回だけ取得（途中の再読み込みで結果のモデルが混ざらない）
+        bundle = load_model_bundle()
+    except Exception as e:
+        return jsonify({
+            "error": f"Stream classification failed: {str(e)}"
+        }), 500
+    
+    top_k = current_app.config.get('INFERENCE_TOP_K', 3)
+    chunk_size = max(1, current_app.config.get('STREAM_CHUNK_SIZE', 100))
+    max_line_bytes = current_app.config.get('STREAM_MAX_LINE_BYTES', 1024 * 1024)
+    stream = request.stream
+    
+    def classify_chunk(chunk: List[Tuple[int, Optional[Dict], Optional[str]]]) -> str:
+        emails = [email for _, email, _ in chunk if email is not None]
+        results = iter(_classify_emails(bundle, emails, top_k) if emails else [])
+        
+        lines = []
+        with timed('serialize'):
+            for line_no, email, error in chunk:
+                if email is None:
+                    lines.append(json.dumps({"line": line_no, "error": error}, ensure_ascii=False))
+                else:
+                    lines.append(json.dumps({**next(results), "line": line_no}, ensure_ascii=False))
+        return '\n'.join(lines) + '\n'
+    
+    def generate() -> Iterator[str]:
+        chunk = []
+        try:
+            for entry in _read_ndjson(stream, max_line_bytes):
+                chunk.append(entry)
+                if len(chunk) >= chunk_size:
+                    yield classify_chunk(chunk)
+                    chunk = []
+            if chunk:
+                yield classify_chunk(chunk)
+        except Exception as e:
+            # レスポンスは送信済みのため、エラーの行を返して終了
+            line_no = chunk[0][0] if chunk else None
+            yield json.dumps({"line": line_no, "error": f"Stream classification failed: {str(e)}"},
+                             ensure_ascii=False) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @classifier_bp.route('/model/status', methods=['GET'])
 def model_status():
     """モデルの状態確認"""
     try:
         pipeline_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'paypay_specialized_v1.pkl')
         old_model_path = os.path.join(os.path.dirname(__file__), '..', 'models', 'model.pkl')
+        bundle = _holder.current  # 差し替えと競合しないよう参照を1回だけ取得
         
         return jsonify({
             "pipeline_file_exists": os.path.exists(pipeline_path),
             "pipeline_path": pipeline_path,
             "old_model_file_exists": os.path.exists(old_model_path),
             "old_model_path": old_model_path,
-            "pipeline_loaded": _pipeline is not None
+            "pipeline_loaded": bundle is not None,
+            "model_loaded": bundle is not None,
+            "model_path": bundle.path if bundle is not None else None,
+            "model_version": bundle.version if bundle is not None else None,
+            "model_checksum": bundle.checksum if bundle is not None else None,
+            "model": bundle.describe() if bundle is not None else None,
+            "model_holder": _holder.describe(),
+            "model_watcher": model_watcher_status(),
+            "result_cache": current_result_cache().stats(),
+            "template_index": current_template_index().stats()
         })
         
     except Exception as e:
@@ -291,21 +389,63 @@ def model_status():
 
 @classifier_bp.route('/model/reload', methods=['POST'])
 def reload_model():
-    """モデルの再読み込み"""
+    """
+    モデルの再読み込み
+    新しいモデルはバックグラウンドで読み込み・検証してから差し替えるため、処理中・後続のリクエストは
+    差し替えまで旧モデルで処理される（?async=1 の場合は完了を待たずに 202 を返す）。
+    プリフォークサーバーのワーカーではマスターに再読み込みを要求して 202 を返す（ワーカーはマスターが作り直す）
+    """
     try:
-        global _pipeline
-        _pipeline = None  # キャッシュクリア
+        if request_master_reload():
+            return jsonify({
+                "status": "accepted",
+                "message": "Model reload requested from prefork master",
+                "model_holder": _holder.describe()
+            }), 202
+        
+        if request.args.get('async', '').lower() in ('1', 'true'):
+            _holder.reload(wait=False)
+            return jsonify({
+                "status": "accepted",
+                "message": "Model reload started",
+                "model_holder": _holder.describe()
+            }), 202
+        
+        _holder.reload(wait=True)
+        if _holder.last_error is not None:
+            return jsonify({
+                "error": f"Reload failed: {_holder.last_error}",
+                "model": _holder.current.describe() if _holder.current is not None else None
+            }), 500
         
-        # 新しいPipelineを読み込み
-        pipeline = load_pipeline()
+        # 旧モデルの分類結果・テンプレート予測は差し替え時に破棄済み（init_model_swap_invalidation）
         
         return jsonify({
             "status": "success",
             "message": "Pipeline model reloaded successfully",
-            "pipeline_loaded": _pipeline is not None
+            "pipeline_loaded": _holder.current is not None,
+            "model": _holder.current.describe(),
+            "model_holder": _holder.describe()
         })
         
     except Exception as e:
         return jsonify({
             "error": f"Reload failed: {str(e)}"
-        }), 500
\ No newline at end of file
+        }), 500
+
+@classifier_bp.route('/model/templates', methods=['GET'])
+def template_report():
+    """テンプレート指紋毎のラベル安定性レポート"""
+    try:
+        limit = request.args.get('limit', 50, type=int)
+        index = current_template_index()
+        
+        return jsonify({
+            "summary": index.stats(),
+            "templates": index.report(limit)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "error": f"Template report failed: {str(e)}"
+        }), 500
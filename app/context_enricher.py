@@ -9,8 +9,29 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import logging
 
+from models.keyword_matcher import KeywordHits, compile_keyword_tables
+from models.linear_patterns import compile_pattern
+from .input_budget import current_input_budget
+from .metrics import timed
+from .result_cache import current_result_cache, make_cache_key
+
 context_bp = Blueprint('context', __name__)
 
+# 数字始まりの金額・日付パターンが使う文字のみからなる区間（一致はこの区間をまたがない）
+_NUMERIC_RUN = re.compile(r'[\d,.:/\-年月日円¥]+')
+_DIGIT = re.compile(r'\d')
+
+class TextScan:
+    """1回の走査結果（extract_entities / analyze_payment_context で共有）"""
+
+    __slots__ = ('text', 'hits', 'numeric_text')
+
+    def __init__(self, text: str, hits: KeywordHits, numeric_text: str):
+        self.text = text
+        self.hits = hits
+        # 数字区間を空白区切りで連結したもの（数字始まりのパターンはこちらを検索、数字がなければ空）
+        self.numeric_text = numeric_text
+
 class AdvancedContextEnricher:
     """高度な文脈補完クラス（Gmail特化）"""
     
@@ -61,9 +82,62 @@ class AdvancedContextEnricher:
             'transfer': ['送金', '振込', '受取', '送付'],
             'general': ['支払い', '決済', '入金', '残高', '利用', '購入']
         }
+        
+        # PayPay・完了・アクション・金額文脈キーワード
+        self.paypay_variants = ['PayPay', 'paypay', 'ペイペイ', 'ペイ', 'PAYPAY']
+        self.paypay_indicators = ['PayPay', 'paypay', 'ペイペイ', 'ペイ']
+        self.completion_words = ['完了', '終了', 'しました', 'されました', '確定']
+        self.amount_context_words = ['金額', '料金', '¥', '円']
+        self.action_words = ['期限', '確認', '手続き', 'お支払い', '変更']
+        
+        # 各正規表現が一致し得るために必要な文字列（いずれも含まないテキストでは実行しない）と、
+        # 数字区間のみを検索すればよいか（数字始まりで区間内の文字のみからなるパターン）
+        self.amount_prefilters = [
+            (('円',), True), (('¥',), True), (('¥',), True),
+            (('金額',), False), (('利用金額',), False), (('請求金額',), False),
+            (('.',), True)
+        ]
+        self.date_prefilters = [
+            (('年', '/', '-'), True), (('月', '/', '-'), True), (('/',), True), (('-',), True),
+            (('期限',), False), (('/',), True), ((':',), True)
+        ]
+        
+        self._compile()
 
-    def extract_entities(self, text: str) -> Dict:
+    def _compile(self):
+        """キーワード表・正規表現を1回だけコンパイル（長い数字列で2乗の時間がかかるパターンは線形時間の抽出器）"""
+        self._amount_regexes = [(compile_pattern(pattern), anchors, numeric)
+                                for pattern, (anchors, numeric) in zip(self.amount_patterns, self.amount_prefilters)]
+        self._date_regexes = [(compile_pattern(pattern), anchors, numeric)
+                              for pattern, (anchors, numeric) in zip(self.date_patterns, self.date_prefilters)]
+        self._matcher = compile_keyword_tables(
+            self.payment_services, self.urgency_keywords, self.payment_keywords,
+            self.paypay_variants, self.paypay_indicators, self.completion_words,
+            self.amount_context_words, self.action_words
+        )
+
+    def scan(self, text: str) -> TextScan:
+        """全キーワード表の検索と数字区間の切り出しをテキスト1回の走査で行う"""
+        numeric_text = ' '.join(_NUMERIC_RUN.findall(text))
+        if not _DIGIT.search(numeric_text):
+            numeric_text = ''
+        return TextScan(text, self._matcher.scan(text), numeric_text)
+
+    @staticmethod
+    def _findall(regexes: List, scan: TextScan) -> List:
+        """必要な文字列を含む正規表現だけを実行（数字を含まないテキストでは全て不一致）"""
+        matches = []
+        if not scan.numeric_text:
+            return matches
+        for regex, anchors, numeric in regexes:
+            if any(anchor in scan.text for anchor in anchors):
+                matches.extend(regex.findall(scan.numeric_text if numeric else scan.text))
+        return matches
+
+    def extract_entities(self, text: str, scan: Optional[TextScan] = None) -> Dict:
         """エンティティ抽出（Gmail特化）"""
+        scan = scan or self.scan(text)
+        hits = scan.hits
         entities = {
             'amounts': [],
             'dates': [],
@@ -74,42 +148,39 @@ class AdvancedContextEnricher:
         }
         
         # 金額抽出
-        for pattern in self.amount_patterns:
-            matches = re.findall(pattern, text)
-            entities['amounts'].extend(matches)
+        entities['amounts'] = self._findall(self._amount_regexes, scan)
         
         # 日付抽出
-        for pattern in self.date_patterns:
-            matches = re.findall(pattern, text)
-            entities['dates'].extend(matches)
+        entities['dates'] = self._findall(self._date_regexes, scan)
         
         # 決済サービス分類
         for service_type, services in self.payment_services.items():
-            found_services = [s for s in services if s in text]
+            found_services = hits.found(services)
             if found_services:
                 entities['payment_services'][service_type] = found_services
         
         # PayPay強度計算
-        paypay_variants = ['PayPay', 'paypay', 'ペイペイ', 'ペイ', 'PAYPAY']
-        for variant in paypay_variants:
-            entities['paypay_strength'] += text.count(variant)
+        for variant in self.paypay_variants:
+            entities['paypay_strength'] += hits.count(variant)
         
         # 緊急度判定
         for level, keywords in self.urgency_keywords.items():
-            if any(keyword in text for keyword in keywords):
+            if hits.any(keywords):
                 entities['urgency_level'] = level
                 break
         
         # 支払いタイプ判定
         for pay_type, keywords in self.payment_keywords.items():
-            if any(keyword in text for keyword in keywords):
+            if hits.any(keywords):
                 entities['payment_type'] = pay_type
                 break
         
         return entities
 
-    def analyze_payment_context(self, text: str) -> Dict:
+    def analyze_payment_context(self, text: str, scan: Optional[TextScan] = None) -> Dict:
         """支払い関連文脈の詳細分析（PayPay特化）"""
+        scan = scan or self.scan(text)
+        hits = scan.hits
         payment_context = {
             'is_payment_related': False,
             'payment_type': None,
@@ -124,7 +195,7 @@ class AdvancedContextEnricher:
         # 全支払いキーワード検索
         all_keywords = []
         for category, keywords in self.payment_keywords.items():
-            found = [kw for kw in keywords if kw in text]
+            found = hits.found(keywords)
             all_keywords.extend(found)
             if found and category != 'general':
                 payment_context['payment_type'] = category
@@ -136,25 +207,20 @@ class AdvancedContextEnricher:
             payment_context['context_strength'] = len(all_keywords)
         
         # PayPay特化判定
-        paypay_indicators = ['PayPay', 'paypay', 'ペイペイ', 'ペイ']
-        if any(indicator in text for indicator in paypay_indicators):
+        if hits.any(self.paypay_indicators):
             payment_context['paypay_specific'] = True
             payment_context['context_strength'] += 2
         
         # 完了指標検出
-        completion_words = ['完了', '終了', 'しました', 'されました', '確定']
-        payment_context['completion_indicators'] = [
-            word for word in completion_words if word in text
-        ]
+        payment_context['completion_indicators'] = hits.found(self.completion_words)
         
         # 金額文脈判定
-        if any(pattern in text for pattern in ['金額', '料金', '¥', '円']):
+        if hits.any(self.amount_context_words):
             payment_context['amount_context'] = True
             payment_context['context_strength'] += 1
         
         # アクション要求判定
-        action_words = ['期限', '確認', '手続き', 'お支払い', '変更']
-        if any(word in text for word in action_words):
+        if hits.any(self.action_words):
             payment_context['action_required'] = True
         
         return payment_context
@@ -203,12 +269,13 @@ class AdvancedContextEnricher:
     def enrich_context(self, subject: str, body: str) -> Dict:
         """統合文脈補完（Gmail特化）"""
         full_text = f"{subject} {body}"
+        scan = self.scan(full_text)
         
         # エンティティ抽出
-        entities = self.extract_entities(full_text)
+        entities = self.extract_entities(full_text, scan)
         
         # 支払い文脈分析
-        payment_context = self.analyze_payment_context(full_text)
+        payment_context = self.analyze_payment_context(full_text, scan)
         
         # 優先度計算
         priority = self.calculate_priority(entities, payment_context)
@@ -285,20 +352,29 @@ advanced_enricher = AdvancedContextEnricher()
 def enrich_context():
     """高度文脈補完エンドポイント"""
     try:
-        data = request.json
+        with timed('parse'):
+            data = request.json
         
         if not data or 'body' not in data:
             return jsonify({
                 "error": "Missing required field: body"
             }), 400
         
-        body = data.get('body', '')
-        subject = data.get('subject', '')
+        # 長文は上限内に収めてから分析（先頭・重要箇所・末尾のみ）
+        email, budget_info = current_input_budget().apply(data)
+        body = email.get('body', '')
+        subject = email.get('subject', '')
+        
+        # 高度文脈分析（モデルに依存しないため内容のみをキーにキャッシュ）
+        def compute() -> Dict:
+            with timed('enrich'):
+                return advanced_enricher.enrich_context(subject, body)
         
-        # 高度文脈分析
-        context_info = advanced_enricher.enrich_context(subject, body)
+        context_info = current_result_cache().get_or_compute(
+            make_cache_key('enrich', '', {'subject': subject, 'body': body}), compute
+        )
         
-        return jsonify(context_info)
+        return jsonify({**context_info, 'input_truncated': budget_info['truncated']})
         
     except Exception as e:
         logging.error(f"Context enrichment failed: {str(e)}")
@@ -311,17 +387,20 @@ def analyze_payment():
     """支払い分析専用エンドポイント"""
     try:
         data = request.json
-        text = f"{data.get('subject', '')} {data.get('body', '')}"
+        email, budget_info = current_input_budget().apply(data)
+        text = f"{email.get('subject', '')} {email.get('body', '')}"
         
-        payment_analysis = advanced_enricher.analyze_payment_context(text)
-        entities = advanced_enricher.extract_entities(text)
+        scan = advanced_enricher.scan(text)
+        payment_analysis = advanced_enricher.analyze_payment_context(text, scan)
+        entities = advanced_enricher.extract_entities(text, scan)
         
         return jsonify({
             'payment_analysis': payment_analysis,
             'extracted_amounts': entities['amounts'],
             'extracted_dates': entities['dates'],
             'payment_services': entities['payment_services'],
-            'paypay_strength': entities['paypay_strength']
+            'paypay_strength': entities['paypay_strength'],
+            'input_truncated': budget_info['truncated']
         })
         
     except Exception as e:
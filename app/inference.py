@@ -0,0 +1,150 @@
+"""
+単一パス推論エンジン
+予測ラベル・全クラス確率・上位k件・決定関数マージンを1回のモデル評価で返す
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from models.linear_scorer import LinearScorer
+from .metrics import timed
+
+# 校正情報がないモデルでマージンを確率化する際の温度
+DEFAULT_MARGIN_TEMPERATURE = 1.0
+
+def _softmax(margins: np.ndarray, temperature: float) -> np.ndarray:
+    scaled = margins / temperature
+    scaled -= scaled.max(axis=1, keepdims=True)
+    exp = np.exp(scaled)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+def _expand_binary(margins: np.ndarray) -> np.ndarray:
+    """二値分類の決定関数値 (n,) を (n, 2) のクラス別マージンに展開"""
+    if margins.ndim == 1:
+        return np.column_stack([-margins, margins])
+    return margins
+
+def _final_margins(final, features) -> Optional[np.ndarray]:
+    """変換済み特徴量に対する最終推定器のクラス別マージン（取得不可ならNone）"""
+    if hasattr(final, 'decision_function'):
+        return _expand_binary(final.decision_function(features))
+
+    from sklearn.calibration import CalibratedClassifierCV
+    if isinstance(final, CalibratedClassifierCV):
+        # fold毎の基底推定器のマージン平均（特徴量変換は共有済みなので追加の変換は不要）
+        classes = np.asarray(final.classes_)
+        margins = np.zeros((features.shape[0], len(classes)))
+        for calibrated in final.calibrated_classifiers_:
+            estimator = calibrated.estimator
+            if not hasattr(estimator, 'decision_function'):
+                return None
+            fold_classes = np.searchsorted(classes, estimator.classes_)
+            margins[:, fold_classes] += _expand_binary(estimator.decision_function(features))
+        return margins / len(final.calibrated_classifiers_)
+
+    return None
+
+class InferenceEngine:
+    """
+    モデル種別に応じた単一パス推論
+
+    評価方法はモデル読み込み時に1回だけ決定し、リクエスト毎の例外処理を行わない:
+      - 'scorer'     : CalibratedLinearScorer / NumpyLinearScorer（確率とマージンを同時計算）
+      - 'pipeline'   : Pipeline（前段の変換を1回だけ行い最終推定器で確率・マージンを計算）
+      - 'proba'      : predict_proba のみ利用可能なモデル（マージンなし）
+      - 'margin'     : decision_function のみ利用可能なモデル（マージンをsoftmaxで確率化）
+    """
+
+    def __init__(self, model, margin_temperature: float = DEFAULT_MARGIN_TEMPERATURE):
+        self.model = model
+        self.margin_temperature = margin_temperature
+        self.classes_ = np.asarray(model.classes_)
+        self.mode, self.calibration = self._resolve_mode(model)
+
+    @staticmethod
+    def _resolve_mode(model) -> Tuple[str, str]:
+        if isinstance(model, LinearScorer):
+            return 'scorer', 'sigmoid' if model.is_calibrated else 'margin_softmax'
+
+        # scikit-learn はスコアラー以外のモデルの場合のみ読み込む（NumPy配列形式のモデルでは不要）
+        from sklearn.pipeline import Pipeline
+
+        if isinstance(model, Pipeline):
+            final = model.steps[-1][1]
+            if hasattr(final, 'predict_proba'):
+                return 'pipeline', 'model'
+            if hasattr(final, 'decision_function'):
+                return 'pipeline', 'margin_softmax'
+
+        if hasattr(model, 'predict_proba'):
+            return 'proba', 'model'
+        if hasattr(model, 'decision_function'):
+            return 'margin', 'margin_softmax'
+
+        raise TypeError(f"Unsupported model for inference: {type(model).__name__}")
+
+    def _evaluate(self, texts: List[str]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """(確率 (n, クラス数), クラス別マージン (n, クラス数) / 取得不可ならNone)"""
+        # 処理段階の計測: ベクトル化（vectorize）/ 決定関数（predict）/ 確率（predict_proba）
+        if self.mode == 'scorer':
+            # NumPyスコアラーはベクトル化と重み行列の集計を1回の走査で行うため、集計までを vectorize とする
+            with timed('vectorize'):
+                scores = self.model.fold_scores(texts)
+            with timed('predict_proba' if self.model.is_calibrated else 'predict'):
+                proba, margins = self.model.combine(scores)
+                margins = _expand_binary(margins)
+        elif self.mode == 'pipeline':
+            with timed('vectorize'):
+                features = self.model[:-1].transform(texts)
+            final = self.model.steps[-1][1]
+            with timed('predict'):
+                margins = _final_margins(final, features)
+            proba = None
+            if self.calibration == 'model':
+                with timed('predict_proba'):
+                    proba = final.predict_proba(features)
+        elif self.mode == 'proba':
+            with timed('predict_proba'):
+                proba, margins = self.model.predict_proba(texts), None
+        else:
+            with timed('predict'):
+                proba, margins = None, _expand_binary(self.model.decision_function(texts))
+
+        if proba is None:
+            # 校正なし: マージンの温度付きsoftmaxを確率として使用
+            with timed('predict_proba'):
+                proba = _softmax(margins, self.margin_temperature)
+
+        return np.asarray(proba), margins
+
+    def infer(self, texts: List[str], top_k: int = 3) -> List[Dict]:
+        """
+        テキスト群を1回で推論
+
+        Returns:
+            テキスト毎の {label, confidence, probabilities, top_k, margin, calibration}
+        """
+        if len(texts) == 0:
+            return []
+
+        proba, margins = self._evaluate(texts)
+        order = np.argsort(-proba, axis=1, kind='stable')[:, :max(1, top_k)]
+
+        results = []
+        for i in range(len(texts)):
+            best = order[i, 0]
+            results.append({
+                'label': str(self.classes_[best]),
+                'confidence': float(proba[i, best]),
+                'probabilities': {str(c): float(p) for c, p in zip(self.classes_, proba[i])},
+                'top_k': [
+                    {'label': str(self.classes_[j]), 'probability': float(proba[i, j])}
+                    for j in order[i]
+                ],
+                'margin': float(margins[i, best]) if margins is not None else None,
+                'calibration': self.calibration
+            })
+        return results
+
+    def infer_one(self, text: str, top_k: int = 3) -> Dict:
+        return self.infer([text], top_k=top_k)[0]
@@ -0,0 +1,150 @@
+"""
+入力の上限（長文メールの処理コストの上限）
+500KB の HTML メールマガジンも全文に対して特徴量関数・文脈補完の正規表現・キーワード走査を実行すると、
+最悪の場合のレイテンシに上限がなくなる。本文が INPUT_MAX_CHARS を超える場合は
+
+- 先頭 INPUT_HEAD_CHARS 文字（件名直後の要点・明細）
+- 中間部分のうち金額・期限・決済サービス・緊急度キーワードの前後（中間の先頭 INPUT_SCAN_CHARS 文字のみ走査）
+- 末尾 INPUT_TAIL_CHARS 文字（署名・問い合わせ先・期限の再掲）
+
+を連結した INPUT_MAX_CHARS 文字以内のテキストに置き換えてから分類・文脈補完する。
+件名などの本文以外のフィールドは INPUT_SUBJECT_MAX_CHARS 文字で切り詰める。
+切り詰めた場合はレスポンスの input_truncated が true になる
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from flask import current_app
+
+# 切り出した区間の区切り
+SEPARATOR = '\n…\n'
+
+def default_key_terms() -> List[str]:
+    """中間部分から切り出す区間の目印（文脈補完が参照する金額・期限・決済サービス・緊急度のキーワード）"""
+    from .context_enricher import advanced_enricher  # context_enricher がこのモジュールを import するため
+    services = advanced_enricher.payment_services
+    return [
+        *advanced_enricher.amount_context_words, '期限', '承認番号', '請求',
+        *services['major_payment'], *services['credit_service'], *services['card_service'],
+        *advanced_enricher.urgency_keywords['high']
+    ]
+
+class InputBudget:
+    """
+    メールの入力を上限内に収める
+
+    Args:
+        max_chars: 本文の上限文字数（区切りを含む）
+        head_chars: 先頭から残す文字数
+        tail_chars: 末尾から残す文字数
+        scan_chars: 目印を探す中間部分の文字数の上限
+        subject_max_chars: 本文以外のフィールドの上限文字数
+        key_context: 目印の前後に残す文字数
+    """
+
+    def __init__(self, max_chars: int = 10000, head_chars: int = 6000, tail_chars: int = 2000,
+                 scan_chars: int = 200000, subject_max_chars: int = 1000, key_context: int = 80,
+                 key_terms: Optional[Iterable[str]] = None):
+        if head_chars + tail_chars + 2 * len(SEPARATOR) > max_chars:
+            raise ValueError("INPUT_HEAD_CHARS + INPUT_TAIL_CHARS must leave room within INPUT_MAX_CHARS")
+        self.max_chars = max_chars
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.scan_chars = scan_chars
+        self.subject_max_chars = subject_max_chars
+        self.key_context = key_context
+        terms = sorted(set(key_terms if key_terms is not None else default_key_terms()), key=len, reverse=True)
+        self._key_regex = re.compile('|'.join(map(re.escape, terms))) if terms else None
+
+    def _key_sections(self, middle: str, budget: int) -> List[str]:
+        """中間部分の目印の前後を出現順に budget 文字まで（重なる区間は結合）"""
+        if self._key_regex is None or budget <= 0:
+            return []
+        spans: List[List[int]] = []
+        used = 0
+        for match in self._key_regex.finditer(middle):
+            start = max(0, match.start() - self.key_context)
+            end = min(len(middle), match.end() + self.key_context)
+            if spans and start <= spans[-1][1]:
+                used += max(0, end - spans[-1][1])
+                spans[-1][1] = max(spans[-1][1], end)
+            else:
+                used += end - start + (len(SEPARATOR) if spans else 0)
+                spans.append([start, end])
+            if used >= budget:
+                break
+
+        sections = []
+        remaining = budget
+        for start, end in spans:
+            if sections:
+                remaining -= len(SEPARATOR)
+            if remaining <= 0:
+                break
+            sections.append(middle[start:min(end, start + remaining)])
+            remaining -= len(sections[-1])
+        return sections
+
+    def window_body(self, body: str) -> Tuple[str, bool]:
+        """上限内の本文（切り詰めたか）"""
+        if len(body) <= self.max_chars:
+            return body, False
+
+        head = body[:self.head_chars]
+        tail = body[len(body) - self.tail_chars:] if self.tail_chars else ''
+        middle = body[self.head_chars:min(len(body) - self.tail_chars, self.head_chars + self.scan_chars)]
+        budget = self.max_chars - len(head) - len(tail) - 2 * len(SEPARATOR)
+
+        sections = self._key_sections(middle, budget)
+        parts = [head, SEPARATOR.join(sections), tail] if sections else [head, tail]
+        return SEPARATOR.join(part for part in parts if part), True
+
+    def apply(self, email: Dict) -> Tuple[Dict, Dict]:
+        """
+        上限内に収めたメール（元の辞書は変更しない）と切り詰めの情報
+
+        Returns:
+            (メール, {truncated, original_length（件名 + 本文の元の文字数）})
+        """
+        subject = str(email.get('subject', ''))
+        body = str(email.get('body', ''))
+        info = {'truncated': False, 'original_length': len(subject) + len(body)}
+
+        budgeted = dict(email)
+        for field, value in email.items():
+            if field != 'body' and isinstance(value, str) and len(value) > self.subject_max_chars:
+                budgeted[field] = value[:self.subject_max_chars]
+                info['truncated'] = True
+        window, truncated = self.window_body(body)
+        if truncated:
+            budgeted['body'] = window
+            info['truncated'] = True
+        return budgeted, info
+
+class DisabledInputBudget:
+    """上限無効時（INPUT_BUDGET_ENABLED=False）の代替。入力をそのまま使う"""
+
+    def window_body(self, body: str) -> Tuple[str, bool]:
+        return body, False
+
+    def apply(self, email: Dict) -> Tuple[Dict, Dict]:
+        length = len(str(email.get('subject', ''))) + len(str(email.get('body', '')))
+        return email, {'truncated': False, 'original_length': length}
+
+def current_input_budget():
+    """現在のアプリケーションの入力の上限（未登録なら無効の代替）"""
+    return current_app.extensions.get('input_budget') or DisabledInputBudget()
+
+def init_input_budget(app) -> None:
+    """アプリケーション設定から入力の上限を作成して app.extensions に登録"""
+    if app.config.get('INPUT_BUDGET_ENABLED', True):
+        budget = InputBudget(
+            max_chars=app.config.get('INPUT_MAX_CHARS', 10000),
+            head_chars=app.config.get('INPUT_HEAD_CHARS', 6000),
+            tail_chars=app.config.get('INPUT_TAIL_CHARS', 2000),
+            scan_chars=app.config.get('INPUT_SCAN_CHARS', 200000),
+            subject_max_chars=app.config.get('INPUT_SUBJECT_MAX_CHARS', 1000)
+        )
+    else:
+        budget = DisabledInputBudget()
+    app.extensions['input_budget'] = budget
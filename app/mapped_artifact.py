@@ -0,0 +1,73 @@
+"""
+メモリマップ形式のモデルファイルの読み込み
+畳み込み済みスコアラーの配列（形式・書き出しは models.mapped_format）を unpickle せず読み取り専用でメモリマップし
+（ページは全ワーカープロセスで共有）、scikit-learn / SciPy を使わない app.numpy_scorer.NumpyLinearScorer で評価する
+"""
+
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from models.mapped_format import term_hash
+from .numpy_scorer import NumpyLinearScorer, build_analyzer
+
+class MappedVocabulary:
+    """
+    ハッシュ値の昇順に並べた語彙（dict を作らず、二分探索で列番号を引く）
+
+    語のハッシュ値はエクスポート時に衝突がないことを確認済み。
+    語彙外の語のハッシュ値が語彙内の語と一致する確率は 語彙数 / 2^64 で無視できる。
+    """
+
+    def __init__(self, hashes: np.ndarray, offsets: np.ndarray, blob):
+        self.hashes = hashes
+        self.offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def lookup(self, tokens: List[str]) -> np.ndarray:
+        """語の列番号（語彙外の語は除外）"""
+        if not tokens:
+            return np.empty(0, dtype=np.int64)
+        hashes = np.fromiter((term_hash(token) for token in tokens), dtype=np.uint64, count=len(tokens))
+        positions = np.searchsorted(self.hashes, hashes)
+        positions[positions == len(self.hashes)] = 0
+        return positions[self.hashes[positions] == hashes]
+
+    def term(self, index: int) -> str:
+        return bytes(self._blob[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+    def terms(self) -> List[str]:
+        return [self.term(i) for i in range(len(self))]
+
+def load_mapped_scorer(path: str, manifest: Dict) -> NumpyLinearScorer:
+    """メモリマップ形式からスコアラーを作成（語彙・重み行列は読み取り専用でマップ）"""
+    def mapped(name: str, mmap: bool = True) -> Optional[np.ndarray]:
+        if name not in manifest['arrays']:
+            return None
+        array = np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+        # np.memmap のままだと添字アクセス毎にサブクラスの処理が入るため、同じバッファの ndarray として扱う
+        return array.view(np.ndarray) if mmap else array
+
+    terms_path = os.path.join(path, 'terms.bin')
+    blob = np.memmap(terms_path, dtype=np.uint8, mode='r') if os.path.getsize(terms_path) else b''
+    vocabulary = MappedVocabulary(mapped('term_hashes'), mapped('term_offsets'), blob)
+
+    return NumpyLinearScorer(
+        analyzer=build_analyzer(manifest['tokenizer']),
+        vocabulary=vocabulary,
+        classes=np.asarray(manifest['classes']),
+        weights=mapped('weights'),
+        norm_weights=mapped('norm_weights'),
+        weight_scales=mapped('weight_scales', mmap=False),
+        intercepts=mapped('intercepts', mmap=False),
+        sigmoid_a=mapped('sigmoid_a', mmap=False),
+        sigmoid_b=mapped('sigmoid_b', mmap=False),
+        output_classes=mapped('output_classes', mmap=False),
+        fold_slices=[tuple(s) for s in manifest['fold_slices']],
+        sublinear_tf=manifest['sublinear_tf'],
+        norm=manifest['norm']
+    )
@@ -0,0 +1,328 @@
+"""
+リクエスト・処理段階毎のレイテンシ計測とメトリクス
+classify_email の時間が JSON 解析・テンプレート指紋・マイクロバッチの待ち・特徴量エンジニアリング（create_*_features）・
+ベクトル化・predict / predict_proba・文脈補完（enrich_context）・レスポンスのシリアライズのどこに
+かかっているかを固定バケットのヒストグラムに集計し、リクエスト数・ラベル毎の件数・エラー・キャッシュヒット・
+モデルバージョンと合わせて GET /metrics で Prometheus のテキスト形式で返す
+
+計測のコスト（上限）:
+    - 処理段階毎に time.perf_counter_ns() 2回と辞書への加算（リクエスト外・計測無効時は ContextVar の参照1回）
+    - リクエスト毎に1回、ロック内でヒストグラム（bisect）と計数への加算（処理段階数 + 1 回）
+    - メモリは系列数 × バケット数で固定（エンドポイントは登録済みのルール、ラベルは MAX_LABEL_SERIES 種類まで）
+"""
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import Response, current_app, g, request
+
+# 計測する処理段階（バッチ分類ではリクエスト内の合計を1回として記録）
+STAGES = ('parse', 'template', 'batch_wait', 'features', 'vectorize', 'predict', 'predict_proba', 'enrich', 'serialize')
+
+# ヒストグラムのバケット上限（秒）
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# ラベル毎の件数の系列数の上限（超えたラベルは OTHER_LABEL に集計）
+MAX_LABEL_SERIES = 64
+OTHER_LABEL = '_other'
+
+PREFIX = 'gmail_classifier'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 処理中のリクエストの処理段階毎の所要時間（ナノ秒）。リクエスト外ではNone
+_request_timings: contextvars.ContextVar = contextvars.ContextVar('request_timings', default=None)
+
+class _Stage:
+    """処理段階の計測（with 文の間の経過時間をリクエストの所要時間に加算）"""
+
+    __slots__ = ('name', 'timings', 'start')
+
+    def __init__(self, name: str, timings: Dict[str, int]):
+        self.name = name
+        self.timings = timings
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings[self.name] = self.timings.get(self.name, 0) + time.perf_counter_ns() - self.start
+        return False
+
+class _NoStage:
+    """リクエスト外・計測無効時の何もしない計測"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NO_STAGE = _NoStage()
+
+def timed(stage: str):
+    """
+    処理段階の計測（with timed('features'): ...）
+
+    推論エンジン・テンプレート指紋などアプリケーション外からも呼ばれるため、計測中のリクエストがなければ何もしない
+    """
+    timings = _request_timings.get()
+    if timings is None:
+        return _NO_STAGE
+    return _Stage(stage, timings)
+
+def current_stage_timings() -> Optional[Dict[str, int]]:
+    """処理中のリクエストの処理段階毎の所要時間（ナノ秒。リクエスト外・計測無効時はNone）"""
+    return _request_timings.get()
+
+class Histogram:
+    """固定バケットのヒストグラム（ロックは Metrics が持つ）"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後は +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        # Prometheus の le は上限を含む（seconds <= le のバケットに入る）
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, 累積件数) のリスト"""
+        total = 0
+        result = []
+        for bound, count in zip([*map(_format_value, self.buckets), '+Inf'], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+class Metrics:
+    """
+    プロセス内のメトリクス
+
+    - リクエスト数（エンドポイント・ステータス毎）とエラー数（4xx: client / 5xx: server）
+    - エンドポイント毎のリクエスト所要時間・処理段階毎の所要時間のヒストグラム
+    - 分類結果のラベル毎の件数（返却元: model / template / cache 毎）
+    プリフォークサーバーのワーカーは fork 時に計数を0から始める（ワーカー毎の値を pid で区別して合算する）
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, max_label_series: int = MAX_LABEL_SERIES):
+        self.buckets = tuple(sorted(buckets))
+        self.max_label_series = max_label_series
+        self._lock = threading.Lock()
+        self._reset()
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _reset(self) -> None:
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.errors: Dict[Tuple[str, str], int] = {}
+        self.classifications: Dict[Tuple[str, str], int] = {}
+        self.request_durations: Dict[str, Histogram] = {}
+        self.stage_durations: Dict[str, Histogram] = {}
+
+    def _after_fork(self) -> None:
+        """fork後の子プロセスではロックを作り直し、マスターでの計数（ウォームアップなど）を引き継がない"""
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _histogram(self, histograms: Dict[str, Histogram], name: str) -> Histogram:
+        """名前のヒストグラム（ロック取得済みで呼ぶ）"""
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram(self.buckets)
+        return histogram
+
+    def observe_request(self, endpoint: str, status: int, elapsed_ns: int,
+                        stage_ns: Optional[Dict[str, int]] = None) -> None:
+        """リクエスト1件の記録"""
+        with self._lock:
+            self.requests[(endpoint, status)] = self.requests.get((endpoint, status), 0) + 1
+            if status >= 400:
+                kind = 'server' if status >= 500 else 'client'
+                self.errors[(endpoint, kind)] = self.errors.get((endpoint, kind), 0) + 1
+            self._histogram(self.request_durations, endpoint).observe(elapsed_ns / 1e9)
+            for stage, ns in (stage_ns or {}).items():
+                self._histogram(self.stage_durations, stage).observe(ns / 1e9)
+
+    def count_classifications(self, results: Iterable[Tuple[str, str]]) -> None:
+        """分類結果の (ラベル, 返却元) の記録"""
+        with self._lock:
+            for label, source in results:
+                key = (label, source)
+                if key not in self.classifications and len(self.classifications) >= self.max_label_series:
+                    key = (OTHER_LABEL, source)
+                self.classifications[key] = self.classifications.get(key, 0) + 1
+
+    def start_request(self) -> None:
+        """リクエスト開始（Flask の before_request）"""
+        g.metrics_start_ns = time.perf_counter_ns()
+        g.metrics_timings = {}
+        g.metrics_recorded = False
+        _request_timings.set(g.metrics_timings)
+
+    def _finish_request(self, status: int) -> None:
+        start = g.get('metrics_start_ns')
+        if start is None or g.get('metrics_recorded'):
+            return
+        g.metrics_recorded = True
+        endpoint = request.endpoint or 'unmatched'
+        self.observe_request(endpoint, status, time.perf_counter_ns() - start, g.metrics_timings)
+
+    def after_request(self, response):
+        """ステータスの確定したリクエストの記録（Flask の after_request）"""
+        self._finish_request(response.status_code)
+        return response
+
+    def teardown_request(self, exc=None) -> None:
+        """未処理の例外で終了したリクエストの記録と計測の終了（Flask の teardown_request）"""
+        if exc is not None:
+            self._finish_request(500)
+        _request_timings.set(None)
+
+    def render(self, result_cache: Dict, template_index: Dict, model: Optional[Dict],
+               micro_batcher: Optional[Dict] = None) -> str:
+        """
+        Prometheus テキスト形式
+
+        Args:
+            result_cache: 結果キャッシュの stats()
+            template_index: テンプレート指紋インデックスの stats()
+            model: 読み込み済みモデルの {version, path, format}（未読み込みならNone）
+            micro_batcher: マイクロバッチの stats()
+        """
+        with self._lock:
+            requests = sorted(self.requests.items())
+            errors = sorted(self.errors.items())
+            classifications = sorted(self.classifications.items())
+            request_durations = {name: h.cumulative() + [('sum', h.sum), ('count', h.count)]
+                                 for name, h in sorted(self.request_durations.items())}
+            stage_durations = {name: h.cumulative() + [('sum', h.sum), ('count', h.count)]
+                               for name, h in sorted(self.stage_durations.items())}
+
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: Iterable[Tuple[str, object]]) -> None:
+            lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+            for suffix_labels, value in samples:
+                lines.append(f'{PREFIX}_{name}{suffix_labels} {_format_value(value)}')
+
+        def histogram(name: str, help_text: str, label: str, series: Dict[str, List]) -> None:
+            lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}_{name} histogram')
+            for key, samples in series.items():
+                *buckets, (_, total), (_, count) = samples
+                for bound, cumulative in buckets:
+                    lines.append(f'{PREFIX}_{name}_bucket{_labels(**{label: key, "le": bound})} {cumulative}')
+                lines.append(f'{PREFIX}_{name}_sum{_labels(**{label: key})} {_format_value(float(total))}')
+                lines.append(f'{PREFIX}_{name}_count{_labels(**{label: key})} {count}')
+
+        metric('process_info', 'gauge', 'Serving process (one series per worker under serve.py)',
+               [(_labels(pid=os.getpid()), 1)])
+        metric('requests_total', 'counter', 'HTTP requests by endpoint and status',
+               [(_labels(endpoint=endpoint, status=status), count) for (endpoint, status), count in requests])
+        metric('errors_total', 'counter', 'HTTP error responses by endpoint (client: 4xx, server: 5xx)',
+               [(_labels(endpoint=endpoint, kind=kind), count) for (endpoint, kind), count in errors])
+        histogram('request_duration_seconds', 'Request latency by endpoint', 'endpoint', request_durations)
+        histogram('stage_duration_seconds', 'Per-request time spent in each processing stage', 'stage',
+                  stage_durations)
+        metric('classifications_total', 'counter', 'Returned classifications by label and source',
+               [(_labels(label=label, source=source), count) for (label, source), count in classifications])
+
+        if result_cache.get('enabled'):
+            metric('result_cache_hits_total', 'counter', 'Result cache hits by tier',
+                   [(_labels(tier='memory'), result_cache['hits']), (_labels(tier='disk'), result_cache['disk_hits'])])
+            metric('result_cache_misses_total', 'counter', 'Result cache misses', [('', result_cache['misses'])])
+            metric('result_cache_shared_total', 'counter', 'Requests that shared an in-flight computation',
+                   [('', result_cache['shared_in_flight'])])
+            metric('result_cache_entries', 'gauge', 'Entries in the in-process result cache',
+                   [('', result_cache['size'])])
+        if template_index.get('enabled'):
+            metric('template_lookups_total', 'counter', 'Template fingerprint lookups',
+                   [('', template_index['lookups'])])
+            metric('template_hits_total', 'counter', 'Template fast-path hits', [('', template_index['hits'])])
+            metric('template_fingerprints', 'gauge', 'Known template fingerprints',
+                   [('', template_index['fingerprints'])])
+
+        if micro_batcher and micro_batcher.get('enabled'):
+            metric('micro_batches_total', 'counter', 'Micro-batches evaluated for single classify requests',
+                   [('', micro_batcher['batches'])])
+            metric('micro_batch_requests_total', 'counter', 'Single classify requests evaluated in micro-batches',
+                   [('', micro_batcher['requests'])])
+            metric('micro_batch_largest', 'gauge', 'Largest micro-batch so far (texts)',
+                   [('', micro_batcher['largest_batch'])])
+
+        metric('model_loaded', 'gauge', 'Whether a model bundle is loaded', [('', 1 if model else 0)])
+        if model:
+            metric('model_info', 'gauge', 'Loaded model version', [(_labels(**model), 1)])
+
+        return '\n'.join(lines) + '\n'
+
+def current_metrics() -> Optional[Metrics]:
+    """現在のアプリケーションのメトリクス（無効ならNone）"""
+    return current_app.extensions.get('metrics')
+
+def count_classifications(results: Iterable[Tuple[str, str]]) -> None:
+    """分類結果の (ラベル, 返却元) の記録（メトリクス無効時は何もしない）"""
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.count_classifications(results)
+
+def metrics_response():
+    """GET /metrics のレスポンス"""
+    from .classifier import current_model_bundle
+    from .micro_batcher import current_micro_batcher
+    from .result_cache import current_result_cache
+    from .template_index import current_template_index
+
+    metrics = current_metrics()
+    if metrics is None:
+        return {"error": "Metrics disabled"}, 404
+
+    bundle = current_model_bundle()
+    model = None
+    if bundle is not None:
+        model = {
+            'version': bundle.version,
+            'path': os.path.basename(bundle.path or ''),
+            'format': 'mapped' if bundle.collapse_info.get('mapped') else 'joblib'
+        }
+    text = metrics.render(current_result_cache().stats(), current_template_index().stats(), model,
+                          current_micro_batcher().stats())
+    return Response(text, content_type=CONTENT_TYPE)
+
+def init_metrics(app) -> None:
+    """アプリケーション設定に従ってメトリクスを登録し、リクエスト毎の計測を開始"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    metrics = Metrics()
+    app.extensions['metrics'] = metrics
+    app.before_request(metrics.start_request)
+    app.after_request(metrics.after_request)
+    app.teardown_request(metrics.teardown_request)
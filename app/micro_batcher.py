@@ -0,0 +1,191 @@
+"""
+単体分類リクエストのマイクロバッチ化
+n8n は /api/classify を1メールずつ呼ぶが、受信箱への一斉着信時には同時に数十件が届く。
+同時に処理中のリクエストの特徴量エンジニアリング・モデル評価を1回のベクトル化推論にまとめ、結果を各リクエストに返す
+
+- 専用スレッドは持たない（prefork のワーカーに fork 後も引き継げるよう、最初に届いたリクエストがバッチを実行する）
+- 待つのは他のリクエストが合流し得る場合のみ（推論前の処理中のリクエストがある、または別のバッチを実行中）。
+  単独のリクエストは待たずに実行し、待ち時間は最大 MICRO_BATCH_MAX_WAIT_MS で打ち切る
+- バッチは同じモデルバンドル・top_k のリクエストだけをまとめる（再読み込み中に新旧のモデルが混ざらない）
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from flask import current_app
+
+from .metrics import timed
+from .request_profiler import is_profiling
+
+def infer_texts(bundle, texts: List[str], top_k: int) -> List[Dict]:
+    """特徴量エンジニアリング + モデル評価（マイクロバッチを使わない経路）"""
+    with timed('features'):
+        enhanced_texts = [bundle.feature_function(text) for text in texts]
+    return bundle.engine.infer(enhanced_texts, top_k=top_k)
+
+class _Batch:
+    """実行待ち・実行中のバッチ"""
+
+    __slots__ = ('bundle', 'top_k', 'texts', 'callers', 'results', 'error', 'done')
+
+    def __init__(self, bundle, top_k: int):
+        self.bundle = bundle
+        self.top_k = top_k
+        self.texts: List[str] = []
+        self.callers = 0
+        self.results: Optional[List[Dict]] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+class MicroBatcher:
+    """
+    同時に届いた単体分類の推論をまとめるアグリゲーター
+
+    Args:
+        max_batch_size: 1バッチのテキスト数の上限（達したら待たずに実行）
+        max_wait_ms: 最初のリクエストが合流を待つ時間の上限（ミリ秒）
+    """
+
+    def __init__(self, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._reset()
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._open: Dict = {}  # (id(bundle), top_k) → 合流を受け付けているバッチ
+        self._pending = 0      # 推論前の処理中のリクエスト数（合流し得るリクエスト）
+        self._executing = 0    # 実行中のバッチ数
+        self._batches = 0
+        self._requests = 0
+        self._texts = 0
+        self._largest = 0
+
+    @contextmanager
+    def pending(self):
+        """推論前の処理（テキスト構成・テンプレート指紋）の間、合流し得るリクエストとして数える"""
+        with self._condition:
+            self._pending += 1
+        self._local.pending = True
+        try:
+            yield
+        finally:
+            self._leave_pending()
+
+    def _leave_pending(self) -> None:
+        if getattr(self._local, 'pending', False):
+            self._local.pending = False
+            with self._condition:
+                self._pending -= 1
+                self._condition.notify_all()
+
+    def _close(self, key, batch: _Batch) -> None:
+        """バッチへの合流を締め切る（ロック取得済みで呼ぶ）"""
+        if self._open.get(key) is batch:
+            del self._open[key]
+
+    def infer(self, bundle, texts: List[str], top_k: int) -> List[Dict]:
+        """
+        texts の推論結果（同時に届いた他のリクエストのテキストとまとめて1回で評価）
+        """
+        self._leave_pending()
+        if not texts:
+            return []
+
+        key = (id(bundle), top_k)
+        with timed('batch_wait'):
+            with self._condition:
+                batch = self._open.get(key)
+                leader = batch is None
+                if leader:
+                    batch = self._open[key] = _Batch(bundle, top_k)
+                start = len(batch.texts)
+                batch.texts.extend(texts)
+                batch.callers += 1
+                if len(batch.texts) >= self.max_batch_size:
+                    self._close(key, batch)
+                self._condition.notify_all()
+
+                if leader:
+                    deadline = time.perf_counter() + self.max_wait
+                    while self._open.get(key) is batch and (self._pending > 0 or self._executing > 0):
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    self._close(key, batch)
+                    self._executing += 1
+
+            if not leader:
+                batch.done.wait()
+
+        if leader:
+            self._run(batch)
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[start:start + len(texts)]
+
+    def _run(self, batch: _Batch) -> None:
+        """バッチの実行（最初に届いたリクエストのスレッドで実行し、完了を全リクエストに通知）"""
+        try:
+            batch.results = infer_texts(batch.bundle, batch.texts, batch.top_k)
+        except BaseException as e:
+            batch.error = e
+        finally:
+            with self._condition:
+                self._executing -= 1
+                self._batches += 1
+                self._requests += batch.callers
+                self._texts += len(batch.texts)
+                self._largest = max(self._largest, len(batch.texts))
+                self._condition.notify_all()
+            batch.done.set()
+
+    def stats(self) -> Dict:
+        with self._condition:
+            return {
+                'enabled': True,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'batches': self._batches,
+                'requests': self._requests,
+                'texts': self._texts,
+                'largest_batch': self._largest,
+                'mean_batch_requests': round(self._requests / self._batches, 3) if self._batches else 0.0
+            }
+
+class DisabledMicroBatcher:
+    """マイクロバッチ無効時（MICRO_BATCH_ENABLED=False）の代替。リクエスト毎に推論する"""
+
+    @contextmanager
+    def pending(self):
+        yield
+
+    def infer(self, bundle, texts: List[str], top_k: int) -> List[Dict]:
+        return infer_texts(bundle, texts, top_k) if texts else []
+
+    def stats(self) -> Dict:
+        return {'enabled': False}
+
+def current_micro_batcher():
+    """現在のアプリケーションのマイクロバッチ（未登録・プロファイリング中のリクエストなら無効の代替）"""
+    if is_profiling():
+        return DisabledMicroBatcher()
+    return current_app.extensions.get('micro_batcher') or DisabledMicroBatcher()
+
+def init_micro_batcher(app) -> None:
+    """アプリケーション設定からマイクロバッチを作成して app.extensions に登録"""
+    if app.config.get('MICRO_BATCH_ENABLED', True):
+        batcher = MicroBatcher(
+            max_batch_size=app.config.get('MICRO_BATCH_MAX_SIZE', 32),
+            max_wait_ms=app.config.get('MICRO_BATCH_MAX_WAIT_MS', 5.0)
+        )
+    else:
+        batcher = DisabledMicroBatcher()
+    app.extensions['micro_batcher'] = batcher
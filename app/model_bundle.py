@@ -0,0 +1,241 @@
+"""
+モデルバンドル
+モデルファイルの選択・読み込み・特徴量関数の解決・推論エンジン構築を読み込み時に1回だけ行い、
+リクエスト処理ではファイル存在確認やimportを一切行わない。
+scikit-learn / joblib はjoblib形式のモデルを読み込む場合のみ import する（NumPy配列形式のみなら不要）
+"""
+
+import os
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from models import mapped_format
+from models.feature_spec import DEFAULT_INPUT_FIELDS, FEATURE_VERSIONS, resolve_feature_function
+from models.mapped_format import artifact_metadata, file_checksum, mapped_path, read_manifest
+from .inference import InferenceEngine
+from .mapped_artifact import load_mapped_scorer
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+# 読み込み優先順位（ファイル名, 表示名, 特徴量仕様を持たない旧形式ファイルの特徴量関数）
+MODEL_CANDIDATES = [
+    ('supervised_model_v1.pkl', 'supervised', 'models.analyze_groundtruth_data:create_supervised_features'),
+    ('realworld_improved_v1.pkl', 'realworld improved', 'models.train_realworld_model:create_improved_features'),
+    ('balanced_model_v1.pkl', 'balanced', 'raw'),
+    ('paypay_specialized_v1.pkl', 'PayPay specialized', 'models.model_sync_solution:create_paypay_specialized_features'),
+]
+LEGACY_MODEL_FILE = 'model.pkl'
+LEGACY_FEATURE_FUNCTION = 'models.model_sync_solution:create_paypay_specialized_features'
+
+class ModelBundle:
+    """推論に必要な全てを解決済みのモデル一式"""
+
+    def __init__(self, model, name: str, path: Optional[str], feature_function: str,
+                 feature_version: Optional[int], input_fields: List[str], metadata: Dict,
+                 checksum: Optional[str] = None, feature_mode: str = 'text',
+                 collapse_info: Optional[Dict] = None):
+        self.name = name
+        self.path = path
+        self.checksum = checksum
+        self.metadata = metadata
+        self.feature_function_name = feature_function
+        self.feature_version = feature_version
+        self.input_fields = list(input_fields)
+        self.feature_mode = feature_mode
+        # 'sparse' モデルはパイプライン内で特徴量化するため、入力は生テキストのまま
+        self.feature_function: Callable[[str], str] = resolve_feature_function(
+            'raw' if feature_mode == 'sparse' else feature_function
+        )
+
+        # キャリブレーション済みアンサンブルを単一スコアラーに畳み込み（許容誤差内の場合のみ採用）
+        # メモリマップ形式は畳み込み済みのスコアラーをそのまま使用
+        if collapse_info is None:
+            from models.calibrated_scorer import collapse_and_verify
+            self.model, self.collapse_info = collapse_and_verify(model)
+        else:
+            self.model, self.collapse_info = model, collapse_info
+        self.engine = InferenceEngine(self.model)
+        self.loaded_at = datetime.now().isoformat()
+
+    @property
+    def version(self) -> str:
+        """モデルバージョン（ファイル内容のハッシュ。同じファイルなら全ワーカーで一致）"""
+        if self.checksum is None:
+            return f'{self.name}:{self.feature_function_name}'
+        return self.checksum[:16]
+
+    def build_text(self, email: Dict) -> str:
+        """モデルの入力フィールドからテキストを構成"""
+        return ' '.join(str(email.get(field, '')) for field in self.input_fields)
+
+    def featurize(self, email: Dict) -> str:
+        return self.feature_function(self.build_text(email))
+
+    def feature_version_mismatch(self) -> bool:
+        """学習時と現在の特徴量関数バージョンが異なるか"""
+        return (self.feature_version is not None and
+                self.feature_version != FEATURE_VERSIONS.get(self.feature_function_name))
+
+    def describe(self) -> Dict:
+        return {
+            'name': self.name,
+            'path': self.path,
+            'version': self.version,
+            'checksum': self.checksum,
+            'feature_function': self.feature_function_name,
+            'feature_version': self.feature_version,
+            'feature_version_mismatch': self.feature_version_mismatch(),
+            'feature_mode': self.feature_mode,
+            'input_fields': self.input_fields,
+            'accuracy': self.metadata.get('accuracy'),
+            'loaded_at': self.loaded_at,
+            'collapsed_scorer': self.collapse_info,
+            'inference_mode': self.engine.mode,
+            'calibration': self.engine.calibration
+        }
+
+def _bundle_from_artifact(path: str, name: str, legacy_feature_function: str) -> ModelBundle:
+    """joblib形式のモデルファイルからバンドルを作成"""
+    import joblib
+    loaded_data = joblib.load(path)
+    metadata = artifact_metadata(loaded_data)
+
+    # 特徴量仕様を持たない旧形式ファイルはファイル名から判定
+    feature_function = metadata.get('feature_function', legacy_feature_function)
+
+    return ModelBundle(
+        loaded_data['pipeline'],
+        name=name,
+        path=path,
+        feature_function=feature_function,
+        feature_version=metadata.get('feature_version'),
+        input_fields=metadata.get('input_fields', DEFAULT_INPUT_FIELDS),
+        metadata=metadata,
+        checksum=file_checksum(path),
+        feature_mode=metadata.get('feature_mode', 'text')
+    )
+
+def _bundle_from_mapped(path: str, name: str, legacy_feature_function: str, manifest: Dict) -> ModelBundle:
+    """メモリマップ形式からバンドルを作成（unpickle しない）"""
+    metadata = manifest['metadata']
+    scorer = load_mapped_scorer(path, manifest)
+
+    return ModelBundle(
+        scorer,
+        name=name,
+        path=path,
+        feature_function=metadata.get('feature_function', legacy_feature_function),
+        feature_version=metadata.get('feature_version'),
+        input_fields=metadata.get('input_fields', DEFAULT_INPUT_FIELDS),
+        metadata=metadata,
+        checksum=manifest['source_checksum'],
+        feature_mode=metadata.get('feature_mode', 'text'),
+        collapse_info={
+            'collapsed': True,
+            'mapped': True,
+            'folds': scorer.n_folds,
+            'vocabulary_size': len(scorer.vocabulary),
+            'compression': manifest.get('compression')
+        }
+    )
+
+def load_mapped_bundle(path: str, name: str = '', legacy_feature_function: str = LEGACY_FEATURE_FUNCTION) -> ModelBundle:
+    """
+    NumPy配列形式のディレクトリを直接読み込む（圧縮版の比較など。元のモデルファイルとの照合はしない）
+
+    Raises:
+        ValueError: NumPy配列形式でない・形式バージョンが異なる
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise ValueError(f"Not a mapped artifact: {path}")
+    return _bundle_from_mapped(path, name or os.path.basename(path), legacy_feature_function, manifest)
+
+def export_mapped_artifact(path: str, name: str = '', legacy_feature_function: str = LEGACY_FEATURE_FUNCTION,
+                           output: Optional[str] = None) -> str:
+    """
+    joblib形式のモデルファイルをメモリマップ形式に変換（既定は <モデルファイル名>.mapped/ に保存）
+
+    Raises:
+        ValueError: 単一スコアラーに畳み込めないモデル（'sparse' 特徴量方式など）
+    """
+    bundle = _bundle_from_artifact(path, name or os.path.basename(path), legacy_feature_function)
+    if not bundle.collapse_info['collapsed']:
+        raise ValueError(f"Model cannot be exported to mapped format: {bundle.collapse_info.get('reason')}")
+    return mapped_format.save_mapped_artifact(bundle.model, output or mapped_path(path), bundle.metadata,
+                                              bundle.checksum)
+
+def _dummy_bundle() -> ModelBundle:
+    """デモ用の簡易分類器（最終フォールバック）"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.pipeline import make_pipeline
+    from sklearn.svm import LinearSVC
+
+    vectorizer = TfidfVectorizer(max_features=1000)
+    model = LinearSVC()
+
+    # ダミーデータで初期化
+    dummy_texts = [
+        "支払い期限のお知らせ 料金の引き落とし",
+        "会議のご案内 スケジュール調整",
+        "重要なお知らせ システムメンテナンス"
+    ]
+    dummy_labels = ["支払い関係", "通知", "重要"]
+
+    X = vectorizer.fit_transform(dummy_texts)
+    model.fit(X, dummy_labels)
+
+    return ModelBundle(
+        make_pipeline(vectorizer, model),
+        name='fallback dummy',
+        path=None,
+        feature_function=LEGACY_FEATURE_FUNCTION,
+        feature_version=None,
+        input_fields=DEFAULT_INPUT_FIELDS,
+        metadata={}
+    )
+
+def load_bundle(models_dir: str = MODELS_DIR, prefer_mapped: bool = True) -> ModelBundle:
+    """
+    優先順位に従ってモデルファイルを選択し、バンドルを作成
+
+    Args:
+        prefer_mapped: モデルファイルと同じ内容から変換されたメモリマップ形式があればそちらを使用
+    """
+    for filename, name, legacy_feature_function in MODEL_CANDIDATES:
+        path = os.path.join(models_dir, filename)
+        if os.path.exists(path):
+            manifest = read_manifest(mapped_path(path)) if prefer_mapped else None
+            if manifest is not None and manifest['source_checksum'] == file_checksum(path):
+                try:
+                    bundle = _bundle_from_mapped(mapped_path(path), name, legacy_feature_function, manifest)
+                    print(f"Loaded {name} model (memory-mapped) with accuracy: {bundle.metadata.get('accuracy', 'N/A')}")
+                    return bundle
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Failed to load memory-mapped {name} model, falling back to joblib: {e}")
+            bundle = _bundle_from_artifact(path, name, legacy_feature_function)
+            print(f"Loaded {name} model with accuracy: {bundle.metadata.get('accuracy', 'N/A')}")
+            return bundle
+
+    legacy_path = os.path.join(models_dir, LEGACY_MODEL_FILE)
+    if os.path.exists(legacy_path):
+        # 旧形式のモデルを読み込み（fallback）
+        import pickle
+        with open(legacy_path, 'rb') as f:
+            vectorizer, model = pickle.load(f)
+        # 旧形式をPipelineに変換
+        from sklearn.pipeline import make_pipeline
+        print("Loaded legacy model")
+        return ModelBundle(
+            make_pipeline(vectorizer, model),
+            name='legacy',
+            path=legacy_path,
+            feature_function=LEGACY_FEATURE_FUNCTION,
+            feature_version=None,
+            input_fields=DEFAULT_INPUT_FIELDS,
+            metadata={},
+            checksum=file_checksum(legacy_path)
+        )
+
+    print("Loaded fallback dummy model")
+    return _dummy_bundle()
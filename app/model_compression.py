@@ -0,0 +1,126 @@
+"""
+NumPy配列形式のモデルの圧縮
+語彙の枝刈り（重みの大きさ / カイ二乗値）と重み行列の低精度化（float32 / float16 / int8）を行った
+NumPy配列形式（models.mapped_format）を書き出す。scikit-learn は使わない
+
+枝刈りした語は正規化（L2ノルム）の計算からも外れるため、推論結果は元のモデルと完全には一致しない。
+精度・レイテンシ・サイズの比較は scripts/compress_model.py で行う
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from models.mapped_format import WEIGHT_DTYPES, read_manifest, write_mapped_artifact
+from .mapped_artifact import load_mapped_scorer
+from .numpy_scorer import NumpyLinearScorer
+
+PRUNE_METHODS = ('weight', 'chi2')
+
+def weight_importance(scorer: NumpyLinearScorer) -> np.ndarray:
+    """語毎の重み（IDF×係数）の最大絶対値"""
+    weights = np.asarray(scorer.weights, dtype=np.float64)
+    if scorer.weight_scales is not None:
+        weights = weights * scorer.weight_scales
+    return np.abs(weights).max(axis=1) if weights.shape[1] else np.zeros(len(weights))
+
+def chi2_importance(scorer: NumpyLinearScorer, texts: Sequence[str], labels: Sequence[str]) -> np.ndarray:
+    """
+    ラベル付きテキストでの語毎のカイ二乗値（sklearn.feature_selection.chi2 と同じく出現数から計算）
+
+    Args:
+        texts: 特徴量化済みのテキスト
+        labels: クラス名（モデルのクラスにないラベルのテキストは無視）
+    """
+    class_index = {str(c): i for i, c in enumerate(scorer.classes_)}
+    observed = np.zeros((len(class_index), len(scorer.vocabulary)))
+    class_counts = np.zeros(len(class_index))
+
+    for text, label in zip(texts, labels):
+        index = class_index.get(str(label))
+        if index is None:
+            continue
+        np.add.at(observed[index], scorer.vocabulary.lookup(scorer.analyzer(text)), 1)
+        class_counts[index] += 1
+
+    if not class_counts.sum():
+        raise ValueError("No labeled texts match the model classes")
+
+    expected = np.outer(class_counts / class_counts.sum(), observed.sum(axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chi2 = np.where(expected > 0, (observed - expected) ** 2 / expected, 0.0)
+    return chi2.sum(axis=0)
+
+def select_terms(importance: np.ndarray, keep_ratio: float,
+                 tie_breaker: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    重要度の高い語の行番号（昇順）
+
+    Args:
+        keep_ratio: 残す語の割合（0 < keep_ratio <= 1）
+        tie_breaker: 重要度が同じ語の順位付け（カイ二乗値0の語を重みの大きさで並べるなど）
+    """
+    if not 0 < keep_ratio <= 1:
+        raise ValueError(f"keep_ratio must be in (0, 1]: {keep_ratio}")
+    n_keep = max(1, int(round(len(importance) * keep_ratio)))
+    keys = (importance,) if tie_breaker is None else (tie_breaker, importance)
+    order = np.lexsort(keys)[::-1]
+    return np.sort(order[:n_keep])
+
+def compress_mapped_artifact(source: str, path: str, keep_ratio: float = 1.0, method: str = 'weight',
+                             weight_dtype: str = 'float16', texts: Optional[Sequence[str]] = None,
+                             labels: Optional[Sequence[str]] = None) -> Dict:
+    """
+    非圧縮のNumPy配列形式から圧縮版を書き出す
+
+    Args:
+        source: 非圧縮のNumPy配列形式のディレクトリ
+        path: 保存先ディレクトリ
+        method: 枝刈りの基準（'weight' / 'chi2'。chi2 は texts / labels が必要）
+        weight_dtype: 重み行列の保存型（WEIGHT_DTYPES）
+
+    Returns:
+        マニフェストの compression に保存した圧縮情報
+    """
+    manifest = read_manifest(source)
+    if manifest is None:
+        raise ValueError(f"Not a mapped artifact: {source}")
+    if manifest.get('weight_dtype', 'float64') != 'float64':
+        raise ValueError("Source artifact is already compressed")
+    if method not in PRUNE_METHODS:
+        raise ValueError(f"Unsupported prune method: {method}")
+    if weight_dtype not in WEIGHT_DTYPES:
+        raise ValueError(f"Unsupported weight dtype: {weight_dtype}")
+
+    scorer = load_mapped_scorer(source, manifest)
+    magnitude = weight_importance(scorer)
+    if keep_ratio >= 1:
+        keep = np.arange(len(magnitude))
+    elif method == 'chi2':
+        if texts is None or labels is None:
+            raise ValueError("chi2 pruning requires labeled texts")
+        keep = select_terms(chi2_importance(scorer, texts, labels), keep_ratio, tie_breaker=magnitude)
+    else:
+        keep = select_terms(magnitude, keep_ratio)
+
+    all_terms: List[str] = scorer.vocabulary.terms()
+    compression = {
+        'method': method if keep_ratio < 1 else None,
+        'keep_ratio': keep_ratio,
+        'terms': int(len(keep)),
+        'original_terms': len(all_terms),
+        'weight_dtype': weight_dtype
+    }
+
+    write_mapped_artifact(
+        path, scorer, [all_terms[i] for i in keep],
+        np.asarray(scorer.weights)[keep], np.asarray(scorer.norm_weights)[keep],
+        manifest={
+            'source_checksum': manifest['source_checksum'],
+            'metadata': manifest['metadata'],
+            'tokenizer': manifest['tokenizer'],
+            'compression': compression
+        },
+        weight_dtype=weight_dtype
+    )
+    return compression
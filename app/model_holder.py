@@ -0,0 +1,177 @@
+"""
+モデルホルダー
+モデルバンドルの読み込みを1回にまとめ、再読み込みはバックグラウンドで読み込み・ウォームアップ・検証してから
+参照を原子的に差し替える（処理中のリクエストは取得済みの旧モデルで完了する）
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .model_bundle import ModelBundle
+
+# ウォームアップ・検証用の入力（全ての入力フィールド構成で空にならないよう件名・本文とも設定）
+WARMUP_EMAILS = [
+    {'subject': 'PayPay決済完了のお知らせ', 'body': 'PayPayでのお支払いが完了しました。利用金額：1,250円'},
+    {'subject': '緊急 システム障害のお知らせ', 'body': 'システムに障害が発生しました。復旧作業中です。'},
+    {'subject': 'Amazon タイムセール開催中', 'body': 'お得な商品が多数あります。'},
+]
+
+def warm_up_and_validate(bundle: ModelBundle) -> None:
+    """
+    推論経路を一通り実行して初回呼び出しのコストを済ませ、出力を検証する
+
+    Raises:
+        ValueError: 推論結果が不正な場合（ラベルがクラス外・確率が不正）
+    """
+    texts = [bundle.featurize(email) for email in WARMUP_EMAILS]
+    classes = {str(c) for c in bundle.engine.classes_}
+
+    for inference in bundle.engine.infer(texts):
+        if inference['label'] not in classes:
+            raise ValueError(f"Model returned unknown label: {inference['label']}")
+        probabilities = np.array(list(inference['probabilities'].values()))
+        if not np.all(np.isfinite(probabilities)) or abs(probabilities.sum() - 1.0) > 1e-6:
+            raise ValueError("Model returned invalid probabilities")
+
+class ModelHolder:
+    """
+    現在のモデルバンドルへの参照を保持
+
+    - get(): 読み込み済みならロックなしで返す。未読み込みの同時呼び出しは1回の読み込みを共有する
+    - reload(): 別スレッドで新しいバンドルを準備し、検証に通った場合のみ差し替える。
+      同時に要求された再読み込みは1回にまとめ、実行中に要求された場合は完了後にもう1回だけ読み込む
+    - add_swap_listener(): 旧モデルを置き換えた差し替え毎に呼ぶ処理（旧モデルの結果の破棄など）を登録する。
+      同期・非同期の再読み込み、ファイル監視による再読み込みのいずれの差し替えでも呼ばれる
+    """
+
+    def __init__(self, loader: Callable[[], ModelBundle],
+                 on_loaded: Optional[Callable[[ModelBundle], None]] = None):
+        self._loader = loader
+        self._on_loaded = on_loaded
+        self._bundle: Optional[ModelBundle] = None
+        self._load_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._reload_thread: Optional[threading.Thread] = None
+        self._reload_pending = False
+        self._swap_listeners: List[Callable[[ModelBundle], None]] = []
+
+        self.generation = 0
+        self.last_swap_at: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        """fork後の子プロセスでロック・再読み込みスレッドの状態を初期化（スレッドは子に引き継がれない）"""
+        self._load_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        self._reload_pending = False
+
+    @property
+    def current(self) -> Optional[ModelBundle]:
+        """読み込み済みのバンドル（未読み込みならNone、読み込みは行わない）"""
+        return self._bundle
+
+    def get(self) -> ModelBundle:
+        bundle = self._bundle
+        if bundle is not None:
+            return bundle
+
+        with self._load_lock:
+            if self._bundle is None:
+                self._swap(self._prepare())
+            return self._bundle
+
+    def _prepare(self) -> ModelBundle:
+        bundle = self._loader()
+        warm_up_and_validate(bundle)
+        return bundle
+
+    def add_swap_listener(self, listener: Callable[[ModelBundle], None]) -> None:
+        """旧モデルを置き換えた差し替え毎に新しいバンドルで呼ぶ処理を登録（初回の読み込みでは呼ばない）"""
+        self._swap_listeners.append(listener)
+
+    def _swap(self, bundle: ModelBundle) -> None:
+        """参照の差し替え（_load_lock 取得済みで呼ぶ）"""
+        replaced = self._bundle is not None
+        self._bundle = bundle
+        self.generation += 1
+        self.last_swap_at = datetime.now().isoformat()
+        if replaced:
+            for listener in list(self._swap_listeners):
+                listener(bundle)
+        if self._on_loaded is not None:
+            self._on_loaded(bundle)
+
+    def _reload_loop(self) -> None:
+        try:
+            while True:
+                with self._reload_lock:
+                    self._reload_pending = False
+
+                try:
+                    bundle = self._prepare()
+                    with self._load_lock:
+                        self._swap(bundle)
+                except Exception as e:
+                    # 検証に失敗したモデルには切り替えない（旧モデルで処理を継続）。
+                    # on_loaded の失敗は差し替え後のため新モデルで処理を継続し、エラーだけ記録する
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    logging.error(f"Model reload failed: {self.last_error}")
+                else:
+                    self.last_error = None
+
+                with self._reload_lock:
+                    if not self._reload_pending:
+                        return
+        finally:
+            # 例外でスレッドが終了しても reloading のまま残らないよう、常に実行中の状態を解除する
+            with self._reload_lock:
+                self._reload_thread = None
+
+    def reload(self, wait: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        モデルの再読み込み
+
+        Args:
+            wait: 差し替え（または失敗）まで待つか
+            timeout: 待機の上限秒数
+
+        Returns:
+            再読み込みが完了したか（wait=False の場合は常にFalse）
+        """
+        with self._reload_lock:
+            thread = self._reload_thread
+            if thread is None:
+                thread = self._reload_thread = threading.Thread(
+                    target=self._reload_loop, name='model-reload', daemon=True
+                )
+                thread.start()
+            else:
+                # 実行中の読み込みは要求前のファイルを読んでいる可能性があるため、完了後にもう1回読み込む
+                self._reload_pending = True
+
+        if not wait:
+            return False
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_thread is not None
+
+    def describe(self) -> Dict:
+        return {
+            'loaded': self._bundle is not None,
+            'generation': self.generation,
+            'last_swap_at': self.last_swap_at,
+            'reloading': self.reloading,
+            'last_error': self.last_error
+        }
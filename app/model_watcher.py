@@ -0,0 +1,217 @@
+"""
+モデルファイル監視
+models/ ディレクトリの .pkl ファイル・NumPy配列形式（.mapped/）の追加・置き換えを検知し、書き込み完了を待ってから
+バックグラウンドでモデルを再読み込みする（再学習後の POST /api/model/reload 忘れで旧モデルのまま動き続けない）
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from models.mapped_format import MANIFEST_FILE, MAPPED_SUFFIX, file_checksum
+
+ARTIFACT_SUFFIX = '.pkl'
+
+class ModelWatcher:
+    """
+    モデルファイルのポーリング監視
+
+    サイズ・更新時刻が変わったファイルは、debounce 秒間変化がなくなるまで（書き込み途中の
+    ファイルを読まないよう）待ってからチェックサムを計算し、内容が変わっていれば on_change を呼ぶ。
+    同じ内容での上書き（touch・再保存）では再読み込みしない。
+    """
+
+    def __init__(self, models_dir: str, on_change: Callable[[], None],
+                 interval: float = 2.0, debounce: float = 1.0):
+        self.models_dir = models_dir
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+
+        # ファイル名 → (サイズ, 更新時刻)
+        self._stats: Dict[str, Tuple[int, float]] = {}
+        # ファイル名 → 最後に確認した内容のチェックサム
+        self._checksums: Dict[str, str] = {}
+        # ファイル名 → 最後に変化を検知した時刻（書き込み完了待ち）
+        self._settling: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.changes = 0
+        self.last_change: Optional[str] = None
+        self.last_change_at: Optional[str] = None
+
+    def _scan(self) -> Dict[str, Tuple[int, float]]:
+        stats = {}
+        try:
+            with os.scandir(self.models_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(ARTIFACT_SUFFIX) and entry.is_file():
+                        stat = entry.stat()
+                        stats[entry.name] = (stat.st_size, stat.st_mtime)
+                    elif entry.name.endswith(MAPPED_SUFFIX) and entry.is_dir():
+                        # NumPy配列形式はマニフェストを最後に書いてディレクトリごと置き換える
+                        name = os.path.join(entry.name, MANIFEST_FILE)
+                        try:
+                            stat = os.stat(os.path.join(self.models_dir, name))
+                        except FileNotFoundError:
+                            continue
+                        stats[name] = (stat.st_size, stat.st_mtime)
+        except FileNotFoundError:
+            pass
+        return stats
+
+    def prime(self) -> None:
+        """現在のファイル状態を基準として記録（起動時点のファイルでは再読み込みしない）"""
+        self._stats = self._scan()
+        for name in self._stats:
+            try:
+                self._checksums[name] = file_checksum(os.path.join(self.models_dir, name))
+            except OSError:
+                pass
+
+    def poll(self, now: Optional[float] = None) -> bool:
+        """
+        1回分の監視処理
+
+        Returns:
+            再読み込みを要求したか
+        """
+        now = time.monotonic() if now is None else now
+        stats = self._scan()
+
+        for name, stat in stats.items():
+            if self._stats.get(name) != stat:
+                self._settling[name] = now
+        for name in set(self._settling) - set(stats):
+            # 書き込み途中で削除・リネームされたファイル
+            del self._settling[name]
+        self._stats = stats
+
+        changed = []
+        for name, since in list(self._settling.items()):
+            if now - since < self.debounce:
+                continue
+            del self._settling[name]
+            try:
+                checksum = file_checksum(os.path.join(self.models_dir, name))
+            except OSError:
+                continue
+            if self._checksums.get(name) != checksum:
+                self._checksums[name] = checksum
+                changed.append(name)
+
+        if not changed:
+            return False
+
+        self.changes += 1
+        self.last_change = ', '.join(sorted(changed))
+        self.last_change_at = datetime.now().isoformat()
+        logging.info(f"Model artifact changed: {self.last_change}")
+        self.on_change()
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logging.error(f"Model watcher failed: {e}")
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.prime()
+        self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+        self._thread.start()
+
+    def restart_after_fork(self) -> None:
+        """fork後の子プロセスで監視スレッドを作り直す（記録済みのファイル状態は引き継ぐ）"""
+        if self._thread is None:
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+        self._thread.start()
+
+    def detach_after_fork(self) -> None:
+        """fork後の子プロセスでは監視しない（スレッドは子に引き継がれないため参照だけ外す）"""
+        self._thread = None
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def describe(self) -> Dict:
+        return {
+            'enabled': True,
+            'running': self._thread is not None,
+            'models_dir': os.path.abspath(self.models_dir),
+            'interval': self.interval,
+            'debounce': self.debounce,
+            'watching': sorted(self._stats),
+            'pending': sorted(self._settling),
+            'changes': self.changes,
+            'last_change': self.last_change,
+            'last_change_at': self.last_change_at
+        }
+
+# モデルホルダーはプロセス内で共有のため、監視もプロセス毎に1つ
+_watcher: Optional[ModelWatcher] = None
+_watcher_lock = threading.Lock()
+# fork後の子プロセスでも監視を続けるか（プリフォークサーバーではマスターだけが監視する）
+_watch_in_children = True
+
+def _after_fork_in_child() -> None:
+    global _watcher_lock
+    _watcher_lock = threading.Lock()
+    if _watcher is None:
+        return
+    if _watch_in_children:
+        _watcher.restart_after_fork()
+    else:
+        _watcher.detach_after_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+def watch_in_master_only(on_change: Callable[[], None]) -> None:
+    """
+    プリフォークサーバーのマスターだけで監視し、変更検知時に on_change（マスターでの再読み込み）を呼ぶ
+
+    ワーカー毎に監視・再読み込みすると、各ワーカーがモデルのコピーを持ちコピーオンライトでの共有がなくなるため、
+    ワーカーは監視せず、マスターが再読み込み後にワーカーを作り直す
+    """
+    global _watch_in_children
+    _watch_in_children = False
+    if _watcher is not None:
+        _watcher.on_change = on_change
+
+def model_watcher_status() -> Dict:
+    """監視状態（未起動なら無効）"""
+    return _watcher.describe() if _watcher is not None else {'enabled': False}
+
+def init_model_watcher(app) -> None:
+    """アプリケーション設定に従ってモデルファイル監視を開始"""
+    global _watcher
+    if not app.config.get('MODEL_WATCH_ENABLED', True):
+        return
+
+    # 監視の変更検知で再読み込みするホルダーは分類APIのもの
+    from .classifier import _holder
+    from .model_bundle import MODELS_DIR
+
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = ModelWatcher(
+                MODELS_DIR,
+                on_change=lambda: _holder.reload(wait=False),
+                interval=app.config.get('MODEL_WATCH_INTERVAL', 2.0),
+                debounce=app.config.get('MODEL_WATCH_DEBOUNCE', 1.0)
+            )
+            _watcher.start()
+    app.extensions['model_watcher'] = _watcher
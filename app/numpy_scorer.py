@@ -0,0 +1,177 @@
+"""
+scikit-learn・SciPy を使わない線形スコアラー
+NumPy配列形式（models.mapped_format）に書き出した「TF-IDF + 線形モデル（+ シグモイド校正）」を、
+トークン化・語彙の探索・重み行の集計だけで評価する。
+n8n から届くのは1件ずつのため、リクエスト毎の疎行列の構築コストを避ける。
+
+このモジュールと app.mapped_artifact・models.mapped_format は scikit-learn / SciPy を import しない
+（NumPy配列形式のモデルだけを使うサーバーは scikit-learn を読み込まずに起動できる）
+"""
+
+import importlib
+import re
+import unicodedata
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models.linear_scorer import LinearScorer
+
+# scikit-learn の CountVectorizer と同じ空白の正規化
+_WHITE_SPACES = re.compile(r"\s\s+")
+
+def _strip_accents_unicode(text: str) -> str:
+    try:
+        text.encode('ASCII', errors='strict')
+        return text
+    except UnicodeEncodeError:
+        normalized = unicodedata.normalize('NFKD', text)
+        return ''.join(c for c in normalized if not unicodedata.combining(c))
+
+def _strip_accents_ascii(text: str) -> str:
+    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('ASCII')
+
+_ACCENT_FUNCTIONS = {None: None, 'unicode': _strip_accents_unicode, 'ascii': _strip_accents_ascii}
+
+def resolve_callable(name: str):
+    """'モジュール:関数名' から関数を解決"""
+    module_name, _, function_name = name.partition(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+def _word_ngrams(tokens: List[str], min_n: int, max_n: int) -> List[str]:
+    if max_n == 1:
+        return tokens
+    ngrams = list(tokens) if min_n == 1 else []
+    for n in range(max(min_n, 2), min(max_n + 1, len(tokens) + 1)):
+        for i in range(len(tokens) - n + 1):
+            ngrams.append(' '.join(tokens[i:i + n]))
+    return ngrams
+
+def _char_ngrams(text: str, min_n: int, max_n: int) -> List[str]:
+    text = _WHITE_SPACES.sub(' ', text)
+    ngrams = list(text) if min_n == 1 else []
+    for n in range(max(min_n, 2), min(max_n + 1, len(text) + 1)):
+        for i in range(len(text) - n + 1):
+            ngrams.append(text[i:i + n])
+    return ngrams
+
+def _char_wb_ngrams(text: str, min_n: int, max_n: int) -> List[str]:
+    ngrams = []
+    for word in _WHITE_SPACES.sub(' ', text).split():
+        word = f' {word} '
+        for n in range(min_n, max_n + 1):
+            offset = 0
+            ngrams.append(word[offset:offset + n])
+            while offset + n < len(word):
+                offset += 1
+                ngrams.append(word[offset:offset + n])
+            if offset == 0:  # n より短い語は1回だけ数える
+                break
+    return ngrams
+
+def build_analyzer(config: Dict) -> Callable[[str], List[str]]:
+    """
+    保存済みのトークン化設定から、CountVectorizer.build_analyzer() と同じ語列を返す関数を作成
+
+    Args:
+        config: models.mapped_format が保存する CountVectorizer のパラメータ
+            （tokenizer は 'モジュール:関数名'、stop_words は語のリスト）
+    """
+    analyzer = config['analyzer']
+    lowercase = config['lowercase']
+    min_n, max_n = config['ngram_range']
+    if config['strip_accents'] not in _ACCENT_FUNCTIONS:
+        raise ValueError(f"Unsupported strip_accents: {config['strip_accents']}")
+    strip_accents = _ACCENT_FUNCTIONS[config['strip_accents']]
+
+    def preprocess(text: str) -> str:
+        if lowercase:
+            text = text.lower()
+        if strip_accents is not None:
+            text = strip_accents(text)
+        return text
+
+    if analyzer == 'char':
+        return lambda text: _char_ngrams(preprocess(text), min_n, max_n)
+    if analyzer == 'char_wb':
+        return lambda text: _char_wb_ngrams(preprocess(text), min_n, max_n)
+    if analyzer != 'word':
+        raise ValueError(f"Unsupported analyzer: {analyzer}")
+
+    if config['tokenizer'] is not None:
+        tokenize = resolve_callable(config['tokenizer'])
+    else:
+        pattern = re.compile(config['token_pattern'])
+        if pattern.groups > 1:
+            raise ValueError("More than 1 capturing group in token pattern")
+        tokenize = pattern.findall
+
+    stop_words = frozenset(config['stop_words']) if config['stop_words'] else None
+
+    def analyze(text: str) -> List[str]:
+        tokens = tokenize(preprocess(text))
+        if stop_words is not None:
+            tokens = [token for token in tokens if token not in stop_words]
+        return _word_ngrams(tokens, min_n, max_n)
+
+    return analyze
+
+class NumpyLinearScorer(LinearScorer):
+    """
+    NumPy配列だけで評価するスコアラー
+
+    テキスト毎に語彙内の語の列番号と出現数を求め、重み行列の該当行だけを集計する
+    （語彙数 × 出力数の重み行列全体も疎行列も作らない）。
+
+    Args:
+        analyzer: テキスト → 語のリスト（build_analyzer）
+        vocabulary: 語のリスト → 列番号（lookup）を持つ語彙（app.mapped_artifact.MappedVocabulary）
+        weights: (語彙数, 全foldの出力数) IDF×係数（圧縮版は float32 / float16 / int8）
+        norm_weights: (語彙数, fold数) 正規化用のIDF（l2ならIDFの2乗）
+        weight_scales: int8 量子化した重み行列の出力列毎のスケール（それ以外はNone）
+    """
+
+    def __init__(self, analyzer: Callable[[str], List[str]], vocabulary, classes: np.ndarray,
+                 weights: np.ndarray, norm_weights: np.ndarray, intercepts: np.ndarray,
+                 sigmoid_a: Optional[np.ndarray], sigmoid_b: Optional[np.ndarray],
+                 output_classes: np.ndarray, fold_slices: List[Tuple[int, int]],
+                 sublinear_tf: bool, norm: Optional[str], weight_scales: Optional[np.ndarray] = None):
+        self.analyzer = analyzer
+        self.vocabulary = vocabulary
+        self.classes_ = classes
+        self.weights = weights
+        self.norm_weights = norm_weights
+        self.weight_scales = weight_scales
+        self.intercepts = intercepts
+        self.sigmoid_a = sigmoid_a
+        self.sigmoid_b = sigmoid_b
+        self.output_classes = output_classes
+        self.fold_slices = fold_slices
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+        # 出力列 → fold番号（fold毎の正規化に使用）
+        self._output_folds = np.concatenate(
+            [np.full(end - start, fold) for fold, (start, end) in enumerate(fold_slices)]
+        ).astype(np.int64)
+
+    def _fold_scores(self, texts: List[str]) -> np.ndarray:
+        scores = np.empty((len(texts), self.weights.shape[1]))
+        for i, text in enumerate(texts):
+            columns, counts = np.unique(self.vocabulary.lookup(self.analyzer(text)), return_counts=True)
+            tf = counts.astype(np.float64)
+            if self.sublinear_tf:
+                tf = np.log(tf) + 1
+
+            raw = tf @ self.weights[columns].astype(np.float64, copy=False)
+            if self.weight_scales is not None:
+                raw *= self.weight_scales
+            if self.norm == 'l2':
+                norms = np.sqrt((tf * tf) @ self.norm_weights[columns].astype(np.float64, copy=False))
+            elif self.norm == 'l1':
+                norms = tf @ self.norm_weights[columns].astype(np.float64, copy=False)
+            else:
+                norms = np.ones(self.n_folds)
+            norms[norms == 0] = 1.0
+
+            scores[i] = raw / norms[self._output_folds]
+        return scores + self.intercepts
@@ -0,0 +1,343 @@
+"""
+プリフォーク型の本番サーバー
+マスタープロセスでモデルを1回だけ読み込んでからワーカープロセスをforkし、
+モデルのメモリページをコピーオンライトで全ワーカーに共有する（ワーカー数を増やしてもモデルのメモリは増えない）
+
+モデルの再読み込み（ファイル監視・SIGHUP・ワーカーへの POST /api/model/reload）はマスターで行い、
+差し替え後にワーカーを作り直す（ワーカー毎に再読み込みするとモデルのコピーがワーカー数だけ作られるため）
+"""
+
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set
+
+from werkzeug.serving import BaseWSGIServer
+
+# マスターがハンドラを登録するシグナル（ワーカーではfork直後に既定の動作に戻す）
+MASTER_SIGNALS = (signal.SIGCHLD, signal.SIGHUP, signal.SIGTERM, signal.SIGINT)
+
+# ワーカープロセスでのマスターのpid（ワーカー以外ではNone）
+_master_pid: Optional[int] = None
+
+def request_master_reload() -> bool:
+    """
+    プリフォークサーバーのワーカーなら、マスターにモデルの再読み込みを要求（SIGHUP）
+
+    Returns:
+        マスターに要求したか（ワーカー以外ではFalse。呼び出し側がプロセス内で再読み込みする）
+    """
+    if _master_pid is None or os.getppid() != _master_pid:
+        return False
+    os.kill(_master_pid, signal.SIGHUP)
+    return True
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    固定サイズのスレッドプールでリクエストを処理するWSGIサーバー
+    （werkzeug の threaded=True はリクエスト毎にスレッドを作成し上限がない）
+
+    空きスレッドがある場合だけ accept する。処理中のワーカーは接続をカーネルの待ち受けキューに残すため、
+    接続は空いている他のワーカーが受け付け、キューが溢れれば SERVER_BACKLOG で接続元に待たせる
+    """
+
+    def __init__(self, host: str, port: int, app, threads: int, fd: int):
+        self.pool = None
+        self._slots = threading.BoundedSemaphore(threads)
+        super().__init__(host, port, app, fd=fd)
+        # 共有ソケットは他のワーカーが先に受け付けることがあるため、accept で待たない
+        self.socket.setblocking(False)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+
+    def _handle_request_noblock(self) -> None:
+        # 空きスレッドができるまで accept しない（キュー済みの接続を抱え込まない）
+        self._slots.acquire()
+        try:
+            request, client_address = self.get_request()
+        except OSError:
+            # 他のワーカーが先に受け付けた（BlockingIOError）
+            self._slots.release()
+            return
+        request.setblocking(True)
+
+        if not self.verify_request(request, client_address):
+            self.shutdown_request(request)
+            self._slots.release()
+            return
+        try:
+            self.process_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def _process(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def process_request(self, request, client_address) -> None:
+        self.pool.submit(self._process, request, client_address)
+
+    def server_close(self) -> None:
+        # 処理中のリクエストを完了させてから閉じる（基底クラスの初期化中にも呼ばれる）
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+        super().server_close()
+
+def _listen(host: str, port: int, backlog: int) -> socket.socket:
+    """全ワーカーで共有する待ち受けソケット（accept はカーネルがワーカー間に分配）"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def _run_worker(app, sock: socket.socket, host: str, port: int, threads: int) -> None:
+    """ワーカープロセスの本体（例外時もマスターの処理に戻らず終了する）"""
+    status = 1
+    try:
+        server = PooledWSGIServer(host, port, app, threads, fd=sock.fileno())
+
+        def stop(signum, frame):
+            # serve_forever と同じスレッドから shutdown() を呼ぶと終了待ちで止まるため別スレッドで呼ぶ
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+        status = 0
+    except BaseException as e:
+        logging.error(f"Worker {os.getpid()} failed: {type(e).__name__}: {e}")
+    finally:
+        os._exit(status)
+
+class PreforkServer:
+    """
+    ワーカープロセスの管理（異常終了したワーカーは再起動、SIGTERM/SIGINT で全ワーカーを停止）
+
+    holder を指定すると、SIGHUP でマスターのモデルを再読み込みし、差し替えた場合は全ワーカーを作り直す
+    （新しいワーカーを起動してから旧ワーカーを停止。旧ワーカーは処理中のリクエストを完了してから終了する）
+
+    シグナルハンドラはフラグを立てるだけで、マスターのループは起床用パイプ（signal.set_wakeup_fd）で起こされ、
+    終了した子プロセスを waitpid(WNOHANG) で全て回収してからフラグを処理する。
+    シグナルハンドラを登録するため、メインスレッドで作成する
+
+    Args:
+        app: Flaskアプリケーション（モデル読み込み済み）
+        workers: ワーカープロセス数
+        threads: ワーカー毎のリクエスト処理スレッド数
+        holder: マスターで再読み込みするモデルホルダー（app.model_holder.ModelHolder）
+    """
+
+    def __init__(self, app, host: str = '0.0.0.0', port: int = 5002,
+                 workers: int = 2, threads: int = 4, backlog: int = 128, holder=None):
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("Prefork server requires os.fork (use run.py on this platform)")
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.backlog = backlog
+        self.holder = holder
+        self.generations = 0  # 再読み込みでワーカーを作り直した回数
+        self._children: Dict[int, int] = {}  # pid → ワーカー番号
+        self._retiring: Set[int] = set()  # 作り直しで停止を指示した旧ワーカー（終了しても再起動しない）
+        self._stopping = False
+        self._reload_pending = False
+        self._master_pid = os.getpid()
+
+        # シグナル（SIGCHLD・SIGHUP・SIGTERM）・request_reload() でマスターのループを起こすパイプ
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_read, False)
+        os.set_blocking(self._wakeup_write, False)
+        signal.set_wakeup_fd(self._wakeup_write)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)  # ハンドラがないと起床用パイプに書かれない
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        if holder is not None:
+            # 監視・ワーカーからの要求がサーバー起動前に届いても終了しないよう、作成時に登録
+            signal.signal(signal.SIGHUP, self._on_reload_signal)
+
+    def _spawn(self, sock: socket.socket, number: int) -> None:
+        # fork直後の子プロセスにマスターのハンドラでシグナルが届かないよう（作り直し直後の SIGTERM を
+        # マスターの _stop で処理して終了しないなど）、子でハンドラを戻すまでシグナルを保留する
+        signal.pthread_sigmask(signal.SIG_BLOCK, MASTER_SIGNALS)
+        pid = -1
+        try:
+            pid = os.fork()
+            if pid == 0:
+                global _master_pid
+                _master_pid = self._master_pid
+                # マスターの起床用パイプはワーカーでは使わない
+                signal.set_wakeup_fd(-1)
+                os.close(self._wakeup_read)
+                os.close(self._wakeup_write)
+                for signum in MASTER_SIGNALS:
+                    signal.signal(signum, signal.SIG_DFL)
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)  # モデルの再読み込みはマスターが行う
+                signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C はマスターが受けてSIGTERMで伝える
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, MASTER_SIGNALS)
+                _run_worker(self.app, sock, self.host, self.port, self.threads)
+        finally:
+            if pid != 0:
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, MASTER_SIGNALS)
+        self._children[pid] = number
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wakeup_write, b'\0')
+        except BlockingIOError:
+            pass  # 起床済み（未読のデータがある）
+
+    def request_reload(self) -> None:
+        """マスターでのモデルの再読み込みを要求（ファイル監視スレッドなどマスターの任意のスレッドから呼べる）"""
+        if os.getpid() != self._master_pid:
+            return
+        self._reload_pending = True
+        self._wake()
+
+    def _on_reload_signal(self, signum, frame) -> None:
+        self._reload_pending = True
+
+    def _reload_and_roll(self, sock: socket.socket) -> None:
+        """マスターでモデルを再読み込みし、差し替えた場合は全ワーカーを作り直す"""
+        self._reload_pending = False
+        generation = self.holder.generation
+        self.holder.reload(wait=True)
+        if self.holder.generation == generation:
+            logging.error(f"Model reload in master failed, keeping workers: {self.holder.last_error}")
+            return
+        if self._stopping:
+            return
+
+        # 旧モデルを解放してから新しいモデルをGCの走査対象から外す
+        gc.collect()
+        gc.freeze()
+
+        old = list(self._children.items())
+        for pid, number in old:
+            del self._children[pid]
+            self._retiring.add(pid)
+            self._spawn(sock, number)
+        for pid, _ in old:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        self.generations += 1
+        print(f"Model reloaded in master, restarted {len(old)} workers")
+
+    def _drain_wakeup(self) -> None:
+        try:
+            while os.read(self._wakeup_read, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _reap(self, sock: socket.socket) -> None:
+        """終了した子プロセスを全て回収し、異常終了したワーカーを再起動"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+                continue
+            number = self._children.pop(pid, None)
+            if number is None or self._stopping:
+                continue
+            logging.error(f"Worker {number} (pid {pid}) exited with status {status}, restarting")
+            time.sleep(1)  # 起動直後に落ち続ける場合の連続forkを抑える
+            self._spawn(sock, number)
+
+    def _stop(self, signum, frame) -> None:
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def serve_forever(self) -> None:
+        if self._stopping:
+            return  # モデルの読み込み中などサーバー起動前に停止を指示された
+        sock = _listen(self.host, self.port, self.backlog)
+
+        # fork前に既存オブジェクトをGCの走査対象から外す
+        # （子プロセスでGCが参照カウント・GCヘッダーを書き換えてモデルのページが複製されるのを防ぐ）
+        gc.collect()
+        gc.freeze()
+
+        for number in range(self.workers):
+            self._spawn(sock, number)
+        print(f"Prefork server listening on {self.host}:{self.port} "
+              f"({self.workers} workers x {self.threads} threads, master pid {os.getpid()})")
+
+        while self._children:
+            self._reap(sock)
+            if self._reload_pending and not self._stopping:
+                self._reload_and_roll(sock)
+                continue
+            if not self._children:
+                break
+            # シグナル・再読み込み要求まで待機（回収後に届いたシグナルもパイプに残るため取りこぼさない）
+            select.select([self._wakeup_read], [], [])
+            self._drain_wakeup()
+
+        # 作り直しで停止を指示した旧ワーカーも回収
+        while self._retiring:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self._retiring.discard(pid)
+
+        sock.close()
+
+def serve(app) -> None:
+    """アプリケーション設定（SERVER_*）に従ってプリフォークサーバーを起動"""
+    from .classifier import _holder, load_model_bundle
+    from .model_watcher import watch_in_master_only
+
+    # モデルの読み込み前にサーバーを作成して SIGHUP のハンドラを登録し、モデルファイルの監視をマスターでの
+    # 再読み込み（ワーカーの作り直し）に切り替える（読み込み中に届いた要求はワーカーの起動後に処理）
+    config = app.config
+    server = PreforkServer(
+        app,
+        host=config.get('SERVER_HOST', '0.0.0.0'),
+        port=config.get('SERVER_PORT', 5002),
+        workers=config.get('SERVER_WORKERS') or os.cpu_count() or 1,
+        threads=config.get('SERVER_THREADS', 4),
+        backlog=config.get('SERVER_BACKLOG', 128),
+        holder=_holder
+    )
+    watch_in_master_only(server.request_reload)
+
+    # マスターで読み込み・ウォームアップしたモデルをコピーオンライトで全ワーカーに共有
+    # （ワーカーは起動直後から準備完了の状態で accept を始める）
+    warmup = app.extensions.get('startup_warmup')
+    if warmup is not None and not warmup.run():
+        logging.error(f"Warm-up failed in master (retried on GET /ready): {warmup.error}")
+    bundle = load_model_bundle()
+    print(f"Model loaded in master: {bundle.name} ({bundle.version})")
+
+    server.serve_forever()
@@ -0,0 +1,292 @@
+"""
+リクエストのプロファイリングと低速リクエストの記録
+本番環境で特定のメールだけが遅い場合に、再デプロイせずに原因を調べるためのデバッグ機能
+
+- プロファイリング（PROFILING_ENABLED=True の場合のみ）: /api/classify・/api/enrich-context に
+  X-Profile: 1 ヘッダーまたは ?profile=1 を付けたリクエストを cProfile で実行し、自己時間の長い関数の
+  ランキング（正規表現・キーワード照合などの組み込み関数は呼び出し元付き）をレスポンスの profile に返す。
+  プロファイル対象のリクエストは結果キャッシュ・テンプレート高速経路を使わずに全処理段階を実行する
+- 低速リクエストの記録（DEBUG_REQUESTS_ENABLED=True の場合のみ）: 直近 SLOW_REQUEST_WINDOW 秒の API リクエストの
+  うち所要時間の長い SLOW_REQUEST_BUFFER_SIZE 件を、処理段階毎の所要時間（app.metrics）と入力の大きさとともに保持する
+
+どちらも GET /debug/requests で確認できる（メールの件名・本文は保存せず、messageId と文字数のみ）。
+エンドポイントには認証がないため、どちらも無効（既定）の場合は登録せず 404 を返す
+"""
+
+import cProfile
+import heapq
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import current_app, g, has_request_context, request
+
+from .metrics import current_stage_timings
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# プロファイリングできるエンドポイント
+PROFILED_ENDPOINTS = ('classifier.classify_email', 'context.enrich_context')
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY = 'profile'
+
+# 関数毎に返す呼び出し元の数
+PROFILE_CALLERS = 3
+
+# 入力の大きさとともに記録する messageId の数（バッチ分類の先頭から）
+MAX_MESSAGE_IDS = 5
+
+def _flag(value: Optional[str]) -> bool:
+    return (value or '').lower() in ('1', 'true', 'yes')
+
+def is_profiling() -> bool:
+    """現在のリクエストをプロファイリング中か（結果キャッシュ・テンプレート高速経路を使わない）"""
+    return has_request_context() and g.get('profiler') is not None
+
+def _function_name(key) -> str:
+    """pstats の (ファイル, 行, 関数名) を表示用に整形（プロジェクト内のファイルは相対パス）"""
+    filename, line, name = key
+    if filename == '~':
+        return name  # 組み込み関数（"<method 'findall' of 're.Pattern' objects>" など）
+    # プロジェクト・標準ライブラリ・site-packages のファイルは import パスからの相対パス
+    for root in [PROJECT_ROOT, *sorted((path for path in sys.path if path), key=len, reverse=True)]:
+        if filename.startswith(root + os.sep):
+            filename = os.path.relpath(filename, root)
+            break
+    return f"{filename}:{line}({name})"
+
+def summarize_profile(profile: cProfile.Profile, top_n: int) -> Dict:
+    """
+    プロファイル結果を自己時間の長い順に top_n 件
+
+    Returns:
+        {total_ms, functions: [{function, calls, self_ms, cumulative_ms, callers}]}
+    """
+    stats = pstats.Stats(profile).stats
+    ranked = sorted(stats.items(), key=lambda item: -item[1][2])[:top_n]
+
+    functions = []
+    for key, (_, calls, self_time, cumulative, callers) in ranked:
+        # 呼び出し元毎の (呼び出し回数, 再帰以外の回数, 自己時間, 累積時間)
+        top_callers = sorted(callers.items(), key=lambda item: -item[1][2])[:PROFILE_CALLERS]
+        functions.append({
+            'function': _function_name(key),
+            'calls': calls,
+            'self_ms': round(self_time * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+            'callers': [_function_name(caller) for caller, _ in top_callers]
+        })
+
+    return {
+        'total_ms': round(sum(entry[2] for entry in stats.values()) * 1000, 3),
+        'functions': functions
+    }
+
+class SlowRequestLog:
+    """
+    所要時間の長いリクエストの記録（直近 window 秒のうち長い順に size 件）
+
+    所要時間が記録済みの最短より短いリクエストはロックを取らずに捨てる
+    """
+
+    def __init__(self, size: int = 50, window: float = 3600.0):
+        self.size = size
+        self.window = window
+        self._lock = threading.Lock()
+        self._heap: List = []  # (所要時間, 連番, 記録時刻, 内容) の最小ヒープ
+        self._counter = itertools.count()
+        self._pruned_at = time.monotonic()
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._heap = []
+
+    def _prune(self, now: float) -> None:
+        """期限切れの記録を削除（ロック取得済みで呼ぶ）"""
+        self._heap = [item for item in self._heap if now - item[2] <= self.window]
+        heapq.heapify(self._heap)
+        self._pruned_at = now
+
+    def qualifies(self, duration_ms: float) -> bool:
+        """記録対象になり得るか（入力の大きさなどを集計する前の判定）"""
+        if self.size <= 0:
+            return False
+        heap = self._heap
+        return len(heap) < self.size or duration_ms > heap[0][0] or time.monotonic() - self._pruned_at > 60
+
+    def record(self, duration_ms: float, entry: Dict) -> None:
+        if not self.qualifies(duration_ms):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._pruned_at > 60:
+                self._prune(now)
+            item = (duration_ms, next(self._counter), now, entry)
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif duration_ms > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def snapshot(self) -> List[Dict]:
+        """記録中のリクエスト（所要時間の長い順）"""
+        with self._lock:
+            self._prune(time.monotonic())
+            items = sorted(self._heap, reverse=True)
+        return [entry for _, _, _, entry in items]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap = []
+
+def _input_sizes(data) -> Dict:
+    """リクエストの入力の大きさ（件名・本文の文字数。内容は保存しない）"""
+    if isinstance(data, dict) and isinstance(data.get('emails'), list):
+        emails = data['emails']
+    elif isinstance(data, list):
+        emails = data
+    elif isinstance(data, dict):
+        emails = [data]
+    else:
+        emails = []
+    emails = [email for email in emails if isinstance(email, dict)]
+
+    return {
+        'request_bytes': request.content_length or 0,
+        'emails': len(emails),
+        'subject_chars': sum(len(str(email.get('subject', ''))) for email in emails),
+        'body_chars': sum(len(str(email.get('body', ''))) for email in emails),
+        'max_body_chars': max((len(str(email.get('body', ''))) for email in emails), default=0),
+        'message_ids': [str(email['messageId']) for email in emails if 'messageId' in email][:MAX_MESSAGE_IDS]
+    }
+
+class RequestProfiler:
+    """
+    リクエスト毎のプロファイリング・低速リクエストの記録（Flask のリクエストフック）
+
+    cProfile は同時に1リクエストだけ実行する（実行中に届いたプロファイル要求は通常どおり処理し、
+    レスポンスの profile に skipped を返す）
+    """
+
+    def __init__(self, slow_log: SlowRequestLog, profiling_enabled: bool = False,
+                 top_n: int = 25, history: int = 10):
+        self.slow_log = slow_log
+        self.profiling_enabled = profiling_enabled
+        self.top_n = top_n
+        self.profiles: deque = deque(maxlen=history)
+        self._profile_lock = threading.Lock()
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        self._profile_lock = threading.Lock()
+        self.profiles.clear()
+
+    def _profile_requested(self) -> bool:
+        return (self.profiling_enabled and request.endpoint in PROFILED_ENDPOINTS
+                and (_flag(request.headers.get(PROFILE_HEADER)) or _flag(request.args.get(PROFILE_QUERY))))
+
+    def before_request(self) -> None:
+        g.profiler_start_ns = time.perf_counter_ns()
+        if not self._profile_requested():
+            return
+        if not self._profile_lock.acquire(blocking=False):
+            g.profile_skipped = 'another request is being profiled'
+            return
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    def _stop_profiler(self) -> Optional[cProfile.Profile]:
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self._profile_lock.release()
+        return profiler
+
+    def after_request(self, response):
+        profiler = self._stop_profiler()
+        duration_ms = (time.perf_counter_ns() - g.get('profiler_start_ns', time.perf_counter_ns())) / 1e6
+
+        summary = None
+        if profiler is not None:
+            summary = summarize_profile(profiler, self.top_n)
+        elif g.get('profile_skipped'):
+            summary = {'skipped': g.profile_skipped}
+
+        if summary is not None:
+            if 'functions' in summary:
+                self.profiles.append({
+                    'endpoint': request.endpoint,
+                    'at': datetime.now().isoformat(),
+                    'duration_ms': round(duration_ms, 3),
+                    'input': _input_sizes(request.get_json(silent=True)),
+                    'profile': summary
+                })
+            body = response.get_json(silent=True) if response.is_json else None
+            if isinstance(body, dict):
+                body['profile'] = summary
+                response.set_data(current_app.json.dumps(body))
+
+        # API（Blueprint）のリクエストのみ記録（/metrics・/debug/requests などは除く）
+        if request.blueprint is not None and self.slow_log.qualifies(duration_ms):
+            stage_ns = current_stage_timings() or {}
+            self.slow_log.record(duration_ms, {
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'at': datetime.now().isoformat(),
+                'duration_ms': round(duration_ms, 3),
+                'stage_ms': {stage: round(ns / 1e6, 3) for stage, ns in stage_ns.items()},
+                'input': _input_sizes(request.get_json(silent=True)),
+                'profiled': profiler is not None
+            })
+        return response
+
+    def teardown_request(self, exc=None) -> None:
+        """未処理の例外で終了した場合もプロファイラを止める"""
+        self._stop_profiler()
+
+    def describe(self) -> Dict:
+        return {
+            'profiling_enabled': self.profiling_enabled,
+            'slow_request_buffer_size': self.slow_log.size,
+            'slow_request_window_seconds': self.slow_log.window,
+            'slowest': self.slow_log.snapshot(),
+            'profiles': list(self.profiles)
+        }
+
+def current_request_profiler() -> Optional[RequestProfiler]:
+    """現在のアプリケーションのリクエストプロファイラ（無効ならNone）"""
+    return current_app.extensions.get('request_profiler')
+
+def debug_requests_response():
+    """GET /debug/requests のレスポンス"""
+    profiler = current_request_profiler()
+    if profiler is None:
+        return {"error": "Request debugging disabled"}, 404
+    return profiler.describe()
+
+def init_request_profiler(app) -> None:
+    """アプリケーション設定に従ってプロファイリング・低速リクエストの記録を登録（どちらも無効なら登録しない）"""
+    profiling_enabled = app.config.get('PROFILING_ENABLED', False)
+    buffer_size = app.config.get('SLOW_REQUEST_BUFFER_SIZE', 50) if app.config.get('DEBUG_REQUESTS_ENABLED', False) else 0
+    if not profiling_enabled and buffer_size <= 0:
+        return
+
+    profiler = RequestProfiler(
+        SlowRequestLog(size=buffer_size, window=app.config.get('SLOW_REQUEST_WINDOW', 3600.0)),
+        profiling_enabled=profiling_enabled,
+        top_n=app.config.get('PROFILE_TOP_N', 25)
+    )
+    app.extensions['request_profiler'] = profiler
+    app.before_request(profiler.before_request)
+    app.after_request(profiler.after_request)
+    app.teardown_request(profiler.teardown_request)
@@ -0,0 +1,269 @@
+"""
+分類・文脈補完結果のコンテンツアドレス型キャッシュ
+モデルバージョンと入力フィールドのハッシュをキーに、プロセス内LRUと任意の共有SQLiteの2段で結果を保持する
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+from flask import current_app
+
+from .request_profiler import is_profiling
+
+_MISSING = object()
+
+def make_cache_key(namespace: str, version: str, fields: Dict) -> str:
+    """
+    キャッシュキーの作成
+
+    Args:
+        namespace: 結果の種類（'classify' / 'enrich' など）
+        version: モデルバージョン（モデルに依存しない結果は空文字）
+        fields: 結果に影響する入力（件名・本文・top_k など。messageId は含めない）
+    """
+    # 正規化: 文字列化したフィールドをキー順に並べた JSON（内容が同じなら順序・型の違いを吸収）
+    normalized = json.dumps([namespace, version, {k: str(v) for k, v in fields.items()}],
+                            ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+class _Flight:
+    """計算中のキーに対する待ち合わせ"""
+
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class _SQLiteTier:
+    """
+    複数ワーカープロセスで共有するディスク層（接続はスレッド毎）
+
+    書き込み毎に古い行を削除して max_rows 件以下に保つ。rowid は書き込み（INSERT OR REPLACE）順に増えるため、
+    最新の rowid から max_rows 件より前の行を rowid の範囲で削除する（件数を数えずに索引だけで済む）
+    """
+
+    def __init__(self, path: str, max_rows: int = 100000):
+        self.path = path
+        self.max_rows = max_rows
+        self._local = threading.local()
+        if hasattr(os, 'register_at_fork'):
+            # SQLite接続はfork先に引き継げないため子プロセスでは接続し直す
+            os.register_at_fork(after_in_child=self._reset_connections)
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)'
+        )
+
+    def _reset_connections(self) -> None:
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str):
+        row = self._connection().execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else _MISSING
+
+    def put(self, key: str, value) -> None:
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)',
+            (key, json.dumps(value, ensure_ascii=False), time.time())
+        )
+        connection.execute('DELETE FROM results WHERE rowid <= (SELECT MAX(rowid) FROM results) - ?',
+                           (self.max_rows,))
+
+    def clear(self) -> None:
+        self._connection().execute('DELETE FROM results')
+
+class ResultCache:
+    """
+    2段構成の結果キャッシュ
+
+    - プロセス内LRU（上限 max_entries 件）
+    - 任意のSQLite層（sqlite_path 指定時。上限 sqlite_max_rows 件、複数ワーカーで共有、ディスク層の障害はミス扱い）
+    同じキーの計算が同時に要求された場合は1回だけ計算し、他のリクエストはその結果を共有する。
+    """
+
+    def __init__(self, max_entries: int = 1024, sqlite_path: Optional[str] = None, sqlite_max_rows: int = 100000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        # invalidate() 前に開始した計算の結果を書き戻さないための世代番号
+        self._generation = 0
+        self._disk = _SQLiteTier(sqlite_path, sqlite_max_rows) if sqlite_path else None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    @property
+    def generation(self) -> int:
+        """
+        現在の世代番号（invalidate() 毎に増える）
+
+        計算前に取得して put() に渡すと、計算中に invalidate() された場合は結果を書き戻さない
+        """
+        with self._lock:
+            return self._generation
+
+    def get(self, key: str):
+        """キャッシュ済みの結果（なければ _MISSING）"""
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self._disk is not None:
+            try:
+                value = self._disk.get(key)
+            except sqlite3.Error as e:
+                logging.warning(f"Result cache disk read failed: {e}")
+                value = _MISSING
+            if value is not _MISSING:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return _MISSING
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """キャッシュ済みの結果（なければNone）"""
+        value = self.get(key)
+        return None if value is _MISSING else value
+
+    def _store(self, key: str, value) -> None:
+        """LRUへの格納（ロック取得済みで呼ぶ）"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key: str, value, generation: Optional[int] = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._store(key, value)
+
+        if self._disk is not None:
+            try:
+                self._disk.put(key, value)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logging.warning(f"Result cache disk write failed: {e}")
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict]):
+        """キャッシュ済みなら返し、なければ計算（同一キーの同時計算は1回にまとめる）"""
+        value = self.get(key)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            generation = self._generation
+
+        if not leader:
+            flight.event.wait()
+            with self._lock:
+                self.shared += 1
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            self.put(key, flight.value, generation)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def invalidate(self) -> None:
+        """全結果の破棄（モデル再読み込み時）"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+        if self._disk is not None:
+            try:
+                self._disk.clear()
+            except sqlite3.Error as e:
+                logging.warning(f"Result cache disk clear failed: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'enabled': True,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'disk_enabled': self._disk is not None,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'shared_in_flight': self.shared,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+
+class DisabledResultCache:
+    """キャッシュ無効時（RESULT_CACHE_ENABLED=False）の代替。常に計算する"""
+
+    generation = 0
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        return None
+
+    def put(self, key: str, value, generation: Optional[int] = None) -> None:
+        pass
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict]):
+        return compute()
+
+    def invalidate(self) -> None:
+        pass
+
+    def stats(self) -> Dict:
+        return {'enabled': False}
+
+def current_result_cache():
+    """現在のアプリケーションの結果キャッシュ（未登録・プロファイリング中のリクエストなら無効キャッシュ）"""
+    if is_profiling():
+        return DisabledResultCache()
+    return current_app.extensions.get('result_cache') or DisabledResultCache()
+
+def init_result_cache(app) -> None:
+    """アプリケーション設定から結果キャッシュを作成して app.extensions に登録"""
+    if app.config.get('RESULT_CACHE_ENABLED', True):
+        cache = ResultCache(
+            max_entries=app.config.get('RESULT_CACHE_MAX_ENTRIES', 1024),
+            sqlite_path=app.config.get('RESULT_CACHE_SQLITE_PATH'),
+            sqlite_max_rows=app.config.get('RESULT_CACHE_SQLITE_MAX_ROWS', 100000)
+        )
+    else:
+        cache = DisabledResultCache()
+    app.extensions['result_cache'] = cache
@@ -0,0 +1,139 @@
+"""
+起動時のウォームアップと準備完了状態
+モデルの読み込み・推論経路・文脈補完・テンプレート指紋・リクエスト処理を合成メールで一通り実行してから
+準備完了とする。GET /ready はウォームアップ完了まで 503 を返す（GET /health はプロセスの生存確認のみ）。
+コンテナ再起動直後の n8n のリクエストが初回の読み込み・初期化のコストを払わないよう、
+ロードバランサー・オーケストレーターは /ready を見てからトラフィックを流す
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import current_app
+
+class StartupWarmup:
+    """
+    ウォームアップ処理の実行と状態（pending → warming → ready / failed）
+
+    run() は同期実行（同時呼び出しは1回の実行を待つ）、start() はバックグラウンド実行。
+    失敗した場合は start() で再実行できる（モデルファイルの修正後など）
+    """
+
+    def __init__(self, steps: List[Tuple[str, Callable[[], None]]]):
+        self._steps = steps
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self.state = 'pending'
+        self.error: Optional[str] = None
+        self.started_at: Optional[str] = None
+        self.ready_at: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        """fork後の子プロセスでロック・スレッドの状態を初期化（実行中だったウォームアップはやり直す）"""
+        self._lock = threading.Lock()
+        self._thread = None
+        if self.state == 'warming':
+            self.state = 'pending'
+
+    @property
+    def ready(self) -> bool:
+        return self.state == 'ready'
+
+    def run(self) -> bool:
+        """ウォームアップを実行して完了まで待つ（準備完了済みなら何もしない）"""
+        with self._lock:
+            if self.ready:
+                return True
+
+            self.state = 'warming'
+            self.error = None
+            self.started_at = datetime.now().isoformat()
+            self.timings = {}
+
+            for name, step in self._steps:
+                start = time.perf_counter()
+                try:
+                    step()
+                except Exception as e:
+                    self.state = 'failed'
+                    self.error = f"{name}: {type(e).__name__}: {e}"
+                    logging.error(f"Startup warm-up failed: {self.error}")
+                    return False
+                self.timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+            self.state = 'ready'
+            self.ready_at = datetime.now().isoformat()
+            return True
+
+    def start(self) -> None:
+        """バックグラウンドでウォームアップを開始（準備完了済み・実行中なら何もしない）"""
+        with self._lock:
+            if self.ready or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self.run, name='startup-warmup', daemon=True)
+            self._thread.start()
+
+    def describe(self) -> Dict:
+        return {
+            'state': self.state,
+            'ready': self.ready,
+            'started_at': self.started_at,
+            'ready_at': self.ready_at,
+            'step_ms': dict(self.timings),
+            'error': self.error
+        }
+
+def _warmup_steps(app) -> List[Tuple[str, Callable[[], None]]]:
+    """ウォームアップ処理（モデル → 文脈補完 → テンプレート指紋 → リクエスト処理の順）"""
+    from .classifier import load_model_bundle
+    from .context_enricher import advanced_enricher
+    from .model_holder import WARMUP_EMAILS
+
+    def warm_model() -> None:
+        # 読み込み・特徴量関数の解決・推論経路の初回実行と出力検証（ModelHolder がまとめて行う）
+        load_model_bundle()
+
+    def warm_enricher() -> None:
+        for email in WARMUP_EMAILS:
+            advanced_enricher.enrich_context(email['subject'], email['body'])
+
+    def warm_templates() -> None:
+        index = app.extensions.get('template_index')
+        if index is not None:
+            bundle = load_model_bundle()
+            for email in WARMUP_EMAILS:
+                index.fingerprint(bundle.build_text(email))
+
+    def warm_requests() -> None:
+        # Flask・werkzeug のリクエスト処理の初回コスト（キャッシュ・テンプレート指紋を汚さないよう /health を使用）
+        app.test_client().get('/health')
+
+    return [
+        ('model', warm_model),
+        ('enricher', warm_enricher),
+        ('templates', warm_templates),
+        ('requests', warm_requests)
+    ]
+
+def current_startup_warmup() -> Optional[StartupWarmup]:
+    """現在のアプリケーションのウォームアップ状態（無効ならNone）"""
+    return current_app.extensions.get('startup_warmup')
+
+def init_startup_warmup(app) -> None:
+    """アプリケーション設定に従ってウォームアップを登録し、バックグラウンドで開始"""
+    if not app.config.get('STARTUP_WARMUP', True):
+        return
+
+    warmup = StartupWarmup(_warmup_steps(app))
+    app.extensions['startup_warmup'] = warmup
+    # プリフォークサーバーはマスターで run() を呼び、完了を待ってからワーカーをforkする
+    warmup.start()
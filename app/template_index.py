@@ -0,0 +1,268 @@
+"""
+定型メールのテンプレート指紋インデックス
+金額・日付・ID・店舗名・数字をマスクしたテキストの指紋毎に過去の予測を記録し、
+予測が安定しているテンプレートはモデル（TF-IDF/SVC）を実行せずに過去の予測の代表値を返す
+"""
+
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from flask import current_app
+
+from models.linear_patterns import NamedAlternation
+from .context_enricher import advanced_enricher
+from .metrics import timed
+from .micro_batcher import infer_texts
+from .request_profiler import is_profiling
+
+# 英数字・ハイフンからなる6文字以上のトークンで数字を含むもの（承認番号・注文番号など）
+ID_PATTERN = r'(?<![A-Za-z0-9])(?=[A-Za-z\-]*\d)[A-Za-z0-9\-]{6,}'
+
+# 店舗名・加盟店名（通知毎に変わる利用先）
+# - 項目名の後の値（「ご利用店舗：ローソン渋谷店」）
+# - 金額の直前の「〇〇で」（「セブンイレブンで1,250円のお支払い」。空白・句読点の後から「で」まで）
+STORE_LABELS = ['店舗', '店舗名', '加盟店', '加盟店名', '利用先', '利用店', '支払先', 'お支払い先', 'お店']
+_STORE_DELIMITERS = r'\s「」『』（）()、。，．,：:'
+STORE_PATTERNS = [
+    rf'(?<={re.escape(label)}[：:])[^{_STORE_DELIMITERS}]+' for label in STORE_LABELS
+] + [
+    rf'(?<![^{_STORE_DELIMITERS}])[^{_STORE_DELIMITERS}\d]{{1,30}}?(?=で(?:[¥￥]|\d))',
+]
+
+class TemplateFingerprinter:
+    """金額・日付・ID・店舗名・数字をマスクしてテンプレート指紋を計算"""
+
+    def __init__(self, amount_patterns: List[str], date_patterns: List[str]):
+        # 同じ位置で一致する場合は日付 > 金額 > ID > 店舗名 > 数字 の順に優先
+        self.masks = [
+            ('DATE', date_patterns),
+            ('AMOUNT', amount_patterns),
+            ('ID', [ID_PATTERN]),
+            ('STORE', STORE_PATTERNS),
+            ('NUM', [r'\d+']),
+        ]
+        # 長い数字・カンマ・ハイフンの列で2乗の時間がかかるパターンは線形時間の抽出器で照合（結果は正規表現と同じ）
+        self._masker = NamedAlternation(self.masks)
+        self._whitespace = re.compile(r'\s+')
+
+    def mask(self, text: str) -> str:
+        masked = self._masker.sub(lambda name: f'<{name}>', text)
+        return self._whitespace.sub(' ', masked).strip()
+
+    def fingerprint(self, text: str) -> str:
+        return hashlib.sha1(self.mask(text).encode('utf-8')).hexdigest()[:16]
+
+class _Template:
+    """指紋毎の観測記録"""
+
+    __slots__ = ('model_version', 'labels', 'probability_sums', 'margin_sum', 'margins',
+                 'calibration', 'hits', 'since_verified')
+
+    def __init__(self, model_version: Optional[str]):
+        # 予測を記録したモデルのバージョン（別バージョンの予測は再利用しない）
+        self.model_version = model_version
+        self.labels: Counter = Counter()
+        # 観測した確率・マージンの合計（高速経路では直前のメールではなく観測全体の平均を返す）
+        self.probability_sums: Counter = Counter()
+        self.margin_sum = 0.0
+        self.margins = 0
+        self.calibration: Optional[str] = None
+        self.hits = 0
+        self.since_verified = 0
+
+    def add(self, inference: Dict) -> None:
+        self.labels[inference['label']] += 1
+        self.probability_sums.update(inference['probabilities'])
+        if inference.get('margin') is not None:
+            self.margin_sum += inference['margin']
+            self.margins += 1
+        self.calibration = inference.get('calibration')
+
+    def representative(self, top_k: int) -> Dict:
+        """
+        安定したラベルと、観測した確率の平均による推論結果（推論エンジンの infer と同じ形式）
+
+        全観測の最多確率ラベルが同じため、平均確率でもそのラベルが最大になる
+        """
+        label = self.labels.most_common(1)[0][0]
+        observations = self.observations
+        probabilities = {c: total / observations for c, total in self.probability_sums.items()}
+        ranked = sorted(probabilities, key=lambda c: (c != label, -probabilities[c]))
+        return {
+            'label': label,
+            'confidence': probabilities[label],
+            'probabilities': probabilities,
+            'top_k': [{'label': c, 'probability': probabilities[c]} for c in ranked[:max(1, top_k)]],
+            'margin': self.margin_sum / self.margins if self.margins else None,
+            'calibration': self.calibration
+        }
+
+    @property
+    def observations(self) -> int:
+        return sum(self.labels.values())
+
+    @property
+    def stability(self) -> float:
+        """最多ラベルの割合"""
+        observations = self.observations
+        return self.labels.most_common(1)[0][1] / observations if observations else 0.0
+
+class TemplateIndex:
+    """
+    テンプレート指紋 → 過去の予測
+
+    min_observations 回以上観測され、全ての予測ラベルが一致した指紋だけを高速経路で返す。
+    高速経路で返した指紋も verify_interval 回毎に1回はモデルで再評価し、ラベルが変われば
+    安定性が下がって高速経路から外れる。
+    """
+
+    def __init__(self, fingerprinter: TemplateFingerprinter, min_observations: int = 3,
+                 max_entries: int = 10000, verify_interval: int = 50):
+        self.fingerprinter = fingerprinter
+        self.min_observations = min_observations
+        self.max_entries = max_entries
+        self.verify_interval = verify_interval
+        self._templates: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+
+    def fingerprint(self, text: str) -> str:
+        return self.fingerprinter.fingerprint(text)
+
+    def lookup(self, fingerprint: str, model_version: Optional[str] = None, top_k: int = 3) -> Optional[Dict]:
+        """
+        安定したテンプレートなら、そのラベルと過去の観測の平均確率による推論結果（モデル実行が必要ならNone）
+
+        返す確率・マージンはこのメールの値ではなくテンプレートの代表値
+        """
+        with self._lock:
+            self.lookups += 1
+            template = self._templates.get(fingerprint)
+            if template is None or template.model_version != model_version:
+                return None
+            self._templates.move_to_end(fingerprint)
+
+            if template.observations < self.min_observations or len(template.labels) > 1:
+                return None
+            if template.since_verified + 1 >= self.verify_interval:
+                # 定期的な再評価のためモデルを実行させる
+                return None
+
+            template.since_verified += 1
+            template.hits += 1
+            self.hits += 1
+            return template.representative(top_k)
+
+    def observe(self, fingerprint: str, inference: Dict, model_version: Optional[str] = None) -> None:
+        """モデルの推論結果を記録（モデルのバージョンが変わった指紋は記録をやり直す）"""
+        with self._lock:
+            template = self._templates.get(fingerprint)
+            if template is None or template.model_version != model_version:
+                template = self._templates[fingerprint] = _Template(model_version)
+                while len(self._templates) > self.max_entries:
+                    self._templates.popitem(last=False)
+            self._templates.move_to_end(fingerprint)
+            template.add(inference)
+            template.since_verified = 0
+
+    def invalidate(self) -> None:
+        """全指紋の破棄（モデル再読み込み時）"""
+        with self._lock:
+            self._templates.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stable = sum(1 for t in self._templates.values()
+                         if t.observations >= self.min_observations and len(t.labels) == 1)
+            return {
+                'enabled': True,
+                'fingerprints': len(self._templates),
+                'stable_fingerprints': stable,
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+                'min_observations': self.min_observations,
+                'verify_interval': self.verify_interval
+            }
+
+    def report(self, limit: int = 50) -> List[Dict]:
+        """観測数の多い指紋毎のラベル分布と安定性"""
+        with self._lock:
+            templates = sorted(self._templates.items(), key=lambda item: -item[1].observations)[:limit]
+            return [{
+                'fingerprint': fingerprint,
+                'observations': template.observations,
+                'labels': dict(template.labels),
+                'stability': template.stability,
+                'hits': template.hits
+            } for fingerprint, template in templates]
+
+class DisabledTemplateIndex:
+    """テンプレート高速経路の無効時（TEMPLATE_INDEX_ENABLED=False）の代替"""
+
+    def fingerprint(self, text: str) -> Optional[str]:
+        return None
+
+    def lookup(self, fingerprint: Optional[str], model_version: Optional[str] = None,
+               top_k: int = 3) -> Optional[Dict]:
+        return None
+
+    def observe(self, fingerprint: Optional[str], inference: Dict, model_version: Optional[str] = None) -> None:
+        pass
+
+    def invalidate(self) -> None:
+        pass
+
+    def stats(self) -> Dict:
+        return {'enabled': False}
+
+    def report(self, limit: int = 50) -> List[Dict]:
+        return []
+
+def infer_with_templates(index, bundle, texts: List[str], top_k: int,
+                         infer: Callable = infer_texts) -> Tuple[List[Dict], List[Optional[str]], List[bool]]:
+    """
+    テンプレート高速経路付きの推論（高速経路で返すテキストは特徴量エンジニアリングも省略）
+
+    Args:
+        infer: 高速経路で返せないテキストの推論（単体分類ではマイクロバッチの infer）
+
+    Returns:
+        (推論結果, 指紋, 高速経路で返したか) のテキスト毎のリスト
+    """
+    with timed('template'):
+        fingerprints = [index.fingerprint(text) for text in texts]
+        inferences: List[Optional[Dict]] = [index.lookup(fingerprint, bundle.version, top_k)
+                                               for fingerprint in fingerprints]
+
+    misses = [i for i, inference in enumerate(inferences) if inference is None]
+    if misses:
+        for i, inference in zip(misses, infer(bundle, [texts[i] for i in misses], top_k)):
+            inferences[i] = inference
+            index.observe(fingerprints[i], inference, bundle.version)
+
+    missed = set(misses)
+    return inferences, fingerprints, [i not in missed for i in range(len(texts))]
+
+def current_template_index():
+    """現在のアプリケーションのテンプレート指紋インデックス（未登録・プロファイリング中のリクエストなら無効）"""
+    if is_profiling():
+        return DisabledTemplateIndex()
+    return current_app.extensions.get('template_index') or DisabledTemplateIndex()
+
+def init_template_index(app) -> None:
+    """アプリケーション設定からテンプレート指紋インデックスを作成して app.extensions に登録"""
+    if app.config.get('TEMPLATE_INDEX_ENABLED', True):
+        index = TemplateIndex(
+            TemplateFingerprinter(advanced_enricher.amount_patterns, advanced_enricher.date_patterns),
+            min_observations=app.config.get('TEMPLATE_MIN_OBSERVATIONS', 3),
+            max_entries=app.config.get('TEMPLATE_MAX_ENTRIES', 10000),
+            verify_interval=app.config.get('TEMPLATE_VERIFY_INTERVAL', 50)
+        )
+    else:
+        index = DisabledTemplateIndex()
+    app.extensions['template_index'] = index
@@ -16,9 +16,72 @@ class Config:
     API_TITLE = "Gmail分類PoC API"
     API_VERSION = "1.0.0"
     
+    # 本番サーバー設定（serve.py。WORKERS 未指定時はCPUコア数）
+    SERVER_HOST = os.environ.get('SERVER_HOST', '0.0.0.0')
+    SERVER_PORT = int(os.environ.get('SERVER_PORT', '5002'))
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', '0')) or os.cpu_count() or 1
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', '4'))
+    SERVER_BACKLOG = int(os.environ.get('SERVER_BACKLOG', '128'))
+    
+    # 起動時ウォームアップ（モデル・文脈補完を合成メールで実行してから GET /ready が 200 を返す）
+    STARTUP_WARMUP = os.environ.get('STARTUP_WARMUP', 'True').lower() == 'true'
+    
+    # メトリクス設定（リクエスト・処理段階毎のレイテンシ・件数を GET /metrics で公開）
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    
+    # デバッグ設定（PROFILING_ENABLED=True で X-Profile: 1 / ?profile=1 のリクエストを cProfile で実行、
+    # DEBUG_REQUESTS_ENABLED=True で直近 SLOW_REQUEST_WINDOW 秒の低速リクエスト上位 SLOW_REQUEST_BUFFER_SIZE 件を記録。
+    # GET /debug/requests は認証がなく messageId を含むため、どちらかを有効にした場合のみ公開（既定は404））
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+    DEBUG_REQUESTS_ENABLED = os.environ.get('DEBUG_REQUESTS_ENABLED', 'False').lower() == 'true'
+    PROFILE_TOP_N = int(os.environ.get('PROFILE_TOP_N', '25'))
+    SLOW_REQUEST_BUFFER_SIZE = int(os.environ.get('SLOW_REQUEST_BUFFER_SIZE', '50'))
+    SLOW_REQUEST_WINDOW = float(os.environ.get('SLOW_REQUEST_WINDOW', '3600'))
+    
     # モデル設定
     MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'model.pkl')
     
+    # モデルファイル監視設定（models/ の .pkl が置き換えられたら DEBOUNCE 秒待ってから自動で再読み込み）
+    MODEL_WATCH_ENABLED = os.environ.get('MODEL_WATCH_ENABLED', 'True').lower() == 'true'
+    MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', '2.0'))
+    MODEL_WATCH_DEBOUNCE = float(os.environ.get('MODEL_WATCH_DEBOUNCE', '1.0'))
+    
+    # バッチ分類設定
+    BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', '500'))
+    
+    # 入力の上限設定（本文が MAX_CHARS を超えたら先頭 HEAD_CHARS・中間の重要箇所・末尾 TAIL_CHARS のみを使用。
+    # 重要箇所は中間の先頭 SCAN_CHARS 文字から探す。件名など本文以外は SUBJECT_MAX_CHARS で切り詰め）
+    INPUT_BUDGET_ENABLED = os.environ.get('INPUT_BUDGET_ENABLED', 'True').lower() == 'true'
+    INPUT_MAX_CHARS = int(os.environ.get('INPUT_MAX_CHARS', '10000'))
+    INPUT_HEAD_CHARS = int(os.environ.get('INPUT_HEAD_CHARS', '6000'))
+    INPUT_TAIL_CHARS = int(os.environ.get('INPUT_TAIL_CHARS', '2000'))
+    INPUT_SCAN_CHARS = int(os.environ.get('INPUT_SCAN_CHARS', '200000'))
+    INPUT_SUBJECT_MAX_CHARS = int(os.environ.get('INPUT_SUBJECT_MAX_CHARS', '1000'))
+    
+    # ストリーム分類設定（NDJSON を CHUNK_SIZE 件毎に分類。1行の上限バイト数を超える行はエラー）
+    STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', '100'))
+    STREAM_MAX_LINE_BYTES = int(os.environ.get('STREAM_MAX_LINE_BYTES', str(1024 * 1024)))
+    
+    # 推論設定（レスポンスに含める上位候補数）
+    INFERENCE_TOP_K = int(os.environ.get('INFERENCE_TOP_K', '3'))
+    
+    # 結果キャッシュ設定（SQLITE_PATH を指定すると複数ワーカーで共有するディスク層を使用）
+    RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'True').lower() == 'true'
+    RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '1024'))
+    RESULT_CACHE_SQLITE_PATH = os.environ.get('RESULT_CACHE_SQLITE_PATH')
+    RESULT_CACHE_SQLITE_MAX_ROWS = int(os.environ.get('RESULT_CACHE_SQLITE_MAX_ROWS', '100000'))
+    
+    # テンプレート指紋設定（MIN_OBSERVATIONS 回以上同じラベルで予測された定型メールはモデル評価を省略）
+    TEMPLATE_INDEX_ENABLED = os.environ.get('TEMPLATE_INDEX_ENABLED', 'True').lower() == 'true'
+    TEMPLATE_MIN_OBSERVATIONS = int(os.environ.get('TEMPLATE_MIN_OBSERVATIONS', '3'))
+    TEMPLATE_MAX_ENTRIES = int(os.environ.get('TEMPLATE_MAX_ENTRIES', '10000'))
+    TEMPLATE_VERIFY_INTERVAL = int(os.environ.get('TEMPLATE_VERIFY_INTERVAL', '50'))
+    
+    # マイクロバッチ設定（同時に届いた単体分類を最大 MAX_SIZE 件まとめて推論。合流待ちは最大 MAX_WAIT_MS ミリ秒）
+    MICRO_BATCH_ENABLED = os.environ.get('MICRO_BATCH_ENABLED', 'True').lower() == 'true'
+    MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', '32'))
+    MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get('MICRO_BATCH_MAX_WAIT_MS', '5.0'))
+    
     # LINE API設定
     LINE_CHANNEL_ACCESS_TOKEN = os.environ.get('LINE_CHANNEL_ACCESS_TOKEN')
     LINE_CHANNEL_SECRET = os.environ.get('LINE_CHANNEL_SECRET')
@@ -4,25 +4,30 @@
 retraining_candidates_sheet.csvのG列（groundTruth）を活用した教師あり学習
 """
 
-import pandas as pd
-import pickle
-import joblib
+import argparse
 import os
-import re
+import sys
 from typing import List, Dict, Tuple
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.svm import LinearSVC
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
-from sklearn.pipeline import make_pipeline
-from sklearn.calibration import CalibratedClassifierCV
 import numpy as np
 from collections import Counter
+# pandas・scikit-learn・joblib は読み込み・学習・保存時のみ import する
+# （APIサーバーは特徴量関数だけを使うため、このモジュールの import で読み込まない）
+
+# プロジェクトルートをパスに追加（models/ から直接実行した場合用）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.feature_spec import describe_features, render_signals
+from models.text_analyzers import ANALYZERS
+from models.serving_export import export_serving_artifact
+from models.keyword_matcher import compile_keyword_tables
+from models.linear_patterns import compile_pattern
 
 def load_groundtruth_data():
     """
     正解ラベル付きデータの読み込みと分析
     """
+    import pandas as pd
+    
     print("=== 正解ラベル付きデータ分析開始 ===\n")
     
     csv_path = '/Users/hasegawayuya/Projects/dev-projects/gmail-classifier/n8n/retraining_candidates_sheet.csv - retraining_candidates_sheet.csv'
@@ -94,94 +99,121 @@ def analyze_prediction_errors(df_labeled):
     
     return misclassifications
 
-def create_supervised_features(text: str) -> str:
+# === 特徴量エンジニアリング用キーワード表（モジュール読み込み時に1回だけコンパイル） ===
+# 支払い関係の強化パターン
+PAYMENT_INDICATORS = {
+    'card_specific': ['デビットカード', 'クレジットカード', 'ご利用のお知らせ'],
+    'payment_services': ['paypay', 'ペイペイ', 'ペイディ', 'paidy'],  
+    'bank_related': ['銀行', '振込', '引き落とし', '口座振替'],
+    'transaction_words': ['決済', '支払い', '料金', '請求', '利用金額']
+}
+
+# 仕事・学習の判定強化
+WORK_STUDY_INDICATORS = {
+    'job_related': ['求人', '募集', '転職', 'エンジニア', '採用'],
+    'tech_keywords': ['github', 'python', 'javascript', 'プログラミング'],
+    'learning_words': ['学習', '研修', '勉強会', '講座', 'コース'],
+    'work_context': ['案件', 'プロジェクト', '業務', '仕事', '職種']
+}
+
+# 重要メールの判定強化
+IMPORTANT_INDICATORS = {
+    'urgency': ['重要', '緊急', '至急', 'important', 'urgent'],
+    'system_issues': ['システム', '障害', 'エラー', 'メンテナンス'],
+    'security': ['セキュリティ', 'パスワード', 'ログイン', 'アラート'],
+    'notifications': ['お知らせ', '通知', 'ご案内', '連絡']
+}
+
+# プロモーションの判定強化
+PROMO_INDICATORS = {
+    'sales_events': ['セール', 'タイムセール', '特価', '割引'],
+    'campaigns': ['キャンペーン', 'ポイント', 'マラソン'],
+    'retailers': ['amazon', '楽天', 'アマゾン'],
+    'offers': ['お得', '限定', '特別', 'off', '％']
+}
+
+# Forwarded emailの検出
+FORWARD_MARKERS = ['fwd:', 'フォワード']
+
+AMOUNT_PATTERNS = [
+    r'\d{1,3}(?:,\d{3})*円',
+    r'¥\d+',
+    r'\d+円'
+]
+
+_SUPERVISED_MATCHER = compile_keyword_tables(
+    PAYMENT_INDICATORS, WORK_STUDY_INDICATORS, IMPORTANT_INDICATORS, PROMO_INDICATORS, FORWARD_MARKERS
+)
+
+def supervised_signals(text: str) -> Dict[str, int]:
     """
     正解データに基づく改良された特徴量エンジニアリング
     """
-    features = []
+    signals = Counter()
     text_lower = text.lower()
-    
-    # 基本テキスト
-    features.append(text)
+    hits = _SUPERVISED_MATCHER.scan(text_lower)
     
     # === 支払い関係の強化パターン ===
-    payment_indicators = {
-        'card_specific': ['デビットカード', 'クレジットカード', 'ご利用のお知らせ'],
-        'payment_services': ['paypay', 'ペイペイ', 'ペイディ', 'paidy'],  
-        'bank_related': ['銀行', '振込', '引き落とし', '口座振替'],
-        'transaction_words': ['決済', '支払い', '料金', '請求', '利用金額']
-    }
-    
-    for category, keywords in payment_indicators.items():
-        count = sum(1 for keyword in keywords if keyword in text_lower)
+    for category, keywords in PAYMENT_INDICATORS.items():
+        count = hits.count_present(keywords)
         if count > 0:
-            features.append(f"PAYMENT_{category.upper()}_{count}")
+            signals[f"PAYMENT_{category.upper()}_{count}"] += 1
     
     # === 仕事・学習の判定強化 ===
-    work_study_indicators = {
-        'job_related': ['求人', '募集', '転職', 'エンジニア', '採用'],
-        'tech_keywords': ['github', 'python', 'javascript', 'プログラミング'],
-        'learning_words': ['学習', '研修', '勉強会', '講座', 'コース'],
-        'work_context': ['案件', 'プロジェクト', '業務', '仕事', '職種']
-    }
-    
-    for category, keywords in work_study_indicators.items():
-        count = sum(1 for keyword in keywords if keyword in text_lower)
+    for category, keywords in WORK_STUDY_INDICATORS.items():
+        count = hits.count_present(keywords)
         if count > 0:
-            features.append(f"WORK_{category.upper()}_{count}")
+            signals[f"WORK_{category.upper()}_{count}"] += 1
     
     # === 重要メールの判定強化 ===
-    important_indicators = {
-        'urgency': ['重要', '緊急', '至急', 'important', 'urgent'],
-        'system_issues': ['システム', '障害', 'エラー', 'メンテナンス'],
-        'security': ['セキュリティ', 'パスワード', 'ログイン', 'アラート'],
-        'notifications': ['お知らせ', '通知', 'ご案内', '連絡']
-    }
-    
-    for category, keywords in important_indicators.items():
-        count = sum(1 for keyword in keywords if keyword in text_lower)
+    for category, keywords in IMPORTANT_INDICATORS.items():
+        count = hits.count_present(keywords)
         if count > 0:
-            features.append(f"IMPORTANT_{category.upper()}_{count}")
+            signals[f"IMPORTANT_{category.upper()}_{count}"] += 1
     
     # === プロモーションの判定強化 ===
-    promo_indicators = {
-        'sales_events': ['セール', 'タイムセール', '特価', '割引'],
-        'campaigns': ['キャンペーン', 'ポイント', 'マラソン'],
-        'retailers': ['amazon', '楽天', 'アマゾン'],
-        'offers': ['お得', '限定', '特別', 'off', '％']
-    }
-    
-    for category, keywords in promo_indicators.items():
-        count = sum(1 for keyword in keywords if keyword in text_lower)
+    for category, keywords in PROMO_INDICATORS.items():
+        count = hits.count_present(keywords)
         if count > 0:
-            features.append(f"PROMO_{category.upper()}_{count}")
+            signals[f"PROMO_{category.upper()}_{count}"] += 1
     
     # === 文脈的特徴量 ===
     # Forwarded emailの検出
-    if 'fwd:' in text_lower or 'フォワード' in text_lower:
-        features.append("FORWARDED_EMAIL")
+    if hits.any(FORWARD_MARKERS):
+        signals["FORWARDED_EMAIL"] += 1
     
     # 金額パターンの検出
-    amount_patterns = [
-        r'\d{1,3}(?:,\d{3})*円',
-        r'¥\d+',
-        r'\d+円'
-    ]
-    
     total_amounts = 0
-    for pattern in amount_patterns:
-        matches = re.findall(pattern, text)
+    for pattern in AMOUNT_PATTERNS:
+        matches = compile_pattern(pattern).findall(text)
         total_amounts += len(matches)
     
     if total_amounts > 0:
-        features.append(f"AMOUNT_DETECTED_{min(total_amounts, 3)}")
+        signals[f"AMOUNT_DETECTED_{min(total_amounts, 3)}"] += 1
     
-    return ' '.join(features)
+    return dict(signals)
 
-def train_supervised_model(df_labeled):
+def create_supervised_features(text: str) -> str:
+    """テキストに supervised_signals のマーカーを付加（'text' 方式の入力）"""
+    return render_signals(text, supervised_signals(text))
+
+def train_supervised_model(df_labeled, feature_mode: str = 'text', analyzer: str = 'word'):
     """
     正解ラベル付きデータで教師あり学習を実行
+
+    Args:
+        feature_mode: 'text'（特徴量文字列をTF-IDF）/ 'sparse'（生テキストTF-IDF + 特徴量の疎な数値列）
+        analyzer: TF-IDFのアナライザー（'word' / 'char' / 'script'、models.text_analyzers 参照）
     """
+    import joblib
+    import pandas as pd
+    from sklearn.svm import LinearSVC
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
+    from sklearn.pipeline import make_pipeline
+    from sklearn.calibration import CalibratedClassifierCV
+    from models.sparse_features import build_vectorizer, prepare_texts
+    
     print("\n=== 教師あり学習モデル訓練開始 ===")
     
     # データ前処理
@@ -208,8 +240,8 @@ def train_supervised_model(df_labeled):
     print()
     
     # 改良された特徴量エンジニアリング適用
-    print("Applying supervised feature engineering...")
-    df_train['enhanced_text'] = df_train['text'].apply(create_supervised_features)
+    print(f"Applying supervised feature engineering (feature mode: {feature_mode})...")
+    df_train['enhanced_text'] = prepare_texts(feature_mode, create_supervised_features, df_train['text'])
     
     # データ分割
     X = df_train['enhanced_text']
@@ -226,7 +258,8 @@ def train_supervised_model(df_labeled):
         )
     
     # TF-IDF Vectorizer設定
-    vectorizer = TfidfVectorizer(
+    vectorizer = build_vectorizer(
+        feature_mode, 'models.analyze_groundtruth_data:create_supervised_features', analyzer=analyzer,
         max_features=5000,
         ngram_range=(1, 3),  # 3-gramまで拡張
         min_df=1,
@@ -288,16 +321,23 @@ def train_supervised_model(df_labeled):
         'classes': model.classes_,
         'accuracy': accuracy,
         'training_size': len(df_train),
-        'ground_truth_based': True
+        'ground_truth_based': True,
+        'analyzer': analyzer,
+        # 特徴量仕様（学習データは件名のみ）
+        **describe_features('models.analyze_groundtruth_data:create_supervised_features', input_fields=['subject'],
+                            feature_mode=feature_mode)
     }
     
     joblib.dump(save_data, model_path)
     print(f"\nSupervised model saved: {model_path}")
+    export_serving_artifact(model_path)
     
     return calibrated_pipeline, save_data
 
 def test_supervised_model(pipeline, save_data):
     """教師あり学習モデルのテスト"""
+    from models.sparse_features import prepare_texts
+    
     print("\n=== 教師あり学習モデルテスト ===")
     
     test_cases = [
@@ -310,7 +350,7 @@ def test_supervised_model(pipeline, save_data):
     ]
     
     for i, subject in enumerate(test_cases, 1):
-        test_text = create_supervised_features(subject)
+        test_text = prepare_texts(save_data['feature_mode'], create_supervised_features, [subject])[0]
         prediction = pipeline.predict([test_text])[0]
         
         try:
@@ -337,6 +377,15 @@ def test_supervised_model(pipeline, save_data):
         print()
 
 if __name__ == "__main__":
+    from models.sparse_features import FEATURE_MODES
+    
+    parser = argparse.ArgumentParser(description='正解データ分析・教師あり学習')
+    parser.add_argument('--feature-mode', choices=FEATURE_MODES, default='text',
+                        help='特徴量の入力方式（sparse: 生テキストTF-IDF + 特徴量の疎な数値列）')
+    parser.add_argument('--analyzer', choices=ANALYZERS, default='word',
+                        help='TF-IDFのアナライザー（char: 文字2-3gram, script: 文字種境界分割）')
+    args = parser.parse_args()
+    
     # データ読み込み
     df_labeled = load_groundtruth_data()
     
@@ -345,7 +394,7 @@ if __name__ == "__main__":
         misclassifications = analyze_prediction_errors(df_labeled)
         
         # 教師あり学習実行
-        pipeline, save_data = train_supervised_model(df_labeled)
+        pipeline, save_data = train_supervised_model(df_labeled, feature_mode=args.feature_mode, analyzer=args.analyzer)
         
         if pipeline is not None:
             # モデルテスト
@@ -0,0 +1,255 @@
+"""
+CalibratedClassifierCV 高速化モジュール
+学習スクリプトが保存する「TF-IDF + 線形モデル」のキャリブレーション済みアンサンブルを
+読み込み時に1つのスコアラーへ畳み込み、1回の変換と1回の疎行列積で確率を計算する
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.pipeline import Pipeline
+
+from models.linear_scorer import LinearScorer
+
+# 元のアンサンブルとの確率差の許容値（float64の丸め誤差のみを想定）
+PROBABILITY_TOLERANCE = 1e-9
+
+# 検証用のサンプルメール（語彙由来のプローブと併用）
+_SAMPLE_TEXTS = [
+    "PayPay決済完了のお知らせ PayPayでのお支払いが完了しました。利用金額：1,250円",
+    "【デビットカード】ご利用のお知らせ 引落金額：3,360.00",
+    "Amazon タイムセール 期間限定 お得な商品をチェック",
+    "緊急 システム障害 サーバーエラーが発生しました",
+    "Indeed 新着求人 エンジニア職 Python",
+    "",
+]
+
+class CalibratedLinearScorer(LinearScorer):
+    """
+    キャリブレーション済み線形アンサンブルの単一パススコアラー
+
+    各foldのTF-IDF語彙を統合した共有カウントベクトル化を1回だけ行い、
+    fold毎のIDF・重みを事前に掛け合わせた1枚の重み行列との疎行列積で
+    全foldの決定関数値を同時に求める。fold毎にL2正規化・シグモイド校正・
+    クラス間正規化を適用し、最後にfold平均を取る（CalibratedClassifierCVと同一の計算）。
+    """
+
+    def __init__(self, count_vectorizer: CountVectorizer, classes: np.ndarray,
+                 weights: np.ndarray, norm_weights: np.ndarray, intercepts: np.ndarray,
+                 sigmoid_a: Optional[np.ndarray], sigmoid_b: Optional[np.ndarray],
+                 output_classes: np.ndarray, fold_slices: List[Tuple[int, int]],
+                 sublinear_tf: bool, norm: Optional[str]):
+        self.count_vectorizer = count_vectorizer
+        self.classes_ = classes
+        self.weights = weights                  # (語彙数, 全foldの出力数) IDF×係数
+        self.norm_weights = norm_weights        # (語彙数, fold数) 正規化用のIDF
+        self.intercepts = intercepts            # (全foldの出力数,)
+        self.sigmoid_a = sigmoid_a              # (全foldの出力数,) 未校正ならNone
+        self.sigmoid_b = sigmoid_b
+        self.output_classes = output_classes    # 各出力列が表すクラスのインデックス
+        self.fold_slices = fold_slices
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+
+    def _fold_scores(self, texts: List[str]) -> np.ndarray:
+        """全foldの決定関数値 (サンプル数, 全foldの出力数) を1回の変換で計算"""
+        X = self.count_vectorizer.transform(texts).astype(np.float64)
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1
+
+        raw_scores = np.asarray(X @ self.weights)
+
+        if self.norm == 'l2':
+            X.data **= 2
+            norms = np.sqrt(np.asarray(X @ self.norm_weights))
+        elif self.norm == 'l1':
+            norms = np.asarray(X @ self.norm_weights)
+        else:
+            norms = np.ones((X.shape[0], self.n_folds))
+        norms[norms == 0] = 1.0
+
+        for fold, (start, end) in enumerate(self.fold_slices):
+            raw_scores[:, start:end] /= norms[:, fold:fold + 1]
+
+        return raw_scores + self.intercepts
+
+def _split_linear_pipeline(estimator) -> Optional[Tuple[TfidfVectorizer, object]]:
+    """Pipeline(TfidfVectorizer, 線形モデル) を分解（対応外の構成はNone）"""
+    if not isinstance(estimator, Pipeline) or len(estimator.steps) != 2:
+        return None
+    vectorizer, model = estimator.steps[0][1], estimator.steps[1][1]
+    if not isinstance(vectorizer, TfidfVectorizer):
+        return None
+    if not hasattr(model, 'coef_') or not hasattr(model, 'intercept_'):
+        return None
+    return vectorizer, model
+
+def _extract_folds(pipeline) -> Optional[List[Dict]]:
+    """
+    モデルからfold毎の (vectorizer, 線形モデル, calibrators) を抽出
+
+    対応する構成:
+      - CalibratedClassifierCV(Pipeline(TfidfVectorizer, 線形モデル))  … train_*_model
+      - Pipeline(TfidfVectorizer, CalibratedClassifierCV(線形モデル))  … model_sync_solution
+      - Pipeline(TfidfVectorizer, 線形モデル)                          … 未校正
+    """
+    if isinstance(pipeline, CalibratedClassifierCV):
+        folds = []
+        for calibrated in pipeline.calibrated_classifiers_:
+            split = _split_linear_pipeline(calibrated.estimator)
+            if split is None or calibrated.method != 'sigmoid':
+                return None
+            folds.append({'vectorizer': split[0], 'model': split[1], 'calibrators': calibrated.calibrators})
+        return folds
+
+    if isinstance(pipeline, Pipeline) and len(pipeline.steps) == 2:
+        vectorizer, final = pipeline.steps[0][1], pipeline.steps[1][1]
+        if not isinstance(vectorizer, TfidfVectorizer):
+            return None
+        if isinstance(final, CalibratedClassifierCV):
+            folds = []
+            for calibrated in final.calibrated_classifiers_:
+                model = calibrated.estimator
+                if not hasattr(model, 'coef_') or calibrated.method != 'sigmoid':
+                    return None
+                folds.append({'vectorizer': vectorizer, 'model': model, 'calibrators': calibrated.calibrators})
+            return folds
+        if _split_linear_pipeline(pipeline) is not None:
+            return [{'vectorizer': vectorizer, 'model': final, 'calibrators': None}]
+
+    return None
+
+def _shared_count_vectorizer(vectorizers: List[TfidfVectorizer], vocabulary: Dict[str, int]) -> CountVectorizer:
+    """全foldで共通のトークン化設定を持つ、統合語彙のCountVectorizerを作成"""
+    count_params = CountVectorizer().get_params().keys()
+    params = {k: v for k, v in vectorizers[0].get_params().items() if k in count_params}
+    params.update(vocabulary=vocabulary, max_features=None, min_df=1, max_df=1.0)
+    return CountVectorizer(**params)
+
+def collapse_calibrated_pipeline(pipeline) -> Optional[CalibratedLinearScorer]:
+    """
+    CalibratedClassifierCVアンサンブルを単一スコアラーに畳み込む
+
+    fold毎のTfidfVectorizerは学習foldが異なるため語彙・IDFが異なり、重みの単純平均では
+    元の確率を再現できない。そこで語彙を統合した1つのカウント変換を共有し、
+    fold毎の (IDF × 係数) を列方向に積んだ1枚の重み行列に変換する。
+
+    Returns:
+        CalibratedLinearScorer（対応外の構成・isotonic校正などはNone）
+    """
+    folds = _extract_folds(pipeline)
+    if not folds:
+        return None
+
+    vectorizers = [fold['vectorizer'] for fold in folds]
+
+    # 語彙以外のトークン化・重み付け設定が全foldで一致している必要がある
+    vocabulary_params = ('vocabulary', 'max_features', 'min_df', 'max_df')
+    settings = [{k: v for k, v in vec.get_params().items() if k not in vocabulary_params} for vec in vectorizers]
+    if any(s != settings[0] for s in settings[1:]) or settings[0]['norm'] not in ('l2', 'l1', None):
+        return None
+
+    classes = np.asarray(pipeline.classes_)
+    n_classes = len(classes)
+
+    # 統合語彙（出現順ではなくソート順で安定化）
+    terms = sorted(set().union(*(v.vocabulary_.keys() for v in vectorizers)))
+    vocabulary = {term: i for i, term in enumerate(terms)}
+    n_terms = len(terms)
+
+    weight_columns, norm_columns, intercepts = [], [], []
+    sigmoid_a, sigmoid_b, output_classes, fold_slices = [], [], [], []
+    calibrated = folds[0]['calibrators'] is not None
+
+    for fold in folds:
+        vectorizer, model = fold['vectorizer'], fold['model']
+
+        # 統合語彙 → fold語彙の列対応
+        fold_terms = vectorizer.get_feature_names_out()
+        union_index = np.array([vocabulary[t] for t in fold_terms], dtype=np.int64)
+        fold_index = np.array([vectorizer.vocabulary_[t] for t in fold_terms], dtype=np.int64)
+
+        idf = np.zeros(n_terms)
+        idf[union_index] = vectorizer.idf_[fold_index] if vectorizer.use_idf else 1.0
+        norm_columns.append(idf ** 2 if vectorizer.norm == 'l2' else idf)
+
+        coef = np.asarray(model.coef_, dtype=np.float64)
+        fold_weights = np.zeros((n_terms, coef.shape[0]))
+        fold_weights[union_index, :] = coef[:, fold_index].T
+        fold_weights *= idf[:, np.newaxis]
+
+        # fold内のクラス → 全体クラスのインデックス
+        model_classes = np.searchsorted(classes, model.classes_)
+        fold_outputs = model_classes[1:] if n_classes == 2 else model_classes
+
+        start = sum(len(c) for c in output_classes)
+        fold_slices.append((start, start + coef.shape[0]))
+        weight_columns.append(fold_weights)
+        intercepts.append(np.atleast_1d(np.asarray(model.intercept_, dtype=np.float64)))
+        output_classes.append(fold_outputs)
+
+        if calibrated:
+            sigmoid_a.append([c.a_ for c in fold['calibrators']])
+            sigmoid_b.append([c.b_ for c in fold['calibrators']])
+
+    return CalibratedLinearScorer(
+        count_vectorizer=_shared_count_vectorizer(vectorizers, vocabulary),
+        classes=classes,
+        weights=np.hstack(weight_columns),
+        norm_weights=np.column_stack(norm_columns),
+        intercepts=np.concatenate(intercepts),
+        sigmoid_a=np.concatenate(sigmoid_a).astype(np.float64) if calibrated else None,
+        sigmoid_b=np.concatenate(sigmoid_b).astype(np.float64) if calibrated else None,
+        output_classes=np.concatenate(output_classes),
+        fold_slices=fold_slices,
+        sublinear_tf=vectorizers[0].sublinear_tf,
+        norm=vectorizers[0].norm
+    )
+
+def probe_texts(scorer: CalibratedLinearScorer, n_probes: int = 20) -> List[str]:
+    """検証用テキスト（サンプルメール + 語彙を網羅するプローブ）"""
+    terms = sorted(scorer.count_vectorizer.vocabulary, key=scorer.count_vectorizer.vocabulary.get)
+    chunk = max(1, len(terms) // n_probes)
+    probes = [' '.join(terms[i:i + chunk]) for i in range(0, len(terms), chunk)]
+    return _SAMPLE_TEXTS + probes
+
+def max_probability_error(pipeline, scorer: CalibratedLinearScorer, texts: List[str]) -> float:
+    """元のモデルとスコアラーの確率（未校正なら決定関数値）の最大誤差"""
+    if scorer.is_calibrated:
+        expected = pipeline.predict_proba(texts)
+        actual = scorer.predict_proba(texts)
+    else:
+        expected = pipeline.decision_function(texts)
+        actual = scorer.decision_function(texts)
+    return float(np.max(np.abs(np.asarray(expected) - actual))) if len(texts) else 0.0
+
+def collapse_and_verify(pipeline, tolerance: float = PROBABILITY_TOLERANCE) -> Tuple[object, Dict]:
+    """
+    読み込み時の高速化ステップ: 畳み込みを試み、許容誤差内の場合のみスコアラーを返す
+
+    Returns:
+        (推論に使うモデル, 畳み込み結果の情報)
+    """
+    try:
+        scorer = collapse_calibrated_pipeline(pipeline)
+    except Exception as e:
+        return pipeline, {'collapsed': False, 'reason': f"collapse failed: {e}"}
+
+    if scorer is None:
+        return pipeline, {'collapsed': False, 'reason': 'unsupported model structure'}
+
+    error = max_probability_error(pipeline, scorer, probe_texts(scorer))
+    info = {
+        'collapsed': error <= tolerance,
+        'folds': scorer.n_folds,
+        'vocabulary_size': len(scorer.count_vectorizer.vocabulary),
+        'max_probability_error': error,
+        'tolerance': tolerance
+    }
+    if error > tolerance:
+        info['reason'] = 'probability mismatch exceeds tolerance'
+        return pipeline, info
+
+    return scorer, info
@@ -0,0 +1,84 @@
+"""
+特徴量エンジニアリング関数の識別情報
+学習スクリプトが保存するモデルファイルに「どの特徴量関数・バージョン・入力フィールドで学習したか」を記録し、
+API側は読み込み時に1回だけ関数を解決する
+"""
+
+import importlib
+from typing import Callable, Dict, List, Optional
+
+# 特徴量関数の識別子（"モジュール:関数名"）とバージョン
+# 関数の出力が変わる変更を入れた場合はバージョンを上げること
+FEATURE_VERSIONS = {
+    'models.analyze_groundtruth_data:create_supervised_features': 1,
+    'models.train_realworld_model:create_improved_features': 1,
+    'models.train_balanced_model:create_balanced_features': 1,
+    'models.model_sync_solution:create_paypay_specialized_features': 2,  # v2: 同じマーカーを1箇所にまとめて付加
+    'models.train_model:create_enhanced_features': 2,  # v2: 同じマーカーを1箇所にまとめて付加
+    'raw': 1,
+}
+
+# 特徴量関数の識別子 → マーカーを {マーカー名: 出現数} で返す関数の識別子
+# 'text' 方式の文字列（render_signals）・'sparse' 方式の疎な数値列（models.sparse_features）の両方をこの関数から作る
+FEATURE_SIGNALS = {
+    'models.analyze_groundtruth_data:create_supervised_features': 'models.analyze_groundtruth_data:supervised_signals',
+    'models.train_realworld_model:create_improved_features': 'models.train_realworld_model:improved_signals',
+    'models.train_balanced_model:create_balanced_features': 'models.train_balanced_model:balanced_signals',
+    'models.model_sync_solution:create_paypay_specialized_features':
+        'models.model_sync_solution:paypay_specialized_signals',
+    'models.train_model:create_enhanced_features': 'models.train_model:enhanced_signals',
+    'raw': 'raw',
+}
+
+# 既定の入力フィールド（件名 + 本文）
+DEFAULT_INPUT_FIELDS = ['subject', 'body']
+
+def describe_features(feature_function: str, input_fields: Optional[List[str]] = None,
+                      feature_mode: str = 'text') -> Dict:
+    """
+    モデルファイルに保存する特徴量仕様を作成
+
+    Args:
+        feature_function: 特徴量関数の識別子（FEATURE_VERSIONS のキー）
+        input_fields: 特徴量関数に渡すテキストを構成するフィールド（空白区切りで結合）
+        feature_mode: 'text'（特徴量関数の出力文字列を入力）/ 'sparse'（生テキストを入力し、
+            パイプライン内で特徴量を疎な数値列化。models.sparse_features 参照）
+    """
+    if feature_function not in FEATURE_VERSIONS:
+        raise ValueError(f"Unknown feature function: {feature_function}")
+
+    return {
+        'feature_function': feature_function,
+        'feature_version': FEATURE_VERSIONS[feature_function],
+        'input_fields': list(input_fields or DEFAULT_INPUT_FIELDS),
+        'feature_mode': feature_mode
+    }
+
+def render_signals(text: str, signals: Dict[str, int]) -> str:
+    """テキストの後にマーカーを出現数だけ空白区切りで付加（'text' 方式の特徴量関数の出力）"""
+    return ' '.join([text] + [name for name, count in signals.items() for _ in range(count)])
+
+def _identity(text: str) -> str:
+    return text
+
+def _no_signals(text: str) -> Dict[str, int]:
+    return {}
+
+def _import(name: str) -> Callable:
+    module_name, _, function_name = name.partition(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, function_name)
+
+def resolve_feature_function(feature_function: str) -> Callable[[str], str]:
+    """特徴量関数の識別子から関数を解決（モデル読み込み時に1回だけ呼ぶ）"""
+    if feature_function == 'raw':
+        return _identity
+    return _import(feature_function)
+
+def resolve_signal_function(feature_function: str) -> Callable[[str], Dict[str, int]]:
+    """特徴量関数の識別子から、マーカーを辞書で返す関数を解決（FEATURE_SIGNALS 参照）"""
+    if feature_function not in FEATURE_SIGNALS:
+        raise ValueError(f"Unknown feature function: {feature_function}")
+    if feature_function == 'raw':
+        return _no_signals
+    return _import(FEATURE_SIGNALS[feature_function])
@@ -0,0 +1,153 @@
+"""
+複数キーワード一括マッチャー
+特徴量関数のキーワード表を1つのトライ（接頭辞木）にまとめてコンパイルし、
+テキストを1回走査するだけで全キーワードの出現位置を求める
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_TERMINAL = ''  # トライのノードでキーワード終端を表すキー（文字キーと衝突しない空文字）
+
+def _trie_pattern(node: Dict) -> str:
+    """トライを「いずれかのキーワードがここから始まる」ことを判定する正規表現に変換"""
+    branches = [re.escape(char) + _trie_pattern(child)
+                for char, child in sorted(node.items()) if char != _TERMINAL]
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    # 終端ノードはここで一致が成立するため、後続は任意
+    return f'(?:{pattern})?' if _TERMINAL in node else pattern
+
+class KeywordHits:
+    """1回の走査で得られたキーワード出現位置"""
+
+    __slots__ = ('_starts',)
+
+    def __init__(self, starts: Dict[str, List[int]]):
+        self._starts = starts
+
+    def __contains__(self, keyword: str) -> bool:
+        """`keyword in text` と同じ判定"""
+        return keyword in self._starts
+
+    def count(self, keyword: str) -> int:
+        """`text.count(keyword)` と同じ重複なしの出現回数"""
+        starts = self._starts.get(keyword)
+        if not starts:
+            return 0
+        total, next_free = 0, 0
+        for start in starts:
+            if start >= next_free:
+                total += 1
+                next_free = start + len(keyword)
+        return total
+
+    def count_present(self, keywords: Iterable[str]) -> int:
+        """`sum(1 for k in keywords if k in text)` と同じ、出現したキーワードの数"""
+        return sum(1 for keyword in keywords if keyword in self._starts)
+
+    def any(self, keywords: Iterable[str]) -> bool:
+        """`any(k in text for k in keywords)` と同じ判定"""
+        return any(keyword in self._starts for keyword in keywords)
+
+    def found(self, keywords: Iterable[str]) -> List[str]:
+        """`[k for k in keywords if k in text]` と同じ、出現したキーワードの一覧"""
+        return [keyword for keyword in keywords if keyword in self._starts]
+
+class KeywordMatcher:
+    """
+    キーワード表を1つのトライにコンパイルしたマッチャー
+
+    走査はトライから生成した正規表現（C実装）の非重複検索1回で行い、各ヒットでは
+    「同じ位置から始まる短いキーワード」と「ヒット内部から始まるキーワード」を
+    コンパイル時に求めた表から補完する。ヒット内部から始まり末尾をまたぐ可能性がある
+    位置だけPython側でトライを辿るため、走査コストはキーワード数ではなく
+    テキスト長とヒット数に比例する。
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = sorted({keyword for keyword in keywords if keyword})
+        self._trie: Dict = {}
+        for keyword in self.keywords:
+            node = self._trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[_TERMINAL] = keyword
+
+        self._max_length = max((len(keyword) for keyword in self.keywords), default=0)
+
+        pattern = _trie_pattern(self._trie)
+        self._finder = re.compile(pattern) if pattern else None
+
+        # ヒットしたキーワード毎に、同時に出現が確定するキーワード (オフセット, キーワード) と
+        # 末尾をまたぐ可能性があり実行時にトライを辿る必要があるオフセット (オフセット, None) を事前計算
+        self._expansions = {keyword: self._expand(keyword) for keyword in self.keywords}
+
+    def _walk(self, text: str, position: int) -> List[str]:
+        """position から始まるキーワードを全て列挙"""
+        found = []
+        node = self._trie
+        for char in text[position:position + self._max_length]:
+            node = node.get(char)
+            if node is None:
+                break
+            keyword = node.get(_TERMINAL)
+            if keyword is not None:
+                found.append(keyword)
+        return found
+
+    def _expand(self, keyword: str) -> List[Tuple[int, Optional[str]]]:
+        """keyword の出現位置から相対的に確定する出現をオフセット順に列挙"""
+        expansions = []
+        for offset in range(len(keyword)):
+            node = self._trie
+            found = []
+            for char in keyword[offset:]:
+                node = node.get(char)
+                if node is None:
+                    break
+                if _TERMINAL in node:
+                    found.append(node[_TERMINAL])
+            else:
+                if offset > 0:
+                    # keyword の末尾までトライを辿れた: 後続テキスト次第で更に長いキーワードがあり得る
+                    expansions.append((offset, None))
+                    continue
+            expansions.extend((offset, k) for k in found)
+        return expansions
+
+    def scan(self, text: str) -> KeywordHits:
+        """テキストを1回走査して全キーワードの出現位置を返す（重複する出現も全て含む）"""
+        starts: Dict[str, List[int]] = {}
+        if self._finder is None:
+            return KeywordHits(starts)
+
+        expansions = self._expansions
+        for match in self._finder.finditer(text):
+            position = match.start()
+            for offset, keyword in expansions[match.group()]:
+                if keyword is not None:
+                    positions = starts.get(keyword)
+                    if positions is None:
+                        starts[keyword] = [position + offset]
+                    else:
+                        positions.append(position + offset)
+                else:
+                    for found in self._walk(text, position + offset):
+                        starts.setdefault(found, []).append(position + offset)
+
+        return KeywordHits(starts)
+
+def compile_keyword_tables(*tables) -> KeywordMatcher:
+    """
+    特徴量関数のキーワード表（リスト、またはリストを値に持つ辞書）をまとめてコンパイル
+    """
+    keywords = []
+    for table in tables:
+        if isinstance(table, dict):
+            for values in table.values():
+                keywords.extend(values)
+        else:
+            keywords.extend(table)
+    return KeywordMatcher(keywords)
@@ -0,0 +1,273 @@
+r"""
+線形時間の正規表現の代替
+`(\d{1,3}(?:,\d{3})*|\d+)円` のように「数字・カンマの列の直後の文字」で一致が決まる正規表現は、
+一致しない長い列に対して開始位置毎に列の末尾まで照合し直すため、列の長さの2乗の時間がかかる
+（1万桁の数字列で数百ミリ秒、数万桁で数秒）。ここでは既知のそのようなパターンを、列を1回だけ走査して
+re の findall と同じ結果を返す抽出器に置き換える。
+
+compile_pattern は既知のパターンなら線形時間の抽出器を、それ以外は re.compile の結果を返す
+（どちらも pattern 属性と findall を持つ）。NamedAlternation は名前付きグループの選択
+`(?P<A>...)|(?P<B>...)` の sub を、既知のパターンを線形時間の抽出器に置き換えて同じ結果で行う。
+
+抽出器の findall は列を探す正規表現1回の走査と終端文字毎の処理だけなので、通常のメールでも元の正規表現と
+同程度の時間で済む。NamedAlternation は一致毎に Python で候補を突き合わせるため、照合し直しの対象になる
+文字の列が LONG_RUN 文字未満のテキスト（開始位置毎の照合も LONG_RUN 文字で止まる通常のメール）では
+元の正規表現をそのまま使い、長い列を含むテキストだけ線形時間の走査に切り替える
+"""
+
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Pattern, Sequence, Tuple, Union
+
+# 一致の開始位置の区間 [first, stop) と、その区間のどこから始めても同じ一致の終了位置
+Span = Tuple[int, int, int]
+
+# NamedAlternation がこの文字数以上の列を含むテキストを線形時間の走査で照合する
+LONG_RUN = 64
+
+def _runs_before(text: str, terminator: Pattern, run: Pattern) -> Iterator[Tuple[int, int]]:
+    """
+    直前に列の文字がある終端文字毎に、その列の区間 (start, end)（end が終端文字の位置）
+
+    Args:
+        terminator: 列の文字1字と終端文字に一致する正規表現
+        run: 列の文字の0回以上の繰り返しに一致する正規表現
+    """
+    lower = 0
+    for match in terminator.finditer(text):
+        end = match.start() + 1
+        # 前の一致の後ろからの区間を反転して列の長さを求める（区間は重ならないため全体でテキスト長に線形）
+        yield end - run.match(text[lower:end][::-1]).end(), end
+        lower = match.end()
+
+class LinearPattern(ABC):
+    """
+    線形時間の抽出器の基底（pattern の正規表現と同じ結果を返す）
+
+    サブクラスは spans で「一致し得る開始位置」を互いに重ならない区間として first の昇順に返す。
+    findall / NamedAlternation はその区間を走査位置と突き合わせるだけなので、テキスト長に線形の時間で済む
+
+    Args:
+        pattern: 同じ結果を返す正規表現
+        run_class: 開始位置毎に照合し直す列の文字クラス
+    """
+
+    def __init__(self, pattern: str, run_class: str):
+        self.pattern = pattern
+        self.run_class = run_class
+
+    @abstractmethod
+    def spans(self, text: str) -> List[Span]:
+        """一致し得る開始位置の区間 (first, stop, end) のリスト（互いに重ならず first の昇順）"""
+
+    def group(self, text: str, start: int, end: int) -> str:
+        """findall が返す文字列（キャプチャグループがあればその部分）"""
+        return text[start:end]
+
+    def findall(self, text: str) -> List[str]:
+        """`re.findall(self.pattern, text)` と同じ結果"""
+        matches = []
+        position = 0
+        for first, stop, end in self.spans(text):
+            if stop <= position:
+                continue
+            start = max(first, position)
+            matches.append(self.group(text, start, end))
+            position = end
+        return matches
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.pattern!r})'
+
+class TerminatedNumber(LinearPattern):
+    r"""
+    数字列の直後に終端文字が続く金額（`(\d{1,3}(?:,\d{3})*|\d+)円`・`\d+円` など）
+
+    一致は終端文字の直前の数字・カンマの列の中にしかないため、終端文字毎にその列を1回だけ調べる
+
+    Args:
+        terminator: 終端文字（'円' / '¥'）
+        grouped: 3桁区切りの数字列 `\d{1,3}(?:,\d{3})*` に一致するか
+        digits: 区切りのない数字列 `\d+` に一致するか
+        capture: findall が数字列（キャプチャグループ）を返すか（False なら終端文字を含む一致全体）
+    """
+
+    def __init__(self, terminator: str, grouped: bool = True, digits: bool = True, capture: bool = False):
+        if not (grouped or digits):
+            raise ValueError("TerminatedNumber needs grouped or digits")
+        self.terminator = terminator
+        self.grouped = grouped
+        self.digits = digits
+        self.capture = capture
+
+        number = '|'.join(part for part, enabled in ((r'\d{1,3}(?:,\d{3})*', grouped), (r'\d+', digits)) if enabled)
+        if capture:
+            number = f'({number})'
+        elif grouped and digits:
+            number = f'(?:{number})'
+        super().__init__(number + re.escape(terminator), r'[\d,]')
+        self._terminator = re.compile(r'[\d,]' + re.escape(terminator))
+
+    def _starts(self, run: str, end: int) -> List[Tuple[int, int]]:
+        """end で終わる数字・カンマの列 run のうち、そこから終端文字までが数字列に一致する開始位置（降順の区間）"""
+        groups = run.split(',')
+        last = groups[-1]
+        if not last:
+            return []
+        last_start = end - len(last)
+        starts = [(last_start if self.digits else max(last_start, end - 3), end)]
+
+        # 3桁区切り: 末尾の組が3桁なら、左へ3桁の組が続く限り延ばせる（先頭の組は1〜3桁）
+        if self.grouped and len(last) == 3:
+            stop = last_start - 1
+            for group in reversed(groups[:-1]):
+                if group:
+                    starts.append((stop - min(3, len(group)), stop))
+                if len(group) != 3:
+                    break
+                stop -= 4
+        return starts
+
+    _RUN = re.compile(r'[\d,]*')
+
+    def spans(self, text: str) -> List[Span]:
+        spans = []
+        for start, end in _runs_before(text, self._terminator, self._RUN):
+            starts = self._starts(text[start:end], end)
+            spans.extend((first, stop, end + len(self.terminator)) for first, stop in reversed(starts))
+        return spans
+
+    def group(self, text: str, start: int, end: int) -> str:
+        return text[start:end - len(self.terminator)] if self.capture else text[start:end]
+
+class DecimalNumber(LinearPattern):
+    r"""小数点以下2桁の数字（`\d+\.\d{2}` / `(\d+\.\d{2})`）"""
+
+    def __init__(self, capture: bool = False):
+        super().__init__(r'(\d+\.\d{2})' if capture else r'\d+\.\d{2}', r'\d')
+
+    _RUN = re.compile(r'\d*')
+    _POINT = re.compile(r'\d\.(?=\d{2})')
+
+    def spans(self, text: str) -> List[Span]:
+        # 列の途中（前の一致の直後）から始めても、一致は同じ小数点の2桁後で終わる
+        return [(start, end, end + 3) for start, end in _runs_before(text, self._POINT, self._RUN)]
+
+class IdToken(LinearPattern):
+    r"""
+    英数字・ハイフンからなる6文字以上のトークンで数字を含むもの
+    （`(?<![A-Za-z0-9])(?=[A-Za-z\-]*\d)[A-Za-z0-9\-]{6,}`。区切り線 '-----' などハイフンの列で2乗の時間がかかる）
+    """
+
+    _TOKEN = re.compile(r'[A-Za-z0-9\-]{6,}')
+    _DIGIT = re.compile(r'\d')
+
+    def __init__(self):
+        super().__init__(r'(?<![A-Za-z0-9])(?=[A-Za-z\-]*\d)[A-Za-z0-9\-]{6,}', r'[A-Za-z\-]')
+
+    def spans(self, text: str) -> List[Span]:
+        spans = []
+        for token in self._TOKEN.finditer(text):
+            start, end = token.span()
+            value = token.group()
+            # 先読み `[A-Za-z\-]*\d` は、開始位置より後ろにトークン内の数字があるか、トークン直後が数字なら成立
+            if self._DIGIT.match(text, end):
+                last_start = end - 6
+            else:
+                last_start = min(end - 6, max(value.rfind(digit) for digit in '0123456789') + start)
+            # 開始できるのはトークンの先頭とハイフンの直後（直前が英数字でない位置）
+            position = start
+            while 0 <= position <= last_start:
+                spans.append((position, position + 1, end))
+                position = text.find('-', position, last_start) + 1 or -1
+        return spans
+
+# 2乗の時間がかかる既知のパターン → 線形時間の抽出器
+LINEAR_PATTERNS: Dict[str, LinearPattern] = {
+    extractor.pattern: extractor for extractor in (
+        TerminatedNumber('円', capture=True),
+        TerminatedNumber('¥', capture=True),
+        TerminatedNumber('円', digits=False),
+        TerminatedNumber('円', grouped=False),
+        DecimalNumber(capture=True),
+        DecimalNumber(),
+        IdToken(),
+    )
+}
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern: str) -> Union[LinearPattern, Pattern]:
+    """既知のパターンなら線形時間の抽出器、それ以外は re.compile（いずれも findall を持つ）"""
+    return LINEAR_PATTERNS.get(pattern) or re.compile(pattern)
+
+class NamedAlternation:
+    """
+    名前付きグループの選択 `(?P<NAME>p1|p2|...)|...` の線形時間版
+
+    長い列を含むテキストでは、既知のパターンは線形時間の抽出器で、それ以外は1つの正規表現で検索し、
+    同じ位置で一致する場合は元の選択の順（先に書かれたパターン）を優先する。空文字列に一致するパターンは扱わない
+
+    Args:
+        groups: (グループ名, パターンのリスト) のリスト（この順に優先）
+    """
+
+    def __init__(self, groups: Sequence[Tuple[str, Sequence[str]]]):
+        self._names: List[str] = []
+        self._linear: List[Tuple[int, LinearPattern]] = []
+        alternatives = []
+        for name, patterns in groups:
+            for pattern in patterns:
+                rank = len(self._names)
+                self._names.append(name)
+                compiled = compile_pattern(pattern)
+                if isinstance(compiled, LinearPattern):
+                    self._linear.append((rank, compiled))
+                else:
+                    alternatives.append(f'(?P<_{rank}>{pattern})')
+        self._regex = re.compile('|'.join(alternatives)) if alternatives else None
+        self._combined = re.compile('|'.join(
+            f"(?P<{name}>{'|'.join(f'(?:{pattern})' for pattern in patterns)})" for name, patterns in groups
+        ))
+        classes = sorted({extractor.run_class for _, extractor in self._linear})
+        self._long_run = re.compile('|'.join(f'{run_class}{{{LONG_RUN}}}' for run_class in classes)) if classes else None
+
+    def sub(self, repl: Callable[[str], str], text: str) -> str:
+        """一致した部分を repl(グループ名) で置き換える（長い列を含む場合だけ線形時間の走査）"""
+        if self._long_run is None or self._long_run.search(text) is None:
+            return self._combined.sub(lambda match: repl(match.lastgroup), text)
+        return self.sub_linear(repl, text)
+
+    def sub_linear(self, repl: Callable[[str], str], text: str) -> str:
+        """sub の線形時間の走査（元の正規表現の sub と同じ結果）"""
+        cursors = [[rank, extractor.spans(text), 0] for rank, extractor in self._linear]
+        pieces = []
+        position = 0
+        match = None
+        exhausted = self._regex is None
+        while True:
+            # 正規表現の一致は、走査位置より前で始まるもの以外は次の周回でも有効（一致がなくなれば以降も探さない）
+            if not exhausted and (match is None or match.start() < position):
+                match = self._regex.search(text, position)
+                exhausted = match is None
+            best = (match.start(), int(match.lastgroup[1:]), match.end()) if match else None
+
+            for cursor in cursors:
+                rank, spans, index = cursor
+                while index < len(spans) and spans[index][1] <= position:
+                    index += 1
+                cursor[2] = index
+                if index < len(spans):
+                    first, _, end = spans[index]
+                    candidate = (max(first, position), rank, end)
+                    if best is None or candidate[:2] < best[:2]:
+                        best = candidate
+
+            if best is None:
+                break
+            start, rank, end = best
+            pieces.append(text[position:start])
+            pieces.append(repl(self._names[rank]))
+            position = end
+        pieces.append(text[position:])
+        return ''.join(pieces)
@@ -0,0 +1,107 @@
+"""
+線形スコアラーの共通部分
+畳み込み済みスコアラー（models.calibrated_scorer）と NumPy配列形式のスコアラー（app.numpy_scorer）が共有する、
+fold毎の決定関数値から確率・マージンを計算する処理（NumPy のみを使用）
+"""
+
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+class LinearScorer(ABC):
+    """
+    fold毎の決定関数値から確率・マージンを計算する共通部分
+    （CalibratedClassifierCV と同じくfold毎にシグモイド校正・クラス間正規化を行い、fold平均を取る）
+
+    サブクラスは _fold_scores() と以下の属性を持つ:
+        classes_, intercepts, sigmoid_a, sigmoid_b, output_classes, fold_slices
+    """
+
+    classes_: np.ndarray
+    sigmoid_a: Optional[np.ndarray]
+    sigmoid_b: Optional[np.ndarray]
+    output_classes: np.ndarray
+    fold_slices: List[Tuple[int, int]]
+
+    @property
+    def is_calibrated(self) -> bool:
+        return self.sigmoid_a is not None
+
+    @property
+    def n_folds(self) -> int:
+        return len(self.fold_slices)
+
+    @abstractmethod
+    def _fold_scores(self, texts: List[str]) -> np.ndarray:
+        """全foldの決定関数値 (サンプル数, 全foldの出力数)"""
+
+    def fold_scores(self, texts: List[str]) -> np.ndarray:
+        """全foldの決定関数値（テキストのベクトル化と重み行列の集計。校正前）"""
+        return self._fold_scores(texts)
+
+    def score(self, texts: List[str]) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """
+        確率とマージンを同時に計算
+
+        Returns:
+            (確率 (サンプル数, クラス数) / 未校正ならNone, fold平均の決定関数値)
+        """
+        return self.combine(self._fold_scores(texts))
+
+    def combine(self, scores: np.ndarray) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """fold毎の決定関数値から確率（シグモイド校正・クラス間正規化）とマージンを計算（score() の後半）"""
+        n_samples, n_classes = scores.shape[0], len(self.classes_)
+
+        margins = np.zeros((n_samples, n_classes))
+        proba = np.zeros((n_samples, n_classes)) if self.is_calibrated else None
+
+        if self.is_calibrated:
+            calibrated = 1.0 / (1.0 + np.exp(self.sigmoid_a * scores + self.sigmoid_b))
+
+        for start, end in self.fold_slices:
+            fold_classes = self.output_classes[start:end]
+            margins[:, fold_classes] += scores[:, start:end]
+
+            if not self.is_calibrated:
+                continue
+
+            fold_proba = np.zeros((n_samples, n_classes))
+            fold_proba[:, fold_classes] = calibrated[:, start:end]
+            if n_classes == 2:
+                fold_proba[:, 0] = 1.0 - fold_proba[:, 1]
+            else:
+                denominator = fold_proba.sum(axis=1)[:, np.newaxis]
+                fold_proba = np.divide(
+                    fold_proba, denominator,
+                    out=np.full_like(fold_proba, 1 / n_classes),
+                    where=denominator != 0
+                )
+            fold_proba[(1.0 < fold_proba) & (fold_proba <= 1.0 + 1e-5)] = 1.0
+            proba += fold_proba
+
+        margins /= self.n_folds
+        if proba is not None:
+            proba /= self.n_folds
+
+        if n_classes == 2:
+            # 二値分類の決定関数値は正クラスの1列のみ（sklearn互換）
+            margins = margins[:, 1]
+
+        return proba, margins
+
+    def decision_function(self, texts: List[str]) -> np.ndarray:
+        return self.score(texts)[1]
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        if not self.is_calibrated:
+            raise AttributeError("Scorer is not calibrated: predict_proba is unavailable")
+        return self.score(texts)[0]
+
+    def predict(self, texts: List[str]) -> np.ndarray:
+        proba, margins = self.score(texts)
+        if proba is not None:
+            return self.classes_[proba.argmax(axis=1)]
+        if margins.ndim == 1:
+            return self.classes_[(margins > 0).astype(int)]
+        return self.classes_[margins.argmax(axis=1)]
@@ -0,0 +1,222 @@
+"""
+NumPy配列形式（メモリマップ形式）のモデルファイルの形式定義と書き出し
+学習スクリプト（models.serving_export）・APIサーバー（app.mapped_artifact / app.model_bundle）の両方が使う。
+読み込み側が scikit-learn / SciPy なしで起動できるよう、このモジュールは NumPy だけを import する
+（joblib形式からの変換 export_mapped_artifact() は呼び出し時に scikit-learn を読み込む）
+
+ディレクトリ構成（<モデルファイル名>.mapped/）:
+    manifest.json       形式バージョン・元ファイルのチェックサム・メタデータ・トークン化設定・クラス
+    term_hashes.npy     語彙のハッシュ値（uint64、昇順。行番号 = 特徴量の列番号）
+    term_offsets.npy    terms.bin 内の各語の開始位置
+    terms.bin           語彙（UTF-8、ハッシュ順に連結）
+    weights.npy 他      スコアラーの配列（未校正モデルは sigmoid_a / sigmoid_b なし、
+                        int8 量子化した重み行列は weight_scales あり）
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+from models.linear_scorer import LinearScorer
+
+if TYPE_CHECKING:
+    from models.calibrated_scorer import CalibratedLinearScorer
+
+FORMAT_VERSION = 2
+MAPPED_SUFFIX = '.mapped'
+MANIFEST_FILE = 'manifest.json'
+
+# 重み行列の保存型（float64 以外は圧縮版。int8 は weight_scales.npy に出力列毎のスケールを保存）
+WEIGHT_DTYPES = ('float64', 'float32', 'float16', 'int8')
+
+# 保存するトークン化設定（CountVectorizer のパラメータ）
+TOKENIZER_PARAMS = ('analyzer', 'lowercase', 'token_pattern', 'ngram_range', 'tokenizer',
+                    'strip_accents', 'stop_words')
+
+def mapped_path(artifact_path: str) -> str:
+    """モデルファイルに対応するメモリマップ形式のディレクトリ"""
+    return os.path.splitext(artifact_path)[0] + MAPPED_SUFFIX
+
+def file_checksum(path: str) -> str:
+    """モデルファイルのSHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# 定型文の語は繰り返し出現するため、ハッシュ値をキャッシュ
+@lru_cache(maxsize=1 << 16)
+def term_hash(term: str) -> int:
+    """語のハッシュ値（プロセス間で一定。Pythonの hash() は起動毎に変わるため使わない）"""
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def _callable_name(function) -> str:
+    return f'{function.__module__}:{function.__qualname__}'
+
+def _tokenizer_config(count_vectorizer) -> Dict:
+    """CountVectorizer のトークン化設定をJSONで保存できる形に変換（読み込み側は scikit-learn 不要）"""
+    params = count_vectorizer.get_params()
+    if callable(params['analyzer']) or params['preprocessor'] is not None:
+        raise ValueError("Custom analyzer/preprocessor cannot be exported to mapped format")
+
+    config = {key: params[key] for key in TOKENIZER_PARAMS}
+    config['ngram_range'] = list(config['ngram_range'])
+    if config['tokenizer'] is not None:
+        config['tokenizer'] = _callable_name(config['tokenizer'])
+    # 'english' などの組み込みリストも語のリストとして保存
+    stop_words = count_vectorizer.get_stop_words()
+    config['stop_words'] = sorted(stop_words) if stop_words else None
+    return config
+
+def _json_value(value):
+    """メタデータ値のJSON化（numpyの数値はPythonの数値に、その他の非対応型は文字列に）"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+def quantize_weights(weights: np.ndarray, weight_dtype: str):
+    """
+    重み行列を保存用の型に変換
+
+    Returns:
+        (変換後の重み行列, 出力列毎のスケール / int8以外はNone)
+        int8 は出力列毎の対称量子化（列の最大絶対値を127に対応させる）
+    """
+    if weight_dtype not in WEIGHT_DTYPES:
+        raise ValueError(f"Unsupported weight dtype: {weight_dtype}")
+    if weight_dtype != 'int8':
+        return weights.astype(weight_dtype), None
+
+    scales = np.abs(weights).max(axis=0) / 127 if len(weights) else np.ones(weights.shape[1])
+    scales[scales == 0] = 1.0
+    return np.round(weights / scales).astype(np.int8), scales
+
+def save_mapped_artifact(scorer: 'CalibratedLinearScorer', path: str, metadata: Dict,
+                         source_checksum: str, weight_dtype: str = 'float64') -> str:
+    """
+    スコアラーをメモリマップ形式で保存（一時ディレクトリに書いてから置き換える）
+
+    Args:
+        scorer: 畳み込み済みスコアラー
+        path: 保存先ディレクトリ
+        metadata: モデルファイルのメタデータ（特徴量仕様・精度など）
+        source_checksum: 元のモデルファイルのチェックサム（古い変換結果の検出とモデルバージョンに使用）
+        weight_dtype: 重み行列の保存型（WEIGHT_DTYPES）
+    """
+    vocabulary = scorer.count_vectorizer.vocabulary
+    terms = sorted(vocabulary, key=vocabulary.get)
+    return write_mapped_artifact(
+        path, scorer, terms, scorer.weights, scorer.norm_weights,
+        manifest={
+            'source_checksum': source_checksum,
+            'metadata': metadata,
+            'tokenizer': _tokenizer_config(scorer.count_vectorizer)
+        },
+        weight_dtype=weight_dtype
+    )
+
+def write_mapped_artifact(path: str, scorer: LinearScorer, terms: List[str], weights: np.ndarray,
+                          norm_weights: np.ndarray, manifest: Dict, weight_dtype: str = 'float64') -> str:
+    """
+    語彙・重み行列とスコアラーの校正パラメータをメモリマップ形式で保存
+
+    Args:
+        scorer: 切片・シグモイド校正パラメータ・クラス・fold構成を持つスコアラー
+        terms: 語彙（weights / norm_weights の行の順）
+        manifest: source_checksum / metadata / tokenizer（必要なら compression）
+    """
+    hashes = np.array([term_hash(term) for term in terms], dtype=np.uint64)
+    if len(np.unique(hashes)) != len(hashes):
+        raise ValueError("Term hash collision in vocabulary")
+
+    # 列をハッシュ値の昇順に並べ替え（探索位置がそのまま列番号になる）
+    order = np.argsort(hashes, kind='stable')
+    encoded = [terms[i].encode('utf-8') for i in order]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(term) for term in encoded])
+
+    quantized, scales = quantize_weights(np.asarray(weights, dtype=np.float64)[order], weight_dtype)
+    norm_dtype = np.float64 if weight_dtype == 'float64' else np.float32
+    arrays = {
+        'term_hashes': hashes[order],
+        'term_offsets': offsets,
+        'weights': np.ascontiguousarray(quantized),
+        'norm_weights': np.ascontiguousarray(np.asarray(norm_weights)[order], dtype=norm_dtype),
+        'intercepts': scorer.intercepts,
+        'output_classes': scorer.output_classes,
+    }
+    if scales is not None:
+        arrays['weight_scales'] = scales
+    if scorer.is_calibrated:
+        arrays.update(sigmoid_a=scorer.sigmoid_a, sigmoid_b=scorer.sigmoid_b)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        **manifest,
+        'classes': [str(c) for c in scorer.classes_],
+        'fold_slices': [list(s) for s in scorer.fold_slices],
+        'sublinear_tf': bool(scorer.sublinear_tf),
+        'norm': scorer.norm,
+        'weight_dtype': weight_dtype,
+        'arrays': sorted(arrays)
+    }
+
+    staging = f'{path}.tmp-{os.getpid()}'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, f'{name}.npy'), np.asarray(array))
+    with open(os.path.join(staging, 'terms.bin'), 'wb') as f:
+        f.write(b''.join(encoded))
+    with open(os.path.join(staging, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, default=_json_value)
+
+    # 読み込み中のワーカーは旧ファイルのマップを保持したまま動作できる（POSIX）
+    previous = f'{path}.old-{os.getpid()}'
+    if os.path.exists(path):
+        os.rename(path, previous)
+    os.rename(staging, path)
+    shutil.rmtree(previous, ignore_errors=True)
+    return path
+
+def read_manifest(path: str) -> Optional[Dict]:
+    """マニフェスト（未変換・形式バージョン違いならNone）"""
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('format_version') == FORMAT_VERSION else None
+
+def artifact_metadata(loaded_data: Dict) -> Dict:
+    """joblib形式のモデルファイルの内容から、モデル本体以外のメタデータ（特徴量仕様・精度など）を取り出す"""
+    metadata = {k: v for k, v in loaded_data.items()
+                if k not in ('pipeline', 'vectorizer', 'model', 'feature_names', 'classes')}
+    # model_sync_solution はメタデータを 'metadata' キーに保存している
+    metadata.update(loaded_data.get('metadata') or {})
+    return metadata
+
+def export_mapped_artifact(path: str, output: Optional[str] = None) -> str:
+    """
+    joblib形式のモデルファイルをメモリマップ形式に変換（既定は <モデルファイル名>.mapped/ に保存）
+
+    Raises:
+        ValueError: 単一スコアラーに畳み込めないモデル（'sparse' 特徴量方式など）
+    """
+    import joblib
+    from models.calibrated_scorer import collapse_and_verify
+
+    loaded_data = joblib.load(path)
+    scorer, info = collapse_and_verify(loaded_data['pipeline'])
+    if not info['collapsed']:
+        raise ValueError(f"Model cannot be exported to mapped format: {info.get('reason')}")
+    return save_mapped_artifact(scorer, output or mapped_path(path), artifact_metadata(loaded_data),
+                                file_checksum(path))
@@ -4,87 +4,109 @@ Gmail分類システム - モデル不一致根本解決
 統合ソリューション: Pipeline化 + 単一特徴量関数 + 確率化
 """
 
-import pandas as pd
-import pickle
-import joblib
+import argparse
 import os
 import re
-from typing import List, Dict, Tuple
-from sklearn.pipeline import make_pipeline
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.svm import LinearSVC
-from sklearn.calibration import CalibratedClassifierCV
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, accuracy_score
+import sys
+from collections import Counter
+from typing import TYPE_CHECKING, List, Dict, Tuple
 
-def create_paypay_specialized_features(text: str) -> str:
+# プロジェクトルートをパスに追加（models/ から直接実行した場合用）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.feature_spec import describe_features, render_signals
+from models.text_analyzers import ANALYZERS
+from models.serving_export import export_serving_artifact
+from models.keyword_matcher import compile_keyword_tables
+from models.linear_patterns import compile_pattern
+
+# pandas・scikit-learn・joblib は学習・保存時のみ import する
+# （APIサーバーは特徴量関数だけを使うため、このモジュールの import で読み込まない）
+if TYPE_CHECKING:
+    import pandas as pd
+
+# === 特徴量エンジニアリング用キーワード表（モジュール読み込み時に1回だけコンパイル） ===
+PAYPAY_VARIANTS = [
+    'PayPay', 'paypay', 'ペイペイ', 'ペイ', 'PAYPAY', 
+    'PayPay残高', 'PayPay決済', 'PayPay利用'
+]
+
+PAYPAY_CONTEXTS = {
+    'チャージ': ['チャージ', 'charge', '入金', '残高追加'],
+    '決済': ['決済', '支払い', '購入', 'お支払い', '利用'],
+    '完了': ['完了', '終了', 'しました', 'されました'],
+    '通知': ['お知らせ', '通知', 'ご案内', 'notice']
+}
+
+PAYMENT_SERVICES = {
+    'major': ['PayPay', 'LINE Pay', 'Apple Pay', 'Google Pay'],
+    'credit': ['ペイディ', 'Paidy', 'メルペイ', '楽天ペイ'],
+    'card': ['デビットカード', 'クレジットカード', 'VISA', 'MasterCard', 'JCB'],
+    'bank': ['銀行振込', '口座振替', '引き落とし', '振替']
+}
+
+AMOUNT_PATTERNS = {
+    'comma_yen': r'\d{1,3}(?:,\d{3})*円',
+    'symbol_yen': r'¥\d{1,3}(?:,\d{3})*',
+    'decimal': r'\d+\.\d{2}',
+    'simple_yen': r'\d+円',
+    'range_amount': r'\d{3,6}円'
+}
+
+ACTION_CATEGORIES = {
+    'completion': ['完了', '終了', 'しました', 'されました', '実行'],
+    'processing': ['処理中', '手続き', '確認中', 'processing'],
+    'notification': ['お知らせ', '通知', 'ご案内', '連絡'],
+    'charge': ['チャージ', '入金', '追加', '補充'],
+    'payment': ['支払い', '決済', '購入', '引き落とし', '振替'],
+    'card_usage': ['ご利用', '使用', '決済', 'transaction']
+}
+
+COMPLETION_COMBO_WORDS = ['完了', 'しました']
+
+_PAYPAY_MATCHER = compile_keyword_tables(
+    PAYPAY_VARIANTS, PAYPAY_CONTEXTS, PAYMENT_SERVICES, ACTION_CATEGORIES, COMPLETION_COMBO_WORDS
+)
+
+def paypay_specialized_signals(text: str) -> Dict[str, int]:
     """
     PayPay特化特徴量エンジニアリング - 単一定義版
     注意: この関数は model_sync_solution.py でのみ定義し、他からはimportする
     """
-    features = []
-    
-    # 基本テキスト
-    features.append(text)
+    signals = Counter()
+    hits = _PAYPAY_MATCHER.scan(text)
     
     # === PayPay特化特徴量（重点強化） ===
-    paypay_variants = [
-        'PayPay', 'paypay', 'ペイペイ', 'ペイ', 'PAYPAY', 
-        'PayPay残高', 'PayPay決済', 'PayPay利用'
-    ]
-    
     # PayPay検出強度計算
     paypay_strength = 0
-    for variant in paypay_variants:
-        count = text.count(variant)
+    for variant in PAYPAY_VARIANTS:
+        count = hits.count(variant)
         if count > 0:
             paypay_strength += count
-            features.append(f"PAYPAY_VARIANT_{variant.replace(' ', '_')}")
+            signals[f"PAYPAY_VARIANT_{variant.replace(' ', '_')}"] += 1
     
     if paypay_strength > 0:
-        features.append(f"PAYPAY_STRENGTH_{min(paypay_strength, 5)}")
+        signals[f"PAYPAY_STRENGTH_{min(paypay_strength, 5)}"] += 1
     
     # PayPay文脈特徴量
-    paypay_contexts = {
-        'チャージ': ['チャージ', 'charge', '入金', '残高追加'],
-        '決済': ['決済', '支払い', '購入', 'お支払い', '利用'],
-        '完了': ['完了', '終了', 'しました', 'されました'],
-        '通知': ['お知らせ', '通知', 'ご案内', 'notice']
-    }
-    
-    for context_type, keywords in paypay_contexts.items():
-        context_count = sum(1 for keyword in keywords if keyword in text)
+    for context_type, keywords in PAYPAY_CONTEXTS.items():
+        context_count = hits.count_present(keywords)
         if context_count > 0:
-            features.append(f"PAYPAY_CONTEXT_{context_type}_{context_count}")
+            signals[f"PAYPAY_CONTEXT_{context_type}_{context_count}"] += 1
     
     # === 決済サービス階層化特徴量 ===
-    payment_services = {
-        'major': ['PayPay', 'LINE Pay', 'Apple Pay', 'Google Pay'],
-        'credit': ['ペイディ', 'Paidy', 'メルペイ', '楽天ペイ'],
-        'card': ['デビットカード', 'クレジットカード', 'VISA', 'MasterCard', 'JCB'],
-        'bank': ['銀行振込', '口座振替', '引き落とし', '振替']
-    }
-    
-    for service_type, services in payment_services.items():
-        service_count = sum(1 for service in services if service in text)
+    for service_type, services in PAYMENT_SERVICES.items():
+        service_count = hits.count_present(services)
         if service_count > 0:
-            features.append(f"PAYMENT_TYPE_{service_type.upper()}_{service_count}")
+            signals[f"PAYMENT_TYPE_{service_type.upper()}_{service_count}"] += 1
     
     # === 金額パターン拡張特徴量 ===
-    amount_patterns = {
-        'comma_yen': r'\d{1,3}(?:,\d{3})*円',
-        'symbol_yen': r'¥\d{1,3}(?:,\d{3})*',
-        'decimal': r'\d+\.\d{2}',
-        'simple_yen': r'\d+円',
-        'range_amount': r'\d{3,6}円'
-    }
-    
     total_amounts = 0
-    for pattern_name, pattern in amount_patterns.items():
-        matches = re.findall(pattern, text)
+    for pattern_name, pattern in AMOUNT_PATTERNS.items():
+        matches = compile_pattern(pattern).findall(text)
         if matches:
             total_amounts += len(matches)
-            features.append(f"AMOUNT_{pattern_name.upper()}_{len(matches)}")
+            signals[f"AMOUNT_{pattern_name.upper()}_{len(matches)}"] += 1
             
             # 金額レンジ分類
             for match in matches:
@@ -92,41 +114,38 @@ def create_paypay_specialized_features(text: str) -> str:
                 if numbers:
                     amount = int(numbers[0])
                     if amount < 1000:
-                        features.append("AMOUNT_RANGE_SMALL")
+                        signals["AMOUNT_RANGE_SMALL"] += 1
                     elif amount < 10000:
-                        features.append("AMOUNT_RANGE_MEDIUM")
+                        signals["AMOUNT_RANGE_MEDIUM"] += 1
                     else:
-                        features.append("AMOUNT_RANGE_LARGE")
+                        signals["AMOUNT_RANGE_LARGE"] += 1
     
     if total_amounts > 0:
-        features.append(f"TOTAL_AMOUNT_MENTIONS_{min(total_amounts, 3)}")
+        signals[f"TOTAL_AMOUNT_MENTIONS_{min(total_amounts, 3)}"] += 1
     
     # === 決済アクション詳細分類 ===
-    action_categories = {
-        'completion': ['完了', '終了', 'しました', 'されました', '実行'],
-        'processing': ['処理中', '手続き', '確認中', 'processing'],
-        'notification': ['お知らせ', '通知', 'ご案内', '連絡'],
-        'charge': ['チャージ', '入金', '追加', '補充'],
-        'payment': ['支払い', '決済', '購入', '引き落とし', '振替'],
-        'card_usage': ['ご利用', '使用', '決済', 'transaction']
-    }
-    
-    for action_type, actions in action_categories.items():
-        action_count = sum(1 for action in actions if action in text)
+    for action_type, actions in ACTION_CATEGORIES.items():
+        action_count = hits.count_present(actions)
         if action_count > 0:
-            features.append(f"ACTION_{action_type.upper()}_{action_count}")
+            signals[f"ACTION_{action_type.upper()}_{action_count}"] += 1
     
     # === PayPay特化組み合わせ特徴量 ===
-    if any(variant in text for variant in paypay_variants) and any(completion in text for completion in ['完了', 'しました']):
-        features.append("PAYPAY_COMPLETION_COMBO")
+    if hits.any(PAYPAY_VARIANTS) and hits.any(COMPLETION_COMBO_WORDS):
+        signals["PAYPAY_COMPLETION_COMBO"] += 1
     
-    if any(variant in text for variant in paypay_variants) and total_amounts > 0:
-        features.append("PAYPAY_AMOUNT_COMBO")
+    if hits.any(PAYPAY_VARIANTS) and total_amounts > 0:
+        signals["PAYPAY_AMOUNT_COMBO"] += 1
     
-    return ' '.join(features)
+    return dict(signals)
 
-def create_training_data() -> pd.DataFrame:
+def create_paypay_specialized_features(text: str) -> str:
+    """テキストに paypay_specialized_signals のマーカーを付加（'text' 方式の入力）"""
+    return render_signals(text, paypay_specialized_signals(text))
+
+def create_training_data() -> 'pd.DataFrame':
     """統合学習データの作成"""
+    import pandas as pd
+    
     training_data = [
         # PayPay特化学習データ
         {
@@ -219,11 +238,22 @@ def create_training_data() -> pd.DataFrame:
     
     return pd.DataFrame(training_data)
 
-def create_pipeline_model() -> Tuple[object, Dict]:
+def create_pipeline_model(feature_mode: str = 'text', analyzer: str = 'word') -> Tuple[object, Dict]:
     """
     Pipeline化されたモデルの作成
     vectorizer + model を単一パイプラインに統合
+
+    Args:
+        feature_mode: 'text'（特徴量文字列をTF-IDF）/ 'sparse'（生テキストTF-IDF + 特徴量の疎な数値列）
+        analyzer: TF-IDFのアナライザー（'word' / 'char' / 'script'、models.text_analyzers 参照）
     """
+    from sklearn.pipeline import make_pipeline
+    from sklearn.svm import LinearSVC
+    from sklearn.calibration import CalibratedClassifierCV
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report, accuracy_score
+    from models.sparse_features import build_vectorizer, prepare_texts
+    
     print("=== Pipeline化統合モデル学習開始 ===\n")
     
     # データセット作成
@@ -232,8 +262,11 @@ def create_pipeline_model() -> Tuple[object, Dict]:
     print(f"分類クラス分布:\n{df['label'].value_counts()}\n")
     
     # 特徴量エンジニアリング適用
-    print("PayPay特化特徴量エンジニアリングを適用中...")
-    df['enhanced_text'] = df.apply(lambda row: create_paypay_specialized_features(f"{row['subject']} {row['body']}"), axis=1)
+    print(f"PayPay特化特徴量エンジニアリングを適用中（特徴量方式: {feature_mode}）...")
+    df['enhanced_text'] = prepare_texts(
+        feature_mode, create_paypay_specialized_features,
+        (f"{subject} {body}" for subject, body in zip(df['subject'], df['body']))
+    )
     
     # 学習データ準備
     X = df['enhanced_text']
@@ -245,7 +278,8 @@ def create_pipeline_model() -> Tuple[object, Dict]:
     )
     
     # TfidfVectorizer設定
-    vectorizer = TfidfVectorizer(
+    vectorizer = build_vectorizer(
+        feature_mode, 'models.model_sync_solution:create_paypay_specialized_features', analyzer=analyzer,
         max_features=5000,
         ngram_range=(1, 3),
         min_df=1,
@@ -305,13 +339,18 @@ def create_pipeline_model() -> Tuple[object, Dict]:
         'total_samples': len(df),
         'accuracy': accuracy,
         'classes': list(pipeline.classes_),
-        'feature_engineering': 'PayPay特化統合版'
+        'feature_engineering': 'PayPay特化統合版',
+        'analyzer': analyzer,
+        # 特徴量仕様
+        **describe_features('models.model_sync_solution:create_paypay_specialized_features', feature_mode=feature_mode)
     }
     
     return pipeline, metadata
 
 def save_pipeline_model(pipeline, metadata, model_path="models/paypay_specialized_v1.pkl"):
     """Pipeline化されたモデルの保存"""
+    import joblib
+    
     # joblib形式で保存（Pipeline対応）
     joblib.dump({
         'pipeline': pipeline,
@@ -321,10 +360,15 @@ def save_pipeline_model(pipeline, metadata, model_path="models/paypay_specialize
     print(f"\nPipeline化モデルを保存しました: {model_path}")
     print(f"ファイルサイズ: {os.path.getsize(model_path) / 1024 / 1024:.2f} MB")
     
+    # APIサーバー用のNumPy配列形式
+    export_serving_artifact(model_path)
+    
     return model_path
 
 def load_pipeline_model(model_path="models/paypay_specialized_v1.pkl"):
     """Pipeline化されたモデルの読み込み"""
+    import joblib
+    
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"モデルファイルが見つかりません: {model_path}")
     
@@ -339,8 +383,10 @@ def load_pipeline_model(model_path="models/paypay_specialized_v1.pkl"):
     
     return pipeline, metadata
 
-def test_pipeline_model(pipeline):
+def test_pipeline_model(pipeline, feature_mode: str = 'text'):
     """Pipeline化されたモデルのテスト"""
+    from models.sparse_features import prepare_texts
+    
     print("\n=== Pipeline化モデルテスト ===")
     
     test_cases = [
@@ -354,7 +400,7 @@ def test_pipeline_model(pipeline):
     for i, (subject, body) in enumerate(test_cases, 1):
         # 特徴量エンジニアリング適用
         text = f"{subject} {body}"
-        enhanced_text = create_paypay_specialized_features(text)
+        enhanced_text = prepare_texts(feature_mode, create_paypay_specialized_features, [text])[0]
         
         # Pipeline予測（特徴量エンジニアリング済みテキストを入力）
         prediction = pipeline.predict([enhanced_text])[0]
@@ -366,12 +412,21 @@ def test_pipeline_model(pipeline):
         print()
 
 if __name__ == "__main__":
+    from models.sparse_features import FEATURE_MODES
+    
+    parser = argparse.ArgumentParser(description='PayPay特化Pipelineモデル学習')
+    parser.add_argument('--feature-mode', choices=FEATURE_MODES, default='text',
+                        help='特徴量の入力方式（sparse: 生テキストTF-IDF + 特徴量の疎な数値列）')
+    parser.add_argument('--analyzer', choices=ANALYZERS, default='word',
+                        help='TF-IDFのアナライザー（char: 文字2-3gram, script: 文字種境界分割）')
+    args = parser.parse_args()
+    
     # Pipeline化モデル学習・保存
-    pipeline, metadata = create_pipeline_model()
+    pipeline, metadata = create_pipeline_model(feature_mode=args.feature_mode, analyzer=args.analyzer)
     model_path = save_pipeline_model(pipeline, metadata)
     
     # Pipeline化モデルテスト
-    test_pipeline_model(pipeline)
+    test_pipeline_model(pipeline, feature_mode=args.feature_mode)
     
     print("\n=== 統合ソリューション完了 ===")
     print("✅ vectorizer + model をPipeline化")
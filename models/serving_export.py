@@ -0,0 +1,25 @@
+"""
+学習済みモデルのAPIサーバー用エクスポート
+joblib形式のモデルファイルと並べて、scikit-learn なしで評価できるNumPy配列形式
+（<モデルファイル名>.mapped/、models.mapped_format 参照）を書き出す
+"""
+
+from typing import Optional
+
+from models.mapped_format import export_mapped_artifact
+
+def export_serving_artifact(model_path: str) -> Optional[str]:
+    """
+    学習スクリプトのモデル保存直後に呼ぶ
+
+    Returns:
+        書き出したディレクトリ（NumPy配列形式に変換できないモデルはNone。APIサーバーはjoblib形式を使用）
+    """
+    try:
+        output = export_mapped_artifact(model_path)
+    except ValueError as e:
+        print(f"NumPy配列形式への変換をスキップしました: {e}")
+        return None
+
+    print(f"NumPy配列形式で保存しました: {output}")
+    return output
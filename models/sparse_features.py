@@ -0,0 +1,104 @@
+"""
+特徴量の直接疎行列化
+特徴量関数のマーカー（PAYPAY_STRENGTH_3 など）を文字列としてTF-IDFに再トークン化させず、
+マーカーの辞書（models.feature_spec.FEATURE_SIGNALS）から疎な数値列を作って生テキストのTF-IDFと横に結合する
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.pipeline import FeatureUnion
+from sklearn.preprocessing import normalize
+
+from models.feature_spec import resolve_signal_function
+from models.text_analyzers import analyzer_params
+
+# 'text'   : 特徴量関数の出力文字列（生テキスト + マーカー）をTF-IDFに入力（従来方式）
+# 'sparse' : 生テキストのTF-IDF + マーカーの疎な数値列（EngineeredFeatures）
+FEATURE_MODES = ('text', 'sparse')
+
+class EngineeredFeatures(BaseEstimator, TransformerMixin):
+    """
+    特徴量関数のマーカーの辞書を疎な数値列に変換するTransformer（入力は生テキスト）
+
+    Args:
+        feature_function: 特徴量関数の識別子（models.feature_spec.FEATURE_VERSIONS のキー）。
+            関数オブジェクトではなく識別子を保持するため、モデルファイルには関数本体が含まれない
+            （マーカーの辞書を返す関数は fit・モデルファイルの読み込み時に1回だけ解決する）
+        weight: マーカー列に掛ける重み（正規化後のマーカー列のノルム）
+        norm: マーカー出現数の行毎の正規化（'l2' ならL2正規化済みのTF-IDF列と同じ尺度、None なら出現数のまま）
+    """
+
+    def __init__(self, feature_function: str, weight: float = 1.0, norm: Optional[str] = 'l2'):
+        self.feature_function = feature_function
+        self.weight = weight
+        self.norm = norm
+
+    def _resolve(self) -> None:
+        self.signals_ = resolve_signal_function(self.feature_function)
+
+    def _markers(self, texts: Iterable[str]) -> List[Dict[str, int]]:
+        return [self.signals_(text) for text in texts]
+
+    def _scale(self, counts):
+        if self.norm is not None:
+            counts = normalize(counts, norm=self.norm)
+        return counts * self.weight
+
+    def fit(self, X, y=None):
+        self._resolve()
+        self.vectorizer_ = DictVectorizer().fit(self._markers(X))
+        return self
+
+    def fit_transform(self, X, y=None):
+        # 特徴量関数の評価を1回で済ませる
+        self._resolve()
+        self.vectorizer_ = DictVectorizer()
+        return self._scale(self.vectorizer_.fit_transform(self._markers(X)))
+
+    def transform(self, X):
+        return self._scale(self.vectorizer_.transform(self._markers(X)))
+
+    def __getstate__(self):
+        # 解決済みの関数はモデルファイルに含めない（読み込み時に識別子から解決し直す）
+        state = dict(super().__getstate__())  # 基底の状態はインスタンスの __dict__ そのものの場合がある
+        state.pop('signals_', None)
+        return state
+
+    def __setstate__(self, state):
+        # norm 追加前のモデルファイルは出現数のまま学習しているため正規化しない
+        state.setdefault('norm', None)
+        super().__setstate__(state)
+        if hasattr(self, 'vectorizer_'):
+            self._resolve()
+
+    def get_feature_names_out(self, input_features=None):
+        return self.vectorizer_.get_feature_names_out()
+
+def build_vectorizer(feature_mode: str, feature_function: str, analyzer: str = 'word', **tfidf_params):
+    """
+    特徴量方式に応じたベクトライザーを作成
+
+    Args:
+        feature_mode: 'text' または 'sparse'
+        feature_function: 特徴量関数の識別子（'sparse' の場合に使用）
+        analyzer: TF-IDFのアナライザー（models.text_analyzers.ANALYZERS）
+        tfidf_params: TfidfVectorizer のパラメータ
+    """
+    tfidf_params = analyzer_params(analyzer, tfidf_params)
+    if feature_mode == 'text':
+        return TfidfVectorizer(**tfidf_params)
+    if feature_mode == 'sparse':
+        return FeatureUnion([
+            ('text', TfidfVectorizer(**tfidf_params)),
+            ('engineered', EngineeredFeatures(feature_function))
+        ])
+    raise ValueError(f"Unknown feature mode: {feature_mode} (expected one of {FEATURE_MODES})")
+
+def prepare_texts(feature_mode: str, feature_function: Callable[[str], str], texts: Iterable[str]) -> List[str]:
+    """モデルへの入力テキストを作成（'sparse' の場合はベクトライザー内で特徴量化するため生テキストのまま）"""
+    if feature_mode == 'sparse':
+        return list(texts)
+    return [feature_function(text) for text in texts]
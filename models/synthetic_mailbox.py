@@ -0,0 +1,274 @@
+"""
+合成メールボックスの生成（ベンチマーク用）
+PayPay・デビットカード・ペイディの利用通知、プロモーション、システムアラート、求人・学習メールを
+シード固定で生成する。本文の長さを指定でき、一部は HTML メールを n8n と同様にテキスト化した本文
+（表組み・フッター・配信停止リンクなどを含む長い本文）になる。
+adversarial_text は金額・日付・ID の正規表現の最悪ケース（長い数字・カンマの列、円・¥ の繰り返しなど）を狙った本文を作る
+"""
+
+import random
+from html import unescape
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Sequence
+
+# カテゴリ → 正解ラベル（学習スクリプトのラベル体系）
+CATEGORY_LABELS = {
+    'paypay': '支払い関係',
+    'debit': '支払い関係',
+    'paidy': '支払い関係',
+    'promotion': 'プロモーション',
+    'alert': '重要',
+    'job': '仕事・学習',
+}
+CATEGORIES = tuple(CATEGORY_LABELS)
+
+STORES = ['セブンイレブン', 'ファミリーマート', 'ローソン', 'Amazon.co.jp', '楽天市場', 'ドン・キホーテ',
+          'マツモトキヨシ', 'スターバックス', 'ユニクロ', 'ヨドバシカメラ', 'OPENAI *CHATGPT SUBSCR',
+          'DONQUIJOTE YAME', 'APPLE.COM/BILL', 'NETFLIX.COM']
+NAMES = ['田中太郎', '佐藤花子', '鈴木一郎', '高橋美咲', '伊藤健太', '渡辺さくら']
+SHOPS = ['Amazon', '楽天市場', 'Yahoo!ショッピング', 'メルカリ', 'Udemy', 'ZOZOTOWN', 'ビックカメラ']
+SERVICES = ['本番APIサーバー', '決済ゲートウェイ', '認証基盤', 'データベース', 'バッチ処理', 'メール配信システム']
+COMPANIES = ['株式会社テックフォワード', '合同会社クラウドワークス', '株式会社データブリッジ', '株式会社ネクストAI']
+POSITIONS = ['バックエンドエンジニア', '機械学習エンジニア', 'SRE', 'フロントエンドエンジニア', 'データアナリスト']
+COURSES = ['Python入門', '機械学習実践', 'Docker/Kubernetes入門', 'SQL集中講座', 'TypeScript基礎']
+
+TEMPLATES = {
+    'paypay': [
+        ('PayPay決済完了のお知らせ',
+         'PayPayでのお支払いが完了しました。利用金額：{amount}円 利用店舗：{store} 利用日時：{date} {time}'),
+        ('PayPay残高チャージ完了',
+         'PayPay残高へのチャージが完了しました。チャージ額：{amount}円 方法：銀行口座 現在の残高：{amount2}円'),
+        ('PayPay送金完了', 'PayPayでの送金が完了しました。送金額：{amount}円 送金先：{name} 送金日時：{date}'),
+        ('ペイペイ利用確定通知', 'ペイペイ決済が確定いたしました。決済額：{amount}円 加盟店：{store} 決済時刻：{time}'),
+        ('PayPay利用明細（月次）', 'PayPay月次利用明細をお送りします。総利用額：{amount}円 利用回数：{count}回'),
+    ],
+    'debit': [
+        ('【デビットカード】ご利用のお知らせ(住信SBIネット銀行)',
+         '[氏名] さま デビットカードのご利用がありました。承認番号：{approval} 利用日時：{date} {time} '
+         '利用加盟店：{store} 引落通貨：JPY 引落金額：{amount}.00'),
+        ('デビットカード利用のお知らせ', 'Visaデビットのご利用を承りました。ご利用金額：{amount}円 ご利用先：{store} 承認番号：{approval}'),
+        ('【重要】デビットカード引落のご案内', 'デビットカードの引落が完了しました。引落日：{date} 引落金額：{amount}円 口座残高をご確認ください'),
+    ],
+    'paidy': [
+        ('ご利用確定のお知らせ',
+         'ペイディのご利用が確定しました。ご利用の確定 {date} {amount}円 {store} お支払いまでの流れ '
+         'すぐ払いを利用して、コンビニで当月中に支払うこともできます。'),
+        ('ペイディ ご請求金額のお知らせ', '{month}月分のご請求金額が確定しました。ご請求金額：{amount}円 お支払い期限：{date}'),
+        ('【ペイディ】お支払い期限が近づいています', 'ペイディのお支払い期限は{date}です。未払い金額：{amount}円 期限までにお支払いください'),
+    ],
+    'promotion': [
+        ('{shop} タイムセール 期間限定', '{shop}タイムセールが開催中です。最大{percent}%OFF！お得な商品をチェックしてください。'),
+        ('{shop} ポイント最大{points}倍キャンペーン', '{shop}でポイント最大{points}倍！今すぐチェック！エントリーは{date}まで'),
+        ('【{shop}】クーポン配布中', '{shop}で使える{amount}円クーポンをプレゼント！お得にお買い物しましょう。'),
+        ('{shop} ビッグセール {percent}%オフ', '{shop}年末ビッグセールで最大{percent}%オフ！限定商品をお見逃しなく。'),
+    ],
+    'alert': [
+        ('緊急 システム障害 {service}', '{service}で障害が発生しました。発生時刻：{date} {time} 影響範囲を調査中です。至急確認してください。'),
+        ('セキュリティアラート 不正アクセス', '{ip} からの不正アクセスの可能性があります。直ちにパスワードを変更してください。'),
+        ('バックアップ失敗通知', '{service}の自動バックアップが失敗しました。エラーコード：E{approval} 手動バックアップを実行してください。'),
+        ('【重要】{service} メンテナンスのお知らせ', '{date} {time}から{service}の緊急メンテナンスを実施します。サービス停止にご注意ください。'),
+    ],
+    'job': [
+        ('Indeed 新着求人 {position}', 'あなたに合う{position}の求人が見つかりました。{company} 年収{salary}万円〜 応募をご検討ください。'),
+        ('GitHub アクティビティサマリー', '今週のGitHubアクティビティサマリーです。コミット数：{count}件 プルリクエスト：{count2}件'),
+        ('Udemy 学習進捗 {course}コース', '{course}コースの学習進捗レポートです。進捗率：{percent}%'),
+        ('【スカウト】{company}より', '{company}の採用担当です。{position}のポジションについてお話しできませんか。'),
+    ],
+}
+
+# 本文を指定の長さまで延ばす文（カテゴリ毎 + 共通のフッター）
+FILLERS = {
+    'paypay': ['ご利用内容に心当たりがない場合は、PayPayアプリのヘルプからお問い合わせください。',
+               'PayPayポイントの付与は{date}頃を予定しています。'],
+    'debit': ['本メールは送信専用です。ご利用明細はWebサイトからご確認いただけます。',
+              '海外でのご利用の場合、為替レートにより金額が変動することがあります。'],
+    'paidy': ['ペイディアプリでご利用履歴とお支払い方法を確認できます。',
+              '口座振替をご利用の場合は、{date}に引き落とされます。'],
+    'promotion': ['対象商品は在庫がなくなり次第終了となります。', '※ポイント付与には上限があります。詳しくはキャンペーンページをご覧ください。'],
+    'alert': ['対応状況は障害管理チャンネルで随時共有します。', 'ログの保存期間は30日です。調査に必要なログは早めに退避してください。'],
+    'job': ['このメールは求人アラートの設定に基づいて送信されています。', '学習を継続すると修了証明書を取得できます。'],
+}
+FOOTERS = ['配信停止をご希望の方はこちら https://example.com/unsubscribe',
+           'Copyright © 2025 All Rights Reserved.',
+           'このメールに返信されても回答できませんのでご了承ください。',
+           'お問い合わせ窓口：平日 9:00〜18:00']
+
+class _TextExtractor(HTMLParser):
+    """HTMLメールのテキスト化（タグを除去し、ブロック要素の区切りを空白・改行にする。n8n の変換相当）"""
+
+    BLOCK_TAGS = {'p', 'div', 'br', 'tr', 'table', 'li', 'h1', 'h2', 'h3'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('style', 'script'):
+            self._skip += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n')
+        elif tag == 'td':
+            self.parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in ('style', 'script'):
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+    def handle_entityref(self, name):
+        self.parts.append(unescape(f'&{name};'))
+
+    def handle_charref(self, name):
+        self.parts.append(unescape(f'&#{name};'))
+
+def html_to_text(html: str) -> str:
+    """HTMLメールの本文をテキスト化"""
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    lines = (' '.join(line.split()) for line in ''.join(extractor.parts).splitlines())
+    return '\n'.join(line for line in lines if line)
+
+class MailboxGenerator:
+    """
+    シード固定の合成メール生成
+
+    Args:
+        seed: 乱数シード（同じシード・引数なら同じメールボックス）
+        body_chars: 本文の目標文字数（0ならテンプレートそのままの長さ）
+        html_ratio: HTMLメールをテキスト化した本文にする割合
+    """
+
+    def __init__(self, seed: int = 0, body_chars: int = 0, html_ratio: float = 0.2):
+        self.random = random.Random(seed)
+        self.body_chars = body_chars
+        self.html_ratio = html_ratio
+        self._count = 0
+
+    def _slots(self) -> Dict[str, object]:
+        r = self.random
+        month = r.randint(1, 12)
+        return {
+            'amount': f'{r.choice([r.randint(100, 999), r.randint(1000, 99999)]):,}',
+            'amount2': f'{r.randint(1000, 50000):,}',
+            'store': r.choice(STORES),
+            'name': r.choice(NAMES),
+            'shop': r.choice(SHOPS),
+            'service': r.choice(SERVICES),
+            'company': r.choice(COMPANIES),
+            'position': r.choice(POSITIONS),
+            'course': r.choice(COURSES),
+            'date': r.choice([f'2025年{month}月{r.randint(1, 28)}日', f'2025/{month:02d}/{r.randint(1, 28):02d}']),
+            'time': f'{r.randint(0, 23):02d}:{r.randint(0, 59):02d}',
+            'month': month,
+            'approval': f'{r.randint(100000, 999999)}',
+            'ip': f'{r.randint(1, 223)}.{r.randint(0, 255)}.{r.randint(0, 255)}.{r.randint(1, 254)}',
+            'percent': r.choice([10, 20, 30, 50, 70, 90]),
+            'points': r.choice([5, 10, 20, 44]),
+            'salary': r.choice([500, 600, 700, 800, 1000]),
+            'count': r.randint(1, 40),
+            'count2': r.randint(0, 10),
+        }
+
+    def _sentences(self, category: str, body: str, slots: Dict) -> List[str]:
+        """本文の文のリスト（目標文字数に達するまでカテゴリの文とフッターを追加）"""
+        fillers = [sentence.format(**slots) for sentence in FILLERS[category]] + FOOTERS
+        sentences = [body]
+        length = len(body)
+        while length < self.body_chars:
+            sentence = self.random.choice(fillers)
+            sentences.append(sentence)
+            length += len(sentence) + 1
+        return sentences
+
+    def _html_body(self, subject: str, sentences: List[str], slots: Dict) -> str:
+        """本文を HTML メール（表組み・スタイル・フッター付き）にしてからテキスト化"""
+        rows = ''.join(
+            f'<tr><td style="padding:4px;border:1px solid #ddd">{key}</td>'
+            f'<td style="padding:4px">{value}</td></tr>'
+            for key, value in (('金額', f"{slots['amount']}円"), ('日時', f"{slots['date']} {slots['time']}"))
+        )
+        html = (
+            '<html><head><style>body{font-family:sans-serif}td{font-size:14px}</style></head><body>'
+            f'<div class="header"><h1>{subject}</h1></div>'
+            + ''.join(f'<p>{sentence}&nbsp;</p>' for sentence in sentences) +
+            f'<table cellpadding="0" cellspacing="0">{rows}</table>'
+            '<div class="footer"><p>&copy; 2025 Example Inc.&nbsp;|&nbsp;'
+            '<a href="https://example.com/unsubscribe?id=12345">配信停止</a></p></div>'
+            '</body></html>'
+        )
+        return html_to_text(html)
+
+    def email(self, category: Optional[str] = None) -> Dict:
+        """メール1件（messageId, subject, body, label, category, html）"""
+        category = category or self.random.choice(CATEGORIES)
+        slots = self._slots()
+        subject_template, body_template = self.random.choice(TEMPLATES[category])
+        subject = subject_template.format(**slots)
+        body = body_template.format(**slots)
+        sentences = self._sentences(category, body, slots)
+
+        html = self.random.random() < self.html_ratio
+        if html:
+            # HTMLメールはヘッダー・表組み・フッターの分だけ目標文字数より長くなる
+            body = self._html_body(subject, sentences, slots)
+        else:
+            body = ' '.join(sentences)[:max(self.body_chars, len(body))]
+
+        self._count += 1
+        return {
+            'messageId': f'synthetic-{self._count:06d}',
+            'subject': subject,
+            'body': body,
+            'label': CATEGORY_LABELS[category],
+            'category': category,
+            'html': html
+        }
+
+def generate_mailbox(n: int, seed: int = 0, body_chars: int = 0, html_ratio: float = 0.2,
+                     categories: Optional[Sequence[str]] = None) -> List[Dict]:
+    """
+    合成メールボックスの生成
+
+    Args:
+        n: メール件数（カテゴリは均等に巡回するため、n >= カテゴリ数なら全カテゴリを含む）
+        seed: 乱数シード
+        body_chars: 本文の目標文字数（0ならテンプレートそのままの長さ）
+        html_ratio: HTMLメールをテキスト化した本文にする割合
+        categories: 生成するカテゴリ（既定は CATEGORIES 全て）
+    """
+    categories = list(categories or CATEGORIES)
+    unknown = set(categories) - set(CATEGORIES)
+    if unknown:
+        raise ValueError(f"Unknown categories: {sorted(unknown)}")
+
+    generator = MailboxGenerator(seed=seed, body_chars=body_chars, html_ratio=html_ratio)
+    return [generator.email(categories[i % len(categories)]) for i in range(n)]
+
+# 正規表現の最悪ケースを狙った本文（名前 → 繰り返す断片）
+ADVERSARIAL_FRAGMENTS = {
+    'digit_run': '1',           # 円・小数点が続かない長い数字列
+    'comma_groups': ',000',     # 円が続かない3桁区切りの列
+    'digit_yen': '1円',         # 円の直前の短い数字列の繰り返し
+    'yen_run': '円',
+    'symbol_run': '¥',
+    'symbol_groups': '¥1,',
+    'dash_run': '-',            # 区切り線
+    'letter_dash': 'a-',        # 数字を含まない英字・ハイフンの列
+}
+ADVERSARIAL_KINDS = tuple(ADVERSARIAL_FRAGMENTS)
+
+def adversarial_text(kind: str, length: int) -> str:
+    """
+    断片を length 文字まで繰り返した本文
+    文脈補完の前置チェック（金額・円・¥・小数点の有無）を全て通し、列の直後は一致しない文字で終わる
+    """
+    if kind not in ADVERSARIAL_FRAGMENTS:
+        raise ValueError(f"Unknown adversarial kind: {kind}")
+    fragment = ADVERSARIAL_FRAGMENTS[kind]
+    run = (fragment * (length // len(fragment) + 1))[:length]
+    return f"ご請求金額のお知らせ {run} x. 円 ¥"
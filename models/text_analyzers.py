@@ -0,0 +1,46 @@
+"""
+日本語向けTF-IDFアナライザー
+空白で区切られない日本語は token_pattern=r'(?u)\b\w+\b' では文節全体が1トークンになり、
+語彙が肥大化して max_features の上限で大半の情報が捨てられるため、文字n-gram・文字種境界分割を選択できるようにする
+"""
+
+import re
+from typing import Dict, List
+
+# 'word'   : 従来の token_pattern（各学習スクリプトの設定のまま）
+# 'char'   : 文字2-3gram（空白区切りの語内、char_wb）
+# 'script' : 漢字・ひらがな・カタカナ・英数字の文字種境界で分割した語の1-2gram
+ANALYZERS = ('word', 'char', 'script')
+
+_SCRIPT_TOKEN = re.compile(
+    r'[A-Za-z0-9_]+'                      # 英数字（特徴量マーカー PAYPAY_STRENGTH_3 などを含む）
+    r'|[Ａ-Ｚａ-ｚ０-９]+'                  # 全角英数字
+    r'|[一-鿿㐀-䶿々〆ヵヶ]+'  # 漢字
+    r'|[ぁ-ゟ]+'                  # ひらがな
+    r'|[゠-ヿ]+'                  # カタカナ（長音符を含む）
+    r'|[ｦ-ﾟ]+'                  # 半角カタカナ
+)
+
+def script_tokenize(text: str) -> List[str]:
+    """文字種の境界でテキストを分割（記号・空白は区切りとして捨てる）"""
+    return _SCRIPT_TOKEN.findall(text)
+
+def analyzer_params(analyzer: str, tfidf_params: Dict) -> Dict:
+    """
+    アナライザーに応じて TfidfVectorizer のパラメータを調整
+
+    Args:
+        analyzer: 'word' / 'char' / 'script'
+        tfidf_params: 学習スクリプトの TfidfVectorizer パラメータ（'word' の場合はそのまま使用）
+    """
+    params = dict(tfidf_params)
+    if analyzer == 'word':
+        return params
+    if analyzer == 'char':
+        params.pop('token_pattern', None)
+        params.update(analyzer='char_wb', ngram_range=(2, 3))
+        return params
+    if analyzer == 'script':
+        params.update(tokenizer=script_tokenize, token_pattern=None, ngram_range=(1, 2))
+        return params
+    raise ValueError(f"Unknown analyzer: {analyzer} (expected one of {ANALYZERS})")
@@ -4,95 +4,123 @@
 実運用データを活用し、支払いラベル偏重問題を修正
 """
 
-import pandas as pd
-import pickle
-import joblib
+import argparse
 import os
-import re
+import sys
+from collections import Counter
 from typing import List, Dict
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.svm import LinearSVC
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
-from sklearn.pipeline import make_pipeline
-from sklearn.calibration import CalibratedClassifierCV
 import numpy as np
+# pandas・scikit-learn・joblib は読み込み・学習・保存時のみ import する
+# （APIサーバーは特徴量関数だけを使うため、このモジュールの import で読み込まない）
 
-def create_balanced_features(text: str) -> str:
+# プロジェクトルートをパスに追加（models/ から直接実行した場合用）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.feature_spec import describe_features, render_signals
+from models.text_analyzers import ANALYZERS
+from models.serving_export import export_serving_artifact
+from models.keyword_matcher import compile_keyword_tables
+from models.linear_patterns import compile_pattern
+
+# === 特徴量エンジニアリング用キーワード表（モジュール読み込み時に1回だけコンパイル） ===
+# 支払い関係特徴量（適度に調整）
+PAYMENT_KEYWORDS = [
+    'paypay', 'ペイペイ', '支払い', '決済', '料金', '引き落とし',
+    'クレジットカード', 'デビットカード', 'ペイディ', 'paidy'
+]
+
+AMOUNT_PATTERNS = [r'\d{1,3}(?:,\d{3})*円', r'¥\d{1,3}(?:,\d{3})*', r'\d+円']
+
+# 重要メール特徴量（強化）
+IMPORTANT_KEYWORDS = [
+    '緊急', '重要', '障害', 'システム', 'メンテナンス', 'エラー',
+    '停止', 'サーバー', 'ダウン', '復旧', '影響', 'urgent', 'critical'
+]
+
+# プロモーション特徴量（強化）
+PROMO_KEYWORDS = [
+    'セール', 'キャンペーン', 'ポイント', '割引', 'タイムセール',
+    '限定', 'お得', 'プロモーション', 'クーポン', 'amazon', '楽天',
+    'sale', 'campaign', 'discount', 'special'
+]
+
+# 仕事・学習特徴量（強化）
+WORK_KEYWORDS = [
+    '求人', 'エンジニア', 'プログラミング', 'github', 'indeed',
+    '転職', 'キャリア', '研修', '学習', 'コミット', 'pull request',
+    'job', 'career', 'learning', 'training', 'education'
+]
+
+# 文脈パターン（全カテゴリ共通）
+COMPLETION_WORDS = ['完了', 'しました', '終了']
+NOTIFICATION_WORDS = ['お知らせ', '通知', 'ご案内']
+CONFIRMATION_WORDS = ['確認', 'チェック', '確定']
+
+_BALANCED_MATCHER = compile_keyword_tables(
+    PAYMENT_KEYWORDS, IMPORTANT_KEYWORDS, PROMO_KEYWORDS, WORK_KEYWORDS,
+    COMPLETION_WORDS, NOTIFICATION_WORDS, CONFIRMATION_WORDS
+)
+
+def balanced_signals(text: str) -> Dict[str, int]:
     """
     バランス調整された特徴量エンジニアリング
     支払いラベルの偏重を防ぐため、他カテゴリの特徴量も強化
     """
-    features = []
+    signals = Counter()
     text_lower = text.lower()
-    
-    # 基本テキスト
-    features.append(text)
+    hits = _BALANCED_MATCHER.scan(text_lower)
     
     # === 支払い関係特徴量（適度に調整）===
-    payment_keywords = [
-        'paypay', 'ペイペイ', '支払い', '決済', '料金', '引き落とし',
-        'クレジットカード', 'デビットカード', 'ペイディ', 'paidy'
-    ]
-    payment_count = sum(1 for keyword in payment_keywords if keyword in text_lower)
+    payment_count = hits.count_present(PAYMENT_KEYWORDS)
     if payment_count > 0:
-        features.append(f"PAYMENT_DETECTED_{min(payment_count, 3)}")
+        signals[f"PAYMENT_DETECTED_{min(payment_count, 3)}"] += 1
     
     # 金額パターン
-    amount_patterns = [r'\d{1,3}(?:,\d{3})*円', r'¥\d{1,3}(?:,\d{3})*', r'\d+円']
     total_amounts = 0
-    for pattern in amount_patterns:
-        matches = re.findall(pattern, text)
+    for pattern in AMOUNT_PATTERNS:
+        matches = compile_pattern(pattern).findall(text)
         total_amounts += len(matches)
     
     if total_amounts > 0:
-        features.append(f"AMOUNT_FOUND_{min(total_amounts, 2)}")
+        signals[f"AMOUNT_FOUND_{min(total_amounts, 2)}"] += 1
     
     # === 重要メール特徴量（強化）===
-    important_keywords = [
-        '緊急', '重要', '障害', 'システム', 'メンテナンス', 'エラー',
-        '停止', 'サーバー', 'ダウン', '復旧', '影響', 'urgent', 'critical'
-    ]
-    important_count = sum(1 for keyword in important_keywords if keyword in text_lower)
+    important_count = hits.count_present(IMPORTANT_KEYWORDS)
     if important_count > 0:
-        features.append(f"IMPORTANT_DETECTED_{min(important_count, 3)}")
+        signals[f"IMPORTANT_DETECTED_{min(important_count, 3)}"] += 1
     
     # === プロモーション特徴量（強化）===
-    promo_keywords = [
-        'セール', 'キャンペーン', 'ポイント', '割引', 'タイムセール',
-        '限定', 'お得', 'プロモーション', 'クーポン', 'amazon', '楽天',
-        'sale', 'campaign', 'discount', 'special'
-    ]
-    promo_count = sum(1 for keyword in promo_keywords if keyword in text_lower)
+    promo_count = hits.count_present(PROMO_KEYWORDS)
     if promo_count > 0:
-        features.append(f"PROMO_DETECTED_{min(promo_count, 3)}")
+        signals[f"PROMO_DETECTED_{min(promo_count, 3)}"] += 1
     
     # === 仕事・学習特徴量（強化）===
-    work_keywords = [
-        '求人', 'エンジニア', 'プログラミング', 'github', 'indeed',
-        '転職', 'キャリア', '研修', '学習', 'コミット', 'pull request',
-        'job', 'career', 'learning', 'training', 'education'
-    ]
-    work_count = sum(1 for keyword in work_keywords if keyword in text_lower)
+    work_count = hits.count_present(WORK_KEYWORDS)
     if work_count > 0:
-        features.append(f"WORK_DETECTED_{min(work_count, 3)}")
+        signals[f"WORK_DETECTED_{min(work_count, 3)}"] += 1
     
     # === 文脈パターン（全カテゴリ共通）===
-    if any(word in text_lower for word in ['完了', 'しました', '終了']):
-        features.append("COMPLETION_CONTEXT")
+    if hits.any(COMPLETION_WORDS):
+        signals["COMPLETION_CONTEXT"] += 1
     
-    if any(word in text_lower for word in ['お知らせ', '通知', 'ご案内']):
-        features.append("NOTIFICATION_CONTEXT")
+    if hits.any(NOTIFICATION_WORDS):
+        signals["NOTIFICATION_CONTEXT"] += 1
     
-    if any(word in text_lower for word in ['確認', 'チェック', '確定']):
-        features.append("CONFIRMATION_CONTEXT")
+    if hits.any(CONFIRMATION_WORDS):
+        signals["CONFIRMATION_CONTEXT"] += 1
     
-    return ' '.join(features)
+    return dict(signals)
+
+def create_balanced_features(text: str) -> str:
+    """テキストに balanced_signals のマーカーを付加（'text' 方式の入力）"""
+    return render_signals(text, balanced_signals(text))
 
 def load_actual_gmail_data() -> List[Dict[str, str]]:
     """
     実際のGmailログデータから学習用データを抽出
     """
+    import pandas as pd
+    
     training_data = []
     
     # CSV読み込み
@@ -196,10 +224,23 @@ def load_actual_gmail_data() -> List[Dict[str, str]]:
     print(f"Total training data: {len(training_data)} samples")
     return training_data
 
-def train_balanced_model():
+def train_balanced_model(feature_mode: str = 'text', analyzer: str = 'word'):
     """
     バランス調整されたモデルの学習
+
+    Args:
+        feature_mode: 'text'（特徴量文字列をTF-IDF）/ 'sparse'（生テキストTF-IDF + 特徴量の疎な数値列）
+        analyzer: TF-IDFのアナライザー（'word' / 'char' / 'script'、models.text_analyzers 参照）
     """
+    import joblib
+    import pandas as pd
+    from sklearn.svm import LinearSVC
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
+    from sklearn.pipeline import make_pipeline
+    from sklearn.calibration import CalibratedClassifierCV
+    from models.sparse_features import build_vectorizer, prepare_texts
+    
     print("=== バランス調整モデル学習開始 ===\n")
     
     # 実データの読み込み
@@ -220,10 +261,10 @@ def train_balanced_model():
     print(f"Class distribution:\n{df['label'].value_counts()}\n")
     
     # バランス調整された特徴量エンジニアリング
-    print("Applying balanced feature engineering...")
-    df['enhanced_text'] = df.apply(
-        lambda row: create_balanced_features(f"{row['subject']} {row['body']}"), 
-        axis=1
+    print(f"Applying balanced feature engineering (feature mode: {feature_mode})...")
+    df['enhanced_text'] = prepare_texts(
+        feature_mode, create_balanced_features,
+        (f"{subject} {body}" for subject, body in zip(df['subject'], df['body']))
     )
     
     # データ分割
@@ -241,7 +282,8 @@ def train_balanced_model():
     
     # TF-IDF設定（バランス調整版）
     print("Setting up balanced TF-IDF...")
-    vectorizer = TfidfVectorizer(
+    vectorizer = build_vectorizer(
+        feature_mode, 'models.train_balanced_model:create_balanced_features', analyzer=analyzer,
         max_features=2000,              # 特徴量数を適度に制限
         ngram_range=(1, 2),             # 2-gramまで
         min_df=1,                       # 最小文書頻度
@@ -297,16 +339,22 @@ def train_balanced_model():
         'feature_names': vectorizer.get_feature_names_out(),
         'classes': model.classes_,
         'accuracy': accuracy,
-        'training_size': len(df)
+        'training_size': len(df),
+        'analyzer': analyzer,
+        # 特徴量仕様
+        **describe_features('models.train_balanced_model:create_balanced_features', feature_mode=feature_mode)
     }
     
     joblib.dump(save_data, model_path)
     print(f"\nBalanced model saved: {model_path}")
+    export_serving_artifact(model_path)
     
     return calibrated_pipeline, save_data
 
 def test_balanced_classification(pipeline, save_data):
     """バランス調整モデルのテスト"""
+    from models.sparse_features import prepare_texts
+    
     print("\n=== バランス調整モデルテスト ===")
     
     test_cases = [
@@ -318,7 +366,7 @@ def test_balanced_classification(pipeline, save_data):
     ]
     
     for i, (subject, body) in enumerate(test_cases, 1):
-        test_text = create_balanced_features(f"{subject} {body}")
+        test_text = prepare_texts(save_data['feature_mode'], create_balanced_features, [f"{subject} {body}"])[0]
         prediction = pipeline.predict([test_text])[0]
         probabilities = pipeline.predict_proba([test_text])[0]
         confidence = max(probabilities)
@@ -333,8 +381,17 @@ def test_balanced_classification(pipeline, save_data):
         print()
 
 if __name__ == "__main__":
+    from models.sparse_features import FEATURE_MODES
+    
+    parser = argparse.ArgumentParser(description='バランス調整モデル学習')
+    parser.add_argument('--feature-mode', choices=FEATURE_MODES, default='text',
+                        help='特徴量の入力方式（sparse: 生テキストTF-IDF + 特徴量の疎な数値列）')
+    parser.add_argument('--analyzer', choices=ANALYZERS, default='word',
+                        help='TF-IDFのアナライザー（char: 文字2-3gram, script: 文字種境界分割）')
+    args = parser.parse_args()
+    
     # バランス調整モデル学習実行
-    pipeline, save_data = train_balanced_model()
+    pipeline, save_data = train_balanced_model(feature_mode=args.feature_mode, analyzer=args.analyzer)
     
     if pipeline is not None:
         # バランス調整モデルテスト
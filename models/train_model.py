@@ -4,17 +4,25 @@ Gmail分類モデル学習スクリプト
 CSVデータから機械学習モデルを作成
 """
 
-import pandas as pd
-import pickle
+import argparse
 import os
-import re
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.svm import LinearSVC
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, accuracy_score
+import sys
+from collections import Counter
+from typing import Dict
+# pandas・scikit-learn・pickle は読み込み・学習・保存時のみ import する
+# （APIサーバーは特徴量関数だけを使うため、このモジュールの import で読み込まない）
+
+# プロジェクトルートをパスに追加（models/ から直接実行した場合用）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.feature_spec import render_signals
+from models.text_analyzers import ANALYZERS, analyzer_params
+from models.linear_patterns import compile_pattern
 
 def load_training_data(csv_path="../data/train_data.csv"):
     """学習データの読み込み"""
+    import pandas as pd
+    
     if not os.path.exists(csv_path):
         print(f"学習データが見つかりません: {csv_path}")
         print("サンプルデータを作成します...")
@@ -25,6 +33,8 @@ def load_training_data(csv_path="../data/train_data.csv"):
 
 def create_sample_data():
     """サンプル学習データの作成"""
+    import pandas as pd
+    
     sample_data = [
         {
             "subject": "支払い期限のお知らせ",
@@ -70,24 +80,21 @@ def create_sample_data():
     
     return pd.DataFrame(sample_data)
 
-def create_enhanced_features(text):
+def enhanced_signals(text: str) -> Dict[str, int]:
     """拡張特徴量エンジニアリング"""
-    features = []
-    
-    # 基本テキスト
-    features.append(text)
+    signals = Counter()
     
     # PayPay関連特徴量（重要！）
     paypay_keywords = ['PayPay', 'paypay', 'ペイペイ', 'ペイ']
     paypay_score = sum(1 for keyword in paypay_keywords if keyword in text)
     if paypay_score > 0:
-        features.append(f"PAYPAY_DETECTED_{paypay_score}")
+        signals[f"PAYPAY_DETECTED_{paypay_score}"] += 1
     
     # 決済サービス特徴量
     payment_services = ['ペイディ', 'Paidy', 'LINE Pay', 'Apple Pay', 'Google Pay']
     for service in payment_services:
         if service in text:
-            features.append(f"PAYMENT_SERVICE_{service.replace(' ', '_')}")
+            signals[f"PAYMENT_SERVICE_{service.replace(' ', '_')}"] += 1
     
     # 金額パターン特徴量
     amount_patterns = [
@@ -98,26 +105,32 @@ def create_enhanced_features(text):
     ]
     
     for pattern in amount_patterns:
-        matches = re.findall(pattern, text)
+        matches = compile_pattern(pattern).findall(text)
         if matches:
-            features.append(f"AMOUNT_PATTERN_{len(matches)}")
+            signals[f"AMOUNT_PATTERN_{len(matches)}"] += 1
     
     # カード系特徴量
     card_keywords = ['デビットカード', 'クレジットカード', 'カード', 'VISA', 'MasterCard', 'JCB']
     for keyword in card_keywords:
         if keyword in text:
-            features.append(f"CARD_{keyword}")
+            signals[f"CARD_{keyword}"] += 1
     
     # 引き落とし・振替特徴量
     payment_actions = ['引き落とし', '引落', '振替', '振込', '決済', '支払い', 'チャージ']
     for action in payment_actions:
         if action in text:
-            features.append(f"PAYMENT_ACTION_{action}")
+            signals[f"PAYMENT_ACTION_{action}"] += 1
     
-    return ' '.join(features)
+    return dict(signals)
+
+def create_enhanced_features(text: str) -> str:
+    """テキストに enhanced_signals のマーカーを付加（'text' 方式の入力）"""
+    return render_signals(text, enhanced_signals(text))
 
 def create_extended_training_data():
     """拡張版学習データの作成（Gmail実データ含む）"""
+    import pandas as pd
+    
     extended_data = [
         # 実際のGmail分析結果を追加（支払い関係強化）
         {
@@ -198,8 +211,13 @@ def create_extended_training_data():
     
     return pd.DataFrame(extended_data)
 
-def train_model(df):
-    """拡張版モデルの学習（特徴量エンジニアリング適用）"""
+def train_model(df, analyzer='word'):
+    """拡張版モデルの学習（特徴量エンジニアリング適用、analyzer は models.text_analyzers 参照）"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.svm import LinearSVC
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report, accuracy_score
+    
     print("拡張版モデル学習を開始します...")
     
     # 特徴量エンジニアリング適用
@@ -225,14 +243,14 @@ def train_model(df):
         )
     
     # 拡張TF-IDF ベクトル化（PayPay問題に対応）
-    vectorizer = TfidfVectorizer(
+    vectorizer = TfidfVectorizer(**analyzer_params(analyzer, dict(
         max_features=3000,      # 特徴量数を増加
         ngram_range=(1, 2),     # 1-gramと2-gramを使用
         min_df=1,               # 最小文書頻度を下げて細かい特徴も捉える
         max_df=0.95,            # 最大文書頻度
         sublinear_tf=True,      # TF値の対数スケーリング
         stop_words=None         # 日本語対応のため
-    )
+    )))
     
     X_train_vec = vectorizer.fit_transform(X_train)
     X_test_vec = vectorizer.transform(X_test)
@@ -281,12 +299,19 @@ def train_extended_model():
 
 def save_model(vectorizer, model, model_path="model.pkl"):
     """モデルの保存"""
+    import pickle
+    
     with open(model_path, "wb") as f:
         pickle.dump((vectorizer, model), f)
     print(f"モデルを保存しました: {model_path}")
 
 def main():
     """メイン実行関数"""
+    parser = argparse.ArgumentParser(description='Gmail分類モデル学習')
+    parser.add_argument('--analyzer', choices=ANALYZERS, default='word',
+                        help='TF-IDFのアナライザー（char: 文字2-3gram, script: 文字種境界分割）')
+    args = parser.parse_args()
+    
     print("=== Gmail分類モデル学習 ===")
     
     # 拡張版データで学習（デフォルト動作を変更）
@@ -294,7 +319,7 @@ def main():
     df = create_extended_training_data()
     
     # モデル学習
-    vectorizer, model = train_model(df)
+    vectorizer, model = train_model(df, analyzer=args.analyzer)
     
     # モデル保存
     save_model(vectorizer, model)
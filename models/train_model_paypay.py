@@ -4,16 +4,24 @@ PayPay特化Gmail分類モデル学習スクリプト
 統合ガイド2の高度特徴量エンジニアリングを適用
 """
 
+import argparse
 import pandas as pd
 import pickle
 import os
 import re
+import sys
 from typing import List, Dict
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.svm import LinearSVC
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score
 
+# プロジェクトルートをパスに追加（models/ から直接実行した場合用）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.text_analyzers import ANALYZERS, analyzer_params
+from models.linear_patterns import compile_pattern
+
 def create_paypay_specialized_features(text: str) -> str:
     """
     PayPay分類問題に特化した拡張特徴量エンジニアリング（統合ガイド2版）
@@ -77,7 +85,7 @@ def create_paypay_specialized_features(text: str) -> str:
     
     total_amounts = 0
     for pattern_name, pattern in amount_patterns.items():
-        matches = re.findall(pattern, text)
+        matches = compile_pattern(pattern).findall(text)
         if matches:
             total_amounts += len(matches)
             features.append(f"AMOUNT_{pattern_name.upper()}_{len(matches)}")
@@ -230,9 +238,12 @@ def create_all_training_data() -> pd.DataFrame:
     all_data = gmail_data + paypay_data
     return pd.DataFrame(all_data)
 
-def train_paypay_specialized_model():
+def train_paypay_specialized_model(analyzer: str = 'word'):
     """
     PayPay特化拡張版モデルの学習（統合ガイド2版）
+
+    Args:
+        analyzer: TF-IDFのアナライザー（'word' / 'char' / 'script'、models.text_analyzers 参照）
     """
     print("=== PayPay特化モデル学習開始（統合ガイド2版）===\n")
     
@@ -261,7 +272,7 @@ def train_paypay_specialized_model():
     
     # PayPay特化TF-IDF ベクトル化設定
     print("PayPay特化TF-IDFパラメータを適用...")
-    vectorizer = TfidfVectorizer(
+    vectorizer = TfidfVectorizer(**analyzer_params(analyzer, dict(
         max_features=5000,              # 特徴量数をさらに増加
         ngram_range=(1, 3),             # 3-gramまで拡張
         min_df=1,                       # 最小文書頻度
@@ -270,7 +281,7 @@ def train_paypay_specialized_model():
         stop_words=None,                # 日本語対応のためストップワード無効
         token_pattern=r'(?u)\b\w+\b|[A-Z_]+\d*',  # 特徴量トークンも認識
         lowercase=False                 # 大文字小文字を区別（PayPay vs paypay）
-    )
+    )))
     
     X_train_vec = vectorizer.fit_transform(X_train)
     X_test_vec = vectorizer.transform(X_test)
@@ -353,8 +364,13 @@ def test_paypay_classification(vectorizer, model):
         print()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='PayPay特化モデル学習')
+    parser.add_argument('--analyzer', choices=ANALYZERS, default='word',
+                        help='TF-IDFのアナライザー（char: 文字2-3gram, script: 文字種境界分割）')
+    args = parser.parse_args()
+    
     # PayPay特化モデル学習実行
-    vectorizer, model = train_paypay_specialized_model()
+    vectorizer, model = train_paypay_specialized_model(analyzer=args.analyzer)
     
     # PayPay分類テスト
     test_paypay_classification(vectorizer, model)
\ No newline at end of file
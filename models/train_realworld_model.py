@@ -4,24 +4,30 @@
 retraining_candidates_sheet.csvとgmail_log_sheet.csvの実データを活用
 """
 
-import pandas as pd
-import pickle
-import joblib
+import argparse
 import os
-import re
+import sys
+from collections import Counter
 from typing import List, Dict, Tuple
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.svm import LinearSVC
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
-from sklearn.pipeline import make_pipeline
-from sklearn.calibration import CalibratedClassifierCV
 import numpy as np
+# pandas・scikit-learn・joblib は読み込み・学習・保存時のみ import する
+# （APIサーバーは特徴量関数だけを使うため、このモジュールの import で読み込まない）
+
+# プロジェクトルートをパスに追加（models/ から直接実行した場合用）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.feature_spec import describe_features, render_signals
+from models.text_analyzers import ANALYZERS
+from models.serving_export import export_serving_artifact
+from models.keyword_matcher import compile_keyword_tables
+from models.linear_patterns import compile_pattern
 
 def analyze_misclassified_data():
     """
     実運用データの分類エラーを分析し、正しいラベルを推定
     """
+    import pandas as pd
+    
     print("=== 実運用データ分析開始 ===\n")
     
     # 実運用データ読み込み
@@ -193,89 +199,111 @@ def predict_correct_label(subject: str, manual_corrections: Dict[str, str]) -> s
         # デフォルトは重要（要確認）
         return '重要'
 
-def create_improved_features(text: str) -> str:
+# === 特徴量エンジニアリング用キーワード表（モジュール読み込み時に1回だけコンパイル） ===
+# より精密な支払い関係特徴量
+PAYMENT_PATTERNS = {
+    'paypay_specific': ['paypay', 'ペイペイ', 'paypay決済', 'paypay利用'],
+    'card_payment': ['デビットカード', 'クレジットカード', 'カード利用', 'ご利用'],
+    'payment_services': ['ペイディ', 'paidy', 'メルペイ', '楽天ペイ'],
+    'payment_actions': ['支払い', '決済', '引き落とし', '料金', '請求']
+}
+
+# システム・重要関連特徴量強化
+IMPORTANT_PATTERNS = {
+    'system_issues': ['システム', '障害', 'エラー', 'ダウン', '復旧'],
+    'security': ['セキュリティ', 'ログイン', 'パスワード', '不審', 'アラート'],
+    'urgent': ['緊急', '重要', '至急', 'urgent', 'critical'],
+    'maintenance': ['メンテナンス', '停止', '作業', '影響']
+}
+
+# プロモーション特徴量精密化
+PROMO_PATTERNS = {
+    'sales': ['セール', 'タイムセール', '特価', '割引'],
+    'campaigns': ['キャンペーン', 'ポイント', 'マラソン', 'フェア'],
+    'stores': ['amazon', '楽天', 'アマゾン'],
+    'offers': ['お得', '限定', '特別', 'プロモーション']
+}
+
+# 仕事・学習特徴量強化
+WORK_PATTERNS = {
+    'jobs': ['求人', '転職', '募集', 'エンジニア'],
+    'tech': ['github', 'プログラミング', 'python', 'javascript'],
+    'learning': ['学習', '研修', '勉強会', '講座'],
+    'career': ['キャリア', 'スキル', '経験', '年収']
+}
+
+AMOUNT_PATTERNS = [
+    r'\d{1,3}(?:,\d{3})*円',    # 1,000円
+    r'¥\d{1,3}(?:,\d{3})*',    # ¥1,000
+    r'\d+円'                    # 1000円
+]
+
+_IMPROVED_MATCHER = compile_keyword_tables(PAYMENT_PATTERNS, IMPORTANT_PATTERNS, PROMO_PATTERNS, WORK_PATTERNS)
+
+def improved_signals(text: str) -> Dict[str, int]:
     """
     実運用データに基づく改良された特徴量エンジニアリング
     """
-    features = []
+    signals = Counter()
     text_lower = text.lower()
-    
-    # 基本テキスト
-    features.append(text)
+    hits = _IMPROVED_MATCHER.scan(text_lower)
     
     # === より精密な支払い関係特徴量 ===
-    payment_patterns = {
-        'paypay_specific': ['paypay', 'ペイペイ', 'paypay決済', 'paypay利用'],
-        'card_payment': ['デビットカード', 'クレジットカード', 'カード利用', 'ご利用'],
-        'payment_services': ['ペイディ', 'paidy', 'メルペイ', '楽天ペイ'],
-        'payment_actions': ['支払い', '決済', '引き落とし', '料金', '請求']
-    }
-    
-    for pattern_type, keywords in payment_patterns.items():
-        count = sum(1 for keyword in keywords if keyword in text_lower)
+    for pattern_type, keywords in PAYMENT_PATTERNS.items():
+        count = hits.count_present(keywords)
         if count > 0:
-            features.append(f"PAYMENT_{pattern_type.upper()}_{count}")
+            signals[f"PAYMENT_{pattern_type.upper()}_{count}"] += 1
     
     # === システム・重要関連特徴量強化 ===
-    important_patterns = {
-        'system_issues': ['システム', '障害', 'エラー', 'ダウン', '復旧'],
-        'security': ['セキュリティ', 'ログイン', 'パスワード', '不審', 'アラート'],
-        'urgent': ['緊急', '重要', '至急', 'urgent', 'critical'],
-        'maintenance': ['メンテナンス', '停止', '作業', '影響']
-    }
-    
-    for pattern_type, keywords in important_patterns.items():
-        count = sum(1 for keyword in keywords if keyword in text_lower)
+    for pattern_type, keywords in IMPORTANT_PATTERNS.items():
+        count = hits.count_present(keywords)
         if count > 0:
-            features.append(f"IMPORTANT_{pattern_type.upper()}_{count}")
+            signals[f"IMPORTANT_{pattern_type.upper()}_{count}"] += 1
     
     # === プロモーション特徴量精密化 ===
-    promo_patterns = {
-        'sales': ['セール', 'タイムセール', '特価', '割引'],
-        'campaigns': ['キャンペーン', 'ポイント', 'マラソン', 'フェア'],
-        'stores': ['amazon', '楽天', 'アマゾン'],
-        'offers': ['お得', '限定', '特別', 'プロモーション']
-    }
-    
-    for pattern_type, keywords in promo_patterns.items():
-        count = sum(1 for keyword in keywords if keyword in text_lower)
+    for pattern_type, keywords in PROMO_PATTERNS.items():
+        count = hits.count_present(keywords)
         if count > 0:
-            features.append(f"PROMO_{pattern_type.upper()}_{count}")
+            signals[f"PROMO_{pattern_type.upper()}_{count}"] += 1
     
     # === 仕事・学習特徴量強化 ===
-    work_patterns = {
-        'jobs': ['求人', '転職', '募集', 'エンジニア'],
-        'tech': ['github', 'プログラミング', 'python', 'javascript'],
-        'learning': ['学習', '研修', '勉強会', '講座'],
-        'career': ['キャリア', 'スキル', '経験', '年収']
-    }
-    
-    for pattern_type, keywords in work_patterns.items():
-        count = sum(1 for keyword in keywords if keyword in text_lower)
+    for pattern_type, keywords in WORK_PATTERNS.items():
+        count = hits.count_present(keywords)
         if count > 0:
-            features.append(f"WORK_{pattern_type.upper()}_{count}")
+            signals[f"WORK_{pattern_type.upper()}_{count}"] += 1
     
     # === 金額パターン（精密化） ===
-    amount_patterns = [
-        r'\d{1,3}(?:,\d{3})*円',    # 1,000円
-        r'¥\d{1,3}(?:,\d{3})*',    # ¥1,000
-        r'\d+円'                    # 1000円
-    ]
-    
     total_amounts = 0
-    for pattern in amount_patterns:
-        matches = re.findall(pattern, text)
+    for pattern in AMOUNT_PATTERNS:
+        matches = compile_pattern(pattern).findall(text)
         total_amounts += len(matches)
     
     if total_amounts > 0:
-        features.append(f"AMOUNT_DETECTED_{min(total_amounts, 3)}")
+        signals[f"AMOUNT_DETECTED_{min(total_amounts, 3)}"] += 1
     
-    return ' '.join(features)
+    return dict(signals)
 
-def train_improved_model():
+def create_improved_features(text: str) -> str:
+    """テキストに improved_signals のマーカーを付加（'text' 方式の入力）"""
+    return render_signals(text, improved_signals(text))
+
+def train_improved_model(feature_mode: str = 'text', analyzer: str = 'word'):
     """
     実運用データに基づく改良モデルの学習
+
+    Args:
+        feature_mode: 'text'（特徴量文字列をTF-IDF）/ 'sparse'（生テキストTF-IDF + 特徴量の疎な数値列）
+        analyzer: TF-IDFのアナライザー（'word' / 'char' / 'script'、models.text_analyzers 参照）
     """
+    import joblib
+    import pandas as pd
+    from sklearn.svm import LinearSVC
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
+    from sklearn.pipeline import make_pipeline
+    from sklearn.calibration import CalibratedClassifierCV
+    from models.sparse_features import build_vectorizer, prepare_texts
+    
     print("=== 実運用改良モデル学習開始 ===\n")
     
     # 補正データの取得
@@ -300,10 +328,10 @@ def train_improved_model():
     print()
     
     # 改良された特徴量エンジニアリング
-    print("Applying improved feature engineering...")
-    df['enhanced_text'] = df.apply(
-        lambda row: create_improved_features(f"{row['subject']} {row['body']}"), 
-        axis=1
+    print(f"Applying improved feature engineering (feature mode: {feature_mode})...")
+    df['enhanced_text'] = prepare_texts(
+        feature_mode, create_improved_features,
+        (f"{subject} {body}" for subject, body in zip(df['subject'], df['body']))
     )
     
     # データ分割
@@ -322,7 +350,8 @@ def train_improved_model():
     
     # 改良されたTF-IDF設定
     print("Setting up improved TF-IDF...")
-    vectorizer = TfidfVectorizer(
+    vectorizer = build_vectorizer(
+        feature_mode, 'models.train_realworld_model:create_improved_features', analyzer=analyzer,
         max_features=3000,              # 特徴量数を適度に増加
         ngram_range=(1, 2),             # 2-gramまで
         min_df=1,                       # 最小文書頻度
@@ -386,16 +415,22 @@ def train_improved_model():
         'classes': model.classes_,
         'accuracy': accuracy,
         'training_size': len(df),
-        'data_sources': df['source'].value_counts().to_dict()
+        'data_sources': df['source'].value_counts().to_dict(),
+        'analyzer': analyzer,
+        # 特徴量仕様
+        **describe_features('models.train_realworld_model:create_improved_features', feature_mode=feature_mode)
     }
     
     joblib.dump(save_data, model_path)
     print(f"\nImproved model saved: {model_path}")
+    export_serving_artifact(model_path)
     
     return calibrated_pipeline, save_data
 
 def test_improved_model(pipeline, save_data):
     """改良モデルのテスト"""
+    from models.sparse_features import prepare_texts
+    
     print("\n=== 実運用改良モデルテスト ===")
     
     test_cases = [
@@ -408,7 +443,7 @@ def test_improved_model(pipeline, save_data):
     ]
     
     for i, (subject, body) in enumerate(test_cases, 1):
-        test_text = create_improved_features(f"{subject} {body}")
+        test_text = prepare_texts(save_data['feature_mode'], create_improved_features, [f"{subject} {body}"])[0]
         prediction = pipeline.predict([test_text])[0]
         
         # 決定関数の値を使用（LinearSVCの場合）
@@ -435,8 +470,17 @@ def test_improved_model(pipeline, save_data):
         print()
 
 if __name__ == "__main__":
+    from models.sparse_features import FEATURE_MODES
+    
+    parser = argparse.ArgumentParser(description='実運用改良モデル学習')
+    parser.add_argument('--feature-mode', choices=FEATURE_MODES, default='text',
+                        help='特徴量の入力方式（sparse: 生テキストTF-IDF + 特徴量の疎な数値列）')
+    parser.add_argument('--analyzer', choices=ANALYZERS, default='word',
+                        help='TF-IDFのアナライザー（char: 文字2-3gram, script: 文字種境界分割）')
+    args = parser.parse_args()
+    
     # 実運用改良モデル学習実行
-    pipeline, save_data = train_improved_model()
+    pipeline, save_data = train_improved_model(feature_mode=args.feature_mode, analyzer=args.analyzer)
     
     if pipeline is not None:
         # 改良モデルテスト
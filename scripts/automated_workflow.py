@@ -239,9 +239,9 @@ def auto_workflow():
     if not run_model_update():
         return False
     
-    # ステップ4: API更新
+    # ステップ4: API更新（失敗してもAPIサーバーのモデルファイル監視が置き換えを検知して再読み込みする）
     if not reload_api_model():
-        return False
+        print("   APIサーバーのモデルファイル監視による自動再読み込みを待ちます")
     
     # ステップ5: 状態確認
     print_workflow_status()
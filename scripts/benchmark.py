@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+ベンチマークスイート
+シード固定の合成メールボックス（models.synthetic_mailbox）で、特徴量関数毎・文脈補完・単体分類・バッチ分類・
+モデル読み込み・学習のスループットとレイテンシ（p50 / p99）を計測し、実行毎に比較できるJSONで保存する
+
+    python scripts/benchmark.py --emails 1000 --body-chars 2000 --json benchmark.json
+    python scripts/benchmark.py --json new.json --compare benchmark.json
+    python scripts/benchmark.py --only adversarial --adversarial-lengths 1000,10000,100000
+
+adversarial は正規表現の最悪ケースの本文（models.synthetic_mailbox.adversarial_text）を長さを変えて
+特徴量関数・文脈補完の抽出・テンプレート指紋のマスクに渡し、1KBあたりの所要時間と入力長に対する増え方の指数
+（線形なら1以下、2乗なら約2）を計測する
+
+分類は Flask アプリケーション（結果キャッシュ・テンプレート高速経路は無効）に対して行い、APIサーバーと同じく
+models/ のモデル（なければフォールバック）を使う。読み込み・学習は合成メールボックスで学習した一時モデルで計測する
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from importlib import metadata
+from typing import Callable, Dict, List, Optional, Sequence
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+
+from models.feature_spec import FEATURE_VERSIONS, resolve_feature_function
+from models.synthetic_mailbox import ADVERSARIAL_KINDS, CATEGORIES, adversarial_text, generate_mailbox
+
+# 結果JSONの形式（項目を変えたら上げる）
+SCHEMA_VERSION = 1
+
+BENCHMARKS = ('features', 'enricher', 'classify', 'batch', 'load', 'train', 'adversarial')
+
+# これを超える増え方の指数は入力長の2乗に近いとして警告する
+SUPERLINEAR_EXPONENT = 1.5
+
+def summarize(latencies_ns: Sequence[int], items: Optional[int] = None) -> Dict:
+    """
+    レイテンシの集計
+
+    Args:
+        latencies_ns: 1回毎の所要時間（ナノ秒）
+        items: 処理したメール件数（バッチなど1回で複数件を処理する場合。既定は回数）
+    """
+    values = np.asarray(latencies_ns, dtype=np.float64) / 1e6
+    total_s = float(values.sum()) / 1000
+    items = len(values) if items is None else items
+    return {
+        'runs': len(values),
+        'items': items,
+        'total_s': round(total_s, 6),
+        'throughput_per_s': round(items / total_s, 3) if total_s else None,
+        'mean_ms': round(float(values.mean()), 4),
+        'p50_ms': round(float(np.percentile(values, 50)), 4),
+        'p99_ms': round(float(np.percentile(values, 99)), 4),
+        'max_ms': round(float(values.max()), 4)
+    }
+
+def time_each(function: Callable, inputs: Sequence, warmup: int = 3) -> List[int]:
+    """入力毎に function を呼んだ所要時間（ナノ秒。最初の warmup 件は計測前にも実行）"""
+    for item in inputs[:warmup]:
+        function(item)
+    latencies = []
+    for item in inputs:
+        start = time.perf_counter_ns()
+        function(item)
+        latencies.append(time.perf_counter_ns() - start)
+    return latencies
+
+def bench_features(mailbox: List[Dict]) -> Dict:
+    """特徴量関数毎（FEATURE_VERSIONS の全関数）"""
+    texts = [f"{email['subject']} {email['body']}" for email in mailbox]
+    return {
+        f'features.{name.split(":")[-1]}': summarize(time_each(resolve_feature_function(name), texts))
+        for name in FEATURE_VERSIONS if name != 'raw'
+    }
+
+def bench_enricher(mailbox: List[Dict]) -> Dict:
+    from app.context_enricher import advanced_enricher
+    return {'enricher.enrich_context': summarize(
+        time_each(lambda email: advanced_enricher.enrich_context(email['subject'], email['body']), mailbox)
+    )}
+
+def _benchmark_app():
+    """分類用のアプリケーション（毎回全処理を実行するため結果キャッシュ・テンプレート高速経路・ファイル監視は無効）"""
+    import config
+    for key in ('RESULT_CACHE_ENABLED', 'TEMPLATE_INDEX_ENABLED', 'MODEL_WATCH_ENABLED', 'STARTUP_WARMUP'):
+        setattr(config.Config, key, False)
+
+    from app import create_app
+    from app.classifier import load_model_bundle
+    app = create_app()
+    app.config['TESTING'] = True
+    bundle = load_model_bundle()
+    return app, {'name': bundle.name, 'version': bundle.version,
+                 'mapped': bool(bundle.collapse_info.get('mapped'))}
+
+def _payload(email: Dict) -> Dict:
+    return {key: email[key] for key in ('messageId', 'subject', 'body')}
+
+def bench_classify(mailbox: List[Dict], app) -> Dict:
+    client = app.test_client()
+
+    def classify(email):
+        response = client.post('/api/classify', json=_payload(email))
+        if response.status_code != 200:
+            raise RuntimeError(f"classify failed: {response.status_code} {response.data[:200]!r}")
+
+    return {'classify.single': summarize(time_each(classify, mailbox))}
+
+def bench_batch(mailbox: List[Dict], app, batch_size: int) -> Dict:
+    client = app.test_client()
+    batches = [[_payload(email) for email in mailbox[i:i + batch_size]]
+               for i in range(0, len(mailbox), batch_size)]
+
+    def classify_batch(batch):
+        response = client.post('/api/classify/batch', json={'emails': batch})
+        if response.status_code != 200:
+            raise RuntimeError(f"batch classify failed: {response.status_code} {response.data[:200]!r}")
+
+    result = summarize(time_each(classify_batch, batches, warmup=1), items=len(mailbox))
+    result['batch_size'] = batch_size
+    return {'classify.batch': result}
+
+def _train(mailbox: List[Dict], analyzer: str = 'word'):
+    """合成メールボックスでの学習（models.model_sync_solution.create_pipeline_model と同じ構成）"""
+    from sklearn.calibration import CalibratedClassifierCV
+    from sklearn.pipeline import make_pipeline
+    from sklearn.svm import LinearSVC
+    from models.model_sync_solution import create_paypay_specialized_features
+    from models.sparse_features import build_vectorizer
+
+    texts = [create_paypay_specialized_features(f"{email['subject']} {email['body']}") for email in mailbox]
+    labels = [email['label'] for email in mailbox]
+    vectorizer = build_vectorizer(
+        'text', 'models.model_sync_solution:create_paypay_specialized_features', analyzer=analyzer,
+        max_features=5000, ngram_range=(1, 3), min_df=1, max_df=0.90, sublinear_tf=True,
+        stop_words=None, token_pattern=r'(?u)\b\w+\b|[A-Z_]+\d*', lowercase=False
+    )
+    model = CalibratedClassifierCV(LinearSVC(C=2.0, random_state=42, max_iter=3000), cv=3, method='sigmoid')
+    return make_pipeline(vectorizer, model).fit(texts, labels)
+
+def bench_train(mailbox: List[Dict], repeat: int) -> Dict:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        _train(mailbox)
+        latencies.append(time.perf_counter_ns() - start)
+    return {'train.pipeline': summarize(latencies, items=len(mailbox) * repeat)}
+
+def bench_load(mailbox: List[Dict], repeat: int) -> Dict:
+    """joblib形式・NumPy配列形式の読み込み（同じプロセスでの再読み込み。新しいプロセスでの計測は report_cold_start.py）"""
+    import joblib
+    from app.model_bundle import export_mapped_artifact, load_bundle
+    from models.feature_spec import describe_features
+
+    workdir = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        path = os.path.join(workdir, 'paypay_specialized_v1.pkl')
+        joblib.dump({
+            'pipeline': _train(mailbox),
+            'metadata': {'accuracy': None},
+            **describe_features('models.model_sync_solution:create_paypay_specialized_features')
+        }, path)
+        export_mapped_artifact(path)
+
+        results = {}
+        for name, prefer_mapped in (('joblib', False), ('mapped', True)):
+            latencies = []
+            for _ in range(repeat + 1):
+                start = time.perf_counter_ns()
+                bundle = load_bundle(workdir, prefer_mapped=prefer_mapped)
+                latencies.append(time.perf_counter_ns() - start)
+            assert bool(bundle.collapse_info.get('mapped')) == prefer_mapped
+            results[f'model.load.{name}'] = summarize(latencies[1:])  # 初回は import を含むため除外
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _adversarial_targets() -> Dict[str, Callable]:
+    """最悪ケースの本文を渡す処理（特徴量関数・文脈補完の抽出・テンプレート指紋のマスク）"""
+    from app.context_enricher import advanced_enricher
+    from app.template_index import TemplateFingerprinter
+    targets = {f'features.{name.split(":")[-1]}': resolve_feature_function(name)
+               for name in FEATURE_VERSIONS if name != 'raw'}
+    targets['enricher.extract_entities'] = advanced_enricher.extract_entities
+    targets['template.mask'] = TemplateFingerprinter(advanced_enricher.amount_patterns,
+                                                     advanced_enricher.date_patterns).mask
+    return targets
+
+def scaling_exponent(lengths: Sequence[int], seconds: Sequence[float]) -> Optional[float]:
+    """最短・最長の入力の所要時間の比から求めた、所要時間が入力長の何乗で増えるか"""
+    if len(lengths) < 2 or min(seconds[0], seconds[-1]) <= 0:
+        return None
+    return math.log(seconds[-1] / seconds[0]) / math.log(lengths[-1] / lengths[0])
+
+def bench_adversarial(lengths: Sequence[int], repeat: int = 3) -> Dict:
+    """正規表現の最悪ケースの本文の種類 × 処理毎の1KBあたりの所要時間（ミリ秒。repeat 回の最小）と増え方の指数"""
+    targets = _adversarial_targets()
+    results = {}
+    for kind in ADVERSARIAL_KINDS:
+        texts = [adversarial_text(kind, length) for length in lengths]
+        for name, function in targets.items():
+            seconds = []
+            for text in texts:
+                function(text)
+                seconds.append(min(time_each(function, [text] * repeat, warmup=0)) / 1e9)
+            exponent = scaling_exponent(lengths, seconds)
+            results[f'{kind}.{name}'] = {
+                'ms_per_kb': {str(length): round(elapsed * 1e6 / length, 4) for length, elapsed in zip(lengths, seconds)},
+                'scaling_exponent': round(exponent, 3) if exponent is not None else None
+            }
+    return results
+
+def print_adversarial(results: Dict, lengths: Sequence[int]) -> None:
+    print("\n| 最悪ケース.処理 | " + ' | '.join(f'{length}文字 (ms/KB)' for length in lengths) + " | 指数 |")
+    print("|---|" + "---:|" * (len(lengths) + 1))
+    for name, result in results.items():
+        print(f"| {name} | " + ' | '.join(str(value) for value in result['ms_per_kb'].values()) +
+              f" | {result['scaling_exponent']} |")
+    superlinear = [name for name, result in results.items()
+                   if (result['scaling_exponent'] or 0) > SUPERLINEAR_EXPONENT]
+    if superlinear:
+        print(f"⚠️  入力長の2乗に近い増え方: {', '.join(superlinear)}")
+
+def environment() -> Dict:
+    """実行環境（結果の比較時に条件が同じか確認するため）"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    versions = {}
+    for package in ('numpy', 'scikit-learn', 'scipy', 'flask'):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': commit,
+        'packages': versions
+    }
+
+def describe_mailbox(mailbox: List[Dict]) -> Dict:
+    body_lengths = [len(email['body']) for email in mailbox]
+    return {
+        'emails': len(mailbox),
+        'categories': dict(Counter(email['category'] for email in mailbox)),
+        'html_emails': sum(email['html'] for email in mailbox),
+        'mean_body_chars': round(float(np.mean(body_lengths)), 1) if mailbox else 0,
+        'max_body_chars': max(body_lengths, default=0)
+    }
+
+def compare(current: Dict, previous: Dict) -> None:
+    """前回の結果JSONとの比較（p50 / p99 / スループットの変化率）"""
+    if previous.get('mailbox', {}).get('emails') != current['mailbox']['emails'] or \
+            previous.get('config') != current['config']:
+        print("⚠️  前回と計測条件（メール件数・引数）が異なります")
+
+    print(f"\n比較: {previous.get('created_at')}（{previous.get('environment', {}).get('git_commit')}）→ 今回")
+    print("| ベンチマーク | p50 (ms) | p99 (ms) | スループット (/s) |")
+    print("|---|---:|---:|---:|")
+
+    def change(new, old):
+        if new is None or not old:
+            return f"{new}"
+        return f"{new} ({(new - old) / old:+.1%})"
+
+    for name, result in current['results'].items():
+        old = previous.get('results', {}).get(name)
+        if old is None:
+            continue
+        print(f"| {name} | {change(result['p50_ms'], old['p50_ms'])} | {change(result['p99_ms'], old['p99_ms'])} | "
+              f"{change(result['throughput_per_s'], old['throughput_per_s'])} |")
+
+def main():
+    parser = argparse.ArgumentParser(description='合成メールボックスによるベンチマーク')
+    parser.add_argument('--emails', type=int, default=600, help='メール件数')
+    parser.add_argument('--seed', type=int, default=0, help='合成メールボックスの乱数シード')
+    parser.add_argument('--body-chars', type=int, default=0, help='本文の目標文字数（0はテンプレートの長さ）')
+    parser.add_argument('--html-ratio', type=float, default=0.2, help='HTMLメールをテキスト化した本文の割合')
+    parser.add_argument('--categories', default=','.join(CATEGORIES), help='生成するカテゴリ（カンマ区切り）')
+    parser.add_argument('--batch-size', type=int, default=50, help='バッチ分類の1リクエストあたりの件数')
+    parser.add_argument('--repeat', type=int, default=3, help='読み込み・学習の計測回数')
+    parser.add_argument('--adversarial-lengths', default='1000,4000,16000',
+                        help='最悪ケースの本文の文字数（カンマ区切り、昇順）')
+    parser.add_argument('--only', default=','.join(BENCHMARKS), help=f"実行するベンチマーク（{','.join(BENCHMARKS)}）")
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    parser.add_argument('--compare', help='比較する前回の結果JSON')
+    args = parser.parse_args()
+
+    selected = args.only.split(',')
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        sys.exit(f"Unknown benchmarks: {sorted(unknown)}")
+
+    mailbox = generate_mailbox(args.emails, seed=args.seed, body_chars=args.body_chars,
+                               html_ratio=args.html_ratio, categories=args.categories.split(','))
+    report = {
+        'schema_version': SCHEMA_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'environment': environment(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('json', 'compare')},
+        'mailbox': describe_mailbox(mailbox),
+        'model': None,
+        'results': {},
+        'adversarial': {}
+    }
+    print(f"合成メールボックス: {report['mailbox']}\n")
+
+    if 'features' in selected:
+        report['results'].update(bench_features(mailbox))
+    if 'enricher' in selected:
+        report['results'].update(bench_enricher(mailbox))
+    if 'classify' in selected or 'batch' in selected:
+        app, report['model'] = _benchmark_app()
+        if 'classify' in selected:
+            report['results'].update(bench_classify(mailbox, app))
+        if 'batch' in selected:
+            report['results'].update(bench_batch(mailbox, app, args.batch_size))
+    if 'load' in selected:
+        report['results'].update(bench_load(mailbox, args.repeat))
+    if 'train' in selected:
+        report['results'].update(bench_train(mailbox, args.repeat))
+    if 'adversarial' in selected:
+        lengths = sorted(int(length) for length in args.adversarial_lengths.split(','))
+        report['adversarial'] = bench_adversarial(lengths)
+
+    print("| ベンチマーク | 回数 | 件数 | スループット (/s) | 平均 (ms) | p50 (ms) | p99 (ms) | 最大 (ms) |")
+    print("|---|---:|---:|---:|---:|---:|---:|---:|")
+    for name, result in report['results'].items():
+        print(f"| {name} | {result['runs']} | {result['items']} | {result['throughput_per_s']} | "
+              f"{result['mean_ms']} | {result['p50_ms']} | {result['p99_ms']} | {result['max_ms']} |")
+    if report['adversarial']:
+        print_adversarial(report['adversarial'], lengths)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を保存しました: {args.json}")
+
+if __name__ == "__main__":
+    main()
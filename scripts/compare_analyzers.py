@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+TF-IDFアナライザー比較レポート
+従来の token_pattern（word）と日本語向けアナライザー（char / script）の
+語彙数・モデルファイルサイズ・変換レイテンシ・精度を比較する
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+import joblib
+import pandas as pd
+from sklearn.model_selection import StratifiedKFold, cross_val_score
+from sklearn.pipeline import make_pipeline
+from sklearn.svm import LinearSVC
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from models.analyze_groundtruth_data import create_supervised_features
+from models.model_sync_solution import create_paypay_specialized_features, create_training_data
+from models.sparse_features import build_vectorizer
+from models.text_analyzers import ANALYZERS
+from models.train_model import create_extended_training_data
+
+RETRAINING_CSV = os.path.join(PROJECT_ROOT, 'n8n', 'retraining_candidates_enhanced.csv')
+
+# model_sync_solution.py / analyze_groundtruth_data.py と同じTF-IDF設定
+TFIDF_PARAMS = dict(
+    max_features=5000,
+    ngram_range=(1, 3),
+    min_df=1,
+    max_df=0.90,
+    sublinear_tf=True,
+    token_pattern=r'(?u)\b\w+\b|[A-Z_]+\d*',
+    lowercase=False
+)
+
+def load_datasets():
+    """比較用データセット（名前, 特徴量関数, テキスト, ラベル）"""
+    datasets = []
+
+    df = pd.concat([create_training_data(), create_extended_training_data()], ignore_index=True)
+    datasets.append((
+        'paypay_specialized (subject + body)',
+        create_paypay_specialized_features,
+        [f"{s} {b}" for s, b in zip(df['subject'], df['body'])],
+        list(df['label'])
+    ))
+
+    if os.path.exists(RETRAINING_CSV):
+        df = pd.read_csv(RETRAINING_CSV)
+        df = df[df['groundTruth'].notna() & (df['groundTruth'] != '')]
+        datasets.append((
+            'supervised (retraining_candidates_enhanced subject)',
+            create_supervised_features,
+            [str(s) for s in df['subject']],
+            list(df['groundTruth'])
+        ))
+
+    return datasets
+
+def _artifact_size(pipeline) -> int:
+    buffer = io.BytesIO()
+    joblib.dump(pipeline, buffer)
+    return buffer.tell()
+
+def _transform_ms_per_1k(vectorizer, texts, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        vectorizer.transform(texts)
+    return (time.perf_counter() - start) / repeat / len(texts) * 1000 * 1000
+
+def evaluate(analyzer: str, feature_function, texts, labels, folds: int, repeat: int):
+    """1アナライザー分の指標"""
+    enhanced = [feature_function(text) for text in texts]
+
+    def pipeline():
+        return make_pipeline(build_vectorizer('text', '', analyzer=analyzer, **TFIDF_PARAMS),
+                             LinearSVC(class_weight='balanced', random_state=42, max_iter=5000, dual=False))
+
+    min_class = pd.Series(labels).value_counts().min()
+    cv = StratifiedKFold(n_splits=min(folds, min_class), shuffle=True, random_state=42)
+    accuracy = cross_val_score(pipeline(), enhanced, labels, cv=cv).mean()
+
+    fitted = pipeline().fit(enhanced, labels)
+    vectorizer = fitted[0]
+
+    # max_features による切り捨て前の語彙数
+    uncapped = build_vectorizer('text', '', analyzer=analyzer, **{**TFIDF_PARAMS, 'max_features': None})
+    uncapped.fit(enhanced)
+
+    return {
+        'analyzer': analyzer,
+        'vocabulary_uncapped': len(uncapped.vocabulary_),
+        'vocabulary': len(vectorizer.vocabulary_),
+        'artifact_kb': _artifact_size(fitted) / 1024,
+        'transform_ms_per_1k': _transform_ms_per_1k(vectorizer, enhanced, repeat),
+        'cv_accuracy': float(accuracy)
+    }
+
+def print_report(name: str, rows) -> None:
+    print(f"\n### {name}\n")
+    print("| analyzer | 語彙数（上限前） | 語彙数 | モデルサイズ (KB) | 変換 (ms / 1000件) | CV精度 |")
+    print("|---|---:|---:|---:|---:|---:|")
+    for row in rows:
+        print(f"| {row['analyzer']} | {row['vocabulary_uncapped']} | {row['vocabulary']} | "
+              f"{row['artifact_kb']:.1f} | {row['transform_ms_per_1k']:.1f} | {row['cv_accuracy']:.3f} |")
+
+def main():
+    parser = argparse.ArgumentParser(description='TF-IDFアナライザー比較レポート')
+    parser.add_argument('--folds', type=int, default=5, help='交差検証の分割数')
+    parser.add_argument('--repeat', type=int, default=20, help='変換レイテンシ測定の繰り返し回数')
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    print("=== TF-IDFアナライザー比較 ===")
+    results = {}
+    for name, feature_function, texts, labels in load_datasets():
+        rows = [evaluate(analyzer, feature_function, texts, labels, args.folds, args.repeat)
+                for analyzer in ANALYZERS]
+        results[name] = rows
+        print(f"\nデータ数: {len(texts)}")
+        print_report(name, rows)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を保存しました: {args.json}")
+
+if __name__ == "__main__":
+    main()
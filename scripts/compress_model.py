@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+モデル圧縮の比較レポート
+学習済みモデル（.pkl）から語彙の枝刈り（重みの大きさ / カイ二乗値）と重み行列の低精度化
+（float32 / float16 / int8）を組み合わせた圧縮版を作成し、サイズ・読み込み時間・1件あたりのレイテンシ・
+groundTruth に対する精度（非圧縮版との差）を比較する。
+精度低下が許容値以内で最も小さい圧縮版を --install で APIサーバー用の <モデルファイル名>.mapped/ に配置できる
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.model_bundle import (LEGACY_FEATURE_FUNCTION, MODEL_CANDIDATES, MODELS_DIR,
+                              export_mapped_artifact, load_mapped_bundle)
+from app.model_compression import PRUNE_METHODS, compress_mapped_artifact
+from models.mapped_format import WEIGHT_DTYPES, mapped_path
+
+DEFAULT_EVAL_CSV = os.path.join(PROJECT_ROOT, 'n8n', 'retraining_candidates_enhanced.csv')
+
+def read_labeled_emails(csv_path: str):
+    """ラベル付きメール（groundTruth 列、なければ label 列）"""
+    emails, labels = [], []
+    with open(csv_path, encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            label = (row.get('groundTruth') or row.get('label') or '').strip()
+            if label and row.get('subject'):
+                emails.append({'subject': row['subject'].strip(), 'body': (row.get('body') or '').strip()})
+                labels.append(label)
+    return emails, labels
+
+def _directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def measure(path: str, legacy_feature_function: str, emails, repeat: int) -> dict:
+    """圧縮版のサイズ・読み込み時間・1件あたりのレイテンシと、全メールの予測ラベル・確率"""
+    load_times = []
+    for _ in range(5):
+        start = time.perf_counter()
+        bundle = load_mapped_bundle(path, legacy_feature_function=legacy_feature_function)
+        load_times.append((time.perf_counter() - start) * 1000)
+
+    # n8n からは1件ずつ届くため、特徴量化を含めて1件毎に推論
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for email in emails:
+            bundle.engine.infer([bundle.featurize(email)])
+        best = min(best, time.perf_counter() - start)
+
+    predictions, scores = predict(path, legacy_feature_function, emails)
+    return {
+        'size_bytes': _directory_size(path),
+        'load_ms': sorted(load_times)[len(load_times) // 2],
+        'latency_ms': best / max(len(emails), 1) * 1000,
+        'predictions': predictions,
+        'scores': scores
+    }
+
+def predict(path: str, legacy_feature_function: str, emails):
+    """予測ラベルと確率（未校正モデルは決定関数値）"""
+    bundle = load_mapped_bundle(path, legacy_feature_function=legacy_feature_function)
+    texts = [bundle.featurize(email) for email in emails]
+    proba, margins = bundle.model.score(texts)
+    return [result['label'] for result in bundle.engine.infer(texts)], (proba if proba is not None else margins)
+
+def _accuracy(predictions, labels):
+    return float(np.mean([p == l for p, l in zip(predictions, labels)])) if labels else None
+
+def main():
+    parser = argparse.ArgumentParser(description='モデル圧縮の比較レポート')
+    parser.add_argument('model', nargs='?', help='圧縮するモデルファイル（省略時は models/ の読み込み優先順位で最初のファイル）')
+    parser.add_argument('--models-dir', default=MODELS_DIR, help='モデルディレクトリ')
+    parser.add_argument('--eval-csv', default=DEFAULT_EVAL_CSV, help='精度評価に使うラベル付きCSV（groundTruth 列）')
+    parser.add_argument('--chi2-csv', help='カイ二乗値の計算に使うラベル付きCSV（省略時は --eval-csv）')
+    parser.add_argument('--keep-ratios', default='1.0,0.5,0.25,0.1', help='残す語彙の割合（カンマ区切り）')
+    parser.add_argument('--methods', default=','.join(PRUNE_METHODS), help='枝刈りの基準（カンマ区切り）')
+    parser.add_argument('--dtypes', default=','.join(WEIGHT_DTYPES), help='重み行列の保存型（カンマ区切り）')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='許容する精度低下（非圧縮版との差）')
+    parser.add_argument('--repeat', type=int, default=3, help='レイテンシ計測の回数（最良値を表示）')
+    parser.add_argument('--install', action='store_true', help='許容値以内で最小の圧縮版をAPIサーバー用に配置')
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    legacy_by_file = {filename: legacy for filename, _, legacy in MODEL_CANDIDATES}
+    if args.model:
+        model_path = args.model
+    else:
+        existing = [os.path.join(args.models_dir, filename) for filename, _, _ in MODEL_CANDIDATES
+                    if os.path.exists(os.path.join(args.models_dir, filename))]
+        if not existing:
+            sys.exit(f"No model file in {args.models_dir}")
+        model_path = existing[0]
+    legacy_feature_function = legacy_by_file.get(os.path.basename(model_path), LEGACY_FEATURE_FUNCTION)
+
+    emails, labels = read_labeled_emails(args.eval_csv)
+    chi2_emails, chi2_labels = read_labeled_emails(args.chi2_csv) if args.chi2_csv else (emails, labels)
+    print(f"モデル: {model_path}（評価 {len(emails)}件: {args.eval_csv}）\n")
+
+    keep_ratios = [float(value) for value in args.keep_ratios.split(',')]
+    methods = args.methods.split(',')
+    dtypes = args.dtypes.split(',')
+
+    workdir = tempfile.mkdtemp(prefix='compress-')
+    try:
+        # 既存の <モデル>.mapped は圧縮済みの可能性があるため、モデルファイルから非圧縮版を作り直す
+        source = export_mapped_artifact(model_path, legacy_feature_function=legacy_feature_function,
+                                        output=os.path.join(workdir, 'source.mapped'))
+        featurize = load_mapped_bundle(source, legacy_feature_function=legacy_feature_function).featurize
+        chi2_texts = [featurize(email) for email in chi2_emails]
+
+        # カイ二乗値を評価データで計算する場合は、評価データを2分割して片方で選んだ語彙をもう片方で評価する
+        # （評価データに出現する語だけを残すと精度差が見かけ上0になるため）
+        cross_fit = not args.chi2_csv
+        halves = [list(range(half, len(emails), 2)) for half in (0, 1)]
+
+        baseline = measure(source, legacy_feature_function, emails, args.repeat)
+        baseline['accuracy'] = _accuracy(baseline['predictions'], labels)
+
+        variants = []
+        for keep_ratio in keep_ratios:
+            for method in (methods if keep_ratio < 1 else [None]):
+                for weight_dtype in dtypes:
+                    name = f"{method or 'full'}-{keep_ratio}-{weight_dtype}"
+                    path = os.path.join(workdir, f'{name}.mapped')
+                    variant = {'name': name, 'path': path, **compress_mapped_artifact(
+                        source, path, keep_ratio=keep_ratio, method=method or 'weight',
+                        weight_dtype=weight_dtype, texts=chi2_texts, labels=chi2_labels
+                    )}
+                    variant.update(measure(path, legacy_feature_function, emails, args.repeat))
+
+                    if method == 'chi2' and cross_fit:
+                        predictions, scores = list(variant['predictions']), np.array(variant['scores'])
+                        for held_out, selected in (halves, halves[::-1]):
+                            fold_path = os.path.join(workdir, f'{name}-fold.mapped')
+                            compress_mapped_artifact(
+                                source, fold_path, keep_ratio=keep_ratio, method=method, weight_dtype=weight_dtype,
+                                texts=[chi2_texts[i] for i in selected], labels=[chi2_labels[i] for i in selected]
+                            )
+                            fold_predictions, fold_scores = predict(
+                                fold_path, legacy_feature_function, [emails[i] for i in held_out])
+                            for row, i in enumerate(held_out):
+                                predictions[i] = fold_predictions[row]
+                                scores[i] = fold_scores[row]
+                        variant.update(predictions=predictions, scores=scores, cross_fit=True)
+
+                    variant['accuracy'] = _accuracy(variant['predictions'], labels)
+                    variant['accuracy_delta'] = (variant['accuracy'] - baseline['accuracy']
+                                                 if baseline['accuracy'] is not None else None)
+                    variant['agreement'] = float(np.mean(
+                        [p == b for p, b in zip(variant['predictions'], baseline['predictions'])]))
+                    variant['max_score_diff'] = (float(np.abs(variant['scores'] - baseline['scores']).max())
+                                                 if emails else 0.0)
+                    variants.append(variant)
+
+        within = [v for v in variants
+                  if v['accuracy_delta'] is None or v['accuracy_delta'] >= -args.tolerance]
+        chosen = min(within, key=lambda v: v['size_bytes']) if within else None
+
+        print("| 枝刈り | 語彙数 | 重みの型 | サイズ (KB) | 読み込み (ms) | 1件あたり (ms) | 精度 | 精度差 | 予測一致率 | 最大確率差 |")
+        print("|---|---:|---|---:|---:|---:|---:|---:|---:|---:|")
+        for variant in variants:
+            prune = f"{variant['method']} {variant['keep_ratio']:.0%}" if variant['method'] else 'なし'
+            prune += '†' if variant.get('cross_fit') else ''
+            marker = ' ✅' if variant is chosen else ''
+            print(f"| {prune}{marker} | {variant['terms']} | {variant['weight_dtype']} | "
+                  f"{variant['size_bytes'] / 1024:.1f} | {variant['load_ms']:.2f} | {variant['latency_ms']:.3f} | "
+                  f"{variant['accuracy']:.3f} | {variant['accuracy_delta']:+.3f} | "
+                  f"{variant['agreement']:.1%} | {variant['max_score_diff']:.2e} |")
+
+        if cross_fit and 'chi2' in methods:
+            print("\n† カイ二乗値は評価データの半分で計算し、残り半分で評価（2分割の交差評価）")
+        if chosen is None:
+            print(f"\n精度低下が許容値（{args.tolerance}）以内の圧縮版はありません")
+        else:
+            print(f"\n許容値（{args.tolerance}）以内で最小: {chosen['name']} "
+                  f"({chosen['size_bytes'] / 1024:.1f} KB / 非圧縮 {baseline['size_bytes'] / 1024:.1f} KB)")
+            if args.install:
+                installed = compress_mapped_artifact(
+                    source, mapped_path(model_path), keep_ratio=chosen['keep_ratio'],
+                    method=chosen['method'] or 'weight', weight_dtype=chosen['weight_dtype'],
+                    texts=chi2_texts, labels=chi2_labels
+                )
+                print(f"APIサーバー用に配置しました: {mapped_path(model_path)} {installed}")
+
+        if args.json:
+            report = {
+                'model': model_path,
+                'eval_csv': args.eval_csv,
+                'tolerance': args.tolerance,
+                'baseline': {k: v for k, v in baseline.items() if k not in ('predictions', 'scores')},
+                'chosen': chosen['name'] if chosen else None,
+                'variants': [{k: v for k, v in variant.items() if k not in ('path', 'predictions', 'scores')}
+                             for variant in variants]
+            }
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"\n結果を保存しました: {args.json}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
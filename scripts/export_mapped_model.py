@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+モデルファイルのメモリマップ形式への変換
+models/ の学習済みモデル（.pkl）を <モデルファイル名>.mapped/ に変換する。
+APIサーバーは元のモデルファイルと内容が一致する変換結果があれば unpickle せずにそちらを読み込む
+"""
+
+import argparse
+import os
+import sys
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.model_bundle import LEGACY_FEATURE_FUNCTION, MODEL_CANDIDATES, MODELS_DIR, export_mapped_artifact
+
+def main():
+    parser = argparse.ArgumentParser(description='モデルファイルのメモリマップ形式への変換')
+    parser.add_argument('paths', nargs='*', help='変換するモデルファイル（省略時は models/ の全候補）')
+    parser.add_argument('--models-dir', default=MODELS_DIR, help='モデルディレクトリ')
+    args = parser.parse_args()
+
+    if args.paths:
+        targets = [(path, os.path.basename(path), LEGACY_FEATURE_FUNCTION) for path in args.paths]
+    else:
+        targets = [(os.path.join(args.models_dir, filename), name, legacy)
+                   for filename, name, legacy in MODEL_CANDIDATES]
+
+    failed = False
+    for path, name, legacy_feature_function in targets:
+        if not os.path.exists(path):
+            continue
+        try:
+            output = export_mapped_artifact(path, name, legacy_feature_function)
+        except ValueError as e:
+            print(f"⚠️  {path}: {e}")
+            failed = True
+            continue
+        print(f"✅ {path} → {output}")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
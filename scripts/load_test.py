@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+負荷試験（n8n のトラフィックの再生）
+n8n/gmail_log_sheet.csv（または合成メールボックス）のメールで /api/classify・/api/enrich-context を呼び、
+同時実行数（クローズドループ）または目標レート（オープンループ）を段階的に上げて
+スループット・p50 / p95 / p99 レイテンシ・エラー率と飽和点を報告する（Gmail のバックフィル前のホストの見積もり用）
+
+    # 起動中のサーバー（serve.py）に対して同時実行数 1→16
+    python scripts/load_test.py --url http://localhost:5002 --concurrency 1,2,4,8,16 --duration 20
+    # 目標レート（リクエスト/秒）毎
+    python scripts/load_test.py --url http://localhost:5002 --rate 50,100,200 --duration 20
+    # プロセス内の create_app()（--url 省略時。GIL のため1ワーカー相当の上限になる）
+    python scripts/load_test.py --synthetic 1000 --concurrency 1,2,4 --json load.json
+
+オープンループのレイテンシは送信予定時刻から計測する（サーバーが詰まって送信が遅れた分も含める）
+"""
+
+import argparse
+import csv
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+
+DEFAULT_CSV = os.path.join(PROJECT_ROOT, 'n8n', 'gmail_log_sheet.csv')
+
+ENDPOINTS = {
+    'classify': '/api/classify',
+    'enrich-context': '/api/enrich-context',
+}
+
+# 飽和と判定する条件（前の段階からのスループットの伸び・目標レートに対する達成率・エラー率）
+SATURATION_GAIN = 0.10
+RATE_ATTAINMENT = 0.95
+MAX_ERROR_RATE = 0.01
+
+def load_csv(path: str) -> List[Dict]:
+    """
+    n8n のログシートのメール（n8n の文脈補完ノードと同じく本文がなければ enrichedContext・'(本文なし)'）
+    """
+    with open(path, encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    return [{
+        'messageId': row.get('messageId') or f'csv-{i}',
+        'subject': row.get('subject', ''),
+        'body': row.get('body') or row.get('enrichedContext') or '(本文なし)'
+    } for i, row in enumerate(rows)]
+
+def load_corpus(csv_path: Optional[str], synthetic: int, seed: int, body_chars: int) -> List[Dict]:
+    if synthetic:
+        from models.synthetic_mailbox import generate_mailbox
+        return [{key: email[key] for key in ('messageId', 'subject', 'body')}
+                for email in generate_mailbox(synthetic, seed=seed, body_chars=body_chars)]
+    return load_csv(csv_path or DEFAULT_CSV)
+
+class InProcessTarget:
+    """プロセス内の create_app() にWSGIで送信（スレッド毎のテストクライアント）"""
+
+    def __init__(self, app):
+        self.app = app
+        self.description = 'in-process'
+        self._local = threading.local()
+
+    def post(self, path: str, payload: Dict) -> int:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client.post(path, json=payload).status_code
+
+class HttpTarget:
+    """起動中のサーバーにHTTPで送信（スレッド毎に keep-alive の接続を使い回す）"""
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.description = url
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            connection = self._local.connection = cls(self.host, self.port, timeout=self.timeout)
+        return connection
+
+    def post(self, path: str, payload: Dict) -> int:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        connection = self._connection()
+        try:
+            connection.request('POST', self.prefix + path, body=body,
+                               headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+                self._local.connection = None
+            return response.status
+        except Exception:
+            connection.close()
+            self._local.connection = None
+            raise
+
+    def check(self) -> None:
+        """サーバーに接続できるか（/health）"""
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        connection = cls(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request('GET', self.prefix + '/health')
+            connection.getresponse().read()
+        finally:
+            connection.close()
+
+class Workload:
+    """メール × エンドポイントの順に巡回して送信する要求を返す（スレッドセーフ）"""
+
+    def __init__(self, corpus: List[Dict], endpoints: List[str]):
+        self.corpus = corpus
+        self.paths = [ENDPOINTS[name] for name in endpoints]
+        self._index = 0
+        self._lock = threading.Lock()
+
+    def next(self) -> Tuple[str, Dict]:
+        with self._lock:
+            index = self._index
+            self._index += 1
+        email = self.corpus[(index // len(self.paths)) % len(self.corpus)]
+        return self.paths[index % len(self.paths)], email
+
+class StepRecorder:
+    """1段階分のレイテンシ・エラーの記録"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies_ns: List[int] = []
+        self.errors: Counter = Counter()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def send(self, target, path: str, payload: Dict, scheduled_ns: Optional[int] = None) -> None:
+        start = scheduled_ns if scheduled_ns is not None else time.perf_counter_ns()
+        try:
+            status = target.post(path, payload)
+            error = None if status < 400 else str(status)
+        except Exception as e:
+            error = type(e).__name__
+        elapsed = time.perf_counter_ns() - start
+        with self._lock:
+            self.latencies_ns.append(elapsed)
+            if error is not None:
+                self.errors[error] += 1
+
+    def summary(self) -> Dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        count = len(self.latencies_ns)
+        errors = sum(self.errors.values())
+        values = np.asarray(self.latencies_ns or [0], dtype=np.float64) / 1e6
+        return {
+            'requests': count,
+            'errors': errors,
+            'error_rate': round(errors / count, 4) if count else 0.0,
+            'errors_by_kind': dict(self.errors),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_per_s': round(count / elapsed, 2) if elapsed else None,
+            'p50_ms': round(float(np.percentile(values, 50)), 3),
+            'p95_ms': round(float(np.percentile(values, 95)), 3),
+            'p99_ms': round(float(np.percentile(values, 99)), 3),
+            'max_ms': round(float(values.max()), 3)
+        }
+
+def run_closed_loop(target, workload: Workload, concurrency: int, duration: float,
+                    max_requests: Optional[int]) -> Dict:
+    """同時実行数 concurrency のクローズドループ（各ワーカーは応答を受けてから次を送る）"""
+    recorder = StepRecorder()
+    deadline = time.perf_counter() + duration
+    remaining = [max_requests]
+    lock = threading.Lock()
+
+    def worker():
+        while time.perf_counter() < deadline:
+            if max_requests is not None:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            path, payload = workload.next()
+            recorder.send(target, path, payload)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.finished = time.perf_counter()
+    return {'mode': 'closed', 'concurrency': concurrency, **recorder.summary()}
+
+def run_open_loop(target, workload: Workload, rate: float, duration: float,
+                  max_requests: Optional[int], max_workers: int) -> Dict:
+    """目標レート rate（リクエスト/秒）のオープンループ（応答を待たずに一定間隔で送る）"""
+    recorder = StepRecorder()
+    total = int(rate * duration)
+    if max_requests is not None:
+        total = min(total, max_requests)
+    interval_ns = int(1e9 / rate)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        start_ns = time.perf_counter_ns()
+        for i in range(total):
+            scheduled_ns = start_ns + i * interval_ns
+            delay = (scheduled_ns - time.perf_counter_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+            path, payload = workload.next()
+            pool.submit(recorder.send, target, path, payload, scheduled_ns)
+    recorder.finished = time.perf_counter()
+    return {'mode': 'open', 'target_rate': rate, **recorder.summary()}
+
+def find_saturation(steps: List[Dict]) -> Optional[Dict]:
+    """
+    飽和点（最初に飽和した段階）
+    クローズドループは前の段階からスループットが SATURATION_GAIN 以上伸びなくなった段階、
+    オープンループは目標レートの RATE_ATTAINMENT 未満しか処理できなかった段階。どちらもエラー率が MAX_ERROR_RATE を超えた段階を含む
+    """
+    previous = None
+    for step in steps:
+        if step['error_rate'] > MAX_ERROR_RATE:
+            return {**step, 'reason': f"error rate {step['error_rate']:.1%}"}
+        throughput = step['throughput_per_s'] or 0
+        if step['mode'] == 'open' and throughput < step['target_rate'] * RATE_ATTAINMENT:
+            return {**step, 'reason': f"achieved {throughput}/s of {step['target_rate']}/s"}
+        if step['mode'] == 'closed' and previous is not None \
+                and throughput < (previous['throughput_per_s'] or 0) * (1 + SATURATION_GAIN):
+            return {**step, 'reason': f"throughput gain below {SATURATION_GAIN:.0%} "
+                                      f"({previous['throughput_per_s']}/s -> {throughput}/s)"}
+        previous = step
+    return None
+
+def in_process_target(keep_caches: bool) -> InProcessTarget:
+    """プロセス内のアプリケーション（既定は結果キャッシュ・テンプレート高速経路なし。同じメールを繰り返し送るため）"""
+    import config
+    config.Config.MODEL_WATCH_ENABLED = False
+    config.Config.STARTUP_WARMUP = False
+    if not keep_caches:
+        config.Config.RESULT_CACHE_ENABLED = False
+        config.Config.TEMPLATE_INDEX_ENABLED = False
+
+    from app import create_app
+    from app.classifier import load_model_bundle
+    app = create_app()
+    app.config['TESTING'] = True
+    load_model_bundle()
+    return InProcessTarget(app)
+
+def _levels(value: str) -> List[float]:
+    return [float(item) for item in value.split(',') if item]
+
+def main():
+    parser = argparse.ArgumentParser(description='n8n のトラフィックを再生する負荷試験')
+    parser.add_argument('--url', help='起動中のサーバーのURL（省略時はプロセス内の create_app()）')
+    parser.add_argument('--csv', help=f'再生するログシート（既定 {os.path.relpath(DEFAULT_CSV, PROJECT_ROOT)}）')
+    parser.add_argument('--synthetic', type=int, default=0, help='ログシートの代わりに合成メールボックスを使う件数')
+    parser.add_argument('--seed', type=int, default=0, help='合成メールボックスの乱数シード')
+    parser.add_argument('--body-chars', type=int, default=0, help='合成メールの本文の目標文字数')
+    parser.add_argument('--endpoints', default='classify,enrich-context',
+                        help=f"呼び出すエンドポイント（{','.join(ENDPOINTS)}。メール毎に順に呼ぶ）")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--concurrency', default='1,2,4,8', help='クローズドループの同時実行数（カンマ区切りで段階的に実行）')
+    mode.add_argument('--rate', help='オープンループの目標レート（リクエスト/秒。カンマ区切りで段階的に実行）')
+    parser.add_argument('--duration', type=float, default=10.0, help='段階毎の秒数')
+    parser.add_argument('--requests', type=int, help='段階毎の最大リクエスト数')
+    parser.add_argument('--warmup', type=int, default=20, help='計測前に送るリクエスト数')
+    parser.add_argument('--max-workers', type=int, default=64, help='オープンループの送信スレッド数の上限')
+    parser.add_argument('--timeout', type=float, default=30.0, help='HTTPのタイムアウト（秒）')
+    parser.add_argument('--keep-caches', action='store_true', help='プロセス内の場合に結果キャッシュ・テンプレート高速経路を有効にする')
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    endpoints = args.endpoints.split(',')
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        sys.exit(f"Unknown endpoints: {sorted(unknown)}")
+    corpus = load_corpus(args.csv, args.synthetic, args.seed, args.body_chars)
+    if not corpus:
+        sys.exit("No emails to replay")
+
+    if args.url:
+        target = HttpTarget(args.url, args.timeout)
+        try:
+            target.check()
+        except OSError as e:
+            sys.exit(f"Cannot connect to {args.url}: {e}")
+    else:
+        target = in_process_target(args.keep_caches)
+
+    workload = Workload(corpus, endpoints)
+    for _ in range(args.warmup):
+        path, payload = workload.next()
+        try:
+            target.post(path, payload)
+        except Exception:
+            pass
+
+    print(f"対象: {target.description}  メール: {len(corpus)}件  エンドポイント: {', '.join(endpoints)}\n")
+    print("| 段階 | リクエスト | スループット (/s) | p50 (ms) | p95 (ms) | p99 (ms) | エラー率 |")
+    print("|---|---:|---:|---:|---:|---:|---:|")
+
+    steps = []
+    levels = _levels(args.rate) if args.rate else [int(level) for level in _levels(args.concurrency)]
+    for level in levels:
+        if args.rate:
+            step = run_open_loop(target, workload, level, args.duration, args.requests, args.max_workers)
+            name = f"rate {level:g}/s"
+        else:
+            step = run_closed_loop(target, workload, level, args.duration, args.requests)
+            name = f"concurrency {level}"
+        steps.append(step)
+        print(f"| {name} | {step['requests']} | {step['throughput_per_s']} | {step['p50_ms']} | "
+              f"{step['p95_ms']} | {step['p99_ms']} | {step['error_rate']:.2%} |")
+
+    saturation = find_saturation(steps)
+    if saturation is None:
+        print("\n飽和点: 計測範囲内では飽和していません")
+    else:
+        level = (f"concurrency {saturation['concurrency']}" if saturation['mode'] == 'closed'
+                 else f"rate {saturation['target_rate']:g}/s")
+        print(f"\n飽和点: {level}（{saturation['reason']}、p99 {saturation['p99_ms']} ms）")
+
+    if args.json:
+        report = {
+            'created_at': datetime.now().isoformat(),
+            'target': target.description,
+            'corpus': {'source': 'synthetic' if args.synthetic else (args.csv or DEFAULT_CSV), 'emails': len(corpus)},
+            'config': {key: value for key, value in vars(args).items() if key != 'json'},
+            'steps': steps,
+            'saturation': saturation
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {args.json}")
+
+if __name__ == "__main__":
+    main()
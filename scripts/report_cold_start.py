@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+モデル読み込みのコールドスタート・メモリレポート
+joblib形式（unpickle）とメモリマップ形式のそれぞれについて、新しいプロセスでの
+読み込み時間・初回推論までの時間・RSS（うちファイル由来の共有可能なページ / ワーカー毎の匿名メモリ）を比較する
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.model_bundle import MODELS_DIR
+
+# 子プロセスで実行する計測コード（importも含めてコールドスタートを計測）
+_PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from app.model_bundle import load_bundle
+imported = time.perf_counter()
+bundle = load_bundle({models_dir!r}, prefer_mapped={mapped!r})
+loaded = time.perf_counter()
+bundle.engine.infer([bundle.featurize({{'subject': 'PayPay決済完了', 'body': '1,250円のお支払い'}})])
+inferred = time.perf_counter()
+
+memory = {{}}
+with open('/proc/self/status') as f:
+    for line in f:
+        key, _, value = line.partition(':')
+        if key in ('VmRSS', 'RssAnon', 'RssFile'):
+            memory[key] = int(value.split()[0])
+print(json.dumps({{
+    'model': bundle.name,
+    'mapped': bool(bundle.collapse_info.get('mapped')),
+    'import_ms': (imported - start) * 1000,
+    'load_ms': (loaded - imported) * 1000,
+    'first_inference_ms': (inferred - loaded) * 1000,
+    'cold_start_ms': (inferred - start) * 1000,
+    'rss_kb': memory.get('VmRSS'),
+    'rss_anon_kb': memory.get('RssAnon'),
+    'rss_file_kb': memory.get('RssFile')
+}}))
+'''
+
+def measure(models_dir: str, mapped: bool) -> dict:
+    """新しいPythonプロセスでモデルを読み込んで計測"""
+    code = _PROBE.format(root=PROJECT_ROOT, models_dir=models_dir, mapped=mapped)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def _median(rows, key):
+    values = sorted(row[key] for row in rows if row[key] is not None)
+    return values[len(values) // 2] if values else None
+
+def main():
+    parser = argparse.ArgumentParser(description='モデル読み込みのコールドスタート・メモリレポート')
+    parser.add_argument('--models-dir', default=MODELS_DIR, help='モデルディレクトリ')
+    parser.add_argument('--runs', type=int, default=5, help='形式毎の計測回数（中央値を表示）')
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    results = {}
+    for label, mapped in (('joblib (unpickle)', False), ('memory-mapped', True)):
+        rows = [measure(args.models_dir, mapped) for _ in range(args.runs)]
+        results[label] = {key: _median(rows, key) for key in rows[0] if key not in ('model', 'mapped')}
+        results[label].update(model=rows[0]['model'], mapped=rows[0]['mapped'])
+
+    print(f"=== コールドスタート・メモリ（{args.runs}回の中央値） ===\n")
+    print("| 形式 | モデル | import (ms) | 読み込み (ms) | 初回推論 (ms) | 合計 (ms) | RSS (MB) | 匿名 (MB) | ファイル (MB) |")
+    print("|---|---|---:|---:|---:|---:|---:|---:|---:|")
+    for label, row in results.items():
+        memory = [f"{row[key] / 1024:.1f}" if row[key] is not None else '-'
+                  for key in ('rss_kb', 'rss_anon_kb', 'rss_file_kb')]
+        print(f"| {label} | {row['model']}{' (mapped)' if row['mapped'] else ''} | {row['import_ms']:.0f} | "
+              f"{row['load_ms']:.1f} | {row['first_inference_ms']:.1f} | {row['cold_start_ms']:.0f} | "
+              f"{' | '.join(memory)} |")
+    print("\n匿名メモリはワーカー毎に増える分、ファイル由来のページ（メモリマップ形式の配列を含む）はプロセス間で共有されます")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を保存しました: {args.json}")
+
+if __name__ == "__main__":
+    main()
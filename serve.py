@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+"""
+Gmail分類PoC - 本番用APIサーバー
+マスタープロセスでモデルを読み込んでからワーカーをforkする（ワーカー数・スレッド数は config.py の SERVER_*）
+開発時は run.py（Flask開発サーバー）を使用
+"""
+
+from app import create_app
+from app.prefork import serve
+
+if __name__ == "__main__":
+    app = create_app()
+    app.config['DEBUG'] = False
+    serve(app)
@@ -0,0 +1,21 @@
+"""
+テスト共通設定
+実行時間を計測して判定するテスト（slow マーカー）は負荷の高いCI環境で揺らぐため、--run-slow 指定時のみ実行する
+"""
+
+import pytest
+
+def pytest_addoption(parser):
+    parser.addoption('--run-slow', action='store_true', default=False,
+                     help='実行時間を計測して判定するテスト（slow）も実行する')
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: 実行時間を計測して判定するテスト（--run-slow 指定時のみ実行）')
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--run-slow'):
+        return
+    skip = pytest.mark.skip(reason='--run-slow 指定時のみ実行')
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip)
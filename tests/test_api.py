@@ -48,6 +48,8 @@ def test_classify_api(client):
     assert 'classification' in data
     assert 'confidence' in data
     assert 'text_length' in data
+    assert data['top_k'][0]['label'] == data['classification']
+    assert 'margin' in data
 
 def test_classify_api_missing_data(client):
     """メール分類API - データ不足テスト"""
@@ -65,6 +67,59 @@ def test_classify_api_missing_data(client):
     data = json.loads(response.data)
     assert 'error' in data
 
+def test_classify_batch_api(client):
+    """メール一括分類APIテスト"""
+    test_data = {
+        "emails": [
+            {
+                "messageId": "msg-1",
+                "subject": "PayPay決済完了のお知らせ",
+                "body": "PayPayでのお支払いが完了しました。利用金額：1,250円"
+            },
+            {
+                "messageId": "msg-2",
+                "subject": "緊急 システム障害",
+                "body": "システムに障害が発生しました。"
+            }
+        ]
+    }
+    
+    response = client.post('/api/classify/batch',
+                          data=json.dumps(test_data),
+                          content_type='application/json')
+    
+    assert response.status_code == 200
+    
+    data = json.loads(response.data)
+    assert data['count'] == 2
+    assert [r['messageId'] for r in data['results']] == ['msg-1', 'msg-2']
+    
+    # 単体APIと同じ結果になることを確認
+    for email, result in zip(test_data['emails'], data['results']):
+        single = client.post('/api/classify',
+                            data=json.dumps(email),
+                            content_type='application/json')
+        single_data = json.loads(single.data)
+        assert result['classification'] == single_data['classification']
+        assert abs(result['confidence'] - single_data['confidence']) < 1e-9
+        assert result['context_analysis'] == single_data['context_analysis']
+
+def test_classify_batch_api_invalid_item(client):
+    """メール一括分類API - 不正な要素テスト"""
+    test_data = [
+        {"subject": "テスト件名", "body": "テスト本文"},
+        {"subject": "本文なし"}
+    ]
+    
+    response = client.post('/api/classify/batch',
+                          data=json.dumps(test_data),
+                          content_type='application/json')
+    
+    assert response.status_code == 400
+    
+    data = json.loads(response.data)
+    assert data['invalid_indices'] == [1]
+
 def test_enrich_context_api(client):
     """文脈補完APIテスト"""
     test_data = {
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+CalibratedClassifierCV 畳み込みスコアラーのテスト
+"""
+
+import pytest
+import numpy as np
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.svm import LinearSVC
+from sklearn.pipeline import make_pipeline
+from sklearn.calibration import CalibratedClassifierCV
+
+from models.calibrated_scorer import (
+    CalibratedLinearScorer, PROBABILITY_TOLERANCE, collapse_and_verify, collapse_calibrated_pipeline
+)
+from models.model_sync_solution import create_paypay_specialized_features
+from models.train_model import create_extended_training_data
+
+@pytest.fixture(scope='module')
+def training_texts():
+    """特徴量エンジニアリング済みの学習データ"""
+    df = create_extended_training_data()
+    texts = [create_paypay_specialized_features(f"{s} {b}") for s, b in zip(df['subject'], df['body'])]
+    return texts, df['label']
+
+def make_vectorizer():
+    return TfidfVectorizer(
+        max_features=5000,
+        ngram_range=(1, 3),
+        max_df=0.85,
+        sublinear_tf=True,
+        token_pattern=r'(?u)\b\w+\b|[A-Z_]+\d*',
+        lowercase=False
+    )
+
+def test_collapse_wrapped_pipeline(training_texts):
+    """CalibratedClassifierCV(Pipeline) 形式（train_*_model）の畳み込みテスト"""
+    X, y = training_texts
+    pipeline = CalibratedClassifierCV(make_pipeline(make_vectorizer(), LinearSVC(dual=False)), method='sigmoid', cv=3)
+    pipeline.fit(X, y)
+
+    scorer, info = collapse_and_verify(pipeline)
+
+    assert isinstance(scorer, CalibratedLinearScorer)
+    assert info['collapsed'] is True
+    assert info['folds'] == 3
+
+    # 元のアンサンブルと許容誤差内で一致すること
+    np.testing.assert_allclose(scorer.predict_proba(X), pipeline.predict_proba(X), atol=PROBABILITY_TOLERANCE)
+    assert list(scorer.predict(X)) == list(pipeline.predict(X))
+
+def test_collapse_inner_calibration(training_texts):
+    """Pipeline(vectorizer, CalibratedClassifierCV) 形式（model_sync_solution）の畳み込みテスト"""
+    X, y = training_texts
+    pipeline = make_pipeline(make_vectorizer(), CalibratedClassifierCV(LinearSVC(dual=False), cv=3))
+    pipeline.fit(X, y)
+
+    scorer, info = collapse_and_verify(pipeline)
+
+    assert info['collapsed'] is True
+    np.testing.assert_allclose(scorer.predict_proba(X), pipeline.predict_proba(X), atol=PROBABILITY_TOLERANCE)
+
+def test_collapse_binary_and_uncalibrated(training_texts):
+    """二値分類・未校正モデルの畳み込みテスト"""
+    X, y = training_texts
+
+    binary = CalibratedClassifierCV(make_pipeline(make_vectorizer(), LinearSVC(dual=False)), method='sigmoid', cv=3)
+    binary.fit(X, y == '支払い関係')
+    scorer = collapse_calibrated_pipeline(binary)
+    np.testing.assert_allclose(scorer.predict_proba(X), binary.predict_proba(X), atol=PROBABILITY_TOLERANCE)
+
+    uncalibrated = make_pipeline(make_vectorizer(), LinearSVC(dual=False)).fit(X, y)
+    scorer = collapse_calibrated_pipeline(uncalibrated)
+    assert not scorer.is_calibrated
+    np.testing.assert_allclose(scorer.decision_function(X), uncalibrated.decision_function(X), atol=1e-9)
+    with pytest.raises(AttributeError):
+        scorer.predict_proba(X)
+
+def test_isotonic_is_not_collapsed(training_texts):
+    """isotonic校正は畳み込まず元のモデルを使用"""
+    X, y = training_texts
+    pipeline = CalibratedClassifierCV(make_pipeline(make_vectorizer(), LinearSVC(dual=False)), method='isotonic', cv=3)
+    pipeline.fit(X, y)
+
+    model, info = collapse_and_verify(pipeline)
+
+    assert model is pipeline
+    assert info['collapsed'] is False
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+ストリーム分類（NDJSON）のテスト
+"""
+
+import pytest
+import io
+import json
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from app import create_app
+
+EMAILS = [
+    {"subject": "PayPay決済完了", "body": "セブンイレブンで1,250円のお支払いが完了しました", "messageId": "m-0"},
+    {"subject": "Amazon タイムセール", "body": "最大50%OFF 今すぐチェック", "messageId": "m-1"},
+    {"subject": "【緊急】システム障害", "body": "本番APIサーバーで障害が発生しました", "messageId": "m-2"},
+    {"subject": "新着求人", "body": "機械学習エンジニア 年収800万円", "messageId": "m-3"},
+]
+
+def _ndjson(items) -> bytes:
+    return ''.join((item if isinstance(item, str) else json.dumps(item, ensure_ascii=False)) + '\n'
+                   for item in items).encode('utf-8')
+
+def _app(**settings):
+    originals = {key: getattr(config.Config, key) for key in settings}
+    for key, value in settings.items():
+        setattr(config.Config, key, value)
+    try:
+        app = create_app()
+    finally:
+        for key, value in originals.items():
+            setattr(config.Config, key, value)
+    app.config['TESTING'] = True
+    return app
+
+def test_stream_matches_batch_and_reports_bad_lines():
+    """一括分類と同じ結果を入力順に返し、不正な行は行番号付きのエラーを返して処理を続けること"""
+    app = _app()
+    data = _ndjson([EMAILS[0], EMAILS[1], '{broken', '', {"subject": "本文なし"}, EMAILS[2], EMAILS[3]])
+
+    with app.test_client() as client:
+        response = client.post('/api/classify/stream', data=data, content_type='application/x-ndjson')
+        batch = json.loads(client.post('/api/classify/batch', data=json.dumps({"emails": EMAILS}),
+                                       content_type='application/json').data)['results']
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+
+    assert [line['line'] for line in lines] == [1, 2, 3, 5, 6, 7]
+    assert 'Invalid JSON' in lines[2]['error']
+    assert 'subject, body' in lines[3]['error']
+
+    results = [line for line in lines if 'error' not in line]
+    assert [result['messageId'] for result in results] == [email['messageId'] for email in EMAILS]
+    for result, expected in zip(results, batch):
+        assert {key: value for key, value in result.items() if key != 'line'} == expected
+
+def test_stream_writes_each_chunk_before_reading_the_rest():
+    """チャンク毎に結果を返し、次のチャンクは読み出されるまで入力から読まないこと"""
+    app = _app(STREAM_CHUNK_SIZE=2)
+    data = _ndjson(EMAILS * 5)
+    stream = io.BytesIO(data)
+
+    with app.test_client() as client:
+        response = client.post('/api/classify/stream', input_stream=stream, content_length=len(data),
+                               content_type='application/x-ndjson', buffered=False)
+        chunks = iter(response.response)
+        first = next(chunks)
+        assert stream.tell() < len(data) / 2
+        rest = b''.join(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8') for chunk in chunks)
+        response.close()
+
+    first = first if isinstance(first, bytes) else first.encode('utf-8')
+    assert len(first.decode('utf-8').splitlines()) == 2
+    assert len(first.decode('utf-8').splitlines()) + len(rest.decode('utf-8').splitlines()) == 20
+    assert stream.tell() == len(data)
+
+def test_stream_rejects_oversized_lines():
+    """1行の上限バイト数を超える行はエラーを返し、後続の行は分類すること"""
+    app = _app(STREAM_MAX_LINE_BYTES=200)
+    data = _ndjson([{"subject": "長文", "body": "あ" * 500}, EMAILS[0]])
+
+    with app.test_client() as client:
+        response = client.post('/api/classify/stream', data=data, content_type='application/x-ndjson')
+    lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+
+    assert lines[0]['line'] == 1 and 'too long' in lines[0]['error']
+    assert lines[1]['line'] == 2 and lines[1]['messageId'] == 'm-0'
+
+if __name__ == '__main__':
+    pytest.main([__file__])
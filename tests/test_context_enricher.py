@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+文脈補完の単一走査化に対する同値性テスト
+旧実装（正規表現・キーワード表を個別に走査する版）を参照実装として保持し、出力が完全一致することを確認
+"""
+
+import pytest
+import random
+import re
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.context_enricher import AdvancedContextEnricher
+from models.train_model import create_extended_training_data
+
+# === 旧実装（参照用、変更しないこと） ===
+
+def legacy_extract_entities(self, text):
+    entities = {
+        'amounts': [],
+        'dates': [],
+        'payment_services': {},
+        'urgency_level': 'low',
+        'paypay_strength': 0,
+        'payment_type': None
+    }
+    for pattern in self.amount_patterns:
+        entities['amounts'].extend(re.findall(pattern, text))
+    for pattern in self.date_patterns:
+        entities['dates'].extend(re.findall(pattern, text))
+    for service_type, services in self.payment_services.items():
+        found_services = [s for s in services if s in text]
+        if found_services:
+            entities['payment_services'][service_type] = found_services
+    for variant in ['PayPay', 'paypay', 'ペイペイ', 'ペイ', 'PAYPAY']:
+        entities['paypay_strength'] += text.count(variant)
+    for level, keywords in self.urgency_keywords.items():
+        if any(keyword in text for keyword in keywords):
+            entities['urgency_level'] = level
+            break
+    for pay_type, keywords in self.payment_keywords.items():
+        if any(keyword in text for keyword in keywords):
+            entities['payment_type'] = pay_type
+            break
+    return entities
+
+def legacy_analyze_payment_context(self, text):
+    payment_context = {
+        'is_payment_related': False,
+        'payment_type': None,
+        'action_required': False,
+        'keywords_found': [],
+        'paypay_specific': False,
+        'context_strength': 0,
+        'completion_indicators': [],
+        'amount_context': False
+    }
+    all_keywords = []
+    for category, keywords in self.payment_keywords.items():
+        found = [kw for kw in keywords if kw in text]
+        all_keywords.extend(found)
+        if found and category != 'general':
+            payment_context['payment_type'] = category
+    payment_context['keywords_found'] = all_keywords
+    if all_keywords:
+        payment_context['is_payment_related'] = True
+        payment_context['context_strength'] = len(all_keywords)
+    if any(indicator in text for indicator in ['PayPay', 'paypay', 'ペイペイ', 'ペイ']):
+        payment_context['paypay_specific'] = True
+        payment_context['context_strength'] += 2
+    payment_context['completion_indicators'] = [
+        word for word in ['完了', '終了', 'しました', 'されました', '確定'] if word in text
+    ]
+    if any(pattern in text for pattern in ['金額', '料金', '¥', '円']):
+        payment_context['amount_context'] = True
+        payment_context['context_strength'] += 1
+    if any(word in text for word in ['期限', '確認', '手続き', 'お支払い', '変更']):
+        payment_context['action_required'] = True
+    return payment_context
+
+# === テストデータ ===
+
+@pytest.fixture(scope='module')
+def enricher():
+    return AdvancedContextEnricher()
+
+def _random_texts(enricher, count: int, seed: int = 0):
+    """キーワード・金額・日付の断片をランダムに連結したテキスト"""
+    rng = random.Random(seed)
+    vocabulary = [k for table in (enricher.payment_services, enricher.urgency_keywords, enricher.payment_keywords)
+                  for keywords in table.values() for k in keywords]
+    fragments = vocabulary + [
+        'ペイ', 'PAYPAY', '完了', 'されました', '期限', '1,250円', '¥3,000', '500¥', '3360.00', '金額：1200',
+        '利用金額: 980円', '2024年3月15日', '3/15', '12-31-2024', '2024/03/15', '10:30:00', '期限：2024年4月1日',
+        '1', '.', '/', '-', ':', '年', '月', ' '
+    ]
+    return [''.join(rng.choice(fragments) for _ in range(rng.randint(0, 25))) for _ in range(count)]
+
+@pytest.fixture(scope='module')
+def corpus(enricher):
+    df = create_extended_training_data()
+    texts = [f"{s} {b}" for s, b in zip(df['subject'], df['body'])]
+    texts += _random_texts(enricher, 500)
+    texts.append('<td style="padding:0">' * 2000 + 'PayPay決済 1,250円 2024/03/15' + '</td>' * 2000)
+    texts.append('')
+    return texts
+
+def test_entity_parity(enricher, corpus):
+    """extract_entities / analyze_payment_context の出力が旧実装と完全一致すること"""
+    for text in corpus:
+        scan = enricher.scan(text)
+        assert enricher.extract_entities(text, scan) == legacy_extract_entities(enricher, text), text[:80]
+        assert enricher.analyze_payment_context(text, scan) == legacy_analyze_payment_context(enricher, text), text[:80]
+
+def test_enrich_context_scans_once(enricher, monkeypatch):
+    """enrich_context はテキストを1回だけ走査すること"""
+    calls = []
+    original = enricher.scan
+    monkeypatch.setattr(enricher, 'scan', lambda text: calls.append(text) or original(text))
+
+    result = enricher.enrich_context('PayPay決済完了', '1,250円 期限：2024年4月1日')
+
+    assert len(calls) == 1
+    assert result['paypay_strength'] == 1
+    assert result['amount_info'] == '1,250'
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+特徴量関数のキーワード一括マッチャー化に対する同値性テスト
+旧実装（キーワード毎に文字列を走査する版）をそのまま参照実装として保持し、出力が完全一致することを確認
+"""
+
+import pytest
+import random
+import re
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collections import Counter
+
+from models.feature_spec import render_signals
+from models.keyword_matcher import KeywordMatcher
+from models.model_sync_solution import create_paypay_specialized_features, _PAYPAY_MATCHER
+from models.analyze_groundtruth_data import create_supervised_features, _SUPERVISED_MATCHER
+from models.train_realworld_model import create_improved_features, _IMPROVED_MATCHER
+from models.train_balanced_model import create_balanced_features, _BALANCED_MATCHER
+from models.train_model import create_extended_training_data
+
+# === 旧実装（参照用、変更しないこと） ===
+
+def legacy_paypay_specialized_features(text: str) -> str:
+    """
+    PayPay特化特徴量エンジニアリング - 単一定義版
+    注意: この関数は model_sync_solution.py でのみ定義し、他からはimportする
+    """
+    features = []
+    
+    # 基本テキスト
+    features.append(text)
+    
+    # === PayPay特化特徴量（重点強化） ===
+    paypay_variants = [
+        'PayPay', 'paypay', 'ペイペイ', 'ペイ', 'PAYPAY', 
+        'PayPay残高', 'PayPay決済', 'PayPay利用'
+    ]
+    
+    # PayPay検出強度計算
+    paypay_strength = 0
+    for variant in paypay_variants:
+        count = text.count(variant)
+        if count > 0:
+            paypay_strength += count
+            features.append(f"PAYPAY_VARIANT_{variant.replace(' ', '_')}")
+    
+    if paypay_strength > 0:
+        features.append(f"PAYPAY_STRENGTH_{min(paypay_strength, 5)}")
+    
+    # PayPay文脈特徴量
+    paypay_contexts = {
+        'チャージ': ['チャージ', 'charge', '入金', '残高追加'],
+        '決済': ['決済', '支払い', '購入', 'お支払い', '利用'],
+        '完了': ['完了', '終了', 'しました', 'されました'],
+        '通知': ['お知らせ', '通知', 'ご案内', 'notice']
+    }
+    
+    for context_type, keywords in paypay_contexts.items():
+        context_count = sum(1 for keyword in keywords if keyword in text)
+        if context_count > 0:
+            features.append(f"PAYPAY_CONTEXT_{context_type}_{context_count}")
+    
+    # === 決済サービス階層化特徴量 ===
+    payment_services = {
+        'major': ['PayPay', 'LINE Pay', 'Apple Pay', 'Google Pay'],
+        'credit': ['ペイディ', 'Paidy', 'メルペイ', '楽天ペイ'],
+        'card': ['デビットカード', 'クレジットカード', 'VISA', 'MasterCard', 'JCB'],
+        'bank': ['銀行振込', '口座振替', '引き落とし', '振替']
+    }
+    
+    for service_type, services in payment_services.items():
+        service_count = sum(1 for service in services if service in text)
+        if service_count > 0:
+            features.append(f"PAYMENT_TYPE_{service_type.upper()}_{service_count}")
+    
+    # === 金額パターン拡張特徴量 ===
+    amount_patterns = {
+        'comma_yen': r'\d{1,3}(?:,\d{3})*円',
+        'symbol_yen': r'¥\d{1,3}(?:,\d{3})*',
+        'decimal': r'\d+\.\d{2}',
+        'simple_yen': r'\d+円',
+        'range_amount': r'\d{3,6}円'
+    }
+    
+    total_amounts = 0
+    for pattern_name, pattern in amount_patterns.items():
+        matches = re.findall(pattern, text)
+        if matches:
+            total_amounts += len(matches)
+            features.append(f"AMOUNT_{pattern_name.upper()}_{len(matches)}")
+            
+            # 金額レンジ分類
+            for match in matches:
+                numbers = re.findall(r'\d+', match.replace(',', ''))
+                if numbers:
+                    amount = int(numbers[0])
+                    if amount < 1000:
+                        features.append("AMOUNT_RANGE_SMALL")
+                    elif amount < 10000:
+                        features.append("AMOUNT_RANGE_MEDIUM")
+                    else:
+                        features.append("AMOUNT_RANGE_LARGE")
+    
+    if total_amounts > 0:
+        features.append(f"TOTAL_AMOUNT_MENTIONS_{min(total_amounts, 3)}")
+    
+    # === 決済アクション詳細分類 ===
+    action_categories = {
+        'completion': ['完了', '終了', 'しました', 'されました', '実行'],
+        'processing': ['処理中', '手続き', '確認中', 'processing'],
+        'notification': ['お知らせ', '通知', 'ご案内', '連絡'],
+        'charge': ['チャージ', '入金', '追加', '補充'],
+        'payment': ['支払い', '決済', '購入', '引き落とし', '振替'],
+        'card_usage': ['ご利用', '使用', '決済', 'transaction']
+    }
+    
+    for action_type, actions in action_categories.items():
+        action_count = sum(1 for action in actions if action in text)
+        if action_count > 0:
+            features.append(f"ACTION_{action_type.upper()}_{action_count}")
+    
+    # === PayPay特化組み合わせ特徴量 ===
+    if any(variant in text for variant in paypay_variants) and any(completion in text for completion in ['完了', 'しました']):
+        features.append("PAYPAY_COMPLETION_COMBO")
+    
+    if any(variant in text for variant in paypay_variants) and total_amounts > 0:
+        features.append("PAYPAY_AMOUNT_COMBO")
+    
+    return ' '.join(features)
+
+def legacy_supervised_features(text: str) -> str:
+    """
+    正解データに基づく改良された特徴量エンジニアリング
+    """
+    features = []
+    text_lower = text.lower()
+    
+    # 基本テキスト
+    features.append(text)
+    
+    # === 支払い関係の強化パターン ===
+    payment_indicators = {
+        'card_specific': ['デビットカード', 'クレジットカード', 'ご利用のお知らせ'],
+        'payment_services': ['paypay', 'ペイペイ', 'ペイディ', 'paidy'],  
+        'bank_related': ['銀行', '振込', '引き落とし', '口座振替'],
+        'transaction_words': ['決済', '支払い', '料金', '請求', '利用金額']
+    }
+    
+    for category, keywords in payment_indicators.items():
+        count = sum(1 for keyword in keywords if keyword in text_lower)
+        if count > 0:
+            features.append(f"PAYMENT_{category.upper()}_{count}")
+    
+    # === 仕事・学習の判定強化 ===
+    work_study_indicators = {
+        'job_related': ['求人', '募集', '転職', 'エンジニア', '採用'],
+        'tech_keywords': ['github', 'python', 'javascript', 'プログラミング'],
+        'learning_words': ['学習', '研修', '勉強会', '講座', 'コース'],
+        'work_context': ['案件', 'プロジェクト', '業務', '仕事', '職種']
+    }
+    
+    for category, keywords in work_study_indicators.items():
+        count = sum(1 for keyword in keywords if keyword in text_lower)
+        if count > 0:
+            features.append(f"WORK_{category.upper()}_{count}")
+    
+    # === 重要メールの判定強化 ===
+    important_indicators = {
+        'urgency': ['重要', '緊急', '至急', 'important', 'urgent'],
+        'system_issues': ['システム', '障害', 'エラー', 'メンテナンス'],
+        'security': ['セキュリティ', 'パスワード', 'ログイン', 'アラート'],
+        'notifications': ['お知らせ', '通知', 'ご案内', '連絡']
+    }
+    
+    for category, keywords in important_indicators.items():
+        count = sum(1 for keyword in keywords if keyword in text_lower)
+        if count > 0:
+            features.append(f"IMPORTANT_{category.upper()}_{count}")
+    
+    # === プロモーションの判定強化 ===
+    promo_indicators = {
+        'sales_events': ['セール', 'タイムセール', '特価', '割引'],
+        'campaigns': ['キャンペーン', 'ポイント', 'マラソン'],
+        'retailers': ['amazon', '楽天', 'アマゾン'],
+        'offers': ['お得', '限定', '特別', 'off', '％']
+    }
+    
+    for category, keywords in promo_indicators.items():
+        count = sum(1 for keyword in keywords if keyword in text_lower)
+        if count > 0:
+            features.append(f"PROMO_{category.upper()}_{count}")
+    
+    # === 文脈的特徴量 ===
+    # Forwarded emailの検出
+    if 'fwd:' in text_lower or 'フォワード' in text_lower:
+        features.append("FORWARDED_EMAIL")
+    
+    # 金額パターンの検出
+    amount_patterns = [
+        r'\d{1,3}(?:,\d{3})*円',
+        r'¥\d+',
+        r'\d+円'
+    ]
+    
+    total_amounts = 0
+    for pattern in amount_patterns:
+        matches = re.findall(pattern, text)
+        total_amounts += len(matches)
+    
+    if total_amounts > 0:
+        features.append(f"AMOUNT_DETECTED_{min(total_amounts, 3)}")
+    
+    return ' '.join(features)
+
+def legacy_improved_features(text: str) -> str:
+    """
+    実運用データに基づく改良された特徴量エンジニアリング
+    """
+    features = []
+    text_lower = text.lower()
+    
+    # 基本テキスト
+    features.append(text)
+    
+    # === より精密な支払い関係特徴量 ===
+    payment_patterns = {
+        'paypay_specific': ['paypay', 'ペイペイ', 'paypay決済', 'paypay利用'],
+        'card_payment': ['デビットカード', 'クレジットカード', 'カード利用', 'ご利用'],
+        'payment_services': ['ペイディ', 'paidy', 'メルペイ', '楽天ペイ'],
+        'payment_actions': ['支払い', '決済', '引き落とし', '料金', '請求']
+    }
+    
+    for pattern_type, keywords in payment_patterns.items():
+        count = sum(1 for keyword in keywords if keyword in text_lower)
+        if count > 0:
+            features.append(f"PAYMENT_{pattern_type.upper()}_{count}")
+    
+    # === システム・重要関連特徴量強化 ===
+    important_patterns = {
+        'system_issues': ['システム', '障害', 'エラー', 'ダウン', '復旧'],
+        'security': ['セキュリティ', 'ログイン', 'パスワード', '不審', 'アラート'],
+        'urgent': ['緊急', '重要', '至急', 'urgent', 'critical'],
+        'maintenance': ['メンテナンス', '停止', '作業', '影響']
+    }
+    
+    for pattern_type, keywords in important_patterns.items():
+        count = sum(1 for keyword in keywords if keyword in text_lower)
+        if count > 0:
+            features.append(f"IMPORTANT_{pattern_type.upper()}_{count}")
+    
+    # === プロモーション特徴量精密化 ===
+    promo_patterns = {
+        'sales': ['セール', 'タイムセール', '特価', '割引'],
+        'campaigns': ['キャンペーン', 'ポイント', 'マラソン', 'フェア'],
+        'stores': ['amazon', '楽天', 'アマゾン'],
+        'offers': ['お得', '限定', '特別', 'プロモーション']
+    }
+    
+    for pattern_type, keywords in promo_patterns.items():
+        count = sum(1 for keyword in keywords if keyword in text_lower)
+        if count > 0:
+            features.append(f"PROMO_{pattern_type.upper()}_{count}")
+    
+    # === 仕事・学習特徴量強化 ===
+    work_patterns = {
+        'jobs': ['求人', '転職', '募集', 'エンジニア'],
+        'tech': ['github', 'プログラミング', 'python', 'javascript'],
+        'learning': ['学習', '研修', '勉強会', '講座'],
+        'career': ['キャリア', 'スキル', '経験', '年収']
+    }
+    
+    for pattern_type, keywords in work_patterns.items():
+        count = sum(1 for keyword in keywords if keyword in text_lower)
+        if count > 0:
+            features.append(f"WORK_{pattern_type.upper()}_{count}")
+    
+    # === 金額パターン（精密化） ===
+    amount_patterns = [
+        r'\d{1,3}(?:,\d{3})*円',    # 1,000円
+        r'¥\d{1,3}(?:,\d{3})*',    # ¥1,000
+        r'\d+円'                    # 1000円
+    ]
+    
+    total_amounts = 0
+    for pattern in amount_patterns:
+        matches = re.findall(pattern, text)
+        total_amounts += len(matches)
+    
+    if total_amounts > 0:
+        features.append(f"AMOUNT_DETECTED_{min(total_amounts, 3)}")
+    
+    return ' '.join(features)
+
+def legacy_balanced_features(text: str) -> str:
+    """
+    バランス調整された特徴量エンジニアリング
+    支払いラベルの偏重を防ぐため、他カテゴリの特徴量も強化
+    """
+    features = []
+    text_lower = text.lower()
+    
+    # 基本テキスト
+    features.append(text)
+    
+    # === 支払い関係特徴量（適度に調整）===
+    payment_keywords = [
+        'paypay', 'ペイペイ', '支払い', '決済', '料金', '引き落とし',
+        'クレジットカード', 'デビットカード', 'ペイディ', 'paidy'
+    ]
+    payment_count = sum(1 for keyword in payment_keywords if keyword in text_lower)
+    if payment_count > 0:
+        features.append(f"PAYMENT_DETECTED_{min(payment_count, 3)}")
+    
+    # 金額パターン
+    amount_patterns = [r'\d{1,3}(?:,\d{3})*円', r'¥\d{1,3}(?:,\d{3})*', r'\d+円']
+    total_amounts = 0
+    for pattern in amount_patterns:
+        matches = re.findall(pattern, text)
+        total_amounts += len(matches)
+    
+    if total_amounts > 0:
+        features.append(f"AMOUNT_FOUND_{min(total_amounts, 2)}")
+    
+    # === 重要メール特徴量（強化）===
+    important_keywords = [
+        '緊急', '重要', '障害', 'システム', 'メンテナンス', 'エラー',
+        '停止', 'サーバー', 'ダウン', '復旧', '影響', 'urgent', 'critical'
+    ]
+    important_count = sum(1 for keyword in important_keywords if keyword in text_lower)
+    if important_count > 0:
+        features.append(f"IMPORTANT_DETECTED_{min(important_count, 3)}")
+    
+    # === プロモーション特徴量（強化）===
+    promo_keywords = [
+        'セール', 'キャンペーン', 'ポイント', '割引', 'タイムセール',
+        '限定', 'お得', 'プロモーション', 'クーポン', 'amazon', '楽天',
+        'sale', 'campaign', 'discount', 'special'
+    ]
+    promo_count = sum(1 for keyword in promo_keywords if keyword in text_lower)
+    if promo_count > 0:
+        features.append(f"PROMO_DETECTED_{min(promo_count, 3)}")
+    
+    # === 仕事・学習特徴量（強化）===
+    work_keywords = [
+        '求人', 'エンジニア', 'プログラミング', 'github', 'indeed',
+        '転職', 'キャリア', '研修', '学習', 'コミット', 'pull request',
+        'job', 'career', 'learning', 'training', 'education'
+    ]
+    work_count = sum(1 for keyword in work_keywords if keyword in text_lower)
+    if work_count > 0:
+        features.append(f"WORK_DETECTED_{min(work_count, 3)}")
+    
+    # === 文脈パターン（全カテゴリ共通）===
+    if any(word in text_lower for word in ['完了', 'しました', '終了']):
+        features.append("COMPLETION_CONTEXT")
+    
+    if any(word in text_lower for word in ['お知らせ', '通知', 'ご案内']):
+        features.append("NOTIFICATION_CONTEXT")
+    
+    if any(word in text_lower for word in ['確認', 'チェック', '確定']):
+        features.append("CONFIRMATION_CONTEXT")
+    
+    return ' '.join(features)
+
+# === テストデータ ===
+
+FEATURE_PAIRS = [
+    (create_paypay_specialized_features, legacy_paypay_specialized_features),
+    (create_supervised_features, legacy_supervised_features),
+    (create_improved_features, legacy_improved_features),
+    (create_balanced_features, legacy_balanced_features),
+]
+
+MATCHERS = [_PAYPAY_MATCHER, _SUPERVISED_MATCHER, _IMPROVED_MATCHER, _BALANCED_MATCHER]
+
+def _random_texts(count: int, seed: int = 0):
+    """全キーワード表の語と断片・金額をランダムに連結したテキスト"""
+    rng = random.Random(seed)
+    vocabulary = sorted({k for matcher in MATCHERS for k in matcher.keywords})
+    fragments = vocabulary + [k[:len(k) // 2] for k in vocabulary if len(k) > 1] + [
+        ' ', '　', '1,250円', '¥3,000', '3360.00', '500円', 'PAYPAY', 'PayPay', 'Fwd:', 'FWD:', 'の', 'に'
+    ]
+    texts = []
+    for _ in range(count):
+        words = [rng.choice(fragments) for _ in range(rng.randint(0, 30))]
+        texts.append(rng.choice(['', ' ']).join(words))
+    return texts
+
+@pytest.fixture(scope='module')
+def corpus():
+    df = create_extended_training_data()
+    texts = [f"{s} {b}" for s, b in zip(df['subject'], df['body'])]
+    texts += _random_texts(500)
+    # HTMLメールを模した長文（キーワードは疎）
+    texts.append('<div class="footer">' * 2000 + 'PayPay決済 1,250円 ご利用のお知らせ' + '</div>' * 2000)
+    texts.append('')
+    return texts
+
+def _grouped(text: str, legacy_output: str) -> str:
+    """旧実装の出力の同じマーカーを初出の位置にまとめた文字列（マーカーの辞書から作る現在の形式、feature_version 2）"""
+    return render_signals(text, Counter(legacy_output[len(text):].split()))
+
+@pytest.mark.parametrize('new, legacy', FEATURE_PAIRS, ids=lambda f: getattr(f, '__name__', ''))
+def test_feature_parity(corpus, new, legacy):
+    """新旧の特徴量関数の出力が一致すること（同じマーカーが離れて付加される旧形式は初出の位置にまとめて比較）"""
+    for text in corpus:
+        expected = legacy(text)
+        assert new(text) == _grouped(text, expected), text[:80]
+        assert sorted(new(text)[len(text):].split()) == sorted(expected[len(text):].split())
+
+def test_keyword_hits_match_str_semantics():
+    """KeywordHits が `in` / `str.count` と同じ結果を返すこと（重なり合うキーワードを含む）"""
+    keywords = ['ペイ', 'ペイペイ', 'イペ', 'paypay', 'pay', 'aya', 'ay', 'a']
+    matcher = KeywordMatcher(keywords)
+    rng = random.Random(1)
+    for _ in range(2000):
+        text = ''.join(rng.choice(['ペ', 'イ', 'p', 'a', 'y', ' ']) for _ in range(rng.randint(0, 40)))
+        hits = matcher.scan(text)
+        for keyword in keywords:
+            assert (keyword in hits) == (keyword in text)
+            assert hits.count(keyword) == text.count(keyword), (text, keyword)
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+単一パス推論エンジンのテスト
+"""
+
+import pytest
+import numpy as np
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.svm import LinearSVC
+from sklearn.pipeline import make_pipeline
+from sklearn.calibration import CalibratedClassifierCV
+
+from models.calibrated_scorer import collapse_calibrated_pipeline
+from app.inference import InferenceEngine
+from models.train_model import create_extended_training_data
+
+@pytest.fixture(scope='module')
+def training_texts():
+    df = create_extended_training_data()
+    return [f"{s} {b}" for s, b in zip(df['subject'], df['body'])], df['label']
+
+def test_calibrated_pipeline_inference(training_texts):
+    """校正済みPipelineの推論結果が predict / predict_proba と一致すること"""
+    X, y = training_texts
+    pipeline = make_pipeline(TfidfVectorizer(), CalibratedClassifierCV(LinearSVC(dual=False), cv=3)).fit(X, y)
+    engine = InferenceEngine(pipeline)
+
+    results = engine.infer(X[:5], top_k=2)
+    proba = pipeline.predict_proba(X[:5])
+
+    assert engine.mode == 'pipeline'
+    assert engine.calibration == 'model'
+    for result, expected_label, expected_proba in zip(results, pipeline.predict(X[:5]), proba):
+        assert result['label'] == expected_label
+        assert result['confidence'] == pytest.approx(expected_proba.max())
+        assert len(result['top_k']) == 2
+        assert result['top_k'][0]['label'] == result['label']
+        assert result['margin'] is not None
+        assert sum(result['probabilities'].values()) == pytest.approx(1.0)
+
+def test_margin_fallback(training_texts):
+    """predict_probaを持たないモデルはマージンのsoftmaxで確率化"""
+    X, y = training_texts
+    pipeline = make_pipeline(TfidfVectorizer(), LinearSVC(dual=False)).fit(X, y)
+
+    for model in (pipeline, collapse_calibrated_pipeline(pipeline)):
+        engine = InferenceEngine(model)
+        results = engine.infer(X[:5])
+
+        assert engine.calibration == 'margin_softmax'
+        for result, expected_label, margins in zip(results, pipeline.predict(X[:5]), pipeline.decision_function(X[:5])):
+            assert result['label'] == expected_label
+            assert result['margin'] == pytest.approx(margins.max())
+            assert 0.0 < result['confidence'] <= 1.0
+
+def test_binary_scorer_inference(training_texts):
+    """二値分類の畳み込みスコアラーで確率・マージンが取得できること"""
+    X, y = training_texts
+    labels = np.where(y == '支払い関係', 'payment', 'other')
+    pipeline = CalibratedClassifierCV(make_pipeline(TfidfVectorizer(), LinearSVC(dual=False)), cv=3).fit(X, labels)
+    engine = InferenceEngine(collapse_calibrated_pipeline(pipeline))
+
+    results = engine.infer(X[:5])
+
+    assert engine.mode == 'scorer'
+    for result, proba in zip(results, pipeline.predict_proba(X[:5])):
+        assert result['confidence'] == pytest.approx(proba.max())
+        assert set(result['probabilities']) == {'payment', 'other'}
+
+if __name__ == '__main__':
+    pytest.main([__file__])
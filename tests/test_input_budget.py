@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+入力の上限（長文メールの切り詰め）のテスト
+"""
+
+import pytest
+import json
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from app import create_app
+from app.input_budget import InputBudget
+
+FILLER = "本日はご覧いただきありがとうございます。新着情報をお届けします。" * 2000
+KEY_LINE = "今月のご請求金額：12,345円 お支払い期限：2024年5月27日"
+
+def _long_body() -> str:
+    return "ペイディ ご利用確定のお知らせ\n" + FILLER + KEY_LINE + FILLER + "\nお問い合わせ：サポートセンター"
+
+def _app(**settings):
+    originals = {key: getattr(config.Config, key) for key in settings}
+    for key, value in settings.items():
+        setattr(config.Config, key, value)
+    try:
+        app = create_app()
+    finally:
+        for key, value in originals.items():
+            setattr(config.Config, key, value)
+    app.config['TESTING'] = True
+    return app
+
+def test_short_email_is_unchanged():
+    """上限以下のメールはそのまま使うこと"""
+    email = {"subject": "PayPay決済完了", "body": "1,250円のお支払いが完了しました", "messageId": "m-1"}
+    budgeted, info = InputBudget().apply(email)
+
+    assert budgeted == email
+    assert info == {'truncated': False, 'original_length': len(email['subject']) + len(email['body'])}
+
+def test_long_body_keeps_head_key_sections_and_tail():
+    """先頭・中間の金額・期限の前後・末尾を上限文字数以内で残すこと"""
+    budget = InputBudget(max_chars=2000, head_chars=800, tail_chars=400)
+    body = _long_body()
+    window, truncated = budget.window_body(body)
+
+    assert truncated
+    assert len(window) <= 2000
+    assert window.startswith(body[:800])
+    assert window.endswith(body[-400:])
+    assert KEY_LINE in window
+
+def test_scan_limit_and_subject_cap():
+    """重要箇所は中間の先頭 scan_chars 文字だけから探し、本文以外のフィールドは上限で切り詰めること"""
+    budget = InputBudget(max_chars=2000, head_chars=800, tail_chars=400, scan_chars=1000, subject_max_chars=50)
+    budgeted, info = budget.apply({"subject": "件名" * 100, "body": _long_body()})
+
+    assert KEY_LINE not in budgeted['body']
+    assert len(budgeted['subject']) == 50
+    assert info['truncated']
+    assert info['original_length'] == 200 + len(_long_body())
+
+def test_invalid_windows():
+    with pytest.raises(ValueError):
+        InputBudget(max_chars=1000, head_chars=800, tail_chars=400)
+
+def test_classify_reports_truncation():
+    """長文の分類・文脈補完は上限内のテキストで行い、レスポンスで切り詰めを報告すること"""
+    app = _app()
+    body = _long_body()
+    with app.test_client() as client:
+        data = json.loads(client.post('/api/classify', data=json.dumps(
+            {"subject": "ペイディ ご請求金額のお知らせ", "body": body, "messageId": "m-long"}),
+            content_type='application/json').data)
+        enriched = json.loads(client.post('/api/enrich-context', data=json.dumps(
+            {"subject": "ペイディ", "body": body}), content_type='application/json').data)
+        short = json.loads(client.post('/api/classify', data=json.dumps(
+            {"subject": "PayPay決済完了", "body": "1,250円"}), content_type='application/json').data)
+
+    assert data['input_truncated'] is True
+    assert data['original_text_length'] == len("ペイディ ご請求金額のお知らせ") + len(body)
+    assert data['text_length'] <= config.Config.INPUT_MAX_CHARS + config.Config.INPUT_SUBJECT_MAX_CHARS + 1
+    assert '12,345' in data['context_analysis']['extracted_amounts']
+    assert enriched['input_truncated'] is True
+    assert short['input_truncated'] is False
+
+def test_budget_can_be_disabled():
+    """INPUT_BUDGET_ENABLED=False では全文を使うこと"""
+    app = _app(INPUT_BUDGET_ENABLED=False)
+    body = _long_body()
+    with app.test_client() as client:
+        data = json.loads(client.post('/api/classify', data=json.dumps({"subject": "件名", "body": body}),
+                                      content_type='application/json').data)
+
+    assert data['input_truncated'] is False
+    assert data['text_length'] == len("件名") + 1 + len(body)
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+線形時間の正規表現の代替と、最悪ケースの本文の1KBあたりの処理時間のテスト
+（処理時間の判定は計測の揺らぎがあるため slow マーカー付き。pytest --run-slow で実行）
+"""
+
+import pytest
+import random
+import re
+import sys
+import os
+import time
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.feature_spec import FEATURE_VERSIONS, resolve_feature_function
+from models.linear_patterns import LINEAR_PATTERNS, LONG_RUN, LinearPattern, NamedAlternation, compile_pattern
+from models.synthetic_mailbox import ADVERSARIAL_KINDS, adversarial_text
+from app.context_enricher import advanced_enricher
+from app.template_index import ID_PATTERN, STORE_PATTERNS, TemplateFingerprinter
+
+# 数字・カンマ・終端文字・ハイフンが密に並ぶ文字の集合（全角数字は \d に一致するがIDの英数字ではない）
+ALPHABETS = ['1,,,1111.円¥-a', '1234,.円¥-aZ x:/年月日金額：', '1.2.３.4円円,', '1-a-1-b２ ', '店舗：で1円¥ 、ab']
+
+MASKS = [
+    ('DATE', advanced_enricher.date_patterns),
+    ('AMOUNT', advanced_enricher.amount_patterns),
+    ('ID', [ID_PATTERN]),
+    ('STORE', STORE_PATTERNS),
+    ('NUM', [r'\d+']),
+]
+
+def _random_texts(alphabet: str, count: int, max_length: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length))) for _ in range(count)]
+
+def _combined(groups) -> re.Pattern:
+    """TemplateFingerprinter が以前使っていた1つの正規表現"""
+    return re.compile('|'.join(
+        f"(?P<{name}>{'|'.join(f'(?:{pattern})' for pattern in patterns)})" for name, patterns in groups
+    ))
+
+@pytest.mark.parametrize('pattern', sorted(LINEAR_PATTERNS))
+def test_extractors_match_regex(pattern):
+    """線形時間の抽出器が元の正規表現の findall と同じ結果を返すこと"""
+    extractor = LINEAR_PATTERNS[pattern]
+    regex = re.compile(pattern)
+    for alphabet in ALPHABETS:
+        for text in _random_texts(alphabet, 3000, 30):
+            assert extractor.findall(text) == regex.findall(text), text
+
+    sample = "ご利用金額：12,345円 ¥1,000 合計1,234,567円（税込3360.00）12345円 1,23円 承認番号 AB-123456 ----"
+    assert extractor.findall(sample) == regex.findall(sample)
+
+def test_compile_pattern():
+    """既知のパターンは線形時間の抽出器、それ以外は re.compile を返すこと"""
+    assert isinstance(compile_pattern(r'(\d{1,3}(?:,\d{3})*|\d+)円'), LinearPattern)
+    assert isinstance(compile_pattern(ID_PATTERN), LinearPattern)
+    assert compile_pattern(r'¥\d+').findall('¥100 ¥2,000') == ['¥100', '¥2']
+    assert not isinstance(compile_pattern(r'¥\d+'), LinearPattern)
+
+def test_masker_matches_combined_regex():
+    """テンプレート指紋のマスクが元の1つの正規表現の sub と同じ結果を返すこと（長い列を含む場合も）"""
+    masker = NamedAlternation(MASKS)
+    regex = _combined(MASKS)
+    texts = [text for alphabet in ALPHABETS for text in _random_texts(alphabet, 2000, 40, seed=1)]
+    texts += ['1' * LONG_RUN + '円 2024年5月27日', '-' * LONG_RUN + ' AB-12345 ' + '1,000' * 20 + '円']
+
+    for text in texts:
+        expected = regex.sub(lambda match: f'<{match.lastgroup}>', text)
+        assert masker.sub_linear(lambda name: f'<{name}>', text) == expected, text
+        assert masker.sub(lambda name: f'<{name}>', text) == expected, text
+
+def _seconds(function, text: str, repeat: int = 3) -> float:
+    function(text)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+@pytest.mark.slow
+def test_adversarial_cost_per_kb_is_bounded():
+    """最悪ケースの本文で、8倍の長さの1KBあたりの所要時間が短い本文の数倍以内に収まること（2乗なら8倍）"""
+    targets = {name: resolve_feature_function(name) for name in FEATURE_VERSIONS if name != 'raw'}
+    targets['extract_entities'] = advanced_enricher.extract_entities
+    targets['mask'] = TemplateFingerprinter(advanced_enricher.amount_patterns, advanced_enricher.date_patterns).mask
+
+    short, long = 2000, 16000
+    for kind in ADVERSARIAL_KINDS:
+        short_text, long_text = adversarial_text(kind, short), adversarial_text(kind, long)
+        for name, function in targets.items():
+            short_per_kb = _seconds(function, short_text) / short
+            long_per_kb = _seconds(function, long_text) / long
+            # 計測の揺らぎを吸収するため 1KB あたり 0.05ms までの差は許容
+            assert long_per_kb <= 3 * short_per_kb + 0.05e-6, (kind, name, short_per_kb, long_per_kb)
+
+if __name__ == '__main__':
+    pytest.main([__file__])
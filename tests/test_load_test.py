@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+負荷試験スクリプトのテスト
+"""
+
+import pytest
+import json
+import subprocess
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+SCRIPT = os.path.join(PROJECT_ROOT, 'scripts', 'load_test.py')
+
+def _run(tmp_path, *args):
+    output = tmp_path / 'load.json'
+    subprocess.run([sys.executable, SCRIPT, '--warmup', '2', '--json', str(output), *args],
+                   check=True, capture_output=True, cwd=PROJECT_ROOT)
+    return json.loads(output.read_text(encoding='utf-8'))
+
+def test_closed_loop_replays_n8n_log(tmp_path):
+    """n8n のログシートを同時実行数毎に再生し、エラーなしの段階毎の結果を保存すること"""
+    report = _run(tmp_path, '--concurrency', '1,2', '--duration', '30', '--requests', '12')
+
+    assert report['target'] == 'in-process'
+    assert report['corpus']['emails'] == 5
+    assert [step['concurrency'] for step in report['steps']] == [1, 2]
+    for step in report['steps']:
+        assert step['requests'] == 12
+        assert step['error_rate'] == 0.0
+        assert step['p50_ms'] <= step['p95_ms'] <= step['p99_ms']
+    assert 'saturation' in report
+
+def test_open_loop_with_synthetic_corpus(tmp_path):
+    """合成メールボックスを目標レートで送信すること"""
+    report = _run(tmp_path, '--synthetic', '20', '--rate', '40', '--duration', '0.5', '--endpoints', 'classify')
+
+    step = report['steps'][0]
+    assert step['mode'] == 'open' and step['target_rate'] == 40
+    assert step['requests'] == 20 and step['errors'] == 0
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+メモリマップ形式のモデルファイルのテスト
+"""
+
+import pytest
+import joblib
+import subprocess
+import sys
+import os
+
+import numpy as np
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.svm import LinearSVC
+from sklearn.pipeline import make_pipeline
+
+from app.classifier import _report_loaded
+from app.model_bundle import export_mapped_artifact, load_bundle
+from app.model_holder import ModelHolder
+from models.feature_spec import describe_features
+from models.mapped_format import mapped_path
+from models.text_analyzers import analyzer_params
+
+TEXTS = [
+    "PayPay決済完了 1,250円 お支払い", "PayPay 残高 チャージ 完了", "デビットカード 引落 3,360円",
+    "Amazon タイムセール 最大50%OFF", "楽天 ポイント キャンペーン", "期間限定 セール 開催中",
+    "緊急 システム障害 発生", "重要 サーバー停止 のお知らせ", "至急 セキュリティ 警告",
+]
+LABELS = ["支払い関係"] * 3 + ["プロモーション"] * 3 + ["重要"] * 3
+
+def _save_artifact(path, analyzer: str = 'word'):
+    vectorizer = TfidfVectorizer(**analyzer_params(analyzer, dict(
+        ngram_range=(1, 2), sublinear_tf=True, token_pattern=r'(?u)\b\w+\b', lowercase=False
+    )))
+    pipeline = CalibratedClassifierCV(make_pipeline(vectorizer, LinearSVC(dual=False)), method='sigmoid', cv=3)
+    joblib.dump({
+        'pipeline': pipeline.fit(TEXTS, LABELS),
+        'accuracy': 0.9,
+        **describe_features('raw')
+    }, path)
+
+@pytest.mark.parametrize('analyzer', ['word', 'char', 'script'])
+def test_mapped_matches_joblib(tmp_path, analyzer):
+    """メモリマップ形式の推論結果がjoblib形式と一致すること"""
+    artifact = tmp_path / 'balanced_model_v1.pkl'
+    _save_artifact(artifact, analyzer)
+    export_mapped_artifact(str(artifact))
+
+    original = load_bundle(str(tmp_path), prefer_mapped=False)
+    mapped = load_bundle(str(tmp_path))
+
+    assert mapped.collapse_info['mapped']
+    assert not mapped.model.weights.flags.owndata
+    assert not mapped.model.weights.flags.writeable
+    assert mapped.version == original.version
+    assert mapped.metadata['accuracy'] == 0.9
+
+    texts = TEXTS + ["PayPay セール 障害", "語彙にない文章", ""]
+    for expected, actual in zip(original.engine.infer(texts), mapped.engine.infer(texts)):
+        assert actual['label'] == expected['label']
+        for label, probability in expected['probabilities'].items():
+            assert actual['probabilities'][label] == pytest.approx(probability, abs=1e-12)
+
+def test_training_export_does_not_import_app(tmp_path):
+    """学習スクリプトの書き出し（models.serving_export）は app を import せず、APIサーバーが読み込める形式で保存すること"""
+    artifact = tmp_path / 'balanced_model_v1.pkl'
+    _save_artifact(artifact)
+    script = (
+        "import sys\n"
+        "from models.serving_export import export_serving_artifact\n"
+        f"export_serving_artifact({str(artifact)!r})\n"
+        "print(sorted(m for m in sys.modules if m == 'app' or m.startswith('app.')))\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True, check=True)
+
+    assert output.stdout.strip().splitlines()[-1] == '[]'
+    bundle = load_bundle(str(tmp_path))
+    assert bundle.collapse_info['mapped']
+    original = load_bundle(str(tmp_path), prefer_mapped=False)
+    assert bundle.engine.infer_one(TEXTS[0])['label'] == original.engine.infer_one(TEXTS[0])['label']
+
+def test_stale_mapped_artifact_is_ignored(tmp_path):
+    """モデルファイルが再学習で置き換えられた後の古い変換結果は使わないこと"""
+    artifact = tmp_path / 'balanced_model_v1.pkl'
+    _save_artifact(artifact)
+    export_mapped_artifact(str(artifact))
+    assert os.path.isdir(mapped_path(str(artifact)))
+
+    _save_artifact(artifact, 'char')
+    bundle = load_bundle(str(tmp_path))
+
+    assert not bundle.collapse_info.get('mapped')
+    assert bundle.path == str(artifact)
+
+def test_mapped_bundle_loads_through_holder(tmp_path, capsys):
+    """メモリマップ形式のバンドルが分類APIと同じホルダー・読み込み報告（_report_loaded）で読み込み・再読み込みできること"""
+    artifact = tmp_path / 'balanced_model_v1.pkl'
+    _save_artifact(artifact)
+    export_mapped_artifact(str(artifact))
+
+    holder = ModelHolder(lambda: load_bundle(str(tmp_path)), on_loaded=_report_loaded)
+    assert holder.get().collapse_info['mapped']
+    assert 'Serving NumPy scorer' in capsys.readouterr().out
+
+    assert holder.reload(wait=True, timeout=30)
+    assert holder.last_error is None
+    assert not holder.reloading
+    assert holder.generation == 2
+    assert 'Serving NumPy scorer' in capsys.readouterr().out
+
+if __name__ == '__main__':
+    pytest.main([__file__])
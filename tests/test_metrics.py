@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+処理段階毎のレイテンシ計測・メトリクスエンドポイントのテスト
+"""
+
+import pytest
+import json
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.metrics import OTHER_LABEL, STAGES, Histogram, Metrics, _request_timings, timed
+
+def _sample(text: str, name: str) -> float:
+    """Prometheus テキスト形式から1系列の値を取り出す"""
+    for line in text.splitlines():
+        if line.startswith(name + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    raise AssertionError(f"{name} not found")
+
+def test_histogram_buckets_are_cumulative():
+    """バケットの上限を含み、累積件数・合計・件数が記録されること"""
+    histogram = Histogram((0.001, 0.01))
+    for seconds in (0.0005, 0.001, 0.005, 2.0):
+        histogram.observe(seconds)
+
+    assert histogram.cumulative() == [('0.001', 2), ('0.01', 3), ('+Inf', 4)]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.0065)
+
+def test_timed_only_records_inside_request():
+    """リクエスト外では何も記録せず、リクエスト中は処理段階毎に所要時間を加算すること"""
+    with timed('features'):
+        pass
+    assert _request_timings.get() is None
+
+    timings = {}
+    token = _request_timings.set(timings)
+    try:
+        for _ in range(2):
+            with timed('features'):
+                pass
+    finally:
+        _request_timings.reset(token)
+
+    assert list(timings) == ['features']
+    assert timings['features'] >= 0
+
+def test_label_series_are_bounded():
+    """ラベル毎の系列数が上限を超えたら OTHER_LABEL に集計すること"""
+    metrics = Metrics(max_label_series=2)
+    metrics.count_classifications([('支払い関係', 'model'), ('通知', 'model'), ('広告', 'model'), ('広告', 'cache')])
+
+    assert metrics.classifications == {
+        ('支払い関係', 'model'): 1,
+        ('通知', 'model'): 1,
+        (OTHER_LABEL, 'model'): 1,
+        (OTHER_LABEL, 'cache'): 1
+    }
+
+def test_metrics_endpoint_reports_stages_and_counts():
+    """分類リクエストの処理段階毎の所要時間・リクエスト数・ラベル・キャッシュヒット・モデルバージョンを返すこと"""
+    app = create_app()
+    app.config['TESTING'] = True
+    email = {"subject": "PayPay決済完了", "body": "利用金額：1,250円"}
+
+    with app.test_client() as client:
+        for _ in range(2):
+            client.post('/api/classify', data=json.dumps(email), content_type='application/json')
+        client.post('/api/classify', data=json.dumps({}), content_type='application/json')
+        label = json.loads(client.post('/api/classify', data=json.dumps(email),
+                                       content_type='application/json').data)['classification']
+
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        text = response.data.decode('utf-8')
+        version = json.loads(client.get('/api/model/status').data)['model_version']
+
+    prefix = 'gmail_classifier_'
+    assert _sample(text, prefix + 'requests_total{endpoint="classifier.classify_email",status="200"}') == 3
+    assert _sample(text, prefix + 'errors_total{endpoint="classifier.classify_email",kind="client"}') == 1
+    assert _sample(text, prefix + f'classifications_total{{label="{label}",source="cache"}}') == 2
+    assert _sample(text, prefix + 'result_cache_hits_total{tier="memory"}') == 2
+    assert _sample(text, prefix + 'model_loaded') == 1
+    assert f'version="{version}"' in text
+
+    # キャッシュから返したリクエストはモデル評価・文脈補完の処理段階を通らない
+    for stage in ('features', 'vectorize', 'enrich'):
+        assert _sample(text, prefix + f'stage_duration_seconds_count{{stage="{stage}"}}') == 1
+    assert _sample(text, prefix + 'stage_duration_seconds_count{stage="parse"}') == 4
+    assert _sample(text, prefix + 'stage_duration_seconds_bucket{stage="parse",le="+Inf"}') == 4
+    stages = {line.split('stage="')[1].split('"')[0] for line in text.splitlines() if 'stage="' in line}
+    assert stages <= set(STAGES)
+
+def test_metrics_can_be_disabled():
+    """METRICS_ENABLED=False では計測せず /metrics は 404 を返すこと"""
+    import config
+    original = config.Config.METRICS_ENABLED
+    config.Config.METRICS_ENABLED = False
+    try:
+        app = create_app()
+    finally:
+        config.Config.METRICS_ENABLED = original
+
+    assert 'metrics' not in app.extensions
+    assert app.test_client().get('/metrics').status_code == 404
+
+if __name__ == '__main__':
+    pytest.main([__file__])
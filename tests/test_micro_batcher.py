@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+単体分類のマイクロバッチのテスト
+"""
+
+import pytest
+import json
+import sys
+import os
+import threading
+import time
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from app import create_app
+from app.classifier import load_model_bundle
+from app.micro_batcher import MicroBatcher, infer_texts
+
+TEXTS = [
+    "PayPay決済完了 セブンイレブンで1,250円のお支払いが完了しました",
+    "Amazon タイムセール 最大50%OFF",
+    "【緊急】本番APIサーバーで障害が発生しました",
+    "新着求人 機械学習エンジニア 年収800万円",
+    "ペイディ ご利用確定のお知らせ 3,980円",
+    "デビットカードのご利用のお知らせ 承認番号123456",
+]
+
+@pytest.fixture(scope='module')
+def bundle():
+    return load_model_bundle()
+
+def _concurrent(batcher, bundle, texts):
+    """推論前の処理中のリクエストが揃ってから一斉に推論する"""
+    ready = threading.Barrier(len(texts))
+    results = [None] * len(texts)
+
+    def request(i):
+        with batcher.pending():
+            ready.wait()
+            results[i] = batcher.infer(bundle, [texts[i]], 3)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(len(texts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_requests_share_one_batch(bundle):
+    """同時に処理中のリクエストを1回の推論にまとめ、各リクエストに自分の結果を返すこと"""
+    batcher = MicroBatcher(max_batch_size=32, max_wait_ms=2000)
+    results = _concurrent(batcher, bundle, TEXTS)
+
+    expected = infer_texts(bundle, TEXTS, 3)
+    assert [result[0]['label'] for result in results] == [inference['label'] for inference in expected]
+    for result, inference in zip(results, expected):
+        assert result[0]['confidence'] == pytest.approx(inference['confidence'])
+
+    stats = batcher.stats()
+    assert stats['batches'] == 1
+    assert stats['requests'] == len(TEXTS)
+    assert stats['largest_batch'] == len(TEXTS)
+
+def test_batch_size_limit(bundle):
+    """バッチの上限件数を超えた分は別のバッチで推論すること"""
+    batcher = MicroBatcher(max_batch_size=4, max_wait_ms=2000)
+    results = _concurrent(batcher, bundle, TEXTS)
+
+    assert all(len(result) == 1 for result in results)
+    stats = batcher.stats()
+    assert stats['batches'] >= 2
+    assert stats['largest_batch'] <= 4
+
+def test_single_request_does_not_wait(bundle):
+    """合流し得るリクエストがなければ待たずに推論すること"""
+    batcher = MicroBatcher(max_wait_ms=5000)
+    start = time.perf_counter()
+    with batcher.pending():
+        batcher.infer(bundle, [TEXTS[0]], 3)
+    assert time.perf_counter() - start < 1.0
+
+def test_wait_is_bounded(bundle):
+    """推論に進まないリクエストがあっても最大待ち時間で打ち切ること"""
+    batcher = MicroBatcher(max_wait_ms=50)
+    holding = threading.Event()
+    release = threading.Event()
+
+    def stalled():
+        with batcher.pending():
+            holding.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=stalled)
+    thread.start()
+    holding.wait(5)
+    try:
+        start = time.perf_counter()
+        batcher.infer(bundle, [TEXTS[0]], 3)
+        elapsed = time.perf_counter() - start
+    finally:
+        release.set()
+        thread.join()
+    assert 0.04 <= elapsed < 1.0
+
+def test_errors_reach_every_caller(bundle):
+    """バッチの推論が失敗したら合流した全リクエストに例外を返すこと"""
+    batcher = MicroBatcher(max_wait_ms=2000)
+    ready = threading.Barrier(3)
+    errors = []
+
+    def request():
+        with batcher.pending():
+            ready.wait()
+            try:
+                batcher.infer(bundle, [None], 3)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=request) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 3
+    assert batcher.stats()['batches'] == 1
+
+def test_classify_endpoint_batches_concurrent_requests():
+    """同時に届いた /api/classify は単体と同じ形式・結果で返り、/metrics にバッチ数が出ること"""
+    original = config.Config.RESULT_CACHE_ENABLED, config.Config.TEMPLATE_INDEX_ENABLED
+    config.Config.RESULT_CACHE_ENABLED = config.Config.TEMPLATE_INDEX_ENABLED = False
+    try:
+        app = create_app()
+    finally:
+        config.Config.RESULT_CACHE_ENABLED, config.Config.TEMPLATE_INDEX_ENABLED = original
+    app.config['TESTING'] = True
+
+    def classify(client, i):
+        response = client.post('/api/classify', data=json.dumps(
+            {"subject": TEXTS[i], "body": "", "messageId": f"m-{i}"}), content_type='application/json')
+        assert response.status_code == 200
+        return json.loads(response.data)
+
+    expected = [classify(app.test_client(), i) for i in range(len(TEXTS))]
+
+    responses = [None] * len(TEXTS)
+
+    def request(i):
+        responses[i] = classify(app.test_client(), i)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(len(TEXTS))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for response, single in zip(responses, expected):
+        assert response.keys() == single.keys()
+        assert response['messageId'] == single['messageId']
+        assert response['classification'] == single['classification']
+        assert response['confidence'] == pytest.approx(single['confidence'])
+
+    metrics = app.test_client().get('/metrics').data.decode()
+    assert 'gmail_classifier_micro_batch_requests_total 12' in metrics
+
+if __name__ == '__main__':
+    pytest.main([__file__])
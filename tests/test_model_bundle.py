@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+自己記述型モデルファイル・モデルバンドルのテスト
+"""
+
+import pytest
+import joblib
+import json
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.svm import LinearSVC
+from sklearn.pipeline import make_pipeline
+
+from app import create_app
+import app.classifier as classifier
+from app.model_bundle import load_bundle
+from models.feature_spec import describe_features
+from models.train_balanced_model import create_balanced_features
+from models.train_realworld_model import create_improved_features
+
+def _train_pipeline():
+    texts = ["PayPay決済完了 1,250円", "Amazon タイムセール", "緊急 システム障害", "Indeed 求人 エンジニア"]
+    labels = ["支払い関係", "プロモーション", "重要", "仕事・学習"]
+    return make_pipeline(TfidfVectorizer(), LinearSVC()).fit(texts, labels)
+
+def test_self_describing_artifact(tmp_path):
+    """モデルファイルに記録された特徴量仕様で関数・入力フィールドが解決されること"""
+    joblib.dump({
+        'pipeline': _train_pipeline(),
+        'accuracy': 0.9,
+        **describe_features('models.train_balanced_model:create_balanced_features', input_fields=['subject'])
+    }, tmp_path / 'balanced_model_v1.pkl')
+
+    bundle = load_bundle(str(tmp_path))
+
+    assert bundle.feature_function is create_balanced_features
+    assert bundle.feature_version == 1
+    assert not bundle.feature_version_mismatch()
+    assert bundle.build_text({'subject': '件名', 'body': '本文'}) == '件名'
+
+def test_legacy_artifact_uses_filename(tmp_path):
+    """特徴量仕様のない旧形式ファイルはファイル名から特徴量関数を判定"""
+    joblib.dump({'pipeline': _train_pipeline()}, tmp_path / 'realworld_improved_v1.pkl')
+
+    bundle = load_bundle(str(tmp_path))
+
+    assert bundle.feature_function is create_improved_features
+    assert bundle.feature_version is None
+    assert bundle.build_text({'subject': '件名', 'body': '本文'}) == '件名 本文'
+
+def test_classify_does_not_probe_filesystem(monkeypatch):
+    """分類リクエスト処理中にファイル存在確認を行わないこと"""
+    app = create_app()
+    app.config['TESTING'] = True
+    classifier.load_model_bundle()
+
+    def fail_exists(path):
+        raise AssertionError(f"os.path.exists called on request path: {path}")
+
+    monkeypatch.setattr(os.path, 'exists', fail_exists)
+
+    with app.test_client() as client:
+        response = client.post('/api/classify',
+                              data=json.dumps({"subject": "PayPay決済完了", "body": "1,250円"}),
+                              content_type='application/json')
+
+    assert response.status_code == 200
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+NumPy配列形式のモデル圧縮（枝刈り・低精度化）のテスト
+"""
+
+import pytest
+import sys
+import os
+
+import numpy as np
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.mapped_artifact import load_mapped_scorer
+from models.mapped_format import mapped_path, quantize_weights, read_manifest
+from app.model_bundle import export_mapped_artifact, load_bundle, load_mapped_bundle
+from app.model_compression import chi2_importance, compress_mapped_artifact, weight_importance
+from tests.test_mapped_artifact import LABELS, TEXTS, _save_artifact
+
+@pytest.fixture
+def source(tmp_path):
+    artifact = tmp_path / 'balanced_model_v1.pkl'
+    _save_artifact(artifact)
+    return export_mapped_artifact(str(artifact))
+
+def test_int8_quantization_error_is_bounded():
+    """int8 量子化の誤差が出力列毎のスケールの半分以内であること"""
+    weights = np.random.default_rng(0).normal(size=(50, 4))
+    weights[:, 3] = 0.0
+    quantized, scales = quantize_weights(weights, 'int8')
+
+    assert quantized.dtype == np.int8
+    assert scales[3] == 1.0
+    assert np.all(np.abs(quantized * scales - weights) <= scales / 2 + 1e-12)
+
+@pytest.mark.parametrize('weight_dtype,tolerance', [('float32', 1e-6), ('float16', 1e-3), ('int8', 2e-2)])
+def test_quantized_artifact_stays_close(tmp_path, source, weight_dtype, tolerance):
+    """低精度化した重み行列でも予測ラベル・確率が非圧縮版とほぼ一致すること"""
+    compressed = str(tmp_path / f'{weight_dtype}.mapped')
+    compress_mapped_artifact(source, compressed, weight_dtype=weight_dtype)
+
+    original = load_mapped_bundle(source)
+    bundle = load_mapped_bundle(compressed)
+    assert bundle.model.weights.dtype == np.dtype(weight_dtype)
+    assert bundle.collapse_info['compression']['weight_dtype'] == weight_dtype
+
+    texts = TEXTS + ["PayPay セール 障害", "語彙にない文章", ""]
+    for expected, actual in zip(original.engine.infer(texts), bundle.engine.infer(texts)):
+        assert actual['label'] == expected['label']
+        for label, probability in expected['probabilities'].items():
+            assert actual['probabilities'][label] == pytest.approx(probability, abs=tolerance)
+
+def test_weight_pruning_keeps_largest_terms(tmp_path, source):
+    """重みの大きさによる枝刈りで重みの大きい語から残ること"""
+    scorer = load_mapped_scorer(source, read_manifest(source))
+    magnitude = dict(zip(scorer.vocabulary.terms(), weight_importance(scorer)))
+
+    compressed = str(tmp_path / 'pruned.mapped')
+    info = compress_mapped_artifact(source, compressed, keep_ratio=0.5, method='weight', weight_dtype='float64')
+    kept = set(load_mapped_scorer(compressed, read_manifest(compressed)).vocabulary.terms())
+
+    assert info['terms'] == len(kept) == round(len(magnitude) * 0.5)
+    assert min(magnitude[term] for term in kept) >= max(
+        value for term, value in magnitude.items() if term not in kept)
+
+def test_chi2_pruning_prefers_class_specific_terms(tmp_path, source):
+    """カイ二乗値による枝刈りでラベル付きテキストのクラスに偏る語が残ること"""
+    scorer = load_mapped_scorer(source, read_manifest(source))
+    chi2 = dict(zip(scorer.vocabulary.terms(), chi2_importance(scorer, TEXTS, LABELS)))
+    assert chi2['PayPay'] > 0
+
+    compressed = str(tmp_path / 'chi2.mapped')
+    compress_mapped_artifact(source, compressed, keep_ratio=0.3, method='chi2',
+                             weight_dtype='float64', texts=TEXTS, labels=LABELS)
+    kept = load_mapped_scorer(compressed, read_manifest(compressed)).vocabulary.terms()
+    assert all(chi2[term] > 0 for term in kept)
+
+    with pytest.raises(ValueError):
+        compress_mapped_artifact(source, compressed, keep_ratio=0.3, method='chi2')
+
+def test_compressed_artifact_is_not_compressed_again(tmp_path, source):
+    """圧縮済みの変換結果を元にした再圧縮は拒否すること"""
+    compressed = str(tmp_path / 'int8.mapped')
+    compress_mapped_artifact(source, compressed, weight_dtype='int8')
+    with pytest.raises(ValueError):
+        compress_mapped_artifact(compressed, str(tmp_path / 'again.mapped'))
+
+def test_installed_compressed_artifact_is_served(tmp_path, source):
+    """モデルファイルの変換先に配置した圧縮版をAPIサーバーが読み込むこと"""
+    artifact = str(tmp_path / 'balanced_model_v1.pkl')
+    assert source == mapped_path(artifact)
+    compress_mapped_artifact(source, str(tmp_path / 'staged.mapped'), keep_ratio=0.5, weight_dtype='int8')
+    os.replace(source, str(tmp_path / 'original.mapped'))
+    os.replace(str(tmp_path / 'staged.mapped'), source)
+
+    bundle = load_bundle(str(tmp_path))
+
+    assert bundle.collapse_info['mapped']
+    assert bundle.collapse_info['compression']['weight_dtype'] == 'int8'
+    assert bundle.collapse_info['vocabulary_size'] == bundle.collapse_info['compression']['terms']
+    assert bundle.engine.infer_one('PayPay決済完了 1,250円')['label'] in LABELS
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+モデルホルダー（単一読み込み・原子的な差し替え）のテスト
+"""
+
+import pytest
+import sys
+import os
+import threading
+import time
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.model_holder import ModelHolder
+
+class _Engine:
+    classes_ = ['important', 'promotion']
+
+    def __init__(self, probabilities):
+        self.probabilities = probabilities
+
+    def infer(self, texts, top_k=None):
+        return [{'label': 'important', 'probabilities': dict(self.probabilities)} for _ in texts]
+
+class _Bundle:
+    """推論経路だけを持つテスト用バンドル"""
+
+    def __init__(self, name, probabilities=None):
+        self.name = name
+        self.engine = _Engine(probabilities or {'important': 0.75, 'promotion': 0.25})
+
+    def featurize(self, email):
+        return f"{email['subject']} {email['body']}"
+
+def test_concurrent_cold_get_loads_once():
+    """未読み込み時の同時呼び出しでも読み込みは1回だけであること"""
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return _Bundle('v1')
+
+    holder = ModelHolder(loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(holder.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(bundle is results[0] for bundle in results)
+    assert holder.generation == 1
+
+def test_reload_swaps_and_keeps_old_on_failure():
+    """検証に通ったモデルだけに差し替え、失敗時は旧モデルを使い続けること"""
+    bundles = iter([
+        _Bundle('v1'),
+        _Bundle('v2'),
+        _Bundle('broken', {'important': float('nan'), 'promotion': 0.5}),
+    ])
+    holder = ModelHolder(lambda: next(bundles))
+
+    old = holder.get()
+    assert holder.reload(wait=True)
+    assert holder.current.name == 'v2'
+    assert holder.current is not old
+    assert holder.last_error is None
+
+    assert holder.reload(wait=True)
+    assert holder.current.name == 'v2'
+    assert 'invalid probabilities' in holder.last_error
+    assert holder.describe()['generation'] == 2
+
+def test_requests_are_served_during_background_reload():
+    """再読み込み中も旧モデルが返り、要求が重なった再読み込みは完了後に1回だけ追加で行われること"""
+    started = threading.Event()
+    release = threading.Event()
+    loaded = []
+
+    def loader():
+        name = f'v{len(loaded) + 1}'
+        loaded.append(name)
+        if name == 'v2':
+            started.set()
+            release.wait(5)
+        return _Bundle(name)
+
+    holder = ModelHolder(loader)
+    assert holder.get().name == 'v1'
+
+    assert holder.reload(wait=False) is False
+    assert started.wait(5)
+    assert holder.reloading
+    assert holder.get().name == 'v1'
+
+    holder.reload(wait=False)
+    holder.reload(wait=False)
+    release.set()
+    deadline = time.time() + 5
+    while holder.reloading and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert not holder.reloading
+    assert loaded == ['v1', 'v2', 'v3']
+    assert holder.current.name == 'v3'
+
+def test_reload_survives_failing_on_loaded():
+    """差し替え後の on_loaded が例外を送出しても、エラーを記録して再読み込みを続けられること"""
+    versions = iter(['v1', 'v2', 'v3'])
+    failures = []
+
+    def on_loaded(bundle):
+        if bundle.name == 'v2':
+            failures.append(bundle.name)
+            raise RuntimeError('callback failed')
+
+    holder = ModelHolder(lambda: _Bundle(next(versions)), on_loaded=on_loaded)
+    assert holder.get().name == 'v1'
+
+    assert holder.reload(wait=True, timeout=5)
+    assert failures == ['v2']
+    assert not holder.reloading
+    assert 'callback failed' in holder.last_error
+    assert holder.current.name == 'v2'
+
+    assert holder.reload(wait=True, timeout=5)
+    assert not holder.reloading
+    assert holder.last_error is None
+    assert holder.current.name == 'v3'
+
+def test_swap_listeners_run_only_when_replacing():
+    """差し替えの通知は旧モデルを置き換えた場合だけ行われること（初回の読み込みでは呼ばない）"""
+    versions = iter(['v1', 'v2'])
+    swapped = []
+
+    holder = ModelHolder(lambda: _Bundle(next(versions)))
+    holder.add_swap_listener(lambda bundle: swapped.append(bundle.name))
+
+    holder.get()
+    assert swapped == []
+
+    assert holder.reload(wait=True, timeout=5)
+    assert swapped == ['v2']
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+モデルファイル監視のテスト
+"""
+
+import pytest
+import json
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.model_watcher import ModelWatcher
+
+@pytest.fixture
+def watched(tmp_path):
+    calls = []
+    watcher = ModelWatcher(str(tmp_path), on_change=lambda: calls.append(1), debounce=1.0)
+    watcher.prime()
+    return tmp_path, watcher, calls
+
+def test_new_artifact_reloads_after_debounce(watched):
+    """追加されたファイルは変化が止まってから1回だけ再読み込みを要求すること"""
+    models_dir, watcher, calls = watched
+    artifact = models_dir / 'supervised_model_v1.pkl'
+
+    artifact.write_bytes(b'partial')
+    assert not watcher.poll(now=100.0)
+    artifact.write_bytes(b'partial-complete')
+    assert not watcher.poll(now=100.5)  # 書き込み途中
+    assert not watcher.poll(now=101.0)  # 最後の変化から debounce 秒未満
+    assert watcher.poll(now=101.6)
+    assert calls == [1]
+
+    assert not watcher.poll(now=110.0)
+    assert watcher.describe()['last_change'] == 'supervised_model_v1.pkl'
+
+def test_same_content_and_other_files_are_ignored(watched):
+    """内容の変わらない上書きと .pkl 以外のファイルでは再読み込みしないこと"""
+    models_dir, watcher, calls = watched
+    artifact = models_dir / 'balanced_model_v1.pkl'
+    artifact.write_bytes(b'model-v1')
+    watcher.poll(now=0.0)
+    watcher.poll(now=5.0)
+    assert calls == [1]
+
+    os.utime(artifact, (1, 1))
+    (models_dir / 'notes.txt').write_text('memo')
+    watcher.poll(now=10.0)
+    assert not watcher.poll(now=20.0)
+    assert calls == [1]
+
+    artifact.write_bytes(b'model-v2')
+    watcher.poll(now=30.0)
+    assert watcher.poll(now=40.0)
+    assert calls == [1, 1]
+
+def test_mapped_export_triggers_reload(watched):
+    """NumPy配列形式の書き出し（マニフェストの置き換え）でも再読み込みを要求すること"""
+    models_dir, watcher, calls = watched
+    mapped = models_dir / 'supervised_model_v1.mapped'
+    mapped.mkdir()
+    (mapped / 'weights.npy').write_bytes(b'weights')
+    watcher.poll(now=0.0)
+    assert not watcher.poll(now=5.0)  # マニフェストがまだない
+
+    (mapped / 'manifest.json').write_text('{"format_version": 2}')
+    watcher.poll(now=10.0)
+    assert watcher.poll(now=20.0)
+    assert calls == [1]
+
+def test_status_reports_served_artifact():
+    """モデル状態APIが提供中のモデルのバージョン・チェックサムを返すこと"""
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        client.post('/api/classify', json={'subject': 'テスト', 'body': '本文'})
+        data = json.loads(client.get('/api/model/status').data)
+
+    assert data['model_loaded']
+    assert data['model_version'] == data['model']['version']
+    assert data['model_checksum'] == data['model']['checksum']
+    assert data['model_watcher']['enabled']
+
+if __name__ == '__main__':
+    pytest.main([__file__])
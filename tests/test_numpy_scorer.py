@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+scikit-learn を使わないスコアラーのテスト
+"""
+
+import pytest
+import joblib
+import subprocess
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from sklearn.feature_extraction.text import CountVectorizer
+
+from models.mapped_format import _tokenizer_config
+from app.model_bundle import export_mapped_artifact
+from app.numpy_scorer import build_analyzer
+from models.text_analyzers import script_tokenize
+from tests.test_mapped_artifact import _save_artifact
+
+TEXTS = [
+    "PayPay決済完了のお知らせ  PayPayでのお支払いが完了しました。利用金額：1,250円",
+    "The Café is OPEN now   and the sale is on",
+    "a",
+    "",
+    "緊急\tシステム障害\n復旧作業中",
+]
+
+@pytest.mark.parametrize('params', [
+    dict(ngram_range=(1, 3), token_pattern=r'(?u)\b\w+\b|[A-Z_]+\d*', lowercase=False),
+    dict(ngram_range=(2, 2), lowercase=True, stop_words='english', strip_accents='unicode'),
+    dict(ngram_range=(1, 1), strip_accents='ascii'),
+    dict(analyzer='char_wb', ngram_range=(2, 3)),
+    dict(analyzer='char', ngram_range=(1, 3), lowercase=False),
+    dict(tokenizer=script_tokenize, token_pattern=None, ngram_range=(1, 2)),
+])
+def test_analyzer_matches_sklearn(params):
+    """保存したトークン化設定から scikit-learn と同じ語列が得られること"""
+    vectorizer = CountVectorizer(**params)
+    expected = vectorizer.build_analyzer()
+    actual = build_analyzer(_tokenizer_config(vectorizer))
+
+    for text in TEXTS:
+        assert actual(text) == expected(text)
+
+def test_mapped_model_serves_without_sklearn(tmp_path):
+    """NumPy配列形式のモデルだけなら scikit-learn / SciPy を読み込まずに推論できること"""
+    artifact = tmp_path / 'balanced_model_v1.pkl'
+    _save_artifact(artifact, 'script')
+    export_mapped_artifact(str(artifact))
+
+    code = (
+        "import sys\n"
+        f"sys.path.insert(0, {PROJECT_ROOT!r})\n"
+        "from app.model_bundle import load_bundle\n"
+        f"bundle = load_bundle({str(tmp_path)!r})\n"
+        "print(bundle.engine.infer_one('PayPay決済完了 1,250円')['label'])\n"
+        "print(sorted(m for m in ('sklearn', 'scipy', 'joblib') if m in sys.modules))\n"
+    )
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    lines = output.strip().splitlines()
+
+    assert lines[-2] == '支払い関係'
+    assert lines[-1] == '[]'
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+プリフォークサーバーのテスト
+"""
+
+import pytest
+import json
+import signal
+import socket
+import subprocess
+import sys
+import os
+import threading
+import time
+import urllib.request
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app import model_watcher
+from app.model_watcher import ModelWatcher
+from app.prefork import PooledWSGIServer, _listen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# マスターでモデル（テスト用バンドル）を読み込んでからワーカー1つで起動するサーバー
+SERVER_SCRIPT = """
+import os, sys
+sys.path.insert(0, {root!r})
+from flask import Flask, jsonify
+from app.model_holder import ModelHolder
+from app.prefork import PreforkServer, request_master_reload
+
+class Engine:
+    classes_ = ['important']
+    def infer(self, texts, top_k=None):
+        return [{{'label': 'important', 'probabilities': {{'important': 1.0}}}} for _ in texts]
+
+class Bundle:
+    def __init__(self, name):
+        self.name = name
+        self.engine = Engine()
+    def featurize(self, email):
+        return email['subject']
+
+loads = []
+def loader():
+    loads.append(os.getpid())
+    return Bundle(f'v{{len(loads)}}')
+
+holder = ModelHolder(loader)
+app = Flask(__name__)
+
+@app.route('/info')
+def info():
+    return jsonify(pid=os.getpid(), model=holder.get().name, loads=len(loads))
+
+@app.route('/reload', methods=['POST'])
+def reload():
+    return jsonify(requested=request_master_reload())
+
+server = PreforkServer(app, host='127.0.0.1', port={port}, workers=1, threads=2, holder=holder)
+{before_serve}
+holder.get()
+server.serve_forever()
+"""
+
+def test_pooled_server_serves_on_shared_socket():
+    """共有ソケットから受け付けたリクエストをスレッドプールで処理すること"""
+    sock = _listen('127.0.0.1', 0, backlog=8)
+    port = sock.getsockname()[1]
+    server = PooledWSGIServer('127.0.0.1', port, create_app(), threads=2, fd=sock.fileno())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        for _ in range(3):
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=5) as response:
+                assert json.loads(response.read())['status'] == 'healthy'
+    finally:
+        server.shutdown()
+        server.server_close()
+        sock.close()
+        thread.join(5)
+
+    assert not thread.is_alive()
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _request(url: str, method: str = 'GET'):
+    request = urllib.request.Request(url, method=method, data=b'' if method == 'POST' else None)
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.loads(response.read())
+
+def _wait_for(url: str, condition, timeout: float = 20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            info = _request(url)
+            if condition(info):
+                return info
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise AssertionError(f"Timed out waiting for {url}")
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_reload_runs_in_master_and_restarts_workers():
+    """ワーカーへの再読み込み要求はマスターで読み込まれ、ワーカーは新しいモデルを引き継いで作り直されること"""
+    port = _free_port()
+    master = subprocess.Popen([sys.executable, '-c', SERVER_SCRIPT.format(root=ROOT, port=port, before_serve='')],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        before = _wait_for(f'{url}/info', lambda info: True)
+        assert before['model'] == 'v1'
+
+        assert _request(f'{url}/reload', 'POST')['requested'] is True
+        after = _wait_for(f'{url}/info', lambda info: info['model'] == 'v2')
+
+        # ワーカーは再読み込みせず、マスターで読み込んだモデルを持って作り直されている
+        assert after['pid'] != before['pid']
+        assert after['loads'] == 2
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(10)
+
+def _start_master(port: int, before_serve: str = '') -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, '-c', SERVER_SCRIPT.format(root=ROOT, port=port, before_serve=before_serve)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_reload_requested_before_serving_is_kept():
+    """サーバー起動前の再読み込み要求（監視スレッド・SIGHUP）でマスターが終了せず、起動後に1回だけ読み込むこと"""
+    port = _free_port()
+    master = _start_master(port, 'server.request_reload()\nimport signal; os.kill(os.getpid(), signal.SIGHUP)')
+    url = f'http://127.0.0.1:{port}'
+    try:
+        info = _wait_for(f'{url}/info', lambda info: info['model'] == 'v2')
+        assert info['loads'] == 2
+        assert master.poll() is None
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(10)
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_master_survives_signal_bursts_and_restarts_crashed_worker():
+    """SIGHUP が連続して届いてもマスターは終了せず、異常終了したワーカーを再起動すること"""
+    port = _free_port()
+    master = _start_master(port)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        first = _wait_for(f'{url}/info', lambda info: True)
+        for _ in range(20):
+            master.send_signal(signal.SIGHUP)
+        reloaded = _wait_for(f'{url}/info', lambda info: info['pid'] != first['pid'] and info['model'] != 'v1')
+        assert master.poll() is None
+
+        os.kill(reloaded['pid'], signal.SIGKILL)
+        restarted = _wait_for(f'{url}/info', lambda info: info['pid'] != reloaded['pid'])
+        assert restarted['model'] == reloaded['model'] or restarted['loads'] > reloaded['loads']
+        assert master.poll() is None
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(10)
+    assert master.returncode == 0
+
+def test_watcher_is_not_restarted_in_prefork_workers(tmp_path):
+    """マスターだけで監視する設定では、fork後の子プロセスで監視スレッドを作り直さないこと"""
+    watcher = ModelWatcher(str(tmp_path), on_change=lambda: None, interval=60)
+    watcher.start()
+    requests = []
+    saved = model_watcher._watcher, model_watcher._watch_in_children
+    model_watcher._watcher = watcher
+    try:
+        model_watcher.watch_in_master_only(lambda: requests.append(1))
+        watcher.on_change()
+        assert requests == [1]
+
+        model_watcher._after_fork_in_child()
+        assert not watcher.describe()['running']
+    finally:
+        model_watcher._watcher, model_watcher._watch_in_children = saved
+        watcher._stop.set()
+
+def test_busy_worker_leaves_connections_to_others():
+    """空きスレッドのないワーカーは accept せず、共有ソケットの接続は他のワーカーが受け付けること"""
+    from flask import Flask
+
+    release = threading.Event()
+    busy_app, idle_app = Flask('busy'), Flask('idle')
+    busy_app.add_url_rule('/who', 'who', lambda: (release.wait(10), 'busy')[1])
+    idle_app.add_url_rule('/who', 'who', lambda: 'idle')
+
+    sock = _listen('127.0.0.1', 0, backlog=8)
+    port = sock.getsockname()[1]
+    servers, threads = [], []
+
+    def start(app):
+        server = PooledWSGIServer('127.0.0.1', port, app, threads=1, fd=sock.fileno())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        servers.append(server)
+        threads.append(thread)
+
+    start(busy_app)
+    first = []
+    requester = threading.Thread(target=lambda: first.append(
+        urllib.request.urlopen(f'http://127.0.0.1:{port}/who', timeout=10).read()))
+    requester.start()
+    try:
+        deadline = time.time() + 5
+        while servers[0]._slots._value and time.time() < deadline:
+            time.sleep(0.01)
+        assert servers[0]._slots._value == 0
+
+        start(idle_app)
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/who', timeout=5) as response:
+            assert response.read() == b'idle'
+    finally:
+        release.set()
+        requester.join(10)
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        sock.close()
+
+    assert first == [b'busy']
+
+if __name__ == '__main__':
+    pytest.main([__file__])
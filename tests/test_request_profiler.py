@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+リクエストのプロファイリング・低速リクエストの記録のテスト
+"""
+
+import pytest
+import json
+import sys
+import os
+import time
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from app import create_app
+from app.request_profiler import SlowRequestLog
+
+EMAIL = {"subject": "PayPay決済完了", "body": "利用金額：1,250円 " * 50, "messageId": "m-profile"}
+
+@pytest.fixture
+def profiling_app():
+    original = config.Config.PROFILING_ENABLED
+    config.Config.PROFILING_ENABLED = True
+    try:
+        app = create_app()
+    finally:
+        config.Config.PROFILING_ENABLED = original
+    app.config['TESTING'] = True
+    app.extensions['request_profiler'].top_n = 500
+    return app
+
+def test_slow_log_keeps_slowest_within_window(monkeypatch):
+    """所要時間の長い順に上限件数だけ保持し、期限切れの記録は捨てること"""
+    log = SlowRequestLog(size=2, window=10)
+    for duration in (5.0, 1.0, 9.0, 3.0):
+        log.record(duration, {'duration_ms': duration})
+
+    assert [entry['duration_ms'] for entry in log.snapshot()] == [9.0, 5.0]
+    assert not log.qualifies(4.0)
+
+    now = time.monotonic()
+    monkeypatch.setattr('app.request_profiler.time.monotonic', lambda: now + 11)
+    assert log.snapshot() == []
+
+def test_profile_ranks_feature_and_enricher_functions(profiling_app):
+    """?profile=1 の分類リクエストはキャッシュを使わずに実行し、特徴量関数・文脈補完を含む関数ランキングを返すこと"""
+    with profiling_app.test_client() as client:
+        client.post('/api/classify', data=json.dumps(EMAIL), content_type='application/json')
+        data = json.loads(client.post('/api/classify?profile=1', data=json.dumps(EMAIL),
+                                      content_type='application/json').data)
+
+    assert data['classification']
+    assert data['inference_source'] == 'model'
+    functions = data['profile']['functions']
+    names = [entry['function'] for entry in functions]
+    assert any('_features' in name for name in names)
+    assert any('enrich_context' in name for name in names)
+    assert functions == sorted(functions, key=lambda entry: -entry['self_ms'])
+
+def test_profile_header_on_enrich_context(profiling_app):
+    """X-Profile ヘッダーでも文脈補完エンドポイントをプロファイリングし、/debug/requests に保存すること"""
+    with profiling_app.test_client() as client:
+        data = json.loads(client.post('/api/enrich-context', data=json.dumps(EMAIL),
+                                      content_type='application/json', headers={'X-Profile': '1'}).data)
+        assert data['profile']['functions']
+
+        debug = json.loads(client.get('/debug/requests').data)
+    assert debug['profiles'][-1]['endpoint'] == 'context.enrich_context'
+
+def test_profiling_is_opt_in():
+    """PROFILING_ENABLED=False（既定）ではヘッダー・クエリを無視すること"""
+    app = create_app()
+    with app.test_client() as client:
+        data = json.loads(client.post('/api/classify?profile=1', data=json.dumps(EMAIL),
+                                      content_type='application/json', headers={'X-Profile': '1'}).data)
+    assert 'profile' not in data
+
+@pytest.fixture
+def debug_requests_app():
+    original = config.Config.DEBUG_REQUESTS_ENABLED
+    config.Config.DEBUG_REQUESTS_ENABLED = True
+    try:
+        return create_app()
+    finally:
+        config.Config.DEBUG_REQUESTS_ENABLED = original
+
+def test_debug_endpoint_is_opt_in():
+    """PROFILING_ENABLED・DEBUG_REQUESTS_ENABLED がどちらも無効（既定）なら /debug/requests は404で、記録もしないこと"""
+    app = create_app()
+    assert 'request_profiler' not in app.extensions
+    with app.test_client() as client:
+        client.post('/api/classify', data=json.dumps(EMAIL), content_type='application/json')
+        assert client.get('/debug/requests').status_code == 404
+
+def test_debug_endpoint_lists_slow_requests(debug_requests_app):
+    """低速リクエストを処理段階毎の所要時間・入力の大きさとともに返し、本文は含めないこと"""
+    app = debug_requests_app
+    with app.test_client() as client:
+        client.post('/api/classify', data=json.dumps(EMAIL), content_type='application/json')
+        client.get('/health')
+        slowest = json.loads(client.get('/debug/requests').data)['slowest']
+
+    assert [entry['endpoint'] for entry in slowest] == ['classifier.classify_email']
+    entry = slowest[0]
+    assert entry['input']['body_chars'] == len(EMAIL['body'])
+    assert entry['input']['message_ids'] == ['m-profile']
+    assert 'parse' in entry['stage_ms']
+    assert EMAIL['body'] not in json.dumps(entry, ensure_ascii=False)
+
+if __name__ == '__main__':
+    pytest.main([__file__])
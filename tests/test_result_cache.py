@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+結果キャッシュのテスト
+"""
+
+import pytest
+import json
+import sqlite3
+import threading
+import time
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import classifier, create_app
+from app.result_cache import ResultCache, make_cache_key
+
+def test_lru_eviction_and_counters():
+    """上限を超えた古いエントリが破棄され、ヒット・ミスが計数されること"""
+    cache = ResultCache(max_entries=2)
+    for name in ('a', 'b', 'c'):
+        cache.put(name, {'value': name})
+
+    assert cache.lookup('a') is None
+    assert cache.lookup('c') == {'value': 'c'}
+
+    stats = cache.stats()
+    assert stats['size'] == 2
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+def test_single_flight():
+    """同一キーの同時要求は1回だけ計算されること"""
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return {'value': 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('key', compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{'value': 1}] * 8
+    assert cache.stats()['shared_in_flight'] == 7
+
+def test_sqlite_tier_shared(tmp_path):
+    """SQLite層が別インスタンス（別ワーカー相当）から参照でき、invalidateで破棄されること"""
+    path = str(tmp_path / 'results.sqlite')
+    writer = ResultCache(sqlite_path=path)
+    reader = ResultCache(sqlite_path=path)
+    key = make_cache_key('classify', 'v1', {'subject': '件名', 'body': '本文'})
+
+    writer.put(key, {'classification': '通知'})
+
+    assert reader.lookup(key) == {'classification': '通知'}
+    assert reader.stats()['disk_hits'] == 1
+
+    writer.invalidate()
+    assert ResultCache(sqlite_path=path).lookup(key) is None
+
+def test_sqlite_tier_max_rows(tmp_path):
+    """SQLite層が上限件数を超えた場合に古い結果から削除されること（上書きしたキーは新しい扱い）"""
+    path = str(tmp_path / 'results.sqlite')
+    cache = ResultCache(max_entries=1, sqlite_path=path, sqlite_max_rows=5)
+    keys = [make_cache_key('classify', 'v1', {'subject': str(i)}) for i in range(12)]
+
+    for i, key in enumerate(keys):
+        cache.put(key, {'index': i})
+    cache.put(keys[6], {'index': 6})
+
+    with sqlite3.connect(path) as connection:
+        assert connection.execute('SELECT COUNT(*) FROM results').fetchone()[0] <= 5
+    reader = ResultCache(sqlite_path=path)
+    assert reader.lookup(keys[0]) is None
+    assert reader.lookup(keys[6]) == {'index': 6}
+    assert reader.lookup(keys[11]) == {'index': 11}
+
+def test_classify_cache_and_reload():
+    """同一内容の再送がキャッシュから返り、messageIdはリクエストのものであること。再読み込みで破棄されること"""
+    app = create_app()
+    app.config['TESTING'] = True
+    email = {"subject": "PayPay決済完了", "body": "利用金額：1,250円"}
+
+    with app.test_client() as client:
+        first = client.post('/api/classify', data=json.dumps({**email, "messageId": "m1"}),
+                            content_type='application/json')
+        second = client.post('/api/classify', data=json.dumps({**email, "messageId": "m2"}),
+                             content_type='application/json')
+
+        assert json.loads(second.data)['messageId'] == 'm2'
+        assert {**json.loads(first.data), 'messageId': 'm2'} == json.loads(second.data)
+
+        stats = json.loads(client.get('/api/model/status').data)['result_cache']
+        assert stats['hits'] == 1
+
+        client.post('/api/model/reload')
+        stats = json.loads(client.get('/api/model/status').data)['result_cache']
+        assert stats['size'] == 0
+
+def test_async_reload_invalidates():
+    """非同期の再読み込み（?async=1）でも差し替え時に結果キャッシュ・テンプレート予測が破棄されること"""
+    app = create_app()
+    app.config['TESTING'] = True
+    email = {"subject": "PayPay決済完了", "body": "利用金額：1,250円", "messageId": "m1"}
+
+    with app.test_client() as client:
+        client.post('/api/classify', data=json.dumps(email), content_type='application/json')
+        status = json.loads(client.get('/api/model/status').data)
+        assert status['result_cache']['size'] == 1
+        assert status['template_index']['fingerprints'] == 1
+
+        generation = status['model_holder']['generation']
+        response = client.post('/api/model/reload?async=1')
+        assert response.status_code == 202
+
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            status = json.loads(client.get('/api/model/status').data)
+            if not status['model_holder']['reloading']:
+                break
+            time.sleep(0.05)
+
+        assert status['model_holder']['generation'] == generation + 1
+        assert status['result_cache']['size'] == 0
+        assert status['template_index']['fingerprints'] == 0
+
+def test_batch_results_dropped_after_invalidate(monkeypatch):
+    """一括分類の推論中に invalidate() された場合、旧モデルの結果をキャッシュに書き戻さないこと"""
+    app = create_app()
+    app.config['TESTING'] = True
+    cache = app.extensions['result_cache']
+    infer = classifier.infer_with_templates
+
+    def infer_during_reload(*args, **kwargs):
+        results = infer(*args, **kwargs)
+        cache.invalidate()  # 推論中にモデルが差し替えられた
+        return results
+
+    monkeypatch.setattr(classifier, 'infer_with_templates', infer_during_reload)
+    emails = [{"subject": "PayPay決済完了", "body": "利用金額：1,250円", "messageId": "m1"}]
+
+    with app.test_client() as client:
+        response = client.post('/api/classify/batch', data=json.dumps({"emails": emails}),
+                               content_type='application/json')
+
+    assert response.status_code == 200
+    assert cache.stats()['size'] == 0
+
+if __name__ == '__main__':
+    pytest.main([__file__])
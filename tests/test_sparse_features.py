@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+特徴量の直接疎行列化（feature_mode='sparse'）のテスト
+"""
+
+import pytest
+import joblib
+import pickle
+import sys
+import os
+
+import numpy as np
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.svm import LinearSVC
+from sklearn.pipeline import make_pipeline
+
+from app.model_bundle import load_bundle
+from models.feature_spec import FEATURE_SIGNALS, describe_features, resolve_feature_function, resolve_signal_function
+from models import sparse_features
+from models.model_sync_solution import create_paypay_specialized_features, paypay_specialized_signals
+from models.sparse_features import EngineeredFeatures, build_vectorizer, prepare_texts
+from models.train_model import create_extended_training_data
+
+FEATURE_FUNCTION = 'models.model_sync_solution:create_paypay_specialized_features'
+
+@pytest.fixture(scope='module')
+def training_data():
+    df = create_extended_training_data()
+    return [f"{s} {b}" for s, b in zip(df['subject'], df['body'])], list(df['label'])
+
+def test_signals():
+    """マーカーが生テキストを含まない {マーカー名: 出現数} の辞書で返ること"""
+    text = "PayPay決済完了 1,250円"
+    signals = paypay_specialized_signals(text)
+
+    assert signals['PAYPAY_VARIANT_PayPay'] == 1
+    assert signals['AMOUNT_RANGE_SMALL'] == 2  # 250円（\d+円・\d{3,6}円）
+    assert all(name.isupper() or '_' in name for name in signals)
+    assert 'PayPay決済完了' not in signals
+
+@pytest.mark.parametrize('name', sorted(FEATURE_SIGNALS))
+def test_text_and_sparse_share_signals(training_data, name):
+    """'text' 方式の文字列と 'sparse' 方式の数値列が同じマーカーの辞書から作られること"""
+    texts, _ = training_data
+    function = resolve_feature_function(name)
+    signals = resolve_signal_function(name)
+    features = EngineeredFeatures(name, norm=None).fit(texts) if name != 'raw' else None
+
+    for text in texts:
+        markers = signals(text)
+        assert function(text) == ' '.join([text] + [m for m, count in markers.items() for _ in range(count)])
+        if features is not None:
+            row = features.transform([text])
+            names = features.get_feature_names_out()
+            assert {names[i]: row[0, i] for i in row.nonzero()[1]} == markers
+
+def test_sparse_vectorizer_has_no_marker_ngrams(training_data):
+    """TF-IDF列は生テキストのみから作られ、マーカーをまたぐn-gramや重複語彙を持たないこと"""
+    texts, _ = training_data
+    params = dict(ngram_range=(1, 3), sublinear_tf=True, token_pattern=r'(?u)\b\w+\b|[A-Z_]+\d*', lowercase=False)
+
+    sparse = build_vectorizer('sparse', FEATURE_FUNCTION, **params)
+    sparse.fit(prepare_texts('sparse', create_paypay_specialized_features, texts))
+    dense = build_vectorizer('text', FEATURE_FUNCTION, **params)
+    dense.fit(prepare_texts('text', create_paypay_specialized_features, texts))
+
+    text_names = sparse.transformer_list[0][1].get_feature_names_out()
+    assert not any('PAYPAY_' in name for name in text_names)
+    assert len(sparse.get_feature_names_out()) < len(dense.get_feature_names_out())
+
+def test_sparse_artifact_serving(tmp_path, training_data):
+    """feature_mode='sparse' のモデルファイルは生テキストを入力として推論されること"""
+    texts, labels = training_data
+    pipeline = make_pipeline(build_vectorizer('sparse', FEATURE_FUNCTION), LinearSVC()).fit(texts, labels)
+    joblib.dump({
+        'pipeline': pipeline,
+        **describe_features(FEATURE_FUNCTION, feature_mode='sparse')
+    }, tmp_path / 'paypay_specialized_v1.pkl')
+
+    bundle = load_bundle(str(tmp_path))
+    text = bundle.build_text({'subject': 'PayPay決済完了', 'body': '利用金額：1,250円'})
+
+    assert bundle.feature_mode == 'sparse'
+    assert bundle.feature_function(text) == text
+    assert bundle.engine.infer_one(text)['label'] == pipeline.predict([text])[0]
+    assert isinstance(pipeline[0].transformer_list[1][1], EngineeredFeatures)
+
+def test_engineered_features_resolve_once_and_scale(monkeypatch, training_data):
+    """特徴量関数は fit・読み込み時に1回だけ解決し、マーカー列はL2正規化されること"""
+    texts, _ = training_data
+    calls = []
+    resolve = sparse_features.resolve_signal_function
+    monkeypatch.setattr(sparse_features, 'resolve_signal_function',
+                        lambda name: calls.append(name) or resolve(name))
+
+    features = EngineeredFeatures(FEATURE_FUNCTION, weight=0.5).fit(texts)
+    features.transform(texts[:3])
+    features.transform(texts[:3])
+    assert calls == [FEATURE_FUNCTION]
+
+    restored = pickle.loads(pickle.dumps(features))
+    assert 'signals_' not in features.__getstate__()
+    assert len(calls) == 2
+    restored.transform(texts[:3])
+    assert len(calls) == 2
+
+    norms = np.sqrt(np.asarray(restored.transform(texts).multiply(restored.transform(texts)).sum(axis=1))).ravel()
+    assert np.allclose(norms[norms > 0], 0.5)
+
+def test_engineered_features_without_norm_keep_counts(training_data):
+    """norm 追加前のモデルファイル（norm なし）は出現数のまま変換されること"""
+    texts, _ = training_data
+    features = EngineeredFeatures(FEATURE_FUNCTION).fit(texts)
+    state = features.__getstate__()
+    del state['norm']
+    legacy = EngineeredFeatures.__new__(EngineeredFeatures)
+    legacy.__setstate__(pickle.loads(pickle.dumps(state)))
+
+    text = texts[0]
+    counts = paypay_specialized_signals(text)
+    assert legacy.norm is None
+    assert legacy.transform([text]).sum() == pytest.approx(sum(counts.values()))
+
+if __name__ == '__main__':
+    pytest.main([__file__])
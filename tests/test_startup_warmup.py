@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+起動時ウォームアップ・準備完了エンドポイントのテスト
+"""
+
+import pytest
+import json
+import subprocess
+import sys
+import os
+import threading
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from app import create_app
+from app.startup_warmup import StartupWarmup
+
+def test_warmup_runs_steps_once():
+    """同時に呼ばれても各処理は1回だけ実行され、処理毎の所要時間が記録されること"""
+    calls = []
+    warmup = StartupWarmup([('model', lambda: calls.append('model')), ('enricher', lambda: calls.append('enricher'))])
+
+    threads = [threading.Thread(target=warmup.run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['model', 'enricher']
+    assert warmup.ready
+    assert set(warmup.describe()['step_ms']) == {'model', 'enricher'}
+
+def test_failed_warmup_can_be_retried():
+    """失敗した処理名とエラーを記録し、再実行で準備完了になれること"""
+    broken = [True]
+
+    def load():
+        if broken[0]:
+            raise ValueError('model file missing')
+
+    warmup = StartupWarmup([('model', load)])
+    assert not warmup.run()
+    assert warmup.state == 'failed'
+    assert warmup.error == 'model: ValueError: model file missing'
+
+    broken[0] = False
+    assert warmup.run()
+    assert warmup.describe()['error'] is None
+
+def test_ready_endpoint_waits_for_warmup():
+    """/ready はウォームアップ完了まで 503、/health は常に 200 を返すこと"""
+    app = create_app()
+    release = threading.Event()
+    warmup = StartupWarmup([('model', lambda: release.wait(5))])
+    app.extensions['startup_warmup'] = warmup
+    client = app.test_client()
+
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert json.loads(response.data)['status'] in ('pending', 'warming')
+    assert client.get('/health').status_code == 200
+
+    release.set()
+    warmup.run()
+    response = client.get('/ready')
+    data = json.loads(response.data)
+    assert response.status_code == 200
+    assert data['status'] == 'ready'
+    assert 'model' in data['warmup']['step_ms']
+
+def test_app_warmup_loads_model_and_enricher():
+    """アプリケーションのウォームアップでモデル・文脈補完が読み込まれること"""
+    app = create_app()
+    warmup = app.extensions['startup_warmup']
+
+    assert warmup.run()
+    assert list(warmup.describe()['step_ms']) == ['model', 'enricher', 'templates', 'requests']
+    assert app.test_client().get('/ready').status_code == 200
+
+def test_app_import_skips_training_dependencies():
+    """アプリケーションの作成で pandas・scikit-learn・SciPy・joblib を読み込まないこと"""
+    code = (
+        "import sys\n"
+        f"sys.path.insert(0, {PROJECT_ROOT!r})\n"
+        "from app import create_app\n"
+        "create_app()\n"
+        "print(sorted(m for m in ('pandas', 'sklearn', 'scipy', 'joblib') if m in sys.modules))\n"
+    )
+    env = dict(os.environ, STARTUP_WARMUP='False', MODEL_WATCH_ENABLED='False')
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, env=env)
+
+    assert output.stdout.strip().splitlines()[-1] == '[]'
+
+if __name__ == '__main__':
+    pytest.main([__file__])
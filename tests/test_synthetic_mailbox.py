@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+合成メールボックス（ベンチマーク用）のテスト
+"""
+
+import pytest
+import json
+import subprocess
+import sys
+import os
+from collections import Counter
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from models.synthetic_mailbox import CATEGORIES, CATEGORY_LABELS, generate_mailbox, html_to_text
+
+def test_same_seed_same_mailbox():
+    """同じシードなら同じメールボックス、異なるシードなら異なるメールボックスを生成すること"""
+    assert generate_mailbox(30, seed=7, body_chars=500) == generate_mailbox(30, seed=7, body_chars=500)
+    assert generate_mailbox(30, seed=7) != generate_mailbox(30, seed=8)
+
+def test_covers_all_categories_and_labels():
+    """全カテゴリを均等に生成し、カテゴリに対応する正解ラベルを付けること"""
+    mailbox = generate_mailbox(len(CATEGORIES) * 4, seed=1)
+
+    assert Counter(email['category'] for email in mailbox) == {category: 4 for category in CATEGORIES}
+    assert all(email['label'] == CATEGORY_LABELS[email['category']] for email in mailbox)
+    assert len({email['messageId'] for email in mailbox}) == len(mailbox)
+
+def test_body_chars_and_html_bodies():
+    """本文が目標文字数以上になり、HTMLメールの本文にタグ・文字参照が残らないこと"""
+    mailbox = generate_mailbox(60, seed=2, body_chars=1500, html_ratio=0.5)
+
+    assert all(len(email['body']) >= 1500 for email in mailbox)
+    html = [email for email in mailbox if email['html']]
+    assert html
+    for email in html:
+        assert '<' not in email['body'] and '&nbsp;' not in email['body']
+
+    assert html_to_text('<p>金額&nbsp;1,000円</p><style>p{color:red}</style><br>以上') == '金額 1,000円\n以上'
+
+def test_unknown_category():
+    with pytest.raises(ValueError):
+        generate_mailbox(5, categories=['paypay', 'unknown'])
+
+def test_benchmark_script_writes_json(tmp_path):
+    """ベンチマークスクリプトが計測結果をJSONで保存すること"""
+    output = tmp_path / 'benchmark.json'
+    subprocess.run([sys.executable, os.path.join(PROJECT_ROOT, 'scripts', 'benchmark.py'),
+                    '--emails', '12', '--only', 'features,enricher,adversarial', '--adversarial-lengths', '200,800',
+                    '--json', str(output)],
+                   check=True, capture_output=True, cwd=PROJECT_ROOT)
+
+    report = json.loads(output.read_text(encoding='utf-8'))
+    assert report['mailbox']['emails'] == 12
+    result = report['results']['enricher.enrich_context']
+    assert result['runs'] == 12 and result['p50_ms'] <= result['p99_ms']
+    assert any(name.startswith('features.') for name in report['results'])
+    adversarial = report['adversarial']['digit_run.template.mask']
+    assert set(adversarial['ms_per_kb']) == {'200', '800'} and adversarial['scaling_exponent'] is not None
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+テンプレート指紋インデックスのテスト
+"""
+
+import pytest
+import json
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.context_enricher import advanced_enricher
+from app.template_index import TemplateFingerprinter, TemplateIndex
+
+def _inference(probabilities, margin=None):
+    """推論エンジンの infer と同じ形式の推論結果"""
+    ranked = sorted(probabilities, key=lambda label: -probabilities[label])
+    return {
+        'label': ranked[0],
+        'confidence': probabilities[ranked[0]],
+        'probabilities': probabilities,
+        'top_k': [{'label': label, 'probability': probabilities[label]} for label in ranked],
+        'margin': margin,
+        'calibration': 'sigmoid'
+    }
+
+@pytest.fixture
+def fingerprinter():
+    return TemplateFingerprinter(advanced_enricher.amount_patterns, advanced_enricher.date_patterns)
+
+def test_fingerprint_masks_variable_fields(fingerprinter):
+    """金額・日付・時刻・IDだけが異なる定型メールは同じ指紋になること"""
+    a = "PayPay決済完了 セブンイレブンで1,250円のお支払いが完了しました 2024/03/15 10:30:12 承認番号 A1B2C3D4"
+    b = "PayPay決済完了 セブンイレブンで980円のお支払いが完了しました 2024/04/01 09:01:59 承認番号 Z9Y8X7W6"
+    c = "Amazon タイムセール 最大50%OFF ¥1,980から"
+
+    assert fingerprinter.fingerprint(a) == fingerprinter.fingerprint(b)
+    assert fingerprinter.fingerprint(a) != fingerprinter.fingerprint(c)
+
+def test_fingerprint_masks_store_names(fingerprinter):
+    """店舗名・加盟店名だけが異なる定型メールは同じ指紋になること"""
+    a = "PayPay決済完了 セブンイレブンで1,250円のお支払いが完了しました"
+    b = "PayPay決済完了 ローソン渋谷店で980円のお支払いが完了しました"
+    assert fingerprinter.mask(a) == "PayPay決済完了 <STORE>で<AMOUNT>のお支払いが完了しました"
+    assert fingerprinter.fingerprint(a) == fingerprinter.fingerprint(b)
+
+    c = "デビットカードご利用のお知らせ ご利用店舗：AMAZON.CO.JP ご利用金額：3,360円"
+    d = "デビットカードご利用のお知らせ ご利用店舗：ファミリーマート ご利用金額：500円"
+    assert fingerprinter.fingerprint(c) == fingerprinter.fingerprint(d)
+    assert fingerprinter.fingerprint(a) != fingerprinter.fingerprint(c)
+
+def test_index_requires_stable_label(fingerprinter):
+    """規定回数同じラベルで観測された指紋だけが高速経路で返され、ラベルが揺れたら外れること"""
+    index = TemplateIndex(fingerprinter, min_observations=2, verify_interval=3)
+
+    index.observe('fp', _inference({'支払い関係': 0.9, '通知': 0.1}, margin=1.5))
+    assert index.lookup('fp') is None
+
+    index.observe('fp', _inference({'支払い関係': 0.7, '通知': 0.3}, margin=0.5))
+    # 直前のメールの値ではなく、観測全体の平均確率を代表値として返す
+    representative = index.lookup('fp')
+    assert representative['label'] == '支払い関係'
+    assert representative['confidence'] == pytest.approx(0.8)
+    assert representative['probabilities'] == pytest.approx({'支払い関係': 0.8, '通知': 0.2})
+    assert representative['margin'] == pytest.approx(1.0)
+    assert [entry['label'] for entry in index.lookup('fp', top_k=1)['top_k']] == ['支払い関係']
+    # verify_interval 回目はモデルでの再評価を要求
+    assert index.lookup('fp') is None
+
+    index.observe('fp', _inference({'支払い関係': 0.4, '通知': 0.6}))
+    assert index.lookup('fp') is None
+    assert index.report()[0]['stability'] == pytest.approx(2 / 3)
+
+def test_classify_uses_template_fast_path():
+    """同じテンプレートが規定回数観測された後はモデルを実行せずに返すこと"""
+    app = create_app()
+    app.config['TESTING'] = True
+
+    with app.test_client() as client:
+        sources = []
+        for amount in ('1,250', '980', '3,300', '12,800'):
+            response = client.post('/api/classify', data=json.dumps({
+                "subject": "PayPay決済完了",
+                "body": f"セブンイレブンで{amount}円のお支払いが完了しました"
+            }), content_type='application/json')
+            sources.append(json.loads(response.data)['inference_source'])
+
+        assert sources == ['model', 'model', 'model', 'template']
+
+        report = json.loads(client.get('/api/model/templates').data)
+        assert report['summary']['hits'] == 1
+        assert report['templates'][0]['observations'] == 3
+
+if __name__ == '__main__':
+    pytest.main([__file__])
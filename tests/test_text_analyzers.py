@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+日本語向けTF-IDFアナライザーのテスト
+"""
+
+import pytest
+import pickle
+import sys
+import os
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from models.text_analyzers import ANALYZERS, analyzer_params, script_tokenize
+
+TFIDF_PARAMS = dict(ngram_range=(1, 3), token_pattern=r'(?u)\b\w+\b|[A-Z_]+\d*', lowercase=False)
+
+def test_script_tokenize_splits_on_script_boundaries():
+    """漢字・ひらがな・カタカナ・英数字の境界で分割され、特徴量マーカーは1トークンのままであること"""
+    tokens = script_tokenize("PayPay決済完了のお知らせ セブンイレブンで1,250円 PAYPAY_STRENGTH_3")
+
+    assert tokens == ['PayPay', '決済完了', 'のお', '知', 'らせ', 'セブンイレブン', 'で', '1', '250', '円',
+                      'PAYPAY_STRENGTH_3']
+
+def test_word_tokenizer_merges_clauses():
+    """従来の token_pattern では空白のない日本語が文節ごと1トークンになること（比較の前提）"""
+    vectorizer = TfidfVectorizer(**analyzer_params('word', TFIDF_PARAMS)).fit(["セブンイレブンで1,250円のお支払いが完了しました"])
+    assert 'セブンイレブンで1' in vectorizer.vocabulary_
+
+@pytest.mark.parametrize('analyzer', ANALYZERS)
+def test_analyzers_fit_and_pickle(analyzer):
+    """全アナライザーで学習・保存・読み込みができること"""
+    texts = ["PayPay決済完了 1,250円", "Amazon タイムセール開催中", "緊急 システム障害のお知らせ"]
+    vectorizer = TfidfVectorizer(**analyzer_params(analyzer, TFIDF_PARAMS)).fit(texts)
+    restored = pickle.loads(pickle.dumps(vectorizer))
+
+    assert (restored.transform(texts) != vectorizer.transform(texts)).nnz == 0
+
+if __name__ == '__main__':
+    pytest.main([__file__])